@@ -2,8 +2,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import get_settings
 from app.core.factory import init_service_factory
+from app.core.tracing import get_tracer
 
-from app.api.routes import router
+from app.api.routes import router, job_queue
+from app.services.core.llm.http_pool import close_shared_http_client
+from app.services.core.monitoring.cost import get_cost_service
+from app.services.core.storage.file_io import shutdown_file_io
+from app.services.core.storage.task_writer import flush_task_writers
 
 # Khởi tạo settings
 settings = get_settings()
@@ -59,4 +64,25 @@ app.add_middleware(
 )
 
 # Add routes
-app.include_router(router, prefix="/api/v1") 
\ No newline at end of file
+app.include_router(router, prefix="/api/v1")
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    """Khởi động worker pool và khôi phục các job chưa hoàn thành"""
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    """Dừng worker pool, các job đang chạy sẽ được chạy lại ở lần khởi động sau"""
+    await job_queue.stop()
+    # Ghi nốt các thay đổi chi phí đang chờ trước khi tắt
+    cost_service = await get_cost_service()
+    await cost_service.shutdown()
+    await flush_task_writers()
+    tracer = get_tracer()
+    if tracer is not None:
+        await tracer.flush()
+    await close_shared_http_client()
+    await shutdown_file_io() 
\ No newline at end of file
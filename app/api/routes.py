@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import PlainTextResponse
 from uuid import uuid4
 from datetime import datetime
 from typing import Dict, Optional, List, Any
@@ -23,12 +24,35 @@ from app.models.cost import PhaseTimingInfo, ResearchCostMonitoring
 from app.services.research.prepare import PrepareService
 from app.services.research.research import ResearchService
 from app.services.research.edit import EditService
-from app.services.research.storage import ResearchStorageService
+from app.services.research.storage import ResearchStorageService, status_projection
+from app.services.research.task_registry import TaskRegistry
+from app.services.core.storage.file_io import get_file_io
+from app.services.core.storage.task_index import SORT_FIELDS as TASK_SORT_FIELDS
 from app.services.core.storage.github import GitHubService
-from app.core.exceptions import BaseError
+from app.core.exceptions import BaseError, JobAlreadyActiveError, QueueFullError
 from app.core.config import get_settings
 from app.core.factory import get_service_factory
 from app.core.logging import logger
+from app.core.metrics import (
+    COST_RESIDENT_BYTES,
+    COST_RESIDENT_TASKS,
+    JOB_QUEUE_JOBS,
+    PROVIDER_CONCURRENCY_LIMIT,
+    PROVIDER_IN_FLIGHT,
+    RESEARCH_TASKS,
+    SINGLE_FLIGHT_IN_FLIGHT,
+    TASK_REGISTRY_RESIDENT_BYTES,
+    TASK_REGISTRY_RESIDENT_TASKS,
+    get_metrics_registry
+)
+from app.core.ratelimit import get_rate_limit_stats
+from app.core.singleflight import get_single_flight
+from app.core.tracing import TRACE_FORMATS, get_tracer
+from app.services.core.jobs import get_job_queue
+from app.services.core.llm.http_pool import get_pool_stats
+from app.services.core.monitoring.analytics import get_cost_index
+from app.services.core.monitoring.budget import get_budget_manager
+from app.services.core.monitoring.pricing import get_pricing_registry
 
 router = APIRouter()
 
@@ -38,19 +62,168 @@ async def health_check():
     """
     Kiểm tra trạng thái hoạt động của API.
     """
+    single_flight = get_single_flight()
+    budget = get_budget_manager()
+    cost_service = await get_service_factory().get_cost_monitoring_service()
     return {
         "status": "ok",
         "timestamp": datetime.now().isoformat(),
         "service": "deep-research-agent",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "queue": job_queue.get_stats(),
+        "llm_http_pool": get_pool_stats(),
+        "single_flight": single_flight.get_stats() if single_flight else None,
+        "rate_limits": get_rate_limit_stats(),
+        "cost_memory": cost_service.get_memory_stats(),
+        "budget": budget.get_stats() if budget else None,
+        "pricing": get_pricing_registry().get_stats(),
+        "file_io": get_file_io().get_stats(),
+        "task_registry": research_tasks.get_stats()
     }
 
-# Lưu trữ tạm thời các research tasks (trong thực tế nên dùng database)
-research_tasks: Dict[str, ResearchResponse] = {}
+@router.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """
+    Metric của pipeline theo định dạng text của Prometheus (độ trễ LLM/search, token, chi phí,
+    cache hit, lỗi, thời gian phase/section, số task đang chạy và độ sâu hàng đợi).
+    """
+    # Cập nhật các gauge từ trạng thái hiện tại trước khi xuất
+    RESEARCH_TASKS.clear()
+    for task in research_tasks.values():
+        RESEARCH_TASKS.inc(status=getattr(task.status, "value", task.status))
+    registry_stats = research_tasks.get_stats()
+    TASK_REGISTRY_RESIDENT_TASKS.set(registry_stats["resident_tasks"])
+    TASK_REGISTRY_RESIDENT_BYTES.set(registry_stats["resident_bytes"])
+    
+    queue_stats = job_queue.get_stats()
+    JOB_QUEUE_JOBS.set(queue_stats["running"], state="running")
+    JOB_QUEUE_JOBS.set(queue_stats["queued"], state="queued")
+    
+    cost_service = await get_service_factory().get_cost_monitoring_service()
+    memory_stats = cost_service.get_memory_stats()
+    COST_RESIDENT_TASKS.set(memory_stats["resident_tasks"])
+    COST_RESIDENT_BYTES.set(memory_stats["resident_bytes"])
+    
+    single_flight = get_single_flight()
+    SINGLE_FLIGHT_IN_FLIGHT.set(single_flight.get_stats()["in_flight"] if single_flight else 0)
+    
+    for provider, stats in get_rate_limit_stats().items():
+        PROVIDER_IN_FLIGHT.set(stats["in_flight"], provider=provider)
+        PROVIDER_CONCURRENCY_LIMIT.set(stats["concurrency_limit"], provider=provider)
+    
+    return PlainTextResponse(
+        get_metrics_registry().render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 # Khởi tạo ResearchStorageService
 research_storage_service = ResearchStorageService()
 
+# Research tasks trong bộ nhớ (LRU, giới hạn theo cấu hình), task bị loại được tải lại từ file
+research_tasks = TaskRegistry(
+    research_storage_service,
+    max_tasks=get_settings().TASK_REGISTRY_MAX_TASKS,
+    max_bytes=get_settings().TASK_REGISTRY_MAX_BYTES
+)
+
+# Hàng đợi job xử lý research tasks (handlers được đăng ký ở cuối module)
+job_queue = get_job_queue()
+
+# Thời gian (giây) client nên chờ trước khi gửi lại yêu cầu khi hệ thống quá tải
+QUEUE_RETRY_AFTER_SECONDS = 30
+
+def _check_queue_capacity():
+    """
+    Kiểm tra hàng đợi còn nhận thêm task không
+    
+    Raises:
+        HTTPException: 429 nếu hàng đợi đã đầy
+    """
+    if job_queue.is_saturated():
+        logger.warning(f"Từ chối yêu cầu mới do hàng đợi đã đầy: {job_queue.get_stats()}")
+        raise HTTPException(
+            status_code=429,
+            detail="Hệ thống đang quá tải, vui lòng thử lại sau",
+            headers={"Retry-After": str(QUEUE_RETRY_AFTER_SECONDS)}
+        )
+
+def _reserve_job(job_type: str, task_id: str):
+    """
+    Giữ chỗ cho job của research task trong hàng đợi (đồng bộ, gọi trước mọi await của request)
+    
+    Args:
+        job_type: Loại job đã đăng ký handler
+        task_id: ID của research task
+        
+    Raises:
+        HTTPException: 429 nếu hàng đợi đã đầy, 409 nếu task đang được xử lý
+    """
+    try:
+        job_queue.reserve(f"{job_type}:{task_id}")
+    except QueueFullError as e:
+        logger.warning(f"[Task {task_id}] Không thể đưa vào hàng đợi: {e.message}")
+        raise HTTPException(
+            status_code=429,
+            detail=e.message,
+            headers={"Retry-After": str(QUEUE_RETRY_AFTER_SECONDS)}
+        )
+    except JobAlreadyActiveError:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Research task {task_id} đang được xử lý"
+        )
+
+async def _save_and_submit(job_type: str, task: ResearchResponse, payload: Dict[str, Any]):
+    """
+    Lưu research task rồi đưa job vào hàng đợi, dùng chỗ đã giữ bằng _reserve_job
+    
+    Nếu không đưa được vào hàng đợi, task đã lưu được đánh dấu FAILED để không còn task
+    PENDING không bao giờ được chạy.
+    
+    Args:
+        job_type: Loại job đã đăng ký handler
+        task: Research task
+        payload: Dữ liệu của job
+        
+    Raises:
+        HTTPException: 429 nếu hàng đợi đã đầy
+    """
+    job_id = f"{job_type}:{task.id}"
+    # Ghi lại loại job để /resume chạy lại đúng quy trình
+    task.job_type = job_type
+    try:
+        research_tasks[task.id] = task
+        await research_storage_service.save_task(task)
+    except BaseException:
+        job_queue.release(job_id)
+        raise
+    
+    try:
+        await job_queue.submit(job_id, job_type, payload, reserved=True)
+    except Exception as e:
+        job_queue.release(job_id)
+        logger.error(f"[Task {task.id}] Không thể đưa vào hàng đợi: {str(e)}")
+        task.status = ResearchStatus.FAILED
+        task.error = ResearchError(
+            message="Không thể đưa research task vào hàng đợi",
+            details={"error": str(e)}
+        )
+        task.updated_at = datetime.utcnow()
+        task.progress_info = {
+            "phase": "failed",
+            "message": f"Không thể đưa vào hàng đợi: {str(e)}",
+            "timestamp": datetime.utcnow().isoformat(),
+            "error": str(e)
+        }
+        await research_storage_service.save_task(task)
+        if isinstance(e, QueueFullError):
+            raise HTTPException(
+                status_code=429,
+                detail=e.message,
+                headers={"Retry-After": str(QUEUE_RETRY_AFTER_SECONDS)}
+            )
+        raise
+
 async def process_research(task_id: str, request: ResearchRequest):
     """
     Xử lý yêu cầu nghiên cứu trong background
@@ -91,6 +264,9 @@ async def process_research(task_id: str, request: ResearchRequest):
         }
         await research_storage_service.save_task(research_tasks[task_id])
         
+        # Tìm kiếm context cho dàn ý song song với bước phân tích (nếu được bật)
+        prepare_service.start_speculative_search(request.query, task_id)
+        
         start_time = time.time()
         analysis = await prepare_service.analyze_query(request.query, task_id)
         end_time = time.time()
@@ -225,10 +401,7 @@ async def process_research(task_id: str, request: ResearchRequest):
             await research_storage_service.save_task(research_tasks[task_id])
 
 @router.post("/research", response_model=ResearchResponse)
-async def create_research(
-    request: ResearchRequest,
-    background_tasks: BackgroundTasks
-) -> ResearchResponse:
+async def create_research(request: ResearchRequest) -> ResearchResponse:
     """
     Tạo một yêu cầu nghiên cứu mới
     
@@ -237,11 +410,13 @@ async def create_research(
     
     Args:
         request: Thông tin yêu cầu nghiên cứu
-        background_tasks: Background tasks để xử lý nghiên cứu
         
     Returns:
         ResearchResponse: Thông tin về research task đã tạo
         
+    Raises:
+        HTTPException: 429 nếu hàng đợi xử lý đã đầy
+        
     Examples:
         ```json
         # Request
@@ -281,11 +456,15 @@ async def create_research(
     try:
         logger.info(f"Nhận yêu cầu nghiên cứu mới: {request.topic or request.query}")
         
-        # Tạo ID cho research task
+        # Từ chối sớm nếu hệ thống đang quá tải
+        _check_queue_capacity()
+        
+        # Tạo ID cho research task và giữ chỗ trong hàng đợi trước khi lưu task
         task_id = str(uuid4())
+        _reserve_job("research", task_id)
         
         # Tạo research task với thông tin tiến độ ban đầu
-        research_tasks[task_id] = ResearchResponse(
+        task = ResearchResponse(
             id=task_id,
             request=request,
             status=ResearchStatus.PENDING,
@@ -298,16 +477,15 @@ async def create_research(
             }
         )
         
-        # Lưu task vào file
-        await research_storage_service.save_task(research_tasks[task_id])
+        # Lưu task và đưa quá trình nghiên cứu vào hàng đợi job
+        await _save_and_submit("research", task, {"task_id": task_id, "request": request.dict()})
         
         logger.info(f"Đã tạo research task {task_id}")
         
-        # Chạy quá trình nghiên cứu trong background
-        background_tasks.add_task(process_research, task_id, request)
-        
-        return research_tasks[task_id]
+        return task
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Lỗi khi tạo research task: {str(e)}")
         raise HTTPException(
@@ -384,11 +562,9 @@ async def get_research(research_id: str) -> ResearchResponse:
         if research_id not in research_tasks:
             # Thử tải từ file
             logger.info(f"Task {research_id} không có trong bộ nhớ, thử tải từ file...")
-            task = await research_storage_service.load_full_task(research_id)
+            task = await research_tasks.load(research_id, full=True)
             
             if task:
-                # Cập nhật vào bộ nhớ
-                research_tasks[research_id] = task
                 logger.info(f"Đã tải đầy đủ task {research_id} từ file, trạng thái: {task.status}")
             else:
                 logger.error(f"Không tìm thấy research task {research_id}")
@@ -398,27 +574,35 @@ async def get_research(research_id: str) -> ResearchResponse:
                 )
         else:
             # Nếu task đã có trong bộ nhớ nhưng chưa có đầy đủ thông tin
-            task = research_tasks[research_id]
+            task = await research_tasks.load(research_id)
+            loaded = False
             
             # Tải outline nếu chưa có
             if not task.outline:
                 outline = await research_storage_service.load_outline(research_id)
                 if outline:
                     task.outline = outline
+                    loaded = True
             
             # Tải sections nếu chưa có
             if not task.sections and task.status in [ResearchStatus.EDITING, ResearchStatus.COMPLETED]:
                 sections = await research_storage_service.load_sections(research_id)
                 if sections:
                     task.sections = sections
+                    loaded = True
             
             # Tải result nếu chưa có
             if not task.result and task.status == ResearchStatus.COMPLETED:
                 result = await research_storage_service.load_result(research_id)
                 if result:
                     task.result = result
+                    loaded = True
             
-        return research_tasks[research_id]
+            # Ước lượng lại dung lượng task trong bộ nhớ sau khi bổ sung nội dung
+            if loaded and not research_tasks.is_pinned(research_id):
+                research_tasks[research_id] = task
+            
+        return task
         
     except HTTPException:
         raise
@@ -429,6 +613,22 @@ async def get_research(research_id: str) -> ResearchResponse:
             detail=str(e)
         )
 
+async def _load_task_status(research_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Lấy trạng thái/tiến độ của task: từ bộ nhớ nếu có, nếu không đọc status.json
+    (không tải toàn bộ task vào bộ nhớ)
+    
+    Args:
+        research_id: ID của research task
+        
+    Returns:
+        Optional[Dict[str, Any]]: Kết quả của status_projection hoặc None nếu không tìm thấy
+    """
+    task = research_tasks.get(research_id)
+    if task is not None:
+        return status_projection(task)
+    return await research_storage_service.load_task_status(research_id)
+
 @router.get("/research/{research_id}/status", response_model=Dict[str, Any])
 async def get_research_status(research_id: str) -> Dict[str, Any]:
     """
@@ -443,38 +643,34 @@ async def get_research_status(research_id: str) -> Dict[str, Any]:
     Raises:
         HTTPException: Nếu không tìm thấy research task
     """
-    if research_id not in research_tasks:
-        # Thử tải từ file
-        task = await research_storage_service.load_task(research_id)
-        if task:
-            research_tasks[research_id] = task
-        else:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Không tìm thấy research task với ID: {research_id}"
-            )
-    
-    task = research_tasks[research_id]
+    # Task trong bộ nhớ hoặc status.json (không tải toàn bộ task)
+    task = await _load_task_status(research_id)
+    if not task:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Không tìm thấy research task với ID: {research_id}"
+        )
     
     # Tạo response với thông tin chi tiết
     response = {
-        "status": task.status,
-        "progress_info": task.progress_info or {}
+        "status": task["status"],
+        "progress_info": task["progress_info"] or {}
     }
     
     # Bổ sung thông tin chi tiết dựa trên trạng thái
-    if task.status == ResearchStatus.RESEARCHING and task.outline:
-        total_sections = len(task.outline.sections)
+    if task["status"] == ResearchStatus.RESEARCHING and task["outline_sections"]:
+        total_sections = len(task["outline_sections"])
         current_section = response["progress_info"].get("current_section", 0)
         
         # Thêm thông tin về section hiện tại
         if 0 < current_section <= total_sections:
-            section = task.outline.sections[current_section - 1]
-            response["progress_info"]["current_section_title"] = section.title
-            response["progress_info"]["current_section_description"] = section.description
+            section = task["outline_sections"][current_section - 1]
+            response["progress_info"]["current_section_title"] = section["title"]
+            response["progress_info"]["current_section_description"] = section["description"]
         
-        # Tính phần trăm hoàn thành
-        completed_percentage = (current_section / total_sections) * 100 if total_sections > 0 else 0
+        # Tính phần trăm hoàn thành (các phần có thể được nghiên cứu song song nên ưu tiên số phần đã xong)
+        completed_sections = response["progress_info"].get("completed_sections", current_section)
+        completed_percentage = (completed_sections / total_sections) * 100 if total_sections > 0 else 0
         response["progress_info"]["completed_percentage"] = round(completed_percentage, 2)
     
     return response
@@ -491,31 +687,27 @@ async def get_research_outline(research_id: str) -> ResearchOutline:
         ResearchOutline: Dàn ý của research task
     """
     try:
-        # Kiểm tra task tồn tại
-        if research_id not in research_tasks:
-            # Thử tải từ file
-            task = await research_storage_service.load_task(research_id)
-            if task:
-                research_tasks[research_id] = task
-            else:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Research task {research_id} not found"
-                )
+        # Kiểm tra task tồn tại (trong bộ nhớ hoặc tải từ file)
+        task = await research_tasks.load(research_id)
+        if not task:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Research task {research_id} not found"
+            )
         
         # Kiểm tra outline tồn tại
-        if not research_tasks[research_id].outline:
+        if not task.outline:
             # Thử tải outline từ file
             outline = await research_storage_service.load_outline(research_id)
             if outline:
-                research_tasks[research_id].outline = outline
+                task.outline = outline
             else:
                 raise HTTPException(
                     status_code=404,
                     detail=f"Outline for research task {research_id} not found"
                 )
         
-        return research_tasks[research_id].outline
+        return task.outline
         
     except HTTPException:
         raise
@@ -527,73 +719,91 @@ async def get_research_outline(research_id: str) -> ResearchOutline:
         )
 
 @router.get("/research", response_model=List[Dict[str, Any]])
-async def list_research() -> List[Dict[str, Any]]:
+async def list_research(
+    response: Response,
+    status: Optional[ResearchStatus] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    limit: int = 100,
+    offset: int = 0
+) -> List[Dict[str, Any]]:
     """
-    Liệt kê tất cả các research tasks với thông tin tóm tắt
+    Liệt kê các research tasks với thông tin tóm tắt, lấy từ chỉ mục task
+    
+    Args:
+        status: Chỉ lấy task có trạng thái này
+        start_date: Ngày tạo từ (YYYY-MM-DD)
+        end_date: Ngày tạo đến (YYYY-MM-DD, bao gồm)
+        sort: Cột sắp xếp: created_at, updated_at hoặc status
+        order: "asc" hoặc "desc" (mặc định mới nhất lên đầu)
+        limit: Số task tối đa trả về (1-1000)
+        offset: Số task bỏ qua
     
     Returns:
-        List[Dict[str, Any]]: Danh sách các research tasks với thông tin tóm tắt
+        List[Dict[str, Any]]: Danh sách các research tasks với thông tin tóm tắt,
+        tổng số task khớp bộ lọc nằm trong header X-Total-Count
     """
+    if sort not in TASK_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort field: {sort}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail=f"Unsupported sort order: {order}")
+    limit = max(1, min(limit, 1000))
+    offset = max(0, offset)
+    
     try:
-        logger.info("Liệt kê tất cả research tasks")
+        logger.info("Liệt kê research tasks từ chỉ mục")
         
-        # Tải tất cả tasks từ file nếu chưa có trong bộ nhớ
-        task_ids = await research_storage_service.list_tasks()
-        
-        for task_id in task_ids:
-            if task_id not in research_tasks:
-                # Chỉ tải thông tin cơ bản của task
-                task = await research_storage_service.load_task(task_id)
-                if task:
-                    research_tasks[task_id] = task
+        page = await research_storage_service.list_task_summaries(
+            status.value if status else None, start_date, end_date, sort, order, limit, offset
+        )
         
-        # Tạo danh sách tasks với thông tin tóm tắt
+        now = datetime.utcnow()
         summary_tasks = []
-        for task in research_tasks.values():
+        for row in page["tasks"]:
             # Tạo thông tin tóm tắt cho mỗi task
             task_summary = {
-                "id": task.id,
-                "status": task.status,
-                "query": task.request.query if task.request else None,
-                "created_at": task.created_at.isoformat() if task.created_at else None,
-                "updated_at": task.updated_at.isoformat() if task.updated_at else None,
+                "id": row["id"],
+                "status": row["status"],
+                "query": row["query"],
+                "created_at": row["created_at"],
+                "updated_at": row["updated_at"],
                 "progress_summary": {}
             }
             
             # Thêm thông tin tiến độ tóm tắt
-            if task.progress_info:
+            if row["progress_phase"] or row["progress_message"] or row["progress_timestamp"]:
                 task_summary["progress_summary"] = {
-                    "phase": task.progress_info.get("phase"),
-                    "message": task.progress_info.get("message"),
-                    "timestamp": task.progress_info.get("timestamp")
+                    "phase": row["progress_phase"],
+                    "message": row["progress_message"],
+                    "timestamp": row["progress_timestamp"]
                 }
             
             # Thêm thông tin về thời gian đã trôi qua
-            if task.created_at:
-                elapsed_time = datetime.utcnow() - task.created_at
+            if row["created_at"]:
+                elapsed_time = now - datetime.fromisoformat(row["created_at"])
                 task_summary["elapsed_time"] = str(elapsed_time).split('.')[0]  # HH:MM:SS format
             
             # Thêm thông tin về outline và sections nếu có
-            if task.outline:
-                task_summary["outline_sections_count"] = len(task.outline.sections)
+            if row["outline_sections_count"] is not None:
+                task_summary["outline_sections_count"] = row["outline_sections_count"]
             
-            if task.sections:
-                task_summary["researched_sections_count"] = len(task.sections)
+            if row["researched_sections_count"] is not None:
+                task_summary["researched_sections_count"] = row["researched_sections_count"]
             
             # Thêm URL GitHub nếu có
-            if task.github_url:
-                task_summary["github_url"] = task.github_url
+            if row["github_url"]:
+                task_summary["github_url"] = row["github_url"]
             
             # Thêm thông tin lỗi nếu có
-            if task.error:
-                task_summary["error"] = task.error.message
+            if row["error"]:
+                task_summary["error"] = row["error"]
             
             summary_tasks.append(task_summary)
         
-        # Sắp xếp theo thời gian tạo, mới nhất lên đầu
-        summary_tasks.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
-        logger.info(f"Đã liệt kê {len(summary_tasks)} research tasks")
+        response.headers["X-Total-Count"] = str(page["total"])
+        logger.info(f"Đã liệt kê {len(summary_tasks)}/{page['total']} research tasks")
         
         return summary_tasks
         
@@ -605,16 +815,12 @@ async def list_research() -> List[Dict[str, Any]]:
         )
 
 @router.post("/research/edit_only", response_model=ResearchResponse)
-async def continue_with_editing(
-    request: EditRequest,
-    background_tasks: BackgroundTasks
-) -> ResearchResponse:
+async def continue_with_editing(request: EditRequest) -> ResearchResponse:
     """
     Tiếp tục xử lý giai đoạn chỉnh sửa cho task được chỉ định
     
     Args:
         request (EditRequest): Request chứa research_id cần chỉnh sửa
-        background_tasks: Background tasks để xử lý chỉnh sửa
     
     Returns:
         ResearchResponse: Thông tin về research task đã cập nhật
@@ -622,6 +828,9 @@ async def continue_with_editing(
     try:
         research_id = request.research_id
         
+        # Từ chối sớm nếu hệ thống đang quá tải
+        _check_queue_capacity()
+        
         # Tải task đầy đủ
         task = await research_storage_service.load_full_task(research_id)
         if not task:
@@ -658,6 +867,9 @@ async def continue_with_editing(
                 detail=f"Task {research_id} không có sections"
             )
         
+        # Giữ chỗ trong hàng đợi trước khi cập nhật task
+        _reserve_job("edit", research_id)
+        
         # Cập nhật trạng thái task và thông tin tiến độ
         task.status = ResearchStatus.EDITING
         task.updated_at = datetime.utcnow()
@@ -669,17 +881,13 @@ async def continue_with_editing(
             "outline_sections_count": len(outline.sections) if outline else 0
         }
         
-        # Lưu task vào bộ nhớ và file
-        research_tasks[research_id] = task
-        await research_storage_service.save_task(task)
+        # Lưu task vào bộ nhớ và file, đưa quá trình chỉnh sửa vào hàng đợi job
+        await _save_and_submit("edit", task, {"task_id": research_id})
         
         logger.info(f"Đã cập nhật task {research_id} để tiếp tục xử lý giai đoạn chỉnh sửa")
         logger.info(f"Thông tin yêu cầu: Query: '{task.request.query}', Topic: '{task.request.topic}', Scope: '{task.request.scope}', Target Audience: '{task.request.target_audience}'")
         logger.info(f"Số phần đã nghiên cứu: {len(sections)}")
         
-        # Chạy quá trình chỉnh sửa trong background
-        background_tasks.add_task(process_research_with_sections, research_id, task.request, outline, sections)
-        
         return task
         
     except HTTPException:
@@ -848,32 +1056,27 @@ async def get_research_progress(research_id: str) -> Dict[str, Any]:
     Raises:
         HTTPException: Nếu không tìm thấy research task
     """
-    if research_id not in research_tasks:
-        # Thử tải từ file
-        task = await research_storage_service.load_task(research_id)
-        if task:
-            research_tasks[research_id] = task
-        else:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Không tìm thấy research task với ID: {research_id}"
-            )
-    
-    task = research_tasks[research_id]
+    # Task trong bộ nhớ hoặc status.json (không tải toàn bộ task)
+    task = await _load_task_status(research_id)
+    if not task:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Không tìm thấy research task với ID: {research_id}"
+        )
     
     # Tạo response với thông tin chi tiết về tiến độ
     response = {
-        "id": task.id,
-        "status": task.status,
-        "progress_info": task.progress_info or {},
-        "created_at": task.created_at.isoformat() if task.created_at else None,
-        "updated_at": task.updated_at.isoformat() if task.updated_at else None,
-        "query": task.request.query if task.request else None
+        "id": task["id"],
+        "status": task["status"],
+        "progress_info": task["progress_info"] or {},
+        "created_at": task["created_at"],
+        "updated_at": task["updated_at"],
+        "query": task["query"]
     }
     
     # Thêm thông tin về thời gian đã trôi qua
-    if task.created_at:
-        elapsed_time = datetime.utcnow() - task.created_at
+    if task["created_at"]:
+        elapsed_time = datetime.utcnow() - datetime.fromisoformat(task["created_at"])
         response["elapsed_time"] = {
             "seconds": elapsed_time.total_seconds(),
             "minutes": elapsed_time.total_seconds() / 60,
@@ -882,41 +1085,35 @@ async def get_research_progress(research_id: str) -> Dict[str, Any]:
         }
     
     # Thêm thông tin về outline nếu có
-    if task.outline:
-        response["outline_sections_count"] = len(task.outline.sections)
+    outline_sections = task["outline_sections"]
+    if outline_sections:
+        response["outline_sections_count"] = len(outline_sections)
     
     # Thêm thông tin về sections đã nghiên cứu nếu có
-    if task.sections:
-        response["researched_sections_count"] = len(task.sections)
+    if task["researched_sections_count"]:
+        response["researched_sections_count"] = task["researched_sections_count"]
         
         # Tính phần trăm hoàn thành dựa trên số sections đã nghiên cứu
-        if task.outline and len(task.outline.sections) > 0:
-            completion_percentage = (len(task.sections) / len(task.outline.sections)) * 100
+        if outline_sections:
+            completion_percentage = (task["researched_sections_count"] / len(outline_sections)) * 100
             response["completion_percentage"] = round(completion_percentage, 2)
     
     # Thêm thông tin về kết quả nếu đã hoàn thành
-    if task.result:
-        response["result_info"] = {
-            "title": task.result.title,
-            "content_length": len(task.result.content) if task.result.content else 0,
-            "sources_count": len(task.result.sources) if task.result.sources else 0
-        }
+    if task["result_info"]:
+        response["result_info"] = task["result_info"]
     
     # Thêm thông tin về lỗi nếu có
-    if task.error:
-        response["error_info"] = {
-            "message": task.error.message,
-            "details": task.error.details
-        }
+    if task["error"]:
+        response["error_info"] = task["error"]
     
     # Thêm URL GitHub nếu có
-    if task.github_url:
-        response["github_url"] = task.github_url
+    if task["github_url"]:
+        response["github_url"] = task["github_url"]
     
     return response 
 
 @router.post("/research/complete", response_model=ResearchResponse)
-async def create_complete_research(request: ResearchRequest, background_tasks: BackgroundTasks) -> ResearchResponse:
+async def create_complete_research(request: ResearchRequest) -> ResearchResponse:
     """
     Tạo yêu cầu nghiên cứu mới và thực hiện toàn bộ quy trình từ đầu đến cuối,
     tự động phát hiện khi research đã xong để chuyển sang edit.
@@ -931,11 +1128,13 @@ async def create_complete_research(request: ResearchRequest, background_tasks: B
     
     Args:
         request: Thông tin yêu cầu nghiên cứu
-        background_tasks: Background tasks để xử lý nghiên cứu
         
     Returns:
         ResearchResponse: Thông tin về research task đã tạo
         
+    Raises:
+        HTTPException: 429 nếu hàng đợi xử lý đã đầy
+        
     Examples:
         ```json
         # Request
@@ -973,8 +1172,12 @@ async def create_complete_research(request: ResearchRequest, background_tasks: B
         > **Lưu ý**: Khi chỉ cung cấp `query`, hệ thống sẽ tự động phân tích để xác định `topic`, `scope` và `target_audience`.
     """
     try:
-        # Tạo ID mới cho research task
+        # Từ chối sớm nếu hệ thống đang quá tải
+        _check_queue_capacity()
+        
+        # Tạo ID mới cho research task và giữ chỗ trong hàng đợi trước khi lưu task
         task_id = str(uuid4())
+        _reserve_job("complete", task_id)
         logger.info(f"Tạo research task mới với ID: {task_id}")
         
         # Tạo research task mới
@@ -991,18 +1194,16 @@ async def create_complete_research(request: ResearchRequest, background_tasks: B
             }
         )
         
-        # Lưu task vào bộ nhớ và file
-        research_tasks[task_id] = task
-        await research_storage_service.save_task(task)
-        
-        # Chạy quá trình nghiên cứu hoàn chỉnh trong background
-        background_tasks.add_task(process_complete_research, task_id, request)
+        # Lưu task vào bộ nhớ và file, đưa quá trình nghiên cứu hoàn chỉnh vào hàng đợi job
+        await _save_and_submit("complete", task, {"task_id": task_id, "request": request.dict()})
         
         logger.info(f"Đã tạo research task với ID: {task_id}")
         logger.info(f"Thông tin yêu cầu: Query: '{request.query}', Topic: '{request.topic}', Scope: '{request.scope}', Target Audience: '{request.target_audience}'")
         
         return task
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Lỗi khi tạo yêu cầu nghiên cứu: {str(e)}")
         raise HTTPException(
@@ -1010,13 +1211,14 @@ async def create_complete_research(request: ResearchRequest, background_tasks: B
             detail=str(e)
         )
 
-async def process_complete_research(task_id: str, request: ResearchRequest):
+async def process_complete_research(task_id: str, request: ResearchRequest, resume: bool = False):
     """
     Xử lý yêu cầu nghiên cứu hoàn chỉnh trong background, tự động phát hiện khi research đã xong để chuyển sang edit
     
     Args:
         task_id: ID của research task
         request: Yêu cầu nghiên cứu
+        resume: Tiếp tục từ phase/section cuối cùng đã lưu thay vì chạy lại từ đầu
     """
     try:
         logger.info(f"=== BẮT ĐẦU XỬ LÝ RESEARCH TASK HOÀN CHỈNH {task_id} ===")
@@ -1037,141 +1239,179 @@ async def process_complete_research(task_id: str, request: ResearchRequest):
         # Gán callback cho research_service
         research_service.update_progress_callback = update_progress_callback
         
-        # Gán task_id vào request để các service có thể sử dụng
-        request.task_id = task_id
-        
-        # Phase 1: Chuẩn bị
-        logger.info(f"[Task {task_id}] === BẮT ĐẦU PHASE CHUẨN BỊ ===")
-        research_tasks[task_id].status = ResearchStatus.ANALYZING
-        research_tasks[task_id].updated_at = datetime.utcnow()
-        research_tasks[task_id].progress_info = {
-            "phase": "analyzing",
-            "message": "Đang phân tích yêu cầu nghiên cứu",
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        await research_storage_service.save_task(research_tasks[task_id])
-        
-        start_time = time.time()
-        analysis = await prepare_service.analyze_query(request.query, task_id)
-        end_time = time.time()
+        # Lưu checkpoint mỗi khi một phần nghiên cứu xong để có thể tiếp tục nếu bị gián đoạn
+        async def section_checkpoint_callback(index: int, section: ResearchSection):
+            await research_storage_service.save_section_checkpoint(task_id, index, section)
         
-        # Chuẩn hóa kết quả phân tích (kiểm tra cả viết hoa và viết thường)
-        topic = analysis.get("Topic") or analysis.get("topic", request.query)
-        scope = analysis.get("Scope") or analysis.get("scope", "Phân tích toàn diện")
-        target_audience = analysis.get("Target Audience") or analysis.get("target_audience", "Người đọc quan tâm đến chủ đề")
+        research_service.section_checkpoint_callback = section_checkpoint_callback
         
-        logger.info(f"[Task {task_id}] Phân tích yêu cầu hoàn thành trong {end_time - start_time:.2f} giây")
-        logger.info(f"[Task {task_id}] Kết quả phân tích: Topic: '{topic}', Scope: '{scope}', Target Audience: '{target_audience}'")
+        # Gán task_id vào request để các service có thể sử dụng
+        request.task_id = task_id
         
-        # Cập nhật request với thông tin phân tích đã chuẩn hóa
-        request.topic = topic
-        request.scope = scope
-        request.target_audience = target_audience
+        # Đọc lại kết quả các phase đã lưu khi tiếp tục từ lần chạy trước
+        outline = None
+        researched_sections = None
+        completed_sections: Dict[int, ResearchSection] = {}
+        result = None
+        if resume:
+            outline = await research_storage_service.load_outline(task_id)
+            if outline:
+                researched_sections = await research_storage_service.load_sections(task_id)
+                if researched_sections and len(researched_sections) < len(outline.sections):
+                    researched_sections = None
+                if researched_sections:
+                    result = await research_storage_service.load_result(task_id)
+                else:
+                    completed_sections = await research_storage_service.load_section_checkpoints(task_id)
+            research_tasks[task_id].outline = outline
+            research_tasks[task_id].sections = researched_sections
+            logger.info(
+                f"[Task {task_id}] Tiếp tục từ checkpoint: "
+                f"dàn ý: {'có' if outline else 'không'}, "
+                f"số phần đã nghiên cứu: {len(researched_sections) if researched_sections else len(completed_sections)}, "
+                f"kết quả chỉnh sửa: {'có' if result else 'không'}"
+            )
         
-        # Cập nhật task với request đã cập nhật
-        research_tasks[task_id].request = request
-        research_tasks[task_id].updated_at = datetime.utcnow()
-        research_tasks[task_id].progress_info = {
-            "phase": "analyzed",
-            "message": "Đã phân tích xong yêu cầu nghiên cứu",
-            "timestamp": datetime.utcnow().isoformat(),
-            "analysis": {
-                "topic": topic,
-                "scope": scope,
-                "target_audience": target_audience
+        if outline is None:
+            # Bỏ qua bước phân tích nếu request đã có kết quả phân tích từ lần chạy trước
+            if not (resume and request.topic and request.scope and request.target_audience):
+                # Phase 1: Chuẩn bị
+                logger.info(f"[Task {task_id}] === BẮT ĐẦU PHASE CHUẨN BỊ ===")
+                research_tasks[task_id].status = ResearchStatus.ANALYZING
+                research_tasks[task_id].updated_at = datetime.utcnow()
+                research_tasks[task_id].progress_info = {
+                    "phase": "analyzing",
+                    "message": "Đang phân tích yêu cầu nghiên cứu",
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+                await research_storage_service.save_task(research_tasks[task_id])
+                
+                # Tìm kiếm context cho dàn ý song song với bước phân tích (nếu được bật)
+                prepare_service.start_speculative_search(request.query, task_id)
+                
+                start_time = time.time()
+                analysis = await prepare_service.analyze_query(request.query, task_id)
+                end_time = time.time()
+                
+                # Chuẩn hóa kết quả phân tích (kiểm tra cả viết hoa và viết thường)
+                topic = analysis.get("Topic") or analysis.get("topic", request.query)
+                scope = analysis.get("Scope") or analysis.get("scope", "Phân tích toàn diện")
+                target_audience = analysis.get("Target Audience") or analysis.get("target_audience", "Người đọc quan tâm đến chủ đề")
+                
+                logger.info(f"[Task {task_id}] Phân tích yêu cầu hoàn thành trong {end_time - start_time:.2f} giây")
+                logger.info(f"[Task {task_id}] Kết quả phân tích: Topic: '{topic}', Scope: '{scope}', Target Audience: '{target_audience}'")
+                
+                # Cập nhật request với thông tin phân tích đã chuẩn hóa
+                request.topic = topic
+                request.scope = scope
+                request.target_audience = target_audience
+                
+                # Cập nhật task với request đã cập nhật
+                research_tasks[task_id].request = request
+                research_tasks[task_id].updated_at = datetime.utcnow()
+                research_tasks[task_id].progress_info = {
+                    "phase": "analyzed",
+                    "message": "Đã phân tích xong yêu cầu nghiên cứu",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "analysis": {
+                        "topic": topic,
+                        "scope": scope,
+                        "target_audience": target_audience
+                    }
+                }
+                await research_storage_service.save_task(research_tasks[task_id])
+            
+            # Tạo dàn ý
+            logger.info(f"[Task {task_id}] === BẮT ĐẦU TẠO DÀN Ý ===")
+            research_tasks[task_id].status = ResearchStatus.OUTLINING
+            research_tasks[task_id].updated_at = datetime.utcnow()
+            research_tasks[task_id].progress_info = {
+                "phase": "outlining",
+                "message": "Đang tạo dàn ý cho bài nghiên cứu",
+                "timestamp": datetime.utcnow().isoformat()
             }
-        }
-        await research_storage_service.save_task(research_tasks[task_id])
-        
-        # Tạo dàn ý
-        logger.info(f"[Task {task_id}] === BẮT ĐẦU TẠO DÀN Ý ===")
-        research_tasks[task_id].status = ResearchStatus.OUTLINING
-        research_tasks[task_id].updated_at = datetime.utcnow()
-        research_tasks[task_id].progress_info = {
-            "phase": "outlining",
-            "message": "Đang tạo dàn ý cho bài nghiên cứu",
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        await research_storage_service.save_task(research_tasks[task_id])
-        
-        start_time = time.time()
-        outline = await prepare_service.create_outline(request, task_id)
-        end_time = time.time()
-        
-        logger.info(f"[Task {task_id}] Tạo dàn ý hoàn thành trong {end_time - start_time:.2f} giây")
-        logger.info(f"[Task {task_id}] Dàn ý có {len(outline.sections)} phần")
-        
-        # Lưu outline vào task
-        research_tasks[task_id].outline = outline
-        research_tasks[task_id].updated_at = datetime.utcnow()
-        research_tasks[task_id].progress_info = {
-            "phase": "outlined",
-            "message": "Đã tạo xong dàn ý cho bài nghiên cứu",
-            "timestamp": datetime.utcnow().isoformat(),
-            "outline_sections_count": len(outline.sections)
-        }
-        await research_storage_service.save_outline(task_id, outline)
-        await research_storage_service.save_task(research_tasks[task_id])
-        
-        # Phase 2: Nghiên cứu
-        logger.info(f"[Task {task_id}] === BẮT ĐẦU PHASE NGHIÊN CỨU ===")
-        research_tasks[task_id].status = ResearchStatus.RESEARCHING
-        research_tasks[task_id].updated_at = datetime.utcnow()
-        research_tasks[task_id].progress_info = {
-            "phase": "researching",
-            "message": "Đang bắt đầu nghiên cứu các phần",
-            "timestamp": datetime.utcnow().isoformat(),
-            "current_section": 0,
-            "total_sections": len(outline.sections),
-            "completed_sections": 0
-        }
-        await research_storage_service.save_task(research_tasks[task_id])
-        
-        start_time = time.time()
-        # Đảm bảo outline có task_id
-        outline.task_id = task_id
-        researched_sections = await research_service.execute(request, outline)
-        end_time = time.time()
-        
-        logger.info(f"[Task {task_id}] Phase nghiên cứu hoàn thành trong {end_time - start_time:.2f} giây")
-        logger.info(f"[Task {task_id}] Đã nghiên cứu {len(researched_sections)}/{len(outline.sections)} phần")
-        
-        # Lưu researched_sections vào task
-        research_tasks[task_id].sections = researched_sections
-        research_tasks[task_id].updated_at = datetime.utcnow()
-        research_tasks[task_id].progress_info = {
-            "phase": "researched",
-            "message": "Đã hoàn thành nghiên cứu tất cả các phần",
-            "timestamp": datetime.utcnow().isoformat(),
-            "total_sections": len(outline.sections),
-            "completed_sections": len(researched_sections),
-            "time_taken": f"{end_time - start_time:.2f} giây"
-        }
-        await research_storage_service.save_sections(task_id, researched_sections)
-        await research_storage_service.save_task(research_tasks[task_id])
-        
-        # Phase 3: Chỉnh sửa - Tự động chuyển sang phase chỉnh sửa
-        logger.info(f"[Task {task_id}] === BẮT ĐẦU PHASE CHỈNH SỬA (TỰ ĐỘNG) ===")
-        research_tasks[task_id].status = ResearchStatus.EDITING
-        research_tasks[task_id].updated_at = datetime.utcnow()
-        research_tasks[task_id].progress_info = {
-            "phase": "editing",
-            "message": "Đang tự động chuyển sang giai đoạn chỉnh sửa",
-            "timestamp": datetime.utcnow().isoformat(),
-            "sections_count": len(researched_sections),
-            "outline_sections_count": len(outline.sections)
-        }
-        await research_storage_service.save_task(research_tasks[task_id])
-        
-        start_time = time.time()
-        result = await edit_service.execute(request, outline, researched_sections)
-        end_time = time.time()
+            await research_storage_service.save_task(research_tasks[task_id])
+            
+            start_time = time.time()
+            outline = await prepare_service.create_outline(request, task_id)
+            end_time = time.time()
+            
+            logger.info(f"[Task {task_id}] Tạo dàn ý hoàn thành trong {end_time - start_time:.2f} giây")
+            logger.info(f"[Task {task_id}] Dàn ý có {len(outline.sections)} phần")
+            
+            # Lưu outline vào task
+            research_tasks[task_id].outline = outline
+            research_tasks[task_id].updated_at = datetime.utcnow()
+            research_tasks[task_id].progress_info = {
+                "phase": "outlined",
+                "message": "Đã tạo xong dàn ý cho bài nghiên cứu",
+                "timestamp": datetime.utcnow().isoformat(),
+                "outline_sections_count": len(outline.sections)
+            }
+            await research_storage_service.save_outline(task_id, outline)
+            await research_storage_service.save_task(research_tasks[task_id])
         
-        logger.info(f"[Task {task_id}] Phase chỉnh sửa hoàn thành trong {end_time - start_time:.2f} giây")
-        logger.info(f"[Task {task_id}] Kết quả: Tiêu đề: '{result.title}', Độ dài nội dung: {len(result.content)} ký tự, Số nguồn: {len(result.sources)}")
+        if researched_sections is None:
+            # Phase 2: Nghiên cứu
+            logger.info(f"[Task {task_id}] === BẮT ĐẦU PHASE NGHIÊN CỨU ===")
+            research_tasks[task_id].status = ResearchStatus.RESEARCHING
+            research_tasks[task_id].updated_at = datetime.utcnow()
+            research_tasks[task_id].progress_info = {
+                "phase": "researching",
+                "message": "Đang bắt đầu nghiên cứu các phần",
+                "timestamp": datetime.utcnow().isoformat(),
+                "current_section": 0,
+                "total_sections": len(outline.sections),
+                "completed_sections": 0
+            }
+            await research_storage_service.save_task(research_tasks[task_id])
+            
+            start_time = time.time()
+            # Đảm bảo outline có task_id
+            outline.task_id = task_id
+            researched_sections = await research_service.execute(request, outline, completed_sections)
+            end_time = time.time()
+            
+            logger.info(f"[Task {task_id}] Phase nghiên cứu hoàn thành trong {end_time - start_time:.2f} giây")
+            logger.info(f"[Task {task_id}] Đã nghiên cứu {len(researched_sections)}/{len(outline.sections)} phần")
+            
+            # Lưu researched_sections vào task
+            research_tasks[task_id].sections = researched_sections
+            research_tasks[task_id].updated_at = datetime.utcnow()
+            research_tasks[task_id].progress_info = {
+                "phase": "researched",
+                "message": "Đã hoàn thành nghiên cứu tất cả các phần",
+                "timestamp": datetime.utcnow().isoformat(),
+                "total_sections": len(outline.sections),
+                "completed_sections": len(researched_sections),
+                "time_taken": f"{end_time - start_time:.2f} giây"
+            }
+            await research_storage_service.save_sections(task_id, researched_sections)
+            await research_storage_service.save_task(research_tasks[task_id])
         
-        # Lưu kết quả vào file
-        await research_storage_service.save_result(task_id, result)
+        if result is None:
+            # Phase 3: Chỉnh sửa - Tự động chuyển sang phase chỉnh sửa
+            logger.info(f"[Task {task_id}] === BẮT ĐẦU PHASE CHỈNH SỬA (TỰ ĐỘNG) ===")
+            research_tasks[task_id].status = ResearchStatus.EDITING
+            research_tasks[task_id].updated_at = datetime.utcnow()
+            research_tasks[task_id].progress_info = {
+                "phase": "editing",
+                "message": "Đang tự động chuyển sang giai đoạn chỉnh sửa",
+                "timestamp": datetime.utcnow().isoformat(),
+                "sections_count": len(researched_sections),
+                "outline_sections_count": len(outline.sections)
+            }
+            await research_storage_service.save_task(research_tasks[task_id])
+            
+            start_time = time.time()
+            result = await edit_service.execute(request, outline, researched_sections)
+            end_time = time.time()
+            
+            logger.info(f"[Task {task_id}] Phase chỉnh sửa hoàn thành trong {end_time - start_time:.2f} giây")
+            logger.info(f"[Task {task_id}] Kết quả: Tiêu đề: '{result.title}', Độ dài nội dung: {len(result.content)} ký tự, Số nguồn: {len(result.sources)}")
+            
+            # Lưu kết quả vào file
+            await research_storage_service.save_result(task_id, result)
         
         # Lưu kết quả lên GitHub
         logger.info(f"[Task {task_id}] === BẮT ĐẦU LƯU KẾT QUẢ LÊN GITHUB ===")
@@ -1216,7 +1456,7 @@ async def process_complete_research(task_id: str, request: ResearchRequest):
         await research_storage_service.save_task(research_tasks[task_id])
         
         logger.info(f"[Task {task_id}] === HOÀN THÀNH RESEARCH TASK HOÀN CHỈNH ===")
-        
+    
     except Exception as e:
         logger.error(f"[Task {task_id}] Lỗi khi xử lý research task hoàn chỉnh: {str(e)}")
         
@@ -1236,27 +1476,102 @@ async def process_complete_research(task_id: str, request: ResearchRequest):
             }
             await research_storage_service.save_task(research_tasks[task_id])
 
+@router.post("/research/{research_id}/resume", response_model=ResearchResponse)
+async def resume_research(research_id: str) -> ResearchResponse:
+    """
+    Tiếp tục một research task bị gián đoạn hoặc thất bại bằng đúng loại job đã tạo task
+    
+    Task tạo bởi /research/complete được chạy lại từ phase hoặc section cuối cùng đã lưu: dàn ý,
+    các phần đã nghiên cứu (checkpoint theo từng phần) và kết quả chỉnh sửa có sẵn sẽ không được
+    tạo lại. Task tạo bởi /research được chạy lại quy trình /research (không chỉnh sửa, không đẩy
+    lên GitHub), task của /research/edit_only được chạy lại giai đoạn chỉnh sửa.
+    
+    Args:
+        research_id: ID của research task cần tiếp tục
+        
+    Returns:
+        ResearchResponse: Thông tin về research task đã cập nhật
+        
+    Raises:
+        HTTPException: 404 nếu không tìm thấy task, 409 nếu task đã hoàn thành hoặc đang được xử lý,
+            429 nếu hàng đợi xử lý đã đầy
+    """
+    try:
+        _check_queue_capacity()
+        
+        task = await research_tasks.load(research_id)
+        if not task or not task.request:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Không tìm thấy research task {research_id}"
+            )
+        
+        if task.status == ResearchStatus.COMPLETED:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Research task {research_id} đã hoàn thành"
+            )
+        
+        if any(job_queue.is_active(f"{job_type}:{research_id}") for job_type in ("research", "complete", "edit")):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Research task {research_id} đang được xử lý"
+            )
+        # Task lưu trước khi có job_type đều được tạo bởi /research/complete
+        job_type = task.job_type or "complete"
+        # Giữ chỗ ngay sau khi kiểm tra (không có await ở giữa) để hai yêu cầu đồng thời không cùng chạy task
+        _reserve_job(job_type, research_id)
+        
+        if job_type == "complete":
+            payload = {"task_id": research_id, "request": task.request.dict(), "resume": True}
+        elif job_type == "research":
+            payload = {"task_id": research_id, "request": task.request.dict()}
+        else:
+            payload = {"task_id": research_id}
+        
+        task.status = ResearchStatus.PENDING
+        task.error = None
+        task.updated_at = datetime.utcnow()
+        task.progress_info = {
+            "phase": "resuming",
+            "message": "Đang tiếp tục nghiên cứu từ checkpoint cuối cùng",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        await _save_and_submit(job_type, task, payload)
+        
+        logger.info(f"Đã đưa research task {research_id} vào hàng đợi ({job_type}) để tiếp tục")
+        return task
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi tiếp tục research task {research_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Lỗi khi tiếp tục research task: {str(e)}"
+        )
+
 @router.get("/research/{research_id}/cost", response_model=ResearchCostMonitoring)
 async def get_research_cost(research_id: str):
     """Lấy thông tin chi phí của một research task"""
     try:
         # Kiểm tra task tồn tại
-        if research_id not in research_tasks:
+        if not await research_tasks.load(research_id):
             raise HTTPException(status_code=404, detail=f"Research task {research_id} not found")
         
         # Tạo cost monitoring service
         service_factory = get_service_factory()
         cost_service = await service_factory.get_cost_monitoring_service()
         
-        # Lấy thông tin chi phí chi tiết
+        # Lấy thông tin chi phí chi tiết (gộp event log vào snapshot cost.json khi được yêu cầu)
         try:
-            monitoring = await cost_service.get_monitoring(research_id)
+            monitoring = await cost_service.materialize_monitoring(research_id)
             if not monitoring:
                 monitoring = cost_service.initialize_monitoring(research_id)
             
             # Cập nhật summary nếu cần
             if not monitoring.summary:
-                monitoring._update_summary()
+                monitoring.recompute_summary()
                 
             return monitoring
             
@@ -1268,4 +1583,207 @@ async def get_research_cost(research_id: str):
         raise
     except Exception as e:
         logger.error(f"Error retrieving cost information: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error retrieving cost information: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error retrieving cost information: {str(e)}") 
+
+@router.get("/research/{research_id}/trace", response_model=Dict[str, Any])
+async def get_research_trace(research_id: str, format: Optional[str] = None):
+    """
+    Lấy trace (các span của pipeline) của một research task
+    
+    Args:
+        research_id: ID của research task
+        format: "chrome" (chrome://tracing, Perfetto) hoặc "otlp" (OTLP-JSON), mặc định theo TRACE_EXPORT_FORMAT
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        raise HTTPException(status_code=503, detail="Tracing is disabled (TRACING_ENABLED=False)")
+    if format is not None and format not in TRACE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported trace format: {format}")
+    
+    try:
+        # Trace còn trong bộ nhớ được xuất theo định dạng yêu cầu, nếu không đọc file đã ghi
+        trace = tracer.render(research_id, format)
+        if trace is None:
+            trace = await tracer.load_exported(research_id)
+        if trace is None:
+            raise HTTPException(status_code=404, detail=f"Trace for research task {research_id} not found")
+        return trace
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy trace của research task {research_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _require_cost_index():
+    """Lấy chỉ mục chi phí tổng hợp, trả lỗi 503 nếu chỉ mục bị tắt"""
+    cost_index = get_cost_index()
+    if cost_index is None:
+        raise HTTPException(status_code=503, detail="Cost analytics index is disabled (COST_INDEX_ENABLED=False)")
+    return cost_index
+
+@router.get("/costs/spend", response_model=Dict[str, Any])
+async def get_cost_spend(start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """
+    Tổng chi phí và chi phí theo ngày của mọi research task
+    
+    Args:
+        start_date: Ngày bắt đầu (YYYY-MM-DD)
+        end_date: Ngày kết thúc (YYYY-MM-DD, bao gồm)
+    """
+    try:
+        return await _require_cost_index().get_spend(start_date, end_date)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi truy vấn chi phí tổng hợp: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/costs/models", response_model=List[Dict[str, Any]])
+async def get_cost_models(start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """
+    Số token, số request và chi phí theo model của mọi research task
+    
+    Args:
+        start_date: Ngày bắt đầu (YYYY-MM-DD)
+        end_date: Ngày kết thúc (YYYY-MM-DD, bao gồm)
+    """
+    try:
+        return await _require_cost_index().get_model_usage(start_date, end_date)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi truy vấn token theo model: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/costs/phases", response_model=List[Dict[str, Any]])
+async def get_cost_phases():
+    """
+    Thời gian thực hiện p50/p95 của từng phase trên mọi research task
+    """
+    try:
+        return await _require_cost_index().get_phase_durations()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi truy vấn thời gian theo phase: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/costs/top-tasks", response_model=List[Dict[str, Any]])
+async def get_cost_top_tasks(limit: int = 10):
+    """
+    Các research task có tổng chi phí cao nhất
+    
+    Args:
+        limit: Số task tối đa
+    """
+    try:
+        return await _require_cost_index().get_top_tasks(max(1, min(limit, 1000)))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi truy vấn task tốn kém nhất: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/costs/pricing", response_model=Dict[str, Any])
+async def get_cost_pricing():
+    """
+    Bảng giá model/search đang dùng (phiên bản, file nguồn, giá theo ngày hiệu lực)
+    """
+    return get_pricing_registry().get_pricing()
+
+@router.post("/costs/pricing/reload", response_model=Dict[str, Any])
+async def reload_cost_pricing():
+    """
+    Nạp lại file bảng giá ngay, không chờ chu kỳ kiểm tra thay đổi
+    """
+    registry = get_pricing_registry()
+    reloaded = await asyncio.to_thread(registry.reload, True)
+    if not reloaded:
+        raise HTTPException(status_code=500, detail=f"Failed to reload pricing file {registry.path}")
+    return registry.get_stats()
+
+async def _restore_task(task_id: str, request: ResearchRequest) -> None:
+    """
+    Đảm bảo research task có trong bộ nhớ trước khi worker xử lý (ví dụ khi khôi phục sau sự cố)
+    
+    Args:
+        task_id: ID của research task
+        request: Yêu cầu nghiên cứu
+    """
+    task = await research_tasks.load(task_id)
+    if not task:
+        task = ResearchResponse(
+            id=task_id,
+            status=ResearchStatus.PENDING,
+            request=request,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+            progress_info={
+                "phase": "pending",
+                "message": "Đã nhận yêu cầu nghiên cứu, đang chuẩn bị xử lý",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        )
+        research_tasks[task_id] = task
+
+async def _release_cost_monitoring(task_id: str) -> None:
+    """Giải phóng cost monitoring của task đã kết thúc (COMPLETED/FAILED) khỏi bộ nhớ sau khi ghi"""
+    task = research_tasks.get(task_id)
+    if task is None or task.status not in (ResearchStatus.COMPLETED, ResearchStatus.FAILED):
+        return
+    try:
+        cost_service = await get_service_factory().get_cost_monitoring_service()
+        await cost_service.release_monitoring(task_id)
+    except Exception as e:
+        logger.error(f"[Task {task_id}] Lỗi khi giải phóng cost monitoring: {str(e)}")
+
+async def _run_research_job(payload: Dict[str, Any]) -> None:
+    """Handler của job queue cho endpoint /research"""
+    task_id = payload["task_id"]
+    request = ResearchRequest(**payload["request"])
+    # Task đang xử lý được ghim trong bộ nhớ, chỉ có thể bị loại sau khi job kết thúc
+    with research_tasks.pinned(task_id):
+        await _restore_task(task_id, request)
+        try:
+            await process_research(task_id, request)
+        finally:
+            await _release_cost_monitoring(task_id)
+
+async def _run_complete_research_job(payload: Dict[str, Any]) -> None:
+    """Handler của job queue cho endpoint /research/complete và /research/{id}/resume"""
+    task_id = payload["task_id"]
+    request = ResearchRequest(**payload["request"])
+    with research_tasks.pinned(task_id):
+        await _restore_task(task_id, request)
+        
+        # Job được khôi phục từ journal sau sự cố cũng tiếp tục từ checkpoint thay vì chạy lại từ đầu
+        task = research_tasks[task_id]
+        resume = payload.get("resume", False) or task.status != ResearchStatus.PENDING
+        if resume and task.request:
+            request = task.request
+        try:
+            await process_complete_research(task_id, request, resume=resume)
+        finally:
+            await _release_cost_monitoring(task_id)
+
+async def _run_edit_job(payload: Dict[str, Any]) -> None:
+    """Handler của job queue cho endpoint /research/edit_only"""
+    task_id = payload["task_id"]
+    
+    with research_tasks.pinned(task_id):
+        task = research_tasks.get(task_id)
+        if not task or not task.outline or not task.sections:
+            task = await research_storage_service.load_full_task(task_id)
+        if not task or not task.request or not task.outline or not task.sections:
+            logger.error(f"[Task {task_id}] Không đủ dữ liệu để chạy giai đoạn chỉnh sửa")
+            return
+        
+        research_tasks[task_id] = task
+        try:
+            await process_research_with_sections(task_id, task.request, task.outline, task.sections)
+        finally:
+            await _release_cost_monitoring(task_id)
+
+job_queue.register_handler("research", _run_research_job)
+job_queue.register_handler("complete", _run_complete_research_job)
+job_queue.register_handler("edit", _run_edit_job)
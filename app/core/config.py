@@ -49,12 +49,110 @@ class Settings(BaseSettings):
     EDIT_MAX_TOKENS: int = 4000
     EDIT_TEMPERATURE: float = 0.7
     
+    # HTTP connection pool dùng chung cho LLM providers
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 30.0  # Giây giữ kết nối rảnh trước khi đóng
+    LLM_HTTP_TIMEOUT: float = 600.0
+    LLM_HTTP2: bool = True  # Chỉ có hiệu lực khi đã cài gói h2
+    
+    # Cache phản hồi LLM theo nội dung request
+    LLM_CACHE_BACKEND: str = "none"  # none, memory hoặc disk
+    LLM_CACHE_TTL_SECONDS: float = 86400  # 0 = không hết hạn
+    LLM_CACHE_MAX_ENTRIES: int = 1000  # Giới hạn cho backend memory
+    LLM_CACHE_MAX_BYTES: int = 100 * 1024 * 1024  # Giới hạn dung lượng cho backend disk
+    LLM_CACHE_DIR: str = "data/cache/llm"
+    
+    # Cache kết quả search theo câu truy vấn đã chuẩn hóa
+    SEARCH_CACHE_BACKEND: str = "none"  # none, memory hoặc disk
+    SEARCH_CACHE_TTL_SECONDS: float = 86400  # 0 = không hết hạn
+    SEARCH_CACHE_MAX_ENTRIES: int = 1000  # Giới hạn cho backend memory
+    SEARCH_CACHE_MAX_BYTES: int = 50 * 1024 * 1024  # Giới hạn dung lượng cho backend disk
+    SEARCH_CACHE_DIR: str = "data/cache/search"
+    
+    # Gộp các lời gọi LLM/search giống hệt nhau đang chạy đồng thời (single-flight)
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_COST_ATTRIBUTION: str = "proportional"  # proportional hoặc first
+    
+    # Rate limit theo provider: RPM/TPM (0 = không giới hạn) và concurrency thích ứng (AIMD)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_OPENAI_RPM: int = 500
+    RATE_LIMIT_OPENAI_TPM: int = 200000
+    RATE_LIMIT_ANTHROPIC_RPM: int = 50
+    RATE_LIMIT_ANTHROPIC_TPM: int = 80000
+    RATE_LIMIT_PERPLEXITY_RPM: int = 50
+    RATE_LIMIT_PERPLEXITY_TPM: int = 0
+    RATE_LIMIT_GOOGLE_RPM: int = 100
+    RATE_LIMIT_GOOGLE_TPM: int = 0
+    RATE_LIMIT_INITIAL_CONCURRENCY: int = 8
+    RATE_LIMIT_MIN_CONCURRENCY: int = 1
+    RATE_LIMIT_MAX_CONCURRENCY: int = 32
+    RATE_LIMIT_MAX_RETRIES: int = 3
+    RATE_LIMIT_BACKOFF_SECONDS: float = 1.0  # Thời gian chờ cơ sở khi không có Retry-After, tăng gấp đôi mỗi lần
+    
+    # Ghi cost.json/task.json theo lô (write-behind)
+    COST_FLUSH_INTERVAL_SECONDS: float = 2.0
+    COST_FLUSH_MAX_PENDING_UPDATES: int = 100  # Flush ngay khi số thay đổi chờ ghi vượt ngưỡng
+    # Giới hạn cost monitoring giữ trong bộ nhớ (LRU), task bị loại được tải lại từ storage khi cần
+    COST_DATA_MAX_TASKS: int = 100  # 0 = không giới hạn
+    COST_DATA_MAX_BYTES: int = 64 * 1024 * 1024  # Dung lượng ước lượng, 0 = không giới hạn
+    # Chỉ mục SQLite tổng hợp chi phí của mọi task (dựng lại bằng create_cost_json.py)
+    COST_INDEX_ENABLED: bool = True
+    COST_INDEX_PATH: str = "data/cost_index.db"
+    # Bảng giá model/search (JSON, có phiên bản theo ngày hiệu lực), tự nạp lại khi file thay đổi
+    PRICING_FILE: str = ""  # Để trống = app/services/core/monitoring/pricing.json
+    PRICING_RELOAD_INTERVAL_SECONDS: float = 30.0  # 0 = không tự nạp lại
+    # Giới hạn ngân sách token/chi phí, kiểm tra trước mỗi lời gọi LLM/search (0 = không giới hạn)
+    BUDGET_TASK_MAX_TOKENS: int = 0
+    BUDGET_TASK_MAX_USD: float = 0.0
+    BUDGET_GLOBAL_DAILY_MAX_TOKENS: int = 0  # Tổng mọi task trong một ngày (UTC)
+    BUDGET_GLOBAL_DAILY_MAX_USD: float = 0.0
+    BUDGET_DEGRADE_RATIO: float = 0.8  # Từ tỷ lệ này: model rẻ hơn, ít kết quả search hơn, bỏ qua edit
+    BUDGET_DEGRADED_SEARCH_RESULTS: int = 2
+    OPENAI_BUDGET_FALLBACK_MODEL: str = "gpt-4o-mini"
+    ANTHROPIC_BUDGET_FALLBACK_MODEL: str = "claude-3-haiku-20240307"
+    # Bộ ghi task.json tuần tự theo task (gộp cost summary và cập nhật tiến độ)
+    TASK_WRITER_MAX_CONCURRENT_WRITES: int = 4  # Số lần ghi task.json đồng thời tối đa trên mọi task
+    TASK_WRITER_MAX_TRACKED_TASKS: int = 1000  # Số task được giữ cost summary để áp lại khi ghi
+    # Thread pool riêng cho đọc/ghi file của storage (không chặn event loop)
+    FILE_IO_MAX_WORKERS: int = 8
+    # Mọi artifact của task được ghi nguyên tử (file tạm + rename); fsync: none, phase hoặc always
+    STORAGE_FSYNC_POLICY: str = "phase"
+    # Chỉ mục SQLite tóm tắt task cho GET /research (lọc, sắp xếp, phân trang không cần đọc task.json)
+    TASK_INDEX_PATH: str = ""  # Để trống = {DATA_DIR}/task_index.db
+    # Research task giữ trong bộ nhớ của API (LRU), task đang xử lý không bị loại (0 = không giới hạn)
+    TASK_REGISTRY_MAX_TASKS: int = 200
+    TASK_REGISTRY_MAX_BYTES: int = 128 * 1024 * 1024  # Dung lượng ước lượng
+    
+    # Tracing theo span của pipeline (xuất ra {TRACE_DIR}/{task_id}/trace.json)
+    TRACING_ENABLED: bool = True
+    TRACE_EXPORT_FORMAT: str = "chrome"  # chrome | otlp
+    TRACE_DIR: str = "data/research_tasks"
+    TRACE_MAX_SPANS_PER_TASK: int = 10000
+    TRACE_MAX_TASKS: int = 50
+    
+    # Prepare phase: tìm kiếm context cho dàn ý song song với analyze_query từ query gốc
+    PREPARE_SPECULATIVE_SEARCH: bool = False
+    PREPARE_SPECULATIVE_MIN_OVERLAP: float = 0.5  # Tỷ lệ từ khóa của topic phải có trong query gốc để giữ kết quả
+    
+    # Research phase concurrency
+    RESEARCH_SECTION_CONCURRENCY: int = 1  # Số section nghiên cứu song song tối đa (1 = tuần tự)
+    RESEARCH_SEARCH_CONCURRENCY: int = 0  # Số lời gọi search song song tối đa trong phase nghiên cứu (0 = không giới hạn riêng)
+    RESEARCH_LLM_CONCURRENCY: int = 0  # Số lời gọi LLM tổng hợp song song tối đa trong phase nghiên cứu (0 = không giới hạn riêng)
+    
+    # Job queue settings
+    QUEUE_WORKERS: int = 2  # Số research task được xử lý song song
+    QUEUE_MAX_PENDING: int = 20  # Số task tối đa đang chờ hoặc đang chạy trước khi trả về 429 (0 = không giới hạn)
+    QUEUE_MAX_ATTEMPTS: int = 3  # Số lần chạy tối đa của một task khi khôi phục sau sự cố
+    QUEUE_JOURNAL_PATH: str = "data/queue/jobs.db"
+    
     # Cost monitoring settings
     ENABLE_COST_MONITORING: bool = True
     COST_STORAGE_PROVIDER: str = "file"
     
     # Cost Tracking
     ENABLE_COST_TRACKING: bool = True
+    # Giá theo token cũ, chỉ áp (cho mọi model của provider) khi được đặt trong môi trường
     OPENAI_COST_PROMPT_TOKEN: float = 0.00000025
     OPENAI_COST_COMPLETION_TOKEN: float = 0.00000075
     CLAUDE_COST_PROMPT_TOKEN: float = 0.000008
@@ -57,3 +57,18 @@ class EditError(ServiceError):
 class ValidationError(BaseError):
     """Raised when there's a validation error in the research process"""
     pass
+
+
+class QueueFullError(ServiceError):
+    """Raised when the job queue cannot accept more work"""
+    pass
+
+
+class JobAlreadyActiveError(ServiceError):
+    """Raised when a job with the same id is already queued or running"""
+    pass
+
+
+class BudgetExceededError(ServiceError):
+    """Raised when a request would exceed the token or cost budget of a task"""
+    pass
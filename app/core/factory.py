@@ -12,6 +12,10 @@ from app.services.core.llm.openai import OpenAIService
 from app.services.core.llm.claude import ClaudeService
 from app.services.core.search.perplexity import PerplexityService
 from app.services.core.search.google import GoogleService
+from app.services.core.search.budget import wrap_with_budget
+from app.services.core.search.cache import wrap_with_cache
+from app.services.core.search.coalescing import wrap_with_single_flight
+from app.services.core.search.instrumented import InstrumentedSearchService
 from app.services.core.storage.github import GitHubService
 from app.services.core.storage.file import FileStorageService
 
@@ -123,6 +127,12 @@ class ServiceFactory:
                     self.services[service_key] = service
                     return service
             
+            # Bọc metrics, single-flight, kiểm tra ngân sách và search cache (nếu được bật), DummySearchService không cần.
+            # Cache nằm ngoài cùng nên ngân sách chỉ được kiểm tra khi cache miss
+            service = InstrumentedSearchService(service, provider_name=provider)
+            service = wrap_with_single_flight(service, provider_name=provider)
+            service = wrap_with_budget(service, provider_name=provider)
+            service = wrap_with_cache(service, provider_name=provider)
             self.services[service_key] = service
             return service
         except Exception as e:
@@ -0,0 +1,372 @@
+import bisect
+import math
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Bucket mặc định (giây) cho độ trễ của lời gọi LLM/search
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Bucket (giây) cho thời gian của phase/section
+DURATION_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0)
+# Bucket (giây) cho thao tác I/O file
+IO_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """Metric có nhãn; mỗi tổ hợp giá trị nhãn là một chuỗi số liệu riêng"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} cần các nhãn {self.labelnames}, nhận được {tuple(labels)}")
+        return tuple(str(labels[name]) if labels[name] is not None else "" for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """
+        Tăng bộ đếm
+
+        Args:
+            amount: Giá trị tăng thêm (không âm)
+            **labels: Giá trị các nhãn
+        """
+        if amount < 0:
+            raise ValueError("Counter chỉ có thể tăng")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        """Lấy giá trị hiện tại của bộ đếm"""
+        return self._values.get(self._key(labels), 0.0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Giá trị tức thời, có thể tăng hoặc giảm"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        """Đặt giá trị của gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Tăng (hoặc giảm nếu amount âm) giá trị của gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        """Lấy giá trị hiện tại của gauge"""
+        return self._values.get(self._key(labels), 0.0)
+
+    def clear(self) -> None:
+        """Xóa mọi chuỗi số liệu (dùng khi tập nhãn thay đổi giữa các lần cập nhật)"""
+        with self._lock:
+            self._values.clear()
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Phân phối giá trị theo bucket cố định (tích lũy như Prometheus)"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # nhãn -> (số lượng theo bucket, tổng, số quan sát)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Ghi nhận một quan sát
+
+        Args:
+            value: Giá trị quan sát (ví dụ độ trễ tính bằng giây)
+            **labels: Giá trị các nhãn
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def get_count(self, **labels: str) -> int:
+        """Lấy số quan sát của một chuỗi số liệu"""
+        value = self._values.get(self._key(labels))
+        return value[2] if value else 0
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        bucket_labels = self.labelnames + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_labels, key + (_format_value(bound),))} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registry metric trong tiến trình, xuất theo định dạng text của Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Lấy hoặc tạo counter"""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Lấy hoặc tạo gauge"""
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        """Lấy hoặc tạo histogram"""
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Lấy metric theo tên"""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Xuất mọi metric theo định dạng text exposition của Prometheus
+
+        Returns:
+            str: Nội dung cho endpoint /metrics
+        """
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric_class, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} đã được đăng ký với kiểu hoặc nhãn khác")
+            return metric
+
+
+# Singleton instance
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Lấy registry metric dùng chung của tiến trình"""
+    return _registry
+
+
+# Metric của pipeline
+LLM_REQUEST_DURATION = _registry.histogram(
+    "deep_research_llm_request_duration_seconds",
+    "Độ trễ lời gọi LLM provider (không tính cache hit)",
+    ("provider", "model", "purpose")
+)
+LLM_TOKENS = _registry.counter(
+    "deep_research_llm_tokens_total",
+    "Số token LLM theo chiều input/output",
+    ("provider", "model", "direction")
+)
+LLM_ERRORS = _registry.counter(
+    "deep_research_llm_errors_total",
+    "Số lời gọi LLM provider bị lỗi",
+    ("provider", "model")
+)
+SEARCH_REQUEST_DURATION = _registry.histogram(
+    "deep_research_search_request_duration_seconds",
+    "Độ trễ lời gọi search provider (không tính cache hit)",
+    ("provider", "purpose")
+)
+SEARCH_ERRORS = _registry.counter(
+    "deep_research_search_errors_total",
+    "Số lời gọi search provider bị lỗi",
+    ("provider",)
+)
+COST_USD = _registry.counter(
+    "deep_research_cost_usd_total",
+    "Chi phí ghi nhận (USD) theo loại và model/provider",
+    ("kind", "name")
+)
+CACHE_HITS = _registry.counter(
+    "deep_research_cache_hits_total",
+    "Số request được phục vụ từ cache theo loại và model/provider",
+    ("kind", "name")
+)
+PHASE_DURATION = _registry.histogram(
+    "deep_research_phase_duration_seconds",
+    "Thời gian thực hiện của từng phase",
+    ("phase", "status"),
+    buckets=DURATION_BUCKETS
+)
+SECTION_DURATION = _registry.histogram(
+    "deep_research_section_duration_seconds",
+    "Thời gian nghiên cứu của từng section",
+    ("status",),
+    buckets=DURATION_BUCKETS
+)
+# Gauge được cập nhật khi /metrics được gọi
+RESEARCH_TASKS = _registry.gauge(
+    "deep_research_tasks",
+    "Số research task trong bộ nhớ theo trạng thái",
+    ("status",)
+)
+JOB_QUEUE_JOBS = _registry.gauge(
+    "deep_research_job_queue_jobs",
+    "Số job đang chạy (running) và đang chờ (queued) trong hàng đợi",
+    ("state",)
+)
+COST_RESIDENT_TASKS = _registry.gauge(
+    "deep_research_cost_monitoring_resident_tasks",
+    "Số task có cost monitoring đang giữ trong bộ nhớ"
+)
+COST_RESIDENT_BYTES = _registry.gauge(
+    "deep_research_cost_monitoring_resident_bytes",
+    "Dung lượng ước lượng của cost monitoring đang giữ trong bộ nhớ"
+)
+TASK_REGISTRY_RESIDENT_TASKS = _registry.gauge(
+    "deep_research_task_registry_resident_tasks",
+    "Số research task đang giữ trong bộ nhớ của API"
+)
+TASK_REGISTRY_RESIDENT_BYTES = _registry.gauge(
+    "deep_research_task_registry_resident_bytes",
+    "Dung lượng ước lượng của các research task đang giữ trong bộ nhớ của API"
+)
+SINGLE_FLIGHT_IN_FLIGHT = _registry.gauge(
+    "deep_research_single_flight_in_flight",
+    "Số lời gọi LLM/search dùng chung đang chạy"
+)
+PROVIDER_IN_FLIGHT = _registry.gauge(
+    "deep_research_provider_in_flight",
+    "Số request đang chạy qua rate limiter của provider",
+    ("provider",)
+)
+PROVIDER_CONCURRENCY_LIMIT = _registry.gauge(
+    "deep_research_provider_concurrency_limit",
+    "Giới hạn concurrency hiện tại (AIMD) của provider",
+    ("provider",)
+)
+TASK_JSON_WRITES = _registry.counter(
+    "deep_research_task_json_writes_total",
+    "Số thay đổi task.json theo kết quả (written, coalesced, skipped, error)",
+    ("outcome",)
+)
+TASK_JSON_QUEUED_UPDATES = _registry.gauge(
+    "deep_research_task_json_queued_updates",
+    "Số thay đổi task.json đang chờ được ghi"
+)
+BUDGET_DECISIONS = _registry.counter(
+    "deep_research_budget_decisions_total",
+    "Số lần kiểm tra ngân sách trước lời gọi LLM/search theo kết quả (ok, degraded, exceeded)",
+    ("kind", "status")
+)
+FILE_IO_QUEUE_DEPTH = _registry.gauge(
+    "deep_research_file_io_queue_depth",
+    "Số thao tác I/O file chờ khóa đường dẫn (waiting_path), chờ thread (queued) và đang chạy (running)",
+    ("state",)
+)
+FILE_IO_OPERATIONS = _registry.counter(
+    "deep_research_file_io_operations_total",
+    "Số thao tác I/O file theo loại và kết quả (ok, error)",
+    ("op", "outcome")
+)
+FILE_IO_QUEUE_WAIT = _registry.histogram(
+    "deep_research_file_io_queue_wait_seconds",
+    "Thời gian thao tác I/O file chờ thread trống",
+    ("op",),
+    buckets=IO_BUCKETS
+)
+FILE_IO_DURATION = _registry.histogram(
+    "deep_research_file_io_duration_seconds",
+    "Thời gian thực hiện thao tác I/O file trên thread",
+    ("op",),
+    buckets=IO_BUCKETS
+)
@@ -0,0 +1,373 @@
+import asyncio
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Status code coi là provider đang quá tải: giảm concurrency và thử lại
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+
+def get_error_status(error: Exception) -> Optional[int]:
+    """
+    Lấy HTTP status code từ lỗi của httpx, OpenAI/Anthropic SDK hoặc googleapiclient
+
+    Args:
+        error: Lỗi của lời gọi provider
+
+    Returns:
+        Optional[int]: Status code, hoặc None nếu lỗi không đến từ HTTP response
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Đọc header Retry-After (số giây hoặc HTTP date) từ lỗi của provider
+
+    Args:
+        error: Lỗi của lời gọi provider
+
+    Returns:
+        Optional[float]: Số giây cần chờ, hoặc None nếu không có header
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        headers = getattr(error, "resp", None)
+    if headers is None:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket nạp lại liên tục theo ngân sách mỗi phút"""
+
+    def __init__(self, per_minute: float):
+        """
+        Args:
+            per_minute: Số token được nạp mỗi phút (cũng là dung lượng tối đa)
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """
+        Lấy token, chờ đến khi bucket đủ token
+
+        Args:
+            amount: Số token cần (bị giới hạn bởi dung lượng bucket)
+
+        Returns:
+            float: Tổng thời gian đã chờ (giây)
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return waited
+            delay = (amount - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+    def adjust(self, amount: float) -> None:
+        """
+        Trả lại (amount > 0) hoặc trừ thêm (amount < 0) token sau khi biết usage thực tế
+
+        Args:
+            amount: Số token điều chỉnh
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AIMDController:
+    """
+    Giới hạn số request đồng thời theo AIMD (additive increase, multiplicative decrease)
+
+    Mỗi request thành công tăng giới hạn thêm increase / limit (khoảng +increase mỗi vòng),
+    mỗi lần provider báo quá tải (429/5xx) giới hạn bị nhân với decrease_factor.
+    """
+
+    def __init__(
+        self,
+        initial: float = 8,
+        minimum: float = 1,
+        maximum: float = 32,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 1.0
+    ):
+        self.minimum = max(1.0, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.limit = min(self.maximum, max(self.minimum, float(initial)))
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters: deque = deque()
+
+    async def acquire(self) -> None:
+        """Chờ đến khi có slot trống và provider không bị tạm dừng (Retry-After)"""
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # _wake đã lấy waiter ra khỏi hàng đợi và tính slot cho nó (kể cả khi việc hủy
+                    # xảy ra trước lúc waiter được resolve): nhường slot cho request chờ tiếp theo
+                    self._wake()
+                raise
+
+    def release(self) -> None:
+        """Trả slot và đánh thức các request đang chờ"""
+        self.in_flight = max(0, self.in_flight - 1)
+        self._wake()
+
+    def on_success(self) -> None:
+        """Tăng giới hạn sau một request thành công"""
+        self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+        self._wake()
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """
+        Giảm giới hạn khi provider quá tải
+
+        Args:
+            retry_after: Thời gian (giây) provider yêu cầu chờ, áp dụng cho mọi request của provider
+        """
+        now = time.monotonic()
+        # Nhiều request cùng bị 429 trong một đợt chỉ tính là một lần giảm
+        if now - self._last_decrease >= self.cooldown_seconds:
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            self._last_decrease = now
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+    def _wake(self) -> None:
+        available = int(self.limit) - self.in_flight
+        while available > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            loop = waiter.get_loop()
+            if waiter.done() or loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(_resolve_waiter, waiter)
+            available -= 1
+
+
+def _resolve_waiter(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class ProviderRateLimiter:
+    """Giới hạn request theo provider: RPM, TPM và concurrency thích ứng, kèm thử lại khi bị 429/5xx"""
+
+    def __init__(
+        self,
+        provider: str,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        controller: Optional[AIMDController] = None,
+        max_retries: int = 3,
+        backoff_seconds: float = 1.0
+    ):
+        """
+        Args:
+            provider: Tên provider
+            requests_per_minute: Ngân sách request mỗi phút (0 = không giới hạn)
+            tokens_per_minute: Ngân sách token mỗi phút (0 = không giới hạn)
+            controller: Bộ điều khiển concurrency
+            max_retries: Số lần thử lại tối đa khi provider quá tải
+            backoff_seconds: Thời gian chờ cơ sở (tăng gấp đôi mỗi lần) khi không có Retry-After
+        """
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.controller = controller or AIMDController()
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.total_requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """
+        Thực hiện lời gọi provider trong giới hạn rate limit
+
+        Args:
+            fn: Hàm thực hiện lời gọi (được gọi lại khi thử lại)
+            tokens: Số token ước tính của request (cho ngân sách TPM)
+
+        Returns:
+            Any: Kết quả của fn
+
+        Raises:
+            Exception: Lỗi của fn khi không thể thử lại hoặc đã hết số lần thử lại
+        """
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            if self.requests:
+                await self.requests.acquire(1)
+            if self.tokens and tokens:
+                await self.tokens.acquire(tokens)
+            await self.controller.acquire()
+            self.wait_seconds += time.monotonic() - started
+            self.total_requests += 1
+            try:
+                result = await fn()
+            except Exception as e:
+                status = get_error_status(e)
+                if status not in RETRYABLE_STATUS_CODES:
+                    raise
+                retry_after = get_retry_after(e)
+                self.throttled += 1
+                self.controller.on_throttle(retry_after)
+                if attempt >= self.max_retries:
+                    logger.error(f"{self.provider} vẫn trả về {status} sau {attempt} lần thử lại")
+                    raise
+                delay = retry_after if retry_after is not None else self.backoff_seconds * (2 ** attempt)
+                attempt += 1
+                self.retries += 1
+                logger.warning(
+                    f"{self.provider} trả về {status}, giảm concurrency xuống {int(self.controller.limit)}, "
+                    f"thử lại lần {attempt}/{self.max_retries} sau {delay:.1f}s"
+                )
+            else:
+                self.controller.on_success()
+                return result
+            finally:
+                self.controller.release()
+            await asyncio.sleep(delay)
+
+    def reconcile_tokens(self, estimated: int, actual: int) -> None:
+        """
+        Điều chỉnh ngân sách TPM theo usage thực tế sau khi request hoàn tất
+
+        Args:
+            estimated: Số token đã trừ trước khi gọi
+            actual: Số token provider báo cáo
+        """
+        if self.tokens and estimated != actual:
+            self.tokens.adjust(estimated - actual)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê của limiter"""
+        return {
+            "concurrency_limit": int(self.controller.limit),
+            "in_flight": self.controller.in_flight,
+            "waiting": len(self.controller._waiters),
+            "requests_available": round(self.requests.tokens, 2) if self.requests else None,
+            "tokens_available": round(self.tokens.tokens, 2) if self.tokens else None,
+            "total_requests": self.total_requests,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "wait_seconds": round(self.wait_seconds, 3)
+        }
+
+
+_rate_limiters: Dict[str, ProviderRateLimiter] = {}
+
+
+def get_rate_limiter(provider: str) -> Optional[ProviderRateLimiter]:
+    """
+    Lấy rate limiter dùng chung của provider
+
+    Ngân sách đọc từ RATE_LIMIT_<PROVIDER>_RPM / RATE_LIMIT_<PROVIDER>_TPM (0 = không giới hạn).
+
+    Args:
+        provider: Tên provider, ví dụ: "openai", "anthropic", "perplexity", "google"
+
+    Returns:
+        Optional[ProviderRateLimiter]: Limiter của provider, hoặc None nếu rate limit bị tắt
+    """
+    settings = get_settings()
+    if not settings.RATE_LIMIT_ENABLED or not provider:
+        return None
+    provider = provider.lower()
+    limiter = _rate_limiters.get(provider)
+    if limiter is None:
+        prefix = f"RATE_LIMIT_{provider.upper()}"
+        limiter = ProviderRateLimiter(
+            provider,
+            requests_per_minute=getattr(settings, f"{prefix}_RPM", 0),
+            tokens_per_minute=getattr(settings, f"{prefix}_TPM", 0),
+            controller=AIMDController(
+                initial=settings.RATE_LIMIT_INITIAL_CONCURRENCY,
+                minimum=settings.RATE_LIMIT_MIN_CONCURRENCY,
+                maximum=settings.RATE_LIMIT_MAX_CONCURRENCY
+            ),
+            max_retries=settings.RATE_LIMIT_MAX_RETRIES,
+            backoff_seconds=settings.RATE_LIMIT_BACKOFF_SECONDS
+        )
+        _rate_limiters[provider] = limiter
+    return limiter
+
+
+async def run_with_rate_limit(provider: str, fn: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+    """
+    Thực hiện lời gọi qua rate limiter của provider (gọi trực tiếp nếu rate limit bị tắt)
+
+    Args:
+        provider: Tên provider
+        fn: Hàm thực hiện lời gọi
+        tokens: Số token ước tính của request
+
+    Returns:
+        Any: Kết quả của fn
+    """
+    limiter = get_rate_limiter(provider)
+    if limiter is None:
+        return await fn()
+    return await limiter.call(fn, tokens=tokens)
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """Lấy thống kê rate limiter của mọi provider đã dùng"""
+    return {provider: limiter.get_stats() for provider, limiter in _rate_limiters.items()}
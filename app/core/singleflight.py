@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# task_id giả truyền cho lời gọi dùng chung; chi phí ghi với task_id này bị
+# capture lại rồi phân bổ cho từng task tham gia, không bao giờ được lưu trực tiếp
+SHARED_TASK_ID = "__single_flight__"
+
+# Danh sách chi phí được capture trong ngữ cảnh của lời gọi dùng chung
+_cost_capture_var: contextvars.ContextVar = contextvars.ContextVar("single_flight_cost_capture", default=None)
+
+
+def capture_cost(kind: str, fields: Dict[str, Any]) -> bool:
+    """
+    Giữ lại một bản ghi chi phí nếu đang chạy trong lời gọi dùng chung
+
+    Args:
+        kind: Loại chi phí ("llm" hoặc "search")
+        fields: Tham số của log_llm_request / log_search_request (không gồm task_id)
+
+    Returns:
+        bool: True nếu bản ghi đã được capture (caller không được ghi trực tiếp)
+    """
+    captured = _cost_capture_var.get()
+    if captured is None:
+        return False
+    captured.append((kind, fields))
+    return True
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # Mọi caller có thể đã bị hủy trước khi lời gọi xong; lấy lỗi để asyncio không
+    # báo "Task exception was never retrieved" (caller còn chờ vẫn nhận lỗi qua shield)
+    if not task.cancelled():
+        task.exception()
+
+
+class _Flight:
+    """Một lời gọi upstream đang chạy cùng số task đang chờ kết quả"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        # task_id của các caller theo thứ tự tham gia, phần tử đầu là leader (None nếu caller không có task_id)
+        self.task_ids: List[Optional[str]] = []
+        self.costs: List[Tuple[str, Dict[str, Any]]] = []
+
+    @property
+    def participants(self) -> int:
+        return len(self.task_ids)
+
+
+class SingleFlight:
+    """
+    Gộp các request giống hệt nhau đang chạy đồng thời thành một lời gọi upstream
+
+    Request đầu tiên (leader) thực hiện lời gọi, các request đến sau khi lời gọi
+    chưa xong chờ và nhận cùng kết quả. Chi phí của lời gọi được phân bổ cho các
+    task tham gia theo attribution: "proportional" (chia đều) hoặc "first" (leader chịu toàn bộ).
+    """
+
+    def __init__(self, attribution: str = "proportional"):
+        """
+        Args:
+            attribution: Cách phân bổ chi phí, "proportional" hoặc "first"
+        """
+        if attribution not in ("proportional", "first"):
+            logger.warning(f"SINGLE_FLIGHT_COST_ATTRIBUTION không hợp lệ: {attribution}, dùng 'proportional'")
+            attribution = "proportional"
+        self.attribution = attribution
+        self._flights: Dict[str, _Flight] = {}
+        self.flights = 0
+        self.coalesced = 0
+
+    def cost_share(self, participants: int, is_leader: bool) -> float:
+        """
+        Tính phần chi phí của một task tham gia
+
+        Args:
+            participants: Tổng số task dùng chung lời gọi
+            is_leader: Task có phải leader không
+
+        Returns:
+            float: Tỷ lệ chi phí (0.0 - 1.0)
+        """
+        if self.attribution == "first":
+            return 1.0 if is_leader else 0.0
+        return 1.0 / max(1, participants)
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[str], Awaitable[Any]],
+        task_id: Optional[str] = None
+    ) -> Any:
+        """
+        Thực hiện fn một lần cho mỗi key đang chạy và chia kết quả cho mọi caller
+
+        Args:
+            key: Khóa xác định request (các request cùng key được gộp)
+            fn: Hàm thực hiện lời gọi upstream, nhận task_id dùng để ghi chi phí
+            task_id: ID của task gọi (để phân bổ chi phí)
+
+        Returns:
+            Any: Kết quả của lời gọi upstream
+
+        Raises:
+            Exception: Lỗi của lời gọi upstream được trả về cho mọi caller
+        """
+        flight = self._flights.get(key)
+        is_leader = flight is None or flight.task.done() or flight.task.get_loop() is not asyncio.get_running_loop()
+        if is_leader:
+            flight = _Flight()
+            flight.task_ids.append(task_id)
+            self._flights[key] = flight
+            self.flights += 1
+            flight.task = asyncio.ensure_future(self._run(key, flight, fn))
+            flight.task.add_done_callback(_consume_exception)
+        else:
+            flight.task_ids.append(task_id)
+            self.coalesced += 1
+            logger.info(f"Gộp request đang chạy cho key {key[:24]}... ({flight.participants} task)")
+
+        # shield: caller bị hủy không làm hủy lời gọi mà các task khác đang chờ
+        return await asyncio.shield(flight.task)
+
+    async def _run(self, key: str, flight: _Flight, fn: Callable[[str], Awaitable[Any]]) -> Any:
+        token = _cost_capture_var.set(flight.costs)
+        try:
+            return await fn(SHARED_TASK_ID)
+        finally:
+            _cost_capture_var.reset(token)
+            # Bỏ flight trước khi phân bổ chi phí để danh sách task tham gia không đổi sau đó
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            # Phân bổ từ chính flight cho mọi task tham gia, kể cả caller đã bị hủy khi đang chờ
+            await self._attribute_costs(flight)
+
+    async def _attribute_costs(self, flight: _Flight) -> None:
+        """Ghi lại các chi phí đã capture cho từng task tham gia với phần chi phí tương ứng"""
+        if not flight.costs:
+            return
+        try:
+            from app.services.core.monitoring.cost import get_cost_service
+
+            cost_service = await get_cost_service()
+        except Exception as e:
+            logger.error(f"Lỗi khi phân bổ chi phí của lời gọi dùng chung: {str(e)}")
+            return
+        for index, task_id in enumerate(flight.task_ids):
+            if not task_id:
+                continue
+            is_leader = index == 0
+            share = self.cost_share(flight.participants, is_leader)
+            try:
+                for kind, fields in flight.costs:
+                    log = cost_service.log_llm_request if kind == "llm" else cost_service.log_search_request
+                    await log(task_id=task_id, cost_share=share, coalesced=not is_leader, **fields)
+            except Exception as e:
+                logger.error(f"Lỗi khi phân bổ chi phí cho task {task_id}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê số lời gọi upstream và số request được gộp"""
+        total = self.flights + self.coalesced
+        return {
+            "attribution": self.attribution,
+            "in_flight": len(self._flights),
+            "flights": self.flights,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / total, 4) if total else 0.0
+        }
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_initialized = False
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """
+    Lấy SingleFlight dùng chung theo SINGLE_FLIGHT_ENABLED
+
+    Returns:
+        Optional[SingleFlight]: Instance dùng chung, hoặc None nếu tính năng bị tắt
+    """
+    global _single_flight, _single_flight_initialized
+    if not _single_flight_initialized:
+        settings = get_settings()
+        if settings.SINGLE_FLIGHT_ENABLED:
+            _single_flight = SingleFlight(attribution=settings.SINGLE_FLIGHT_COST_ATTRIBUTION)
+        _single_flight_initialized = True
+    return _single_flight
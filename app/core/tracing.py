@@ -0,0 +1,433 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+TRACE_FORMATS = ("chrome", "otlp")
+
+# Span đang chạy trong context hiện tại (được sao chép sang các asyncio task con)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("trace_current_span", default=None)
+
+
+class Span:
+    """Một khoảng thời gian có tên trong trace của một research task"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_time", "end_time", "attributes", "status")
+
+    def __init__(self, trace_id: str, name: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Gắn thêm thuộc tính cho span"""
+        self.attributes[key] = value
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time or time.time()) - self.start_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "attributes": self.attributes,
+            "status": self.status
+        }
+
+
+def current_span() -> Optional[Span]:
+    """Lấy span đang chạy trong context hiện tại"""
+    return _current_span.get()
+
+
+def _otlp_trace_id(trace_id: str) -> str:
+    """Trace ID 32 ký tự hex theo OTLP (dùng trực tiếp UUID của task nếu có)"""
+    try:
+        return uuid.UUID(trace_id).hex
+    except ValueError:
+        return hashlib.md5(trace_id.encode("utf-8")).hexdigest()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_chrome_trace(spans: List[Span]) -> Dict[str, Any]:
+    """
+    Chuyển danh sách span sang định dạng Chrome trace (chrome://tracing, Perfetto)
+
+    Mỗi span con trực tiếp của span gốc (ví dụ một section) được đặt trên một "thread" riêng
+    để các nhánh chạy song song không chồng lên nhau.
+
+    Args:
+        spans: Các span đã kết thúc
+
+    Returns:
+        Dict[str, Any]: Trace theo định dạng Chrome trace event
+    """
+    by_id = {span.span_id: span for span in spans}
+    lanes: Dict[str, int] = {}
+
+    def lane_of(span: Span) -> int:
+        # Tìm tổ tiên là con trực tiếp của span gốc
+        node = span
+        while node.parent_id in by_id and by_id[node.parent_id].parent_id in by_id:
+            node = by_id[node.parent_id]
+        if node.parent_id not in by_id:
+            return 0
+        return lanes.setdefault(node.span_id, len(lanes) + 1)
+
+    events = []
+    for span in sorted(spans, key=lambda s: s.start_time):
+        events.append({
+            "name": span.name,
+            "cat": span.name.split(".", 1)[0],
+            "ph": "X",
+            "ts": int(span.start_time * 1_000_000),
+            "dur": int(span.duration * 1_000_000),
+            "pid": 1,
+            "tid": lane_of(span),
+            "args": {**span.attributes, "span_id": span.span_id, "parent_id": span.parent_id, "status": span.status}
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def to_otlp_json(spans: List[Span]) -> Dict[str, Any]:
+    """
+    Chuyển danh sách span sang định dạng OTLP-JSON (ExportTraceServiceRequest)
+
+    Args:
+        spans: Các span đã kết thúc
+
+    Returns:
+        Dict[str, Any]: Trace theo định dạng OTLP-JSON
+    """
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": _otlp_trace_id(span.trace_id),
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(span.start_time * 1_000_000_000)),
+            "endTimeUnixNano": str(int((span.end_time or span.start_time) * 1_000_000_000)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2 if span.status == "error" else 1}
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "deep-research-agent"}}]},
+            "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": otlp_spans}]
+        }]
+    }
+
+
+class Tracer:
+    """
+    Thu thập span theo research task và xuất trace ra file
+
+    Span đã kết thúc được giữ trong bộ nhớ theo task (giới hạn số span mỗi task và số task);
+    khi một span được đánh dấu export (ví dụ một phase) kết thúc, trace của task được ghi ra file.
+    """
+
+    def __init__(
+        self,
+        export_dir: Optional[str] = None,
+        export_format: str = "chrome",
+        max_spans_per_trace: int = 10000,
+        max_traces: int = 50
+    ):
+        """
+        Args:
+            export_dir: Thư mục ghi trace ({export_dir}/{task_id}/trace.json), None để không ghi file
+            export_format: Định dạng file ("chrome" hoặc "otlp")
+            max_spans_per_trace: Số span tối đa giữ cho mỗi task, span vượt quá bị bỏ
+            max_traces: Số task tối đa giữ trace trong bộ nhớ
+        """
+        if export_format not in TRACE_FORMATS:
+            raise ValueError(f"Định dạng trace không hỗ trợ: {export_format}")
+        self.export_dir = export_dir
+        self.export_format = export_format
+        self.max_spans_per_trace = max_spans_per_trace
+        self.max_traces = max(1, max_traces)
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._exports: set = set()
+        self.dropped_spans = 0
+
+    def start_span(self, name: str, trace_id: str, parent: Optional[Span] = None, attributes: Optional[Dict[str, Any]] = None) -> Span:
+        """Tạo span mới (con của parent nếu có)"""
+        return Span(trace_id, name, parent.span_id if parent else None, attributes)
+
+    def end_span(self, span: Span, export: bool = False) -> None:
+        """
+        Kết thúc span và lưu vào trace của task
+
+        Args:
+            span: Span cần kết thúc
+            export: Ghi trace của task ra file sau khi lưu span
+        """
+        span.end_time = time.time()
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            self._traces.move_to_end(span.trace_id)
+            if len(spans) >= self.max_spans_per_trace:
+                self.dropped_spans += 1
+                return
+            spans.append(span)
+        if export and self.export_dir:
+            self._schedule_export(span.trace_id)
+
+    def get_spans(self, trace_id: str) -> Optional[List[Span]]:
+        """Lấy các span đã kết thúc của task, None nếu trace không còn trong bộ nhớ"""
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            return list(spans) if spans is not None else None
+
+    def render(self, trace_id: str, export_format: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Xuất trace của task theo định dạng yêu cầu
+
+        Args:
+            trace_id: ID của task
+            export_format: "chrome" hoặc "otlp" (mặc định theo cấu hình)
+
+        Returns:
+            Optional[Dict[str, Any]]: Trace, None nếu không có trong bộ nhớ
+        """
+        spans = self.get_spans(trace_id)
+        if spans is None:
+            return None
+        if (export_format or self.export_format) == "otlp":
+            return to_otlp_json(spans)
+        return to_chrome_trace(spans)
+
+    def export_path(self, trace_id: str) -> Optional[str]:
+        """Đường dẫn file trace của task"""
+        if not self.export_dir:
+            return None
+        return os.path.join(self.export_dir, trace_id, "trace.json")
+
+    async def export(self, trace_id: str) -> Optional[str]:
+        """
+        Ghi trace của task ra file (ghi nguyên tử)
+
+        Args:
+            trace_id: ID của task
+
+        Returns:
+            Optional[str]: Đường dẫn file đã ghi, None nếu không có gì để ghi
+        """
+        path = self.export_path(trace_id)
+        data = self.render(trace_id)
+        if path is None or data is None:
+            return None
+        await asyncio.to_thread(self._write, path, data)
+        return path
+
+    async def load_exported(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Đọc trace đã ghi ra file của task"""
+        path = self.export_path(trace_id)
+        if path is None or not os.path.exists(path):
+            return None
+
+        def _read() -> Dict[str, Any]:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        return await asyncio.to_thread(_read)
+
+    async def flush(self) -> None:
+        """Chờ các lần ghi trace đang chạy hoàn thành"""
+        if self._exports:
+            await asyncio.gather(*list(self._exports), return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê trace đang giữ trong bộ nhớ"""
+        with self._lock:
+            return {
+                "traces": len(self._traces),
+                "spans": sum(len(spans) for spans in self._traces.values()),
+                "dropped_spans": self.dropped_spans,
+                "export_format": self.export_format
+            }
+
+    def _schedule_export(self, trace_id: str) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._export_safely(trace_id))
+        self._exports.add(task)
+        task.add_done_callback(self._exports.discard)
+
+    async def _export_safely(self, trace_id: str) -> None:
+        try:
+            await self.export(trace_id)
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi trace của task {trace_id}: {str(e)}")
+
+    @staticmethod
+    def _write(path: str, data: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+
+# Singleton instance
+_tracer: Optional[Tracer] = None
+_tracer_initialized = False
+
+
+def get_tracer() -> Optional[Tracer]:
+    """
+    Lấy tracer dùng chung, None nếu tracing bị tắt trong cấu hình
+
+    Returns:
+        Optional[Tracer]: Tracer
+    """
+    global _tracer, _tracer_initialized
+    if not _tracer_initialized:
+        settings = get_settings()
+        if settings.TRACING_ENABLED:
+            _tracer = Tracer(
+                export_dir=settings.TRACE_DIR or None,
+                export_format=settings.TRACE_EXPORT_FORMAT,
+                max_spans_per_trace=settings.TRACE_MAX_SPANS_PER_TASK,
+                max_traces=settings.TRACE_MAX_TASKS
+            )
+        _tracer_initialized = True
+    return _tracer
+
+
+@contextmanager
+def span(name: str, task_id: Optional[str] = None, export: bool = False, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Đo một đoạn code như một span con của span hiện tại
+
+    Span thuộc trace của span hiện tại; nếu chưa có span nào, task_id được dùng làm trace.
+    Không có cả hai (hoặc tracing bị tắt) thì không ghi nhận gì.
+
+    Args:
+        name: Tên span (ví dụ "research.section", "llm.generate")
+        task_id: ID của research task (trace) khi bắt đầu một trace mới
+        export: Ghi trace của task ra file khi span kết thúc (dùng cho span của phase)
+        **attributes: Thuộc tính của span
+
+    Yields:
+        Optional[Span]: Span đang chạy, None nếu không ghi nhận
+    """
+    tracer = get_tracer()
+    parent = _current_span.get()
+    trace_id = parent.trace_id if parent is not None else task_id
+    if tracer is None or not trace_id:
+        yield None
+        return
+
+    current = tracer.start_span(name, trace_id, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.end_span(current, export=export)
+
+
+def traced(
+    name: str,
+    task_id: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None,
+    attributes: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+    export: bool = False,
+    child_only: bool = False
+):
+    """
+    Decorator bọc một hàm (sync hoặc async) trong một span
+
+    Args:
+        name: Tên span
+        task_id: Hàm lấy task_id từ các đối số của lời gọi (mặc định: đối số "task_id")
+        attributes: Hàm lấy thuộc tính span từ các đối số của lời gọi
+        export: Ghi trace của task ra file khi span kết thúc
+        child_only: Chỉ ghi span khi đang có span cha, không bao giờ bắt đầu trace mới
+            (dùng cho thao tác cũng được gọi ngoài pipeline, ví dụ đọc/ghi storage từ API)
+
+    Returns:
+        Callable: Decorator
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def span_args(args, kwargs):
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            if child_only:
+                trace_id = None
+            else:
+                trace_id = task_id(arguments) if task_id else arguments.get("task_id")
+            return trace_id, (attributes(arguments) if attributes else {})
+
+        def should_trace() -> bool:
+            return get_tracer() is not None
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not should_trace():
+                    return await fn(*args, **kwargs)
+                trace_id, attrs = span_args(args, kwargs)
+                with span(name, task_id=trace_id, export=export, **attrs):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not should_trace():
+                return fn(*args, **kwargs)
+            trace_id, attrs = span_args(args, kwargs)
+            with span(name, task_id=trace_id, export=export, **attrs):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
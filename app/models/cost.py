@@ -44,6 +44,14 @@ class LLMCost(BaseModel):
         None, 
         description="Mục đích của cuộc gọi API. Ví dụ: 'Phân tích yêu cầu', 'Tạo dàn ý', 'Nghiên cứu phần 1'"
     )
+    cache_hit: bool = Field(
+        False,
+        description="True nếu phản hồi được lấy từ cache thay vì gọi provider (chi phí bằng 0)."
+    )
+    coalesced: bool = Field(
+        False,
+        description="True nếu request được gộp vào lời gọi đang chạy của task khác (single-flight)."
+    )
 
 class SearchCost(BaseModel):
     """Chi phí cho một cuộc gọi Search API"""
@@ -87,6 +95,14 @@ class SearchCost(BaseModel):
         None,
         description="Số lượng tokens đầu ra (nếu áp dụng). Một số API tìm kiếm tính phí theo tokens."
     )
+    cache_hit: bool = Field(
+        False,
+        description="True nếu kết quả được lấy từ search cache thay vì gọi provider (chi phí bằng 0)."
+    )
+    coalesced: bool = Field(
+        False,
+        description="True nếu request được gộp vào lời gọi đang chạy của task khác (single-flight)."
+    )
 
 class PhaseTimingInfo(BaseModel):
     """Thông tin timing của một phase"""
@@ -151,10 +167,92 @@ class CostSummary(BaseModel):
     total_output_tokens: int = Field(0)
     total_llm_requests: int = Field(0)
     total_search_requests: int = Field(0)
+    llm_cache_hits: int = Field(0)
+    search_cache_hits: int = Field(0)
+    coalesced_requests: int = Field(0)
     model_breakdown: Dict[str, Dict] = Field(default_factory=dict)
     provider_breakdown: Dict[str, Dict] = Field(default_factory=dict)
     last_updated: str = Field(default_factory=lambda: datetime.now().isoformat())
 
+    def add_llm_cost(self, request: "LLMCost") -> None:
+        """Cộng một LLM request vào tổng hợp và breakdown theo model (O(1))"""
+        self.llm_cost_usd += request.cost_usd
+        self.total_cost_usd += request.cost_usd
+        self.total_input_tokens += request.input_tokens
+        self.total_output_tokens += request.output_tokens
+        self.total_tokens += request.input_tokens + request.output_tokens
+        self.total_llm_requests += 1
+        
+        model_data = self.model_breakdown.get(request.model)
+        if model_data is None:
+            model_data = self.model_breakdown[request.model] = {
+                "requests": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cost_usd": 0.0
+            }
+        model_data["requests"] += 1
+        model_data["input_tokens"] += request.input_tokens
+        model_data["output_tokens"] += request.output_tokens
+        model_data["cost_usd"] += request.cost_usd
+        if request.cache_hit:
+            self.llm_cache_hits += 1
+            model_data["cache_hits"] = model_data.get("cache_hits", 0) + 1
+        if request.coalesced:
+            self.coalesced_requests += 1
+        self.last_updated = request.timestamp
+
+    def add_search_cost(self, request: "SearchCost") -> None:
+        """Cộng một Search request vào tổng hợp và breakdown theo provider (O(1))"""
+        self.search_cost_usd += request.cost_usd
+        self.total_cost_usd += request.cost_usd
+        self.total_search_requests += 1
+        
+        provider_data = self.provider_breakdown.get(request.provider)
+        if provider_data is None:
+            provider_data = self.provider_breakdown[request.provider] = {
+                "requests": 0,
+                "cost_usd": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0
+            }
+        provider_data["requests"] += 1
+        provider_data["cost_usd"] += request.cost_usd
+        if request.cache_hit:
+            self.search_cache_hits += 1
+            provider_data["cache_hits"] = provider_data.get("cache_hits", 0) + 1
+        if request.coalesced:
+            self.coalesced_requests += 1
+        
+        # Search có thông tin token (Perplexity) được cộng vào tổng token
+        if request.input_tokens and request.output_tokens:
+            self.total_input_tokens += request.input_tokens
+            self.total_output_tokens += request.output_tokens
+            self.total_tokens += request.input_tokens + request.output_tokens
+            provider_data["input_tokens"] += request.input_tokens
+            provider_data["output_tokens"] += request.output_tokens
+        self.last_updated = request.timestamp
+
+    def matches(self, other: "CostSummary", tolerance: float = 1e-9) -> bool:
+        """
+        So sánh hai summary (bỏ qua last_updated), dùng để kiểm tra tính nhất quán
+
+        Args:
+            other: Summary cần so sánh
+            tolerance: Sai số cho phép với các giá trị chi phí
+
+        Returns:
+            bool: True nếu hai summary khớp nhau
+        """
+        def _equal(a: Any, b: Any) -> bool:
+            if isinstance(a, dict) and isinstance(b, dict):
+                return a.keys() == b.keys() and all(_equal(a[key], b[key]) for key in a)
+            if isinstance(a, float) or isinstance(b, float):
+                return abs(a - b) <= tolerance
+            return a == b
+
+        return _equal(self.dict(exclude={"last_updated"}), other.dict(exclude={"last_updated"}))
+
 class ResearchCostMonitoring(BaseModel):
     """Theo dõi chi phí cho một research task"""
     task_id: str
@@ -167,16 +265,18 @@ class ResearchCostMonitoring(BaseModel):
     summary: Optional[CostSummary] = None
 
     def add_llm_cost(self, cost: LLMCost) -> None:
-        """Thêm một LLM cost mới"""
+        """Thêm một LLM cost mới và cập nhật summary tăng dần"""
+        summary = self.ensure_summary()
         self.llm_requests.append(cost)
+        summary.add_llm_cost(cost)
         self.updated_at = datetime.now().isoformat()
-        self._update_summary()
 
     def add_search_cost(self, cost: SearchCost) -> None:
-        """Thêm một Search cost mới"""
+        """Thêm một Search cost mới và cập nhật summary tăng dần"""
+        summary = self.ensure_summary()
         self.search_requests.append(cost)
+        summary.add_search_cost(cost)
         self.updated_at = datetime.now().isoformat()
-        self._update_summary()
 
     def start_phase(self, phase_name: str) -> str:
         """Bắt đầu timing cho một phase"""
@@ -275,75 +375,28 @@ class ResearchCostMonitoring(BaseModel):
         
         self.updated_at = end_time
 
-    def _update_summary(self) -> CostSummary:
-        """Cập nhật tổng hợp chi phí"""
-        total_llm_cost = sum(request.cost_usd for request in self.llm_requests)
-        total_search_cost = sum(request.cost_usd for request in self.search_requests)
-        total_cost = total_llm_cost + total_search_cost
-        
-        # Tính tổng token từ LLM requests
-        total_input_tokens = sum(request.input_tokens for request in self.llm_requests)
-        total_output_tokens = sum(request.output_tokens for request in self.llm_requests)
-        
-        # Thêm token từ search requests nếu có
-        for request in self.search_requests:
-            if hasattr(request, 'input_tokens') and hasattr(request, 'output_tokens') and request.input_tokens and request.output_tokens:
-                total_input_tokens += request.input_tokens
-                total_output_tokens += request.output_tokens
-        
-        total_tokens = total_input_tokens + total_output_tokens
-        
-        # Tính toán breakdown theo model
-        model_breakdown = {}
+    def ensure_summary(self) -> CostSummary:
+        """Lấy summary hiện tại, tính lại toàn bộ nếu chưa có (ví dụ dữ liệu cũ không lưu summary)"""
+        if self.summary is None:
+            return self.recompute_summary()
+        return self.summary
+
+    def recompute_summary(self) -> CostSummary:
+        """
+        Tính lại toàn bộ summary từ danh sách request (O(n))
+
+        Chỉ dùng khi tải dữ liệu cũ hoặc kiểm tra tính nhất quán; khi ghi nhận request
+        mới, summary được cập nhật tăng dần qua add_llm_cost / add_search_cost.
+
+        Returns:
+            CostSummary: Summary mới đã gán vào monitoring
+        """
+        summary = CostSummary()
         for request in self.llm_requests:
-            model = request.model
-            if model not in model_breakdown:
-                model_breakdown[model] = {
-                    "requests": 0,
-                    "input_tokens": 0,
-                    "output_tokens": 0,
-                    "cost_usd": 0.0
-                }
-            
-            model_breakdown[model]["requests"] += 1
-            model_breakdown[model]["input_tokens"] += request.input_tokens
-            model_breakdown[model]["output_tokens"] += request.output_tokens
-            model_breakdown[model]["cost_usd"] += request.cost_usd
-        
-        # Tính toán breakdown theo provider
-        provider_breakdown = {}
+            summary.add_llm_cost(request)
         for request in self.search_requests:
-            provider = request.provider
-            if provider not in provider_breakdown:
-                provider_breakdown[provider] = {
-                    "requests": 0,
-                    "cost_usd": 0.0,
-                    "input_tokens": 0,
-                    "output_tokens": 0
-                }
-            
-            provider_breakdown[provider]["requests"] += 1
-            provider_breakdown[provider]["cost_usd"] += request.cost_usd
-            
-            # Thêm thông tin token nếu có
-            if hasattr(request, 'input_tokens') and hasattr(request, 'output_tokens') and request.input_tokens and request.output_tokens:
-                provider_breakdown[provider]["input_tokens"] += request.input_tokens
-                provider_breakdown[provider]["output_tokens"] += request.output_tokens
-        
-        # Tạo summary
-        summary = CostSummary(
-            total_cost_usd=total_cost,
-            llm_cost_usd=total_llm_cost,
-            search_cost_usd=total_search_cost,
-            total_tokens=total_tokens,
-            total_input_tokens=total_input_tokens,
-            total_output_tokens=total_output_tokens,
-            total_llm_requests=len(self.llm_requests),
-            total_search_requests=len(self.search_requests),
-            model_breakdown=model_breakdown,
-            provider_breakdown=provider_breakdown,
-            last_updated=datetime.now().isoformat()
-        )
+            summary.add_search_cost(request)
+        summary.last_updated = datetime.now().isoformat()
         
         self.summary = summary
-        return summary 
\ No newline at end of file
+        return summary
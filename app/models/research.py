@@ -91,6 +91,7 @@ class ResearchCostInfo(BaseModel):
     total_tokens: int = Field(0, description="Tổng số tokens đã sử dụng")
     total_requests: int = Field(0, description="Tổng số requests")
     model_breakdown: Dict[str, Dict] = Field(default_factory=dict, description="Chi tiết chi phí theo từng model")
+    cache_hit_rate: Dict[str, float] = Field(default_factory=dict, description="Tỷ lệ cache hit theo loại request, ví dụ: {'llm': 0.25, 'search': 0.4}")
     execution_time_seconds: Dict[str, float] = Field(default_factory=dict, description="Thời gian thực thi cho từng giai đoạn (giây)")
     cost_report_url: Optional[str] = Field(None, description="URL báo cáo chi phí chi tiết (nếu có)")
 
@@ -106,5 +107,6 @@ class ResearchResponse(BaseModel):
     github_url: Optional[str] = Field(None, description="URL của repository trên GitHub")
     progress_info: Dict[str, Any] = Field(default_factory=dict, description="Thông tin chi tiết về tiến độ nghiên cứu")
     cost_info: Optional[ResearchCostInfo] = Field(None, description="Thông tin chi tiết về chi phí thực hiện")
+    job_type: Optional[str] = Field(None, description="Loại job xử lý task: research, complete hoặc edit")
     created_at: datetime = Field(default_factory=datetime.utcnow, description="Thời điểm tạo")
     updated_at: datetime = Field(default_factory=datetime.utcnow, description="Thời điểm cập nhật cuối") 
\ No newline at end of file
@@ -0,0 +1,6 @@
+# Job queue subpackage
+
+from .journal import JobJournal
+from .queue import JobQueue, get_job_queue
+
+__all__ = ['JobJournal', 'JobQueue', 'get_job_queue']
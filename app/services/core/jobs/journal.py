@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Trạng thái của job trong journal
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class JobJournal:
+    """Journal lưu trên SQLite để các job chưa hoàn thành được chạy lại sau khi khởi động lại"""
+    
+    def __init__(self, path: str):
+        """
+        Khởi tạo journal
+        
+        Args:
+            path: Đường dẫn tới file SQLite
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Mở kết nối SQLite và tạo bảng nếu chưa có"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+    
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Thực thi câu lệnh SQL trong lock và commit"""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+            return rows
+    
+    async def add(self, job_id: str, job_type: str, payload: Dict[str, Any]) -> None:
+        """
+        Ghi job mới vào journal với trạng thái queued
+        
+        Args:
+            job_id: ID của job
+            job_type: Loại job (tên handler)
+            payload: Dữ liệu của job, phải serialize được sang JSON
+        """
+        now = datetime.utcnow().isoformat()
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO jobs (id, job_type, payload, status, attempts, error, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 0, NULL, ?, ?)",
+            (job_id, job_type, json.dumps(payload, ensure_ascii=False), JOB_QUEUED, now, now)
+        )
+    
+    async def mark_running(self, job_id: str) -> None:
+        """Đánh dấu job đang chạy và tăng số lần thử"""
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            (JOB_RUNNING, datetime.utcnow().isoformat(), job_id)
+        )
+    
+    async def mark_done(self, job_id: str) -> None:
+        """Đánh dấu job đã hoàn thành"""
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = ?, error = NULL, updated_at = ? WHERE id = ?",
+            (JOB_DONE, datetime.utcnow().isoformat(), job_id)
+        )
+    
+    async def mark_failed(self, job_id: str, error: str) -> None:
+        """Đánh dấu job thất bại"""
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (JOB_FAILED, error, datetime.utcnow().isoformat(), job_id)
+        )
+    
+    async def list_unfinished(self) -> List[Dict[str, Any]]:
+        """
+        Lấy các job chưa hoàn thành (queued hoặc đang chạy khi tiến trình bị dừng)
+        
+        Returns:
+            List[Dict[str, Any]]: Danh sách job theo thứ tự tạo
+        """
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT id, job_type, payload, attempts FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+            (JOB_QUEUED, JOB_RUNNING)
+        )
+        return [
+            {"id": row[0], "job_type": row[1], "payload": json.loads(row[2]), "attempts": row[3]}
+            for row in rows
+        ]
+    
+    def close(self) -> None:
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,242 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.core.exceptions import JobAlreadyActiveError, QueueFullError
+from app.core.logging import get_logger
+from app.services.core.jobs.journal import JobJournal
+
+logger = get_logger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobQueue:
+    """Hàng đợi job với số worker cố định, journal trên đĩa và giới hạn số job đang chờ"""
+    
+    def __init__(self, journal: JobJournal, workers: int = 2, max_pending: int = 0, max_attempts: int = 3):
+        """
+        Khởi tạo hàng đợi
+        
+        Args:
+            journal: Journal lưu trạng thái job
+            workers: Số worker xử lý job song song
+            max_pending: Số job tối đa đang chờ hoặc đang chạy (0 = không giới hạn)
+            max_attempts: Số lần chạy tối đa của một job khi khôi phục sau sự cố
+        """
+        self.journal = journal
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.max_attempts = max(1, max_attempts)
+        self._handlers: Dict[str, JobHandler] = {}
+        self._active_jobs: set = set()
+        # Job đã giữ chỗ (reserve) nhưng chưa được ghi journal và đưa vào hàng đợi
+        self._reserved: set = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._outstanding = 0
+        self._running = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._recovered = False
+    
+    def register_handler(self, job_type: str, handler: JobHandler) -> None:
+        """
+        Đăng ký coroutine xử lý cho một loại job
+        
+        Args:
+            job_type: Loại job
+            handler: Coroutine nhận payload của job
+        """
+        self._handlers[job_type] = handler
+    
+    @property
+    def started(self) -> bool:
+        return bool(self._worker_tasks)
+    
+    def is_saturated(self) -> bool:
+        """Kiểm tra hàng đợi đã đầy chưa"""
+        return self.max_pending > 0 and self._outstanding >= self.max_pending
+    
+    def is_active(self, job_id: str) -> bool:
+        """Kiểm tra job đang chờ hoặc đang chạy trong tiến trình hiện tại"""
+        return job_id in self._active_jobs
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê hiện tại của hàng đợi"""
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queued": self._outstanding - self._running,
+            "max_pending": self.max_pending
+        }
+    
+    async def start(self) -> None:
+        """Khởi động các worker và chạy lại các job chưa hoàn thành trong journal"""
+        self._bind_loop()
+        await self._recover()
+    
+    def _bind_loop(self) -> None:
+        """Khởi động worker trên event loop đang chạy (đồng bộ, không có await)"""
+        loop = asyncio.get_running_loop()
+        if self.started and self._loop is loop:
+            return
+        
+        # Worker gắn với event loop đang chạy; khởi tạo lại nếu loop đã thay đổi
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._active_jobs = set()
+        self._reserved = set()
+        self._outstanding = 0
+        self._running = 0
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(f"Đã khởi động job queue với {self.workers} worker")
+    
+    async def _recover(self) -> None:
+        """Chạy lại các job chưa hoàn thành trong journal (một lần cho mỗi tiến trình)"""
+        if self._recovered:
+            return
+        self._recovered = True
+        
+        for job in await self.journal.list_unfinished():
+            if job["id"] in self._active_jobs:
+                # Job vừa được submit lại trong lúc đọc journal
+                continue
+            if job["attempts"] >= self.max_attempts:
+                logger.warning(f"Bỏ qua job {job['id']} vì đã chạy {job['attempts']} lần")
+                await self.journal.mark_failed(job["id"], "Vượt quá số lần chạy lại tối đa")
+                continue
+            if job["job_type"] not in self._handlers:
+                logger.warning(f"Bỏ qua job {job['id']} vì không có handler cho loại {job['job_type']}")
+                continue
+            logger.info(f"Khôi phục job {job['id']} ({job['job_type']}) từ journal")
+            self._enqueue(job["id"], job["job_type"], job["payload"])
+    
+    async def stop(self) -> None:
+        """Dừng các worker; job đang chạy sẽ được chạy lại ở lần khởi động sau"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+        self._loop = None
+        self._active_jobs = set()
+        self._reserved = set()
+        self._outstanding = 0
+        self._running = 0
+        self.journal.close()
+        logger.info("Đã dừng job queue")
+    
+    def reserve(self, job_id: str) -> None:
+        """
+        Giữ chỗ cho một job trong hàng đợi và đánh dấu job đang hoạt động
+        
+        Được thực hiện đồng bộ (trước mọi await) nên các yêu cầu đồng thời không thể cùng vượt
+        qua kiểm tra giới hạn hoặc cùng tạo một job. Chỗ đã giữ được dùng bởi
+        submit(..., reserved=True) hoặc trả lại bằng release().
+        
+        Args:
+            job_id: ID của job
+            
+        Raises:
+            JobAlreadyActiveError: Nếu job đang chờ hoặc đang chạy
+            QueueFullError: Nếu hàng đợi đã đầy
+        """
+        self._bind_loop()
+        if job_id in self._active_jobs:
+            raise JobAlreadyActiveError(f"Job {job_id} đang được xử lý", details={"job_id": job_id})
+        if self.is_saturated():
+            raise QueueFullError(
+                "Hệ thống đang quá tải, vui lòng thử lại sau",
+                details=self.get_stats()
+            )
+        self._outstanding += 1
+        self._active_jobs.add(job_id)
+        self._reserved.add(job_id)
+    
+    def release(self, job_id: str) -> None:
+        """
+        Trả lại chỗ đã giữ của job chưa được đưa vào hàng đợi (không ảnh hưởng job đã submit)
+        
+        Args:
+            job_id: ID của job
+        """
+        if job_id not in self._reserved:
+            return
+        self._reserved.discard(job_id)
+        self._active_jobs.discard(job_id)
+        self._outstanding -= 1
+    
+    async def submit(self, job_id: str, job_type: str, payload: Dict[str, Any], reserved: bool = False) -> None:
+        """
+        Ghi job vào journal và đưa vào hàng đợi
+        
+        Args:
+            job_id: ID của job (dùng task_id để mỗi task có tối đa một job)
+            job_type: Loại job đã đăng ký handler
+            payload: Dữ liệu của job
+            reserved: Chỗ cho job đã được giữ bằng reserve()
+            
+        Raises:
+            JobAlreadyActiveError: Nếu job đang chờ hoặc đang chạy
+            QueueFullError: Nếu hàng đợi đã đầy
+        """
+        if job_type not in self._handlers:
+            self.release(job_id)
+            raise ValueError(f"Không có handler cho loại job: {job_type}")
+        if not reserved or job_id not in self._reserved:
+            self.reserve(job_id)
+        
+        try:
+            await self.start()
+            await self.journal.add(job_id, job_type, payload)
+        except BaseException:
+            self.release(job_id)
+            raise
+        
+        self._reserved.discard(job_id)
+        self._queue.put_nowait((job_id, job_type, payload))
+        logger.info(f"Đã đưa job {job_id} ({job_type}) vào hàng đợi")
+    
+    def _enqueue(self, job_id: str, job_type: str, payload: Dict[str, Any]) -> None:
+        self._outstanding += 1
+        self._active_jobs.add(job_id)
+        self._queue.put_nowait((job_id, job_type, payload))
+    
+    async def _worker(self, index: int) -> None:
+        """Worker lấy job từ hàng đợi và chạy handler tương ứng"""
+        while True:
+            job_id, job_type, payload = await self._queue.get()
+            self._running += 1
+            try:
+                await self.journal.mark_running(job_id)
+                await self._handlers[job_type](payload)
+                await self.journal.mark_done(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker {index}: lỗi khi xử lý job {job_id}: {str(e)}")
+                await self.journal.mark_failed(job_id, str(e))
+            finally:
+                self._running -= 1
+                self._outstanding -= 1
+                self._active_jobs.discard(job_id)
+                self._queue.task_done()
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Lấy instance JobQueue dùng chung, khởi tạo từ settings ở lần gọi đầu"""
+    global _job_queue
+    if _job_queue is None:
+        settings = get_settings()
+        _job_queue = JobQueue(
+            journal=JobJournal(settings.QUEUE_JOURNAL_PATH),
+            workers=settings.QUEUE_WORKERS,
+            max_pending=settings.QUEUE_MAX_PENDING,
+            max_attempts=settings.QUEUE_MAX_ATTEMPTS
+        )
+    return _job_queue
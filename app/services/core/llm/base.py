@@ -1,13 +1,25 @@
 from abc import ABC, abstractmethod
+import contextvars
 import time
 from typing import Dict, List, Any, Optional
 import uuid
 
+from app.core.exceptions import BudgetExceededError
 from app.core.logging import get_logger
+from app.core.metrics import CACHE_HITS, LLM_ERRORS, LLM_REQUEST_DURATION, LLM_TOKENS
+from app.core.ratelimit import get_rate_limiter
+from app.core.singleflight import get_single_flight
+from app.core.tracing import span, traced
+from app.services.core.llm.cache import get_response_cache, make_cache_key
+from app.services.core.monitoring.budget import BudgetDecision, BudgetManager, get_budget_manager
 from app.services.core.monitoring.cost import get_cost_service
 
 logger = get_logger(__name__)
 
+# Usage của lần gọi gần nhất, tách riêng theo từng asyncio task để các
+# lời gọi generate song song trên cùng một service không ghi đè lẫn nhau
+_last_usage_var: contextvars.ContextVar = contextvars.ContextVar("llm_last_usage", default=None)
+
 class BaseLLMService(ABC):
     """
     Base class for LLM services
@@ -17,6 +29,15 @@ class BaseLLMService(ABC):
         self.config = config
         self.name = self.__class__.__name__
     
+    @property
+    def _last_usage(self) -> Optional[Dict[str, int]]:
+        """Token usage of the last completion in the current context"""
+        return _last_usage_var.get()
+    
+    @_last_usage.setter
+    def _last_usage(self, value: Optional[Dict[str, int]]) -> None:
+        _last_usage_var.set(value)
+    
     @abstractmethod
     def get_completion(self, prompt: str, max_tokens: int = None, temperature: float = None, **kwargs) -> str:
         """
@@ -66,7 +87,8 @@ class BaseLLMService(ABC):
         output_tokens: int, 
         prompt: str, 
         duration_ms: int, 
-        purpose: Optional[str] = None
+        purpose: Optional[str] = None,
+        cache_hit: bool = False
     ):
         """Log request cost if task_id is provided"""
         if task_id:
@@ -80,11 +102,25 @@ class BaseLLMService(ABC):
                     prompt=prompt,
                     duration_ms=duration_ms,
                     endpoint=self.name,
-                    purpose=purpose
+                    purpose=purpose,
+                    cache_hit=cache_hit
                 )
             except Exception as e:
                 logger.error(f"Error logging LLM request cost: {str(e)}")
     
+    def _get_rate_limit_provider(self) -> str:
+        """Tên provider dùng để chọn rate limiter (các service con có thể đặt rate_limit_provider)"""
+        return getattr(self, "rate_limit_provider", None) or self.name
+    
+    def _get_model_name(self) -> str:
+        """Xác định model name từ các thuộc tính có thể có"""
+        if hasattr(self, "model_name"):
+            return self.model_name
+        if hasattr(self, "model"):
+            return self.model
+        return self.config.get("MODEL_NAME", "unknown")
+    
+    @traced("llm.generate", attributes=lambda args: {"service": args["self"].name, "purpose": args.get("purpose") or ""})
     async def generate(
         self, 
         prompt: str, 
@@ -92,6 +128,7 @@ class BaseLLMService(ABC):
         purpose: Optional[str] = None,
         max_tokens: Optional[int] = None, 
         temperature: Optional[float] = None, 
+        use_cache: bool = True,
         **kwargs
     ) -> str:
         """
@@ -103,13 +140,131 @@ class BaseLLMService(ABC):
             purpose: Purpose of the request (for cost tracking)
             max_tokens: Maximum tokens to generate
             temperature: Temperature for generation
+            use_cache: Use the response cache when enabled (False always calls the provider)
             **kwargs: Additional model-specific parameters
             
         Returns:
             str: The generated text
         """
         start_time = time.time()
-        input_token_count = self.count_tokens(prompt)
+        model_name = self._get_model_name()
+        max_tokens = max_tokens or self.config.get("MAX_TOKENS")
+        temperature = temperature or self.config.get("TEMPERATURE")
+        
+        # Tra cứu cache theo nội dung request
+        cache = get_response_cache() if use_cache else None
+        cache_key = None
+        if cache is not None:
+            cache_key = make_cache_key(self.name, model_name, prompt, max_tokens, temperature, **kwargs)
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                duration_ms = int((time.time() - start_time) * 1000)
+                logger.info(f"Cache hit cho {self.name} ({model_name}), bỏ qua lời gọi provider")
+                CACHE_HITS.inc(kind="llm", name=model_name)
+                if task_id:
+                    await self._log_request_cost(
+                        task_id=task_id,
+                        model=model_name,
+                        input_tokens=0,
+                        output_tokens=0,
+                        prompt=prompt,
+                        duration_ms=duration_ms,
+                        purpose=purpose,
+                        cache_hit=True
+                    )
+                return cached["response"]
+        
+        # Kiểm tra ngân sách trước khi gọi provider (cache hit không tốn chi phí nên không cần kiểm tra)
+        budget = get_budget_manager() if task_id else None
+        decision = await self._check_budget(budget, task_id, prompt, model_name, max_tokens) if budget else None
+        model_override = None
+        if decision is not None and decision.model and decision.model != model_name:
+            logger.info(f"Ngân sách của task {task_id} sắp hết, chuyển từ {model_name} sang model rẻ hơn {decision.model}")
+            model_override = model_name = decision.model
+            if cache is not None:
+                cache_key = make_cache_key(self.name, model_name, prompt, max_tokens, temperature, **kwargs)
+        
+        try:
+            # Gộp các request giống hệt nhau đang chạy đồng thời (single-flight)
+            flight = get_single_flight()
+            if flight is None:
+                return await self._generate_uncached(
+                    prompt, task_id, purpose, max_tokens, temperature, start_time, cache, cache_key,
+                    model=model_override, **kwargs
+                )
+            flight_key = cache_key or make_cache_key(self.name, model_name, prompt, max_tokens, temperature, **kwargs)
+            return await flight.do(
+                f"llm:{flight_key}",
+                lambda shared_task_id: self._generate_uncached(
+                    prompt, shared_task_id, purpose, max_tokens, temperature, start_time, cache, cache_key,
+                    model=model_override, **kwargs
+                ),
+                task_id=task_id
+            )
+        finally:
+            if budget is not None:
+                budget.release(decision)
+    
+    async def _check_budget(
+        self,
+        budget: BudgetManager,
+        task_id: str,
+        prompt: str,
+        model_name: str,
+        max_tokens: Optional[int]
+    ) -> BudgetDecision:
+        """
+        Kiểm tra ngân sách của task với số token ước lượng của request
+        
+        Args:
+            budget: Budget manager
+            task_id: ID của task
+            prompt: Prompt sẽ gửi
+            model_name: Model dự định sử dụng
+            max_tokens: Số token đầu ra tối đa
+            
+        Returns:
+            BudgetDecision: Quyết định (có thể chuyển sang model dự phòng rẻ hơn)
+            
+        Raises:
+            BudgetExceededError: Nếu request sẽ vượt giới hạn ngân sách
+        """
+        with span("llm.count_tokens"):
+            input_tokens = self.count_tokens(prompt)
+        decision = await budget.check_llm(
+            task_id,
+            model_name,
+            input_tokens,
+            max_tokens or 0,
+            fallback_model=getattr(self, "budget_fallback_model", None)
+        )
+        if decision.exceeded:
+            raise BudgetExceededError(
+                f"Vượt ngân sách của task {task_id}, không gọi {self.name}",
+                details={"task_id": task_id, "model": model_name, "reason": decision.reason}
+            )
+        return decision
+    
+    async def _generate_uncached(
+        self,
+        prompt: str,
+        task_id: Optional[str],
+        purpose: Optional[str],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        start_time: float,
+        cache=None,
+        cache_key: Optional[str] = None,
+        model: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """Gọi provider, lưu phản hồi vào cache (nếu bật) và ghi nhận chi phí"""
+        model_name = model or self._get_model_name()
+        if model:
+            # Model thay thế (ví dụ model rẻ hơn khi ngân sách sắp hết) được truyền tới provider
+            kwargs["model"] = model
+        with span("llm.count_tokens"):
+            input_token_count = self.count_tokens(prompt)
         
         logger.info(f"Gửi prompt tới {self.name} ({input_token_count} tokens)")
         
@@ -117,23 +272,38 @@ class BaseLLMService(ABC):
         if hasattr(self, '_last_usage'):
             self._last_usage = None
         
-        # Use _get_completion_async if available, otherwise fall back to get_completion
-        if hasattr(self, '_get_completion_async') and callable(getattr(self, '_get_completion_async')):
-            result = await self._get_completion_async(
-                prompt, 
-                max_tokens=max_tokens or self.config.get("MAX_TOKENS"),
-                temperature=temperature or self.config.get("TEMPERATURE"),
-                **kwargs
-            )
-        else:
-            result = self.get_completion(
+        async def complete() -> str:
+            # Use _get_completion_async if available, otherwise fall back to get_completion
+            if hasattr(self, '_get_completion_async') and callable(getattr(self, '_get_completion_async')):
+                return await self._get_completion_async(
+                    prompt, 
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    **kwargs
+                )
+            return self.get_completion(
                 prompt, 
-                max_tokens=max_tokens or self.config.get("MAX_TOKENS"),
-                temperature=temperature or self.config.get("TEMPERATURE"),
+                max_tokens=max_tokens,
+                temperature=temperature,
                 **kwargs
             )
         
+        # Đi qua rate limiter của provider; ngân sách TPM tính cả số token đầu ra tối đa
+        provider = self._get_rate_limit_provider()
+        limiter = get_rate_limiter(provider)
+        estimated_tokens = input_token_count + (max_tokens or 0)
+        try:
+            with span("llm.provider_call", provider=provider, model=model_name, input_tokens=input_token_count):
+                if limiter is not None:
+                    result = await limiter.call(complete, tokens=estimated_tokens)
+                else:
+                    result = await complete()
+        except Exception:
+            LLM_ERRORS.inc(provider=provider, model=model_name)
+            raise
+        
         duration_ms = int((time.time() - start_time) * 1000)
+        LLM_REQUEST_DURATION.observe(duration_ms / 1000, provider=provider, model=model_name, purpose=purpose or "")
         
         # Ưu tiên sử dụng thông tin token từ _last_usage nếu có (từ Anthropic, OpenAI API)
         if hasattr(self, '_last_usage') and self._last_usage:
@@ -141,22 +311,23 @@ class BaseLLMService(ABC):
             output_token_count = self._last_usage.get('output_tokens')
         else:
             # Nếu không có _last_usage, tính toán bằng cách đếm token
-            output_token_count = self.count_tokens(result)
+            with span("llm.count_tokens"):
+                output_token_count = self.count_tokens(result)
         
         logger.info(f"Nhận phản hồi từ {self.name} ({output_token_count} tokens) trong {duration_ms}ms")
         
+        LLM_TOKENS.inc(input_token_count, provider=provider, model=model_name, direction="input")
+        LLM_TOKENS.inc(output_token_count, provider=provider, model=model_name, direction="output")
+        
+        if limiter is not None:
+            limiter.reconcile_tokens(estimated_tokens, input_token_count + output_token_count)
+        
+        if cache is not None:
+            await cache.set(cache_key, result, {"input_tokens": input_token_count, "output_tokens": output_token_count})
+        
         # Log the cost if task_id is provided
         if task_id:
-            # Xác định model name từ các thuộc tính có thể có
-            model_name = "unknown"
-            if hasattr(self, "model_name"):
-                model_name = self.model_name
-            elif hasattr(self, "model"):
-                model_name = self.model
-            elif "MODEL_NAME" in self.config:
-                model_name = self.config["MODEL_NAME"]
-                
-            self._log_request_cost(
+            await self._log_request_cost(
                 task_id=task_id,
                 model=model_name,
                 input_tokens=input_token_count,
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.services.core.storage.file_io import get_file_io
+
+logger = get_logger(__name__)
+
+
+def make_cache_key(
+    provider: str,
+    model: str,
+    prompt: str,
+    max_tokens: Optional[int],
+    temperature: Optional[float],
+    **kwargs
+) -> str:
+    """
+    Tạo khóa cache theo nội dung của request
+    
+    Args:
+        provider: Tên LLM provider
+        model: Tên model
+        prompt: Prompt gửi tới model
+        max_tokens: Số token tối đa
+        temperature: Temperature
+        **kwargs: Các tham số khác ảnh hưởng tới kết quả
+        
+    Returns:
+        str: Khóa SHA-256 dạng hex
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    material = json.dumps(
+        [provider, model, prompt_hash, max_tokens, temperature, kwargs],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class BaseResponseCache(ABC):
+    """Base class cho cache phản hồi của LLM"""
+    
+    def __init__(self, ttl_seconds: float = 0):
+        """
+        Args:
+            ttl_seconds: Thời gian sống của một entry (0 = không hết hạn)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+    
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Lấy entry từ cache
+        
+        Args:
+            key: Khóa cache
+            
+        Returns:
+            Optional[Dict[str, Any]]: Entry gồm "response" và "usage", hoặc None nếu không có / đã hết hạn
+        """
+        entry = await self._get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+    
+    async def set(self, key: str, response: Any, usage: Optional[Dict[str, int]] = None) -> None:
+        """
+        Lưu phản hồi vào cache
+        
+        Args:
+            key: Khóa cache
+            response: Nội dung phản hồi (phải serialize được sang JSON)
+            usage: Token usage của request gốc
+        """
+        await self._set(key, {"response": response, "usage": usage, "created_at": time.time()})
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê hit/miss của cache"""
+        total = self.hits + self.misses
+        return {
+            "backend": self.__class__.__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+    
+    @abstractmethod
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        pass
+    
+    @abstractmethod
+    async def _set(self, key: str, entry: Dict[str, Any]) -> None:
+        pass
+
+
+class MemoryResponseCache(BaseResponseCache):
+    """Cache LRU trong bộ nhớ, giới hạn theo số entry"""
+    
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 0):
+        super().__init__(ttl_seconds)
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._is_expired(entry["created_at"]):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+    
+    async def _set(self, key: str, entry: Dict[str, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "entries": len(self._entries)}
+
+
+class DiskResponseCache(BaseResponseCache):
+    """
+    Cache trên đĩa, mỗi entry một file JSON; giới hạn tổng dung lượng, loại bỏ entry ít dùng nhất
+
+    Đọc/ghi file chạy trên FileIOExecutor, tuần tự theo từng key nên các key khác nhau không chờ nhau.
+    Khóa thread chỉ giữ trong lúc cập nhật chỉ mục LRU, nên cache dùng được từ nhiều event loop.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int = 100 * 1024 * 1024, ttl_seconds: float = 0):
+        super().__init__(ttl_seconds)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Chỉ mục LRU: key -> kích thước file
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+    
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """Liệt kê các file có sẵn, theo thứ tự truy cập cũ nhất trước"""
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".json"):
+                        try:
+                            stat = os.stat(os.path.join(root, name))
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        return sorted(entries)
+    
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # Cập nhật mtime để giữ thứ tự LRU khi khởi động lại
+            os.utime(path, None)
+            return entry
+        except (OSError, ValueError):
+            return None
+    
+    def _write(self, key: str, entry: Dict[str, Any]) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+    
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+    
+    async def _run(self, func: Callable[..., Any], key: str, *args: Any, op: str) -> Any:
+        """Chạy thao tác file của một key trên FileIOExecutor, tuần tự theo key"""
+        return await get_file_io().run(func, key, *args, path=self._path(key), op=op)
+    
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        entries = await get_file_io().run(self._scan, op="cache_scan")
+        with self._lock:
+            # Có thể đã được dựng bởi lời gọi khác trong lúc quét thư mục
+            if not self._loaded:
+                for _, key, size in entries:
+                    self._index[key] = size
+                    self._total_bytes += size
+                self._loaded = True
+    
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        await self._ensure_loaded()
+        with self._lock:
+            if key not in self._index:
+                return None
+        entry = await self._run(self._read, key, op="cache_read")
+        if entry is None or self._is_expired(entry.get("created_at", 0)):
+            with self._lock:
+                self._total_bytes -= self._index.pop(key, 0)
+            await self._run(self._remove, key, op="cache_remove")
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        return entry
+    
+    async def _set(self, key: str, entry: Dict[str, Any]) -> None:
+        await self._ensure_loaded()
+        size = await self._run(self._write, key, entry, op="cache_write")
+        evicted = []
+        with self._lock:
+            self._total_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            await self._run(self._remove, old_key, op="cache_remove")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "entries": len(self._index), "bytes": self._total_bytes}
+
+
+_response_cache: Optional[BaseResponseCache] = None
+_response_cache_initialized = False
+
+
+def get_response_cache() -> Optional[BaseResponseCache]:
+    """
+    Lấy cache phản hồi LLM dùng chung theo LLM_CACHE_BACKEND
+    
+    Returns:
+        Optional[BaseResponseCache]: Cache đã cấu hình, hoặc None nếu cache bị tắt
+    """
+    global _response_cache, _response_cache_initialized
+    if _response_cache_initialized:
+        return _response_cache
+    
+    settings = get_settings()
+    backend = (settings.LLM_CACHE_BACKEND or "none").lower()
+    if backend == "memory":
+        _response_cache = MemoryResponseCache(
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS
+        )
+    elif backend == "disk":
+        _response_cache = DiskResponseCache(
+            directory=settings.LLM_CACHE_DIR,
+            max_bytes=settings.LLM_CACHE_MAX_BYTES,
+            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS
+        )
+    elif backend != "none":
+        logger.warning(f"LLM_CACHE_BACKEND không hợp lệ: {backend}, tắt cache phản hồi LLM")
+    
+    if _response_cache:
+        logger.info(f"Bật cache phản hồi LLM với backend: {backend}")
+    _response_cache_initialized = True
+    return _response_cache
@@ -1,9 +1,9 @@
 from typing import Any, Dict, Optional
 import time
-import asyncio
 import anthropic
 
 from app.services.core.llm.base import BaseLLMService
+from app.services.core.llm.http_pool import get_shared_http_client
 from app.core.config import get_settings
 from app.core.logging import get_logger
 
@@ -22,11 +22,39 @@ class ClaudeService(BaseLLMService):
         """
         self.config = config or {}
         settings = get_settings()
-        self.client = anthropic.Anthropic(api_key=self.config.get("ANTHROPIC_API_KEY", settings.ANTHROPIC_API_KEY))
+        self.api_key = self.config.get("ANTHROPIC_API_KEY", settings.ANTHROPIC_API_KEY)
+        self._client: Optional[anthropic.AsyncAnthropic] = None
+        self._sync_client: Optional[anthropic.Anthropic] = None
         self.model_name = self.config.get("ANTHROPIC_MODEL_NAME", "claude-3-5-sonnet-latest")
         self.max_tokens = self.config.get("MAX_TOKENS", settings.MAX_TOKENS)
         self.temperature = self.config.get("TEMPERATURE", settings.TEMPERATURE)
         self.name = "Claude"
+        self.rate_limit_provider = "anthropic"
+        # Model rẻ hơn dùng khi ngân sách của task sắp hết
+        self.budget_fallback_model = self.config.get("ANTHROPIC_BUDGET_FALLBACK_MODEL")
+
+    @property
+    def client(self) -> anthropic.AsyncAnthropic:
+        """Async client dùng connection pool chung; được tạo lại khi HTTP client dùng chung thay đổi"""
+        http_client = get_shared_http_client()
+        if self._client is None or self._client._client is not http_client:
+            # Khi bật rate limit, 429/5xx được thử lại bởi rate limiter thay vì SDK
+            self._client = anthropic.AsyncAnthropic(
+                api_key=self.api_key,
+                http_client=http_client,
+                max_retries=0 if get_settings().RATE_LIMIT_ENABLED else 2
+            )
+        return self._client
+
+    @property
+    def sync_client(self) -> anthropic.Anthropic:
+        """Client đồng bộ cho get_completion, dùng cùng API key và chính sách retry với async client"""
+        if self._sync_client is None:
+            self._sync_client = anthropic.Anthropic(
+                api_key=self.api_key,
+                max_retries=0 if get_settings().RATE_LIMIT_ENABLED else 2
+            )
+        return self._sync_client
 
     def get_completion(self, prompt: str, max_tokens: int = None, temperature: float = None, **kwargs) -> str:
         """
@@ -43,8 +71,8 @@ class ClaudeService(BaseLLMService):
         try:
             start_time = time.time()
             
-            response = self.client.messages.create(
-                model=self.model_name,
+            response = self.sync_client.messages.create(
+                model=kwargs.pop("model", None) or self.model_name,
                 max_tokens=max_tokens or self.max_tokens,
                 temperature=temperature or self.temperature,
                 messages=[
@@ -52,25 +80,7 @@ class ClaudeService(BaseLLMService):
                 ],
                 **kwargs
             )
-            
-            duration_ms = int((time.time() - start_time) * 1000)
-            logger.info(f"Claude response time: {duration_ms}ms")
-            
-            input_tokens = response.usage.input_tokens
-            output_tokens = response.usage.output_tokens
-            
-            logger.info(f"Claude tokens: {input_tokens} input, {output_tokens} output")
-            
-            self._last_usage = {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens
-            }
-            
-            if hasattr(response, 'content') and len(response.content) > 0:
-                return response.content[0].text
-            else:
-                logger.warning("Claude response has no content")
-                return ""
+            return self._handle_response(response, start_time)
                 
         except Exception as e:
             logger.error(f"Error generating text with Claude: {str(e)}")
@@ -78,24 +88,18 @@ class ClaudeService(BaseLLMService):
         
     def count_tokens(self, text: str) -> int:
         """
-        Count tokens in a string using Anthropic's tokenizer
+        Count tokens in a string
+        
+        Tokenizer của anthropic SDK chỉ chính xác với các model cũ, số token thực tế
+        được lấy từ usage của response nên ở đây chỉ ước lượng.
         
         Args:
             text: The text to count tokens in
             
         Returns:
-            int: The number of tokens
+            int: The approximate number of tokens
         """
-        try:
-            if hasattr(self.client, 'count_tokens'):
-                response = self.client.count_tokens(text)
-                return response.tokens
-            else:
-                logger.warning("No token counting method available in anthropic package, using fallback")
-                return len(text) // 4
-        except Exception as e:
-            logger.warning(f"Error counting tokens: {str(e)}, using fallback method")
-            return len(text) // 4
+        return len(text) // 4
     
     async def generate(self, prompt: str, task_id: Optional[str] = None, purpose: Optional[str] = None, 
                       max_tokens: Optional[int] = None, temperature: Optional[float] = None, **kwargs) -> str:
@@ -128,7 +132,7 @@ class ClaudeService(BaseLLMService):
         
     async def _get_completion_async(self, prompt: str, max_tokens: int = None, temperature: float = None, **kwargs) -> str:
         """
-        Get a completion from Claude API (async wrapper around sync API)
+        Get a completion from Claude API using the async client
         
         Args:
             prompt: The prompt to generate from
@@ -138,8 +142,41 @@ class ClaudeService(BaseLLMService):
         Returns:
             str: The generated text
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, 
-            lambda: self.get_completion(prompt, max_tokens, temperature, **kwargs)
-        )
+        try:
+            start_time = time.time()
+            
+            response = await self.client.messages.create(
+                model=kwargs.pop("model", None) or self.model_name,
+                max_tokens=max_tokens or self.max_tokens,
+                temperature=temperature or self.temperature,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                **kwargs
+            )
+            
+            return self._handle_response(response, start_time)
+                
+        except Exception as e:
+            logger.error(f"Error generating text with Claude: {str(e)}")
+            raise
+
+    def _handle_response(self, response: Any, start_time: float) -> str:
+        """Ghi log thời gian và token, lưu usage cho cost tracking và lấy nội dung text của response"""
+        duration_ms = int((time.time() - start_time) * 1000)
+        logger.info(f"Claude response time: {duration_ms}ms")
+        
+        input_tokens = response.usage.input_tokens
+        output_tokens = response.usage.output_tokens
+        
+        logger.info(f"Claude tokens: {input_tokens} input, {output_tokens} output")
+        
+        self._last_usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens
+        }
+        
+        if hasattr(response, 'content') and len(response.content) > 0:
+            return response.content[0].text
+        logger.warning("Claude response has no content")
+        return ""
@@ -0,0 +1,133 @@
+import asyncio
+import importlib.util
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport ghi nhận số request đang chạy để theo dõi connection pool"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests_total = 0
+        self.errors_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_time_ms = 0.0
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start_time = time.perf_counter()
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            self.errors_total += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_time_ms += (time.perf_counter() - start_time) * 1000
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê của transport và các kết nối trong pool"""
+        connections = list(getattr(self._pool, "connections", []))
+        idle = 0
+        http2 = 0
+        for connection in connections:
+            try:
+                if connection.is_idle():
+                    idle += 1
+                if "HTTP/2" in connection.info():
+                    http2 += 1
+            except Exception:
+                continue
+        return {
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_request_ms": round(self.total_time_ms / self.requests_total, 2) if self.requests_total else 0.0,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "http2_connections": http2
+        }
+
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[PooledTransport] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def http2_available() -> bool:
+    """Kiểm tra gói h2 đã được cài để bật HTTP/2"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """
+    Lấy httpx.AsyncClient dùng chung cho các LLM provider
+    
+    Client giữ kết nối keep-alive giữa các lời gọi và dùng HTTP/2 nếu được bật và gói h2 có sẵn.
+    Kết nối gắn với event loop, nên client được tạo lại nếu loop đang chạy thay đổi.
+    
+    Returns:
+        httpx.AsyncClient: Client dùng chung
+    """
+    global _client, _transport, _client_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    
+    if _client is not None and (loop is None or _client_loop is None or _client_loop is loop):
+        if _client_loop is None:
+            _client_loop = loop
+        return _client
+    
+    settings = get_settings()
+    use_http2 = settings.LLM_HTTP2 and http2_available()
+    limits = httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY
+    )
+    _transport = PooledTransport(limits=limits, http2=use_http2)
+    _client = httpx.AsyncClient(
+        transport=_transport,
+        timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT, connect=10.0),
+        follow_redirects=True
+    )
+    _client_loop = loop
+    logger.info(
+        f"Khởi tạo HTTP client dùng chung cho LLM: max_connections={settings.LLM_HTTP_MAX_CONNECTIONS}, "
+        f"max_keepalive={settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS}, http2={use_http2}"
+    )
+    return _client
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Lấy thống kê connection pool của HTTP client dùng chung"""
+    if _transport is None:
+        return {"initialized": False}
+    return {"initialized": True, "http2_enabled": _transport._pool._http2, **_transport.get_stats()}
+
+
+async def close_shared_http_client() -> None:
+    """Đóng HTTP client dùng chung và giải phóng các kết nối"""
+    global _client, _transport, _client_loop
+    if _client is not None:
+        try:
+            await _client.aclose()
+        except Exception as e:
+            logger.warning(f"Lỗi khi đóng HTTP client dùng chung: {str(e)}")
+    _client = None
+    _transport = None
+    _client_loop = None
@@ -20,8 +20,15 @@ class OpenAIService(BaseLLMService):
             config: Configuration dictionary
         """
         super().__init__(config)
-        self.client = AsyncOpenAI(api_key=self.config.get("OPENAI_API_KEY"))
+        # Khi bật rate limit, 429/5xx được thử lại bởi rate limiter thay vì SDK
+        self.client = AsyncOpenAI(
+            api_key=self.config.get("OPENAI_API_KEY"),
+            max_retries=0 if settings.RATE_LIMIT_ENABLED else 2
+        )
         self.model_name = self.config.get("MODEL_NAME", "gpt-4")
+        self.rate_limit_provider = "openai"
+        # Model rẻ hơn dùng khi ngân sách của task sắp hết
+        self.budget_fallback_model = self.config.get("OPENAI_BUDGET_FALLBACK_MODEL")
         
     def get_completion(self, prompt: str, max_tokens: int = None, temperature: float = None, **kwargs) -> str:
         """
@@ -104,7 +111,7 @@ class OpenAIService(BaseLLMService):
             start_time = time.time()
             
             response = await self.client.chat.completions.create(
-                model=self.model_name,
+                model=kwargs.pop("model", None) or self.model_name,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=max_tokens or self.config.get("MAX_TOKENS", 2000),
                 temperature=temperature or self.config.get("TEMPERATURE", 0.7),
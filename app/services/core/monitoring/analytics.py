@@ -0,0 +1,353 @@
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.models.cost import ResearchCostMonitoring
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_costs (
+    task_id TEXT PRIMARY KEY,
+    total_cost_usd REAL NOT NULL DEFAULT 0,
+    llm_cost_usd REAL NOT NULL DEFAULT 0,
+    search_cost_usd REAL NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    llm_requests INTEGER NOT NULL DEFAULT 0,
+    search_requests INTEGER NOT NULL DEFAULT 0,
+    last_updated TEXT
+);
+CREATE TABLE IF NOT EXISTS daily_costs (
+    task_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (task_id, day, kind, name)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_costs_day ON daily_costs (day);
+CREATE TABLE IF NOT EXISTS phase_durations (
+    task_id TEXT NOT NULL,
+    phase_name TEXT NOT NULL,
+    duration_seconds REAL NOT NULL,
+    PRIMARY KEY (task_id, phase_name)
+);
+CREATE INDEX IF NOT EXISTS idx_phase_durations_phase ON phase_durations (phase_name, duration_seconds);
+"""
+
+_UPSERT_DAILY = """
+INSERT INTO daily_costs (task_id, day, kind, name, requests, input_tokens, output_tokens, cost_usd)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (task_id, day, kind, name) DO UPDATE SET
+    requests = requests + excluded.requests,
+    input_tokens = input_tokens + excluded.input_tokens,
+    output_tokens = output_tokens + excluded.output_tokens,
+    cost_usd = cost_usd + excluded.cost_usd
+"""
+
+_UPSERT_PHASE = """
+INSERT INTO phase_durations (task_id, phase_name, duration_seconds) VALUES (?, ?, ?)
+ON CONFLICT (task_id, phase_name) DO UPDATE SET duration_seconds = excluded.duration_seconds
+"""
+
+_UPSERT_TASK = """
+INSERT INTO task_costs (
+    task_id, total_cost_usd, llm_cost_usd, search_cost_usd, total_tokens,
+    llm_requests, search_requests, last_updated
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (task_id) DO UPDATE SET
+    total_cost_usd = excluded.total_cost_usd,
+    llm_cost_usd = excluded.llm_cost_usd,
+    search_cost_usd = excluded.search_cost_usd,
+    total_tokens = excluded.total_tokens,
+    llm_requests = excluded.llm_requests,
+    search_requests = excluded.search_requests,
+    last_updated = excluded.last_updated
+"""
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """
+    Tính percentile theo phương pháp nearest-rank
+
+    Args:
+        sorted_values: Danh sách giá trị đã sắp xếp tăng dần
+        pct: Percentile cần tính (0-100)
+
+    Returns:
+        Optional[float]: Giá trị percentile, None nếu danh sách rỗng
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _event_rows(task_id: str, events: List[Tuple[str, Dict[str, Any]]]) -> Tuple[list, list]:
+    """Chuyển event chi phí/timing thành các dòng của daily_costs và phase_durations"""
+    daily_rows = []
+    phase_rows = []
+    for event_type, data in events:
+        if event_type == "llm":
+            daily_rows.append((
+                task_id, str(data.get("timestamp", ""))[:10], "llm", data.get("model", ""), 1,
+                data.get("input_tokens", 0), data.get("output_tokens", 0), data.get("cost_usd", 0.0)
+            ))
+        elif event_type == "search":
+            daily_rows.append((
+                task_id, str(data.get("timestamp", ""))[:10], "search", data.get("provider", ""), 1,
+                0, 0, data.get("cost_usd", 0.0)
+            ))
+        elif event_type == "phase" and data.get("duration_seconds") is not None:
+            phase_rows.append((task_id, data["phase_name"], data["duration_seconds"]))
+    return daily_rows, phase_rows
+
+
+def monitoring_events(monitoring: ResearchCostMonitoring) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Chuyển toàn bộ dữ liệu của một monitoring thành danh sách event (dùng khi backfill)
+
+    Args:
+        monitoring: Monitoring của task
+
+    Returns:
+        List[Tuple[str, Dict[str, Any]]]: Danh sách (loại event, dữ liệu)
+    """
+    events = [("llm", cost.dict()) for cost in monitoring.llm_requests]
+    events.extend(("search", cost.dict()) for cost in monitoring.search_requests)
+    events.extend(("phase", timing.dict()) for timing in monitoring.phase_timings)
+    return events
+
+
+class CostAnalyticsIndex:
+    """
+    Chỉ mục SQLite tổng hợp chi phí của mọi research task
+
+    Được cập nhật tăng dần mỗi khi CostMonitoringService ghi dữ liệu của một task, nên các
+    truy vấn tổng hợp (chi phí theo ngày, token theo model, thời gian theo phase, task tốn
+    kém nhất) không cần đọc lại từng research_tasks/*/cost.json.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite (":memory:" để dùng bộ nhớ)
+        """
+        self.db_path = db_path
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if db_path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    async def apply_events(
+        self,
+        task_id: str,
+        monitoring: ResearchCostMonitoring,
+        events: List[Tuple[str, Dict[str, Any]]]
+    ) -> None:
+        """
+        Cập nhật chỉ mục với các event mới của task
+
+        Args:
+            task_id: ID của task
+            monitoring: Monitoring hiện tại của task (dùng cho tổng chi phí của task)
+            events: Các event mới chưa được đưa vào chỉ mục
+        """
+        await asyncio.to_thread(self._apply, task_id, monitoring, events, False)
+
+    async def reindex_task(self, monitoring: ResearchCostMonitoring) -> None:
+        """
+        Dựng lại toàn bộ dữ liệu của một task trong chỉ mục (dùng khi backfill)
+
+        Args:
+            monitoring: Monitoring đầy đủ của task
+        """
+        await asyncio.to_thread(
+            self._apply, monitoring.task_id, monitoring, monitoring_events(monitoring), True
+        )
+
+    async def get_spend(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lấy tổng chi phí và chi phí theo ngày
+
+        Args:
+            start_date: Ngày bắt đầu (YYYY-MM-DD), None để không giới hạn
+            end_date: Ngày kết thúc (YYYY-MM-DD, bao gồm), None để không giới hạn
+
+        Returns:
+            Dict[str, Any]: Tổng chi phí và danh sách chi phí theo ngày
+        """
+        where, params = self._date_filter(start_date, end_date)
+        rows = await asyncio.to_thread(
+            self._query,
+            f"""
+            SELECT day,
+                   SUM(CASE WHEN kind = 'llm' THEN cost_usd ELSE 0 END) AS llm_cost_usd,
+                   SUM(CASE WHEN kind = 'search' THEN cost_usd ELSE 0 END) AS search_cost_usd,
+                   SUM(cost_usd) AS total_cost_usd,
+                   COUNT(DISTINCT task_id) AS tasks
+            FROM daily_costs {where}
+            GROUP BY day ORDER BY day
+            """,
+            params
+        )
+        days = [dict(row) for row in rows]
+        return {
+            "total_cost_usd": sum(day["total_cost_usd"] for day in days),
+            "llm_cost_usd": sum(day["llm_cost_usd"] for day in days),
+            "search_cost_usd": sum(day["search_cost_usd"] for day in days),
+            "days": days
+        }
+
+    async def get_model_usage(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Lấy số token, số request và chi phí theo model
+
+        Args:
+            start_date: Ngày bắt đầu (YYYY-MM-DD)
+            end_date: Ngày kết thúc (YYYY-MM-DD, bao gồm)
+
+        Returns:
+            List[Dict[str, Any]]: Thống kê theo model, sắp xếp theo tổng token giảm dần
+        """
+        where, params = self._date_filter(start_date, end_date, "kind = 'llm'")
+        rows = await asyncio.to_thread(
+            self._query,
+            f"""
+            SELECT name AS model,
+                   SUM(requests) AS requests,
+                   SUM(input_tokens) AS input_tokens,
+                   SUM(output_tokens) AS output_tokens,
+                   SUM(input_tokens + output_tokens) AS total_tokens,
+                   SUM(cost_usd) AS cost_usd
+            FROM daily_costs {where}
+            GROUP BY name ORDER BY total_tokens DESC
+            """,
+            params
+        )
+        return [dict(row) for row in rows]
+
+    async def get_phase_durations(self) -> List[Dict[str, Any]]:
+        """
+        Lấy p50/p95 thời gian thực hiện của từng phase trên mọi task
+
+        Returns:
+            List[Dict[str, Any]]: Thống kê theo phase
+        """
+        rows = await asyncio.to_thread(
+            self._query,
+            "SELECT phase_name, duration_seconds FROM phase_durations ORDER BY phase_name, duration_seconds",
+            ()
+        )
+        durations: Dict[str, List[float]] = {}
+        for row in rows:
+            durations.setdefault(row["phase_name"], []).append(row["duration_seconds"])
+        return [
+            {
+                "phase_name": phase_name,
+                "count": len(values),
+                "p50_seconds": percentile(values, 50),
+                "p95_seconds": percentile(values, 95),
+                "max_seconds": values[-1]
+            }
+            for phase_name, values in durations.items()
+        ]
+
+    async def get_top_tasks(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Lấy các task có tổng chi phí cao nhất
+
+        Args:
+            limit: Số task tối đa
+
+        Returns:
+            List[Dict[str, Any]]: Danh sách task theo chi phí giảm dần
+        """
+        rows = await asyncio.to_thread(
+            self._query,
+            "SELECT * FROM task_costs ORDER BY total_cost_usd DESC LIMIT ?",
+            (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _date_filter(start_date: Optional[str], end_date: Optional[str], *conditions: str) -> Tuple[str, tuple]:
+        clauses = list(conditions)
+        params = []
+        if start_date:
+            clauses.append("day >= ?")
+            params.append(start_date)
+        if end_date:
+            clauses.append("day <= ?")
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, tuple(params)
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _apply(
+        self,
+        task_id: str,
+        monitoring: ResearchCostMonitoring,
+        events: List[Tuple[str, Dict[str, Any]]],
+        replace: bool
+    ) -> None:
+        daily_rows, phase_rows = _event_rows(task_id, events)
+        summary = monitoring.ensure_summary()
+        with self._lock, self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM daily_costs WHERE task_id = ?", (task_id,))
+                self._conn.execute("DELETE FROM phase_durations WHERE task_id = ?", (task_id,))
+            self._conn.executemany(_UPSERT_DAILY, daily_rows)
+            self._conn.executemany(_UPSERT_PHASE, phase_rows)
+            self._conn.execute(_UPSERT_TASK, (
+                task_id,
+                summary.total_cost_usd,
+                summary.llm_cost_usd,
+                summary.search_cost_usd,
+                summary.total_tokens,
+                summary.total_llm_requests,
+                summary.total_search_requests,
+                monitoring.updated_at
+            ))
+
+
+# Singleton instance
+_cost_index: Optional[CostAnalyticsIndex] = None
+
+
+def get_cost_index() -> Optional[CostAnalyticsIndex]:
+    """
+    Lấy chỉ mục chi phí dùng chung, None nếu bị tắt trong cấu hình
+
+    Returns:
+        Optional[CostAnalyticsIndex]: Chỉ mục chi phí
+    """
+    global _cost_index
+    settings = get_settings()
+    if not settings.COST_INDEX_ENABLED:
+        return None
+    if _cost_index is None:
+        _cost_index = CostAnalyticsIndex(settings.COST_INDEX_PATH)
+    return _cost_index
@@ -0,0 +1,321 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import BUDGET_DECISIONS
+
+logger = get_logger(__name__)
+
+# Trạng thái ngân sách
+BUDGET_OK = "ok"
+BUDGET_DEGRADED = "degraded"  # Vượt ngưỡng degrade: dùng model rẻ hơn, ít kết quả search hơn, bỏ qua edit
+BUDGET_EXCEEDED = "exceeded"  # Lời gọi sẽ vượt giới hạn: không gọi provider
+
+
+class BudgetDecision:
+    """Kết quả kiểm tra ngân sách của một lời gọi, giữ phần ngân sách đã đặt trước cho lời gọi đó"""
+
+    __slots__ = ("task_id", "status", "reason", "model", "tokens", "usd")
+
+    def __init__(
+        self,
+        task_id: str,
+        status: str,
+        reason: Optional[str] = None,
+        model: Optional[str] = None,
+        tokens: int = 0,
+        usd: float = 0.0
+    ):
+        self.task_id = task_id
+        self.status = status
+        self.reason = reason
+        # Model nên dùng cho lời gọi (model rẻ hơn khi ngân sách bị degrade)
+        self.model = model
+        # Phần ngân sách ước lượng đã được đặt trước, trả lại bằng BudgetManager.release
+        self.tokens = tokens
+        self.usd = usd
+
+    @property
+    def degraded(self) -> bool:
+        return self.status == BUDGET_DEGRADED
+
+    @property
+    def exceeded(self) -> bool:
+        return self.status == BUDGET_EXCEEDED
+
+
+class BudgetManager:
+    """
+    Giới hạn token và chi phí (USD) theo task và toàn cục (theo ngày UTC)
+
+    Mỗi lời gọi LLM/search được kiểm tra trước khi gửi tới provider với số token ước lượng.
+    Chi tiêu của task lấy từ cost monitoring; chi tiêu toàn cục được cộng dồn qua record_spend
+    và khởi tạo từ chỉ mục chi phí ở lần kiểm tra đầu tiên trong ngày. Ước lượng của các lời gọi
+    đang chạy được đặt trước để các phần nghiên cứu song song không cùng vượt giới hạn.
+    """
+
+    def __init__(
+        self,
+        task_max_tokens: int = 0,
+        task_max_usd: float = 0.0,
+        global_max_tokens: int = 0,
+        global_max_usd: float = 0.0,
+        degrade_ratio: float = 0.8
+    ):
+        """
+        Args:
+            task_max_tokens: Số token tối đa của một task (0 = không giới hạn)
+            task_max_usd: Chi phí tối đa của một task (0 = không giới hạn)
+            global_max_tokens: Số token tối đa mỗi ngày trên mọi task (0 = không giới hạn)
+            global_max_usd: Chi phí tối đa mỗi ngày trên mọi task (0 = không giới hạn)
+            degrade_ratio: Tỷ lệ sử dụng của giới hạn mà từ đó pipeline chuyển sang chế độ tiết kiệm
+        """
+        self.task_max_tokens = max(0, task_max_tokens)
+        self.task_max_usd = max(0.0, task_max_usd)
+        self.global_max_tokens = max(0, global_max_tokens)
+        self.global_max_usd = max(0.0, global_max_usd)
+        self.degrade_ratio = min(max(degrade_ratio, 0.0), 1.0)
+        # Chi tiêu toàn cục trong ngày hiện tại
+        self._day: Optional[str] = None
+        self._global_tokens = 0
+        self._global_usd = 0.0
+        self._seeded = False
+        self._seed_lock: Optional[asyncio.Lock] = None
+        # Ước lượng của các lời gọi đang chạy: task_id -> (tokens, usd)
+        self._reserved: Dict[str, Tuple[int, float]] = {}
+        self._reserved_tokens = 0
+        self._reserved_usd = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.task_max_tokens or self.task_max_usd or self.global_max_tokens or self.global_max_usd)
+
+    async def check_llm(
+        self,
+        task_id: str,
+        model: str,
+        input_tokens: int,
+        max_output_tokens: int,
+        fallback_model: Optional[str] = None
+    ) -> BudgetDecision:
+        """
+        Kiểm tra ngân sách trước một lời gọi LLM
+
+        Khi vượt ngưỡng degrade và có model dự phòng rẻ hơn, quyết định trả về model dự phòng.
+
+        Args:
+            task_id: ID của task
+            model: Model dự định sử dụng
+            input_tokens: Số token của prompt (ước lượng bằng count_tokens)
+            max_output_tokens: Số token đầu ra tối đa
+            fallback_model: Model rẻ hơn dùng khi ngân sách bị degrade
+
+        Returns:
+            BudgetDecision: Quyết định; phần ngân sách được đặt trước nếu lời gọi được phép
+        """
+        from app.services.core.monitoring.cost import get_cost_service
+
+        cost_service = await get_cost_service()
+        tokens = input_tokens + max_output_tokens
+        usd = cost_service.estimate_llm_cost(model, input_tokens, max_output_tokens)
+        status, reason = await self._evaluate(task_id, tokens, usd)
+
+        if status != BUDGET_OK and fallback_model and fallback_model != model:
+            fallback_usd = cost_service.estimate_llm_cost(fallback_model, input_tokens, max_output_tokens)
+            fallback_status, fallback_reason = await self._evaluate(task_id, tokens, fallback_usd)
+            if fallback_status != BUDGET_EXCEEDED:
+                # Model rẻ hơn vẫn nằm trong giới hạn: tiếp tục ở chế độ degrade
+                model, usd, status, reason = fallback_model, fallback_usd, BUDGET_DEGRADED, reason or fallback_reason
+
+        return self._decide("llm", task_id, status, reason, model, tokens, usd)
+
+    async def check_search(self, task_id: str, provider: str) -> BudgetDecision:
+        """
+        Kiểm tra ngân sách trước một lời gọi search
+
+        Args:
+            task_id: ID của task
+            provider: Search provider
+
+        Returns:
+            BudgetDecision: Quyết định; phần ngân sách được đặt trước nếu lời gọi được phép
+        """
+        from app.services.core.monitoring.cost import get_cost_service
+
+        cost_service = await get_cost_service()
+        usd = cost_service.estimate_search_cost(provider)
+        status, reason = await self._evaluate(task_id, 0, usd)
+        return self._decide("search", task_id, status, reason, None, 0, usd)
+
+    async def get_status(self, task_id: str) -> str:
+        """
+        Trạng thái ngân sách hiện tại của task (không tính thêm lời gọi mới)
+
+        Args:
+            task_id: ID của task
+
+        Returns:
+            str: BUDGET_OK, BUDGET_DEGRADED hoặc BUDGET_EXCEEDED
+        """
+        status, _ = await self._evaluate(task_id, 0, 0.0)
+        return status
+
+    def release(self, decision: Optional[BudgetDecision]) -> None:
+        """
+        Trả lại phần ngân sách đã đặt trước khi lời gọi kết thúc (chi phí thực tế được ghi qua cost monitoring)
+
+        Args:
+            decision: Quyết định của lời gọi
+        """
+        if decision is None or (not decision.tokens and not decision.usd):
+            return
+        tokens, usd = self._reserved.get(decision.task_id, (0, 0.0))
+        tokens, usd = tokens - decision.tokens, usd - decision.usd
+        if tokens <= 0 and usd <= 1e-12:
+            self._reserved.pop(decision.task_id, None)
+        else:
+            self._reserved[decision.task_id] = (tokens, usd)
+        self._reserved_tokens = max(0, self._reserved_tokens - decision.tokens)
+        self._reserved_usd = max(0.0, self._reserved_usd - decision.usd)
+        decision.tokens, decision.usd = 0, 0.0
+
+    def record_spend(self, tokens: int, usd: float) -> None:
+        """
+        Cộng chi tiêu thực tế vào tổng toàn cục của ngày (gọi bởi cost monitoring cho mỗi request)
+
+        Args:
+            tokens: Số token đã dùng
+            usd: Chi phí (USD)
+        """
+        self._roll_day()
+        self._global_tokens += max(0, tokens)
+        self._global_usd += max(0.0, usd)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy giới hạn, chi tiêu toàn cục trong ngày và phần ngân sách đang được đặt trước"""
+        self._roll_day()
+        return {
+            "task_max_tokens": self.task_max_tokens,
+            "task_max_usd": self.task_max_usd,
+            "global_max_tokens": self.global_max_tokens,
+            "global_max_usd": self.global_max_usd,
+            "day": self._day,
+            "global_tokens": self._global_tokens,
+            "global_usd": round(self._global_usd, 6),
+            "reserved_tokens": self._reserved_tokens,
+            "reserved_usd": round(self._reserved_usd, 6)
+        }
+
+    async def _evaluate(self, task_id: str, tokens: int, usd: float) -> Tuple[str, Optional[str]]:
+        """So sánh chi tiêu đã có + đang đặt trước + lời gọi mới với các giới hạn"""
+        status, reason = BUDGET_OK, None
+        checks = []
+        if self.task_max_tokens or self.task_max_usd:
+            task_tokens, task_usd = await self._get_task_spend(task_id)
+            reserved_tokens, reserved_usd = self._reserved.get(task_id, (0, 0.0))
+            checks.append(("task tokens", task_tokens + reserved_tokens + tokens, self.task_max_tokens))
+            checks.append(("task USD", task_usd + reserved_usd + usd, self.task_max_usd))
+        if self.global_max_tokens or self.global_max_usd:
+            await self._seed_global()
+            checks.append(("global tokens", self._global_tokens + self._reserved_tokens + tokens, self.global_max_tokens))
+            checks.append(("global USD", self._global_usd + self._reserved_usd + usd, self.global_max_usd))
+
+        for name, used, limit in checks:
+            if not limit:
+                continue
+            if used > limit:
+                return BUDGET_EXCEEDED, f"{name} {used:g} > {limit:g}"
+            if status == BUDGET_OK and used >= limit * self.degrade_ratio:
+                status, reason = BUDGET_DEGRADED, f"{name} {used:g} >= {self.degrade_ratio:.0%} của {limit:g}"
+        return status, reason
+
+    def _decide(
+        self,
+        kind: str,
+        task_id: str,
+        status: str,
+        reason: Optional[str],
+        model: Optional[str],
+        tokens: int,
+        usd: float
+    ) -> BudgetDecision:
+        BUDGET_DECISIONS.inc(kind=kind, status=status)
+        if status == BUDGET_EXCEEDED:
+            logger.warning(f"Ngân sách của task {task_id} không đủ cho lời gọi {kind}: {reason}")
+            return BudgetDecision(task_id, status, reason, model)
+        if status == BUDGET_DEGRADED:
+            logger.info(f"Ngân sách của task {task_id} ở chế độ tiết kiệm cho lời gọi {kind}: {reason}")
+        reserved_tokens, reserved_usd = self._reserved.get(task_id, (0, 0.0))
+        self._reserved[task_id] = (reserved_tokens + tokens, reserved_usd + usd)
+        self._reserved_tokens += tokens
+        self._reserved_usd += usd
+        return BudgetDecision(task_id, status, reason, model, tokens, usd)
+
+    async def _get_task_spend(self, task_id: str) -> Tuple[int, float]:
+        from app.services.core.monitoring.cost import get_cost_service
+
+        cost_service = await get_cost_service()
+        summary = await cost_service.get_summary(task_id)
+        return summary.total_tokens, summary.total_cost_usd
+
+    def _roll_day(self) -> None:
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        if today != self._day:
+            self._day = today
+            self._global_tokens = 0
+            self._global_usd = 0.0
+            self._seeded = False
+
+    async def _seed_global(self) -> None:
+        """Khởi tạo chi tiêu toàn cục trong ngày từ chỉ mục chi phí (ví dụ sau khi khởi động lại)"""
+        self._roll_day()
+        if self._seeded:
+            return
+        if self._seed_lock is None:
+            self._seed_lock = asyncio.Lock()
+        async with self._seed_lock:
+            if self._seeded:
+                return
+            from app.services.core.monitoring.analytics import get_cost_index
+
+            cost_index = get_cost_index()
+            if cost_index is not None:
+                try:
+                    day = self._day
+                    spend = await cost_index.get_spend(day, day)
+                    usage = await cost_index.get_model_usage(day, day)
+                    # Chi tiêu ghi nhận trước khi khởi tạo có thể đã nằm trong chỉ mục: lấy giá trị lớn hơn
+                    self._global_usd = max(self._global_usd, spend["total_cost_usd"] or 0.0)
+                    self._global_tokens = max(self._global_tokens, sum(row["total_tokens"] or 0 for row in usage))
+                except Exception as e:
+                    logger.error(f"Không thể khởi tạo chi tiêu trong ngày từ chỉ mục chi phí: {str(e)}")
+            self._seeded = True
+
+
+# Singleton instance
+_budget_manager: Optional[BudgetManager] = None
+_budget_initialized = False
+
+
+def get_budget_manager() -> Optional[BudgetManager]:
+    """
+    Lấy budget manager dùng chung, None nếu không cấu hình giới hạn nào
+
+    Returns:
+        Optional[BudgetManager]: Budget manager
+    """
+    global _budget_manager, _budget_initialized
+    if not _budget_initialized:
+        settings = get_settings()
+        manager = BudgetManager(
+            task_max_tokens=settings.BUDGET_TASK_MAX_TOKENS,
+            task_max_usd=settings.BUDGET_TASK_MAX_USD,
+            global_max_tokens=settings.BUDGET_GLOBAL_DAILY_MAX_TOKENS,
+            global_max_usd=settings.BUDGET_GLOBAL_DAILY_MAX_USD,
+            degrade_ratio=settings.BUDGET_DEGRADE_RATIO
+        )
+        _budget_manager = manager if manager.enabled else None
+        _budget_initialized = True
+    return _budget_manager
@@ -16,52 +16,78 @@ from app.models.cost import (
 )
 from app.models.research import ResearchCostInfo
 from app.core.logging import get_logger
-from app.services.core.monitoring.custom_pricing import get_custom_pricing
+from app.core.config import get_settings
+from app.core.metrics import COST_USD, PHASE_DURATION, SECTION_DURATION
+from app.core.singleflight import capture_cost
+from app.services.core.monitoring.analytics import CostAnalyticsIndex, get_cost_index
+from app.services.core.monitoring.budget import get_budget_manager
+from app.services.core.monitoring.events import CostEventLog
+from app.services.core.monitoring.persistence import WriteBehindPersistence
+from app.services.core.monitoring.pricing import PricingRegistry, get_pricing_registry
+from app.services.core.monitoring.resident import ResidentMonitoringStore, estimate_size
+from app.services.core.storage.file_io import get_file_io
+from app.services.core.storage.task_writer import get_task_writer
 
 logger = get_logger(__name__)
 
-# Lấy bảng giá tùy chỉnh
-MODEL_PRICING, SEARCH_PRICING = get_custom_pricing()
-
-# Bảng giá model - giá trên 1000 token
-MODEL_PRICING = {
-    # OpenAI models
-    "gpt-4o": {"input": 0.003, "output": 0.01},  # Giá trên 1 triệu token là $3 cho input và $10 cho output, nên trên 1000 token là $0.003 và $0.01
-    "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},  # Giá trên 1 triệu token là $0.15 cho input và $0.6 cho output, nên trên 1000 token là $0.00015 và $0.0006
-    "gpt-4-turbo": {"input": 0.01, "output": 0.03},
-    "gpt-4": {"input": 0.03, "output": 0.06},
-    "gpt-4-32k": {"input": 0.06, "output": 0.12},
-    "gpt-3.5-turbo": {"input": 0.0015, "output": 0.002},
-    
-    # Anthropic models
-    "claude-3-5-sonnet-latest": {"input": 0.003, "output": 0.015},  # Giá mới nhất cho Claude 3.5 Sonnet
-    "claude-3.5-sonnet": {"input": 0.003, "output": 0.015},  # Giá trên 1 triệu token là $3 cho input và $15 cho output, nên trên 1000 token là $0.003 và $0.015
-    "claude-3-opus": {"input": 0.015, "output": 0.075},
-    "claude-3-sonnet": {"input": 0.003, "output": 0.015},
-    "claude-3-haiku": {"input": 0.00025, "output": 0.00125},
-    "claude-2": {"input": 0.008, "output": 0.024},
-    "claude-instant": {"input": 0.0008, "output": 0.0024},
-    
-    # Perplexity models
-    "llama-3.1-sonar-small-128k-online": {"input": 0.0002, "output": 0.0002},  # Giá trên 1 triệu token là $0.2 cho input và $0.2 cho output, nên trên 1000 token là $0.0002
-}
-
-# Giá cho search providers - giá trên mỗi request
-SEARCH_PRICING = {
-    "google": 0.01,  # Giả định 1 cent mỗi request
-    "perplexity": 0.005,  # Giả định 0.5 cent mỗi request
-    "custom": 0.0  # Không tính phí
-}
-
 
 class CostMonitoringService:
     """Service để theo dõi và quản lý chi phí cho research tasks"""
     
     def __init__(self, storage_service=None):
         self.storage_service = storage_service
-        self._cost_data: Dict[str, ResearchCostMonitoring] = {}
-        self.model_pricing = MODEL_PRICING.copy()
-        self.search_pricing = SEARCH_PRICING.copy()
+        settings = get_settings()
+        # Monitoring trong bộ nhớ theo LRU; task còn thay đổi chưa ghi được ghim
+        self._cost_data = ResidentMonitoringStore(
+            max_tasks=settings.COST_DATA_MAX_TASKS,
+            max_bytes=settings.COST_DATA_MAX_BYTES,
+            is_pinned=self._is_pinned
+        )
+        # Ghi cost.json và task.json theo lô thay vì sau mỗi request
+        self._persistence = WriteBehindPersistence(
+            self._flush_task_data,
+            interval_seconds=settings.COST_FLUSH_INTERVAL_SECONDS,
+            max_pending_updates=settings.COST_FLUSH_MAX_PENDING_UPDATES
+        )
+        # Event chưa được ghi nối vào cost_events.jsonl, theo task
+        self._pending_events: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        self._event_log: Optional[CostEventLog] = None
+        # Chỉ mục chi phí tổng hợp mọi task, được cập nhật khi flush
+        self.cost_index: Optional[CostAnalyticsIndex] = None
+        # Bảng giá nạp từ file dữ liệu, tự nạp lại khi file thay đổi
+        self.pricing: PricingRegistry = get_pricing_registry()
+    
+    def _is_pinned(self, task_id: str) -> bool:
+        """Task chưa thể loại khỏi bộ nhớ: không có storage để tải lại hoặc còn dữ liệu chưa ghi"""
+        return (
+            not self.storage_service
+            or self._persistence.is_busy(task_id)
+            or bool(self._pending_events.get(task_id))
+        )
+    
+    def _get_event_log(self) -> Optional[CostEventLog]:
+        """Event log của storage cục bộ, None nếu storage không phải file (ví dụ GitHub)"""
+        base_dir = getattr(self.storage_service, "base_dir", None)
+        if base_dir is None:
+            return None
+        if self._event_log is None or self._event_log.base_dir != str(base_dir):
+            self._event_log = CostEventLog(base_dir)
+        return self._event_log
+    
+    def _record_event(self, task_id: str, event_type: str, record: Any) -> None:
+        """
+        Ghi nhận một event chi phí/timing để ghi nối vào event log ở lần flush kế tiếp
+        
+        Args:
+            task_id: ID của task
+            event_type: Loại event ("llm", "search", "phase", "section")
+            record: Bản ghi (LLMCost, SearchCost, PhaseTimingInfo, SectionTimingInfo)
+        """
+        data = record.dict()
+        if self.storage_service:
+            self._pending_events.setdefault(task_id, []).append((event_type, data))
+        self._save_cost_data(task_id)
+        self._cost_data.grow(task_id, estimate_size(data))
     
     def initialize_monitoring(self, task_id: str) -> ResearchCostMonitoring:
         """Khởi tạo monitoring cho một task mới"""
@@ -88,6 +114,24 @@ class CostMonitoringService:
             logger.warning(f"Không thể tải cost monitoring cho task {task_id}: storage_service chưa được cấu hình")
             return None
         
+        event_log = self._get_event_log()
+        if event_log is not None:
+            try:
+                # Dựng lại từ snapshot cost.json và các event ghi sau snapshot
+                cost_monitoring, _ = await event_log.materialize(task_id)
+                if task_id in self._cost_data:
+                    # Một coroutine khác đã tải task trong lúc chờ đọc file
+                    return self._cost_data[task_id]
+                if cost_monitoring is None:
+                    logger.info(f"Không tìm thấy dữ liệu cost monitoring cho task {task_id}, tạo mới")
+                    return self.initialize_monitoring(task_id)
+                self._cost_data[task_id] = cost_monitoring
+                return cost_monitoring
+            except Exception as e:
+                logger.error(f"Lỗi khi tải cost monitoring cho task {task_id}: {str(e)}")
+                logger.info(f"Khởi tạo cost monitoring mới cho task {task_id}")
+                return self.initialize_monitoring(task_id)
+        
         try:
             # Thử tải từ file
             cost_data_path = f"research_tasks/{task_id}/cost.json"
@@ -105,6 +149,8 @@ class CostMonitoringService:
                 return self.initialize_monitoring(task_id)
             
             cost_monitoring = ResearchCostMonitoring.parse_obj(cost_data)
+            # Tính lại summary một lần khi tải để các cập nhật tăng dần sau đó bắt đầu từ dữ liệu nhất quán
+            cost_monitoring.recompute_summary()
             self._cost_data[task_id] = cost_monitoring
             return cost_monitoring
             
@@ -128,33 +174,59 @@ class CostMonitoringService:
     
     def update_model_pricing(self, pricing_data: Dict[str, Dict[str, float]]):
         """Cập nhật bảng giá model"""
-        self.model_pricing.update(pricing_data)
-        logger.info(f"Đã cập nhật bảng giá model: {self.model_pricing}")
+        self.pricing.update_model_pricing(pricing_data)
+        logger.info(f"Đã cập nhật bảng giá model: {pricing_data}")
     
     def update_search_pricing(self, pricing_data: Dict[str, float]):
         """Cập nhật bảng giá search"""
-        self.search_pricing.update(pricing_data)
-        logger.info(f"Đã cập nhật bảng giá search: {self.search_pricing}")
+        self.pricing.update_search_pricing(pricing_data)
+        logger.info(f"Đã cập nhật bảng giá search: {pricing_data}")
     
     def _calculate_llm_cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
         """Tính toán chi phí cho một LLM request"""
-        if model not in self.model_pricing:
-            logger.warning(f"Không tìm thấy bảng giá cho model {model}, sử dụng giá mặc định")
-            return 0.0
-        
-        pricing = self.model_pricing[model]
-        input_cost = (input_tokens / 1000) * pricing["input"]
-        output_cost = (output_tokens / 1000) * pricing["output"]
-        
-        return input_cost + output_cost
+        return self.pricing.calculate_llm_cost(model, input_tokens, output_tokens)
     
     def _calculate_search_cost(self, provider: str) -> float:
         """Tính toán chi phí cho một Search request"""
-        if provider not in self.search_pricing:
-            logger.warning(f"Không tìm thấy bảng giá cho provider {provider}, sử dụng giá mặc định")
-            return 0.0
+        return self.pricing.calculate_search_cost(provider)
+    
+    def estimate_llm_cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
+        """
+        Ước lượng chi phí của một LLM request trước khi gửi (dùng cho kiểm tra ngân sách)
         
-        return self.search_pricing[provider]
+        Args:
+            model: Tên model
+            input_tokens: Số token đầu vào ước lượng
+            output_tokens: Số token đầu ra tối đa
+            
+        Returns:
+            float: Chi phí ước lượng (USD)
+        """
+        return self._calculate_llm_cost(model, input_tokens, output_tokens)
+    
+    def estimate_search_cost(self, provider: str) -> float:
+        """
+        Ước lượng chi phí của một Search request trước khi gửi (dùng cho kiểm tra ngân sách)
+        
+        Args:
+            provider: Tên provider
+            
+        Returns:
+            float: Chi phí ước lượng (USD)
+        """
+        return self._calculate_search_cost(provider)
+    
+    @staticmethod
+    def _record_budget_spend(tokens: int, cost_usd: float) -> None:
+        """Cộng chi tiêu thực tế vào ngân sách toàn cục trong ngày (nếu có giới hạn)"""
+        budget = get_budget_manager()
+        if budget is not None:
+            budget.record_spend(tokens, cost_usd)
+    
+    @staticmethod
+    def _share_tokens(tokens: int, cost_share: float) -> int:
+        """Tính số token thuộc về task theo phần chi phí được phân bổ"""
+        return tokens if cost_share == 1.0 else int(round(tokens * cost_share))
     
     async def log_llm_request(
         self, 
@@ -165,7 +237,10 @@ class CostMonitoringService:
         prompt: Optional[str] = None,
         duration_ms: Optional[int] = None,
         endpoint: Optional[str] = None,
-        purpose: Optional[str] = None
+        purpose: Optional[str] = None,
+        cache_hit: bool = False,
+        cost_share: float = 1.0,
+        coalesced: bool = False
     ) -> None:
         """
         Ghi nhận một LLM request
@@ -179,9 +254,27 @@ class CostMonitoringService:
             duration_ms: Thời gian xử lý (ms)
             endpoint: Endpoint API đã sử dụng
             purpose: Mục đích của request
+            cache_hit: Phản hồi được lấy từ cache, không tính chi phí
+            cost_share: Phần chi phí task phải chịu khi lời gọi được dùng chung (single-flight)
+            coalesced: Request được gộp vào lời gọi của task khác
         """
-        # Tính toán chi phí
-        cost_usd = self._calculate_llm_cost(model, input_tokens, output_tokens)
+        # Lời gọi dùng chung: giữ lại để phân bổ chi phí cho các task tham gia
+        if capture_cost("llm", {
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "prompt": prompt,
+            "duration_ms": duration_ms,
+            "endpoint": endpoint,
+            "purpose": purpose,
+            "cache_hit": cache_hit
+        }):
+            return
+        
+        # Tính toán chi phí (cache hit không gọi provider nên không mất phí)
+        cost_usd = 0.0 if cache_hit else self._calculate_llm_cost(model, input_tokens, output_tokens) * cost_share
+        input_tokens = self._share_tokens(input_tokens, cost_share)
+        output_tokens = self._share_tokens(output_tokens, cost_share)
         
         # Lấy monitoring data
         monitoring = await self.get_monitoring(task_id)
@@ -196,26 +289,20 @@ class CostMonitoringService:
             prompt=prompt[:500] if prompt else None,  # Chỉ lưu 500 ký tự đầu tiên
             duration_ms=duration_ms,
             endpoint=endpoint,
-            purpose=purpose
+            purpose=purpose,
+            cache_hit=cache_hit,
+            coalesced=coalesced
         )
         
-        # Thêm vào danh sách
-        monitoring.llm_requests.append(llm_cost)
+        # Thêm vào danh sách và cập nhật summary tăng dần
+        monitoring.add_llm_cost(llm_cost)
+        COST_USD.inc(cost_usd, kind="llm", name=model)
+        self._record_budget_spend(input_tokens + output_tokens, cost_usd)
         
-        # Cập nhật summary
-        self._update_summary(monitoring)
+        # Ghi nối vào event log theo lô
+        self._record_event(task_id, "llm", llm_cost)
         
-        # Lưu dữ liệu
-        self._save_cost_data(task_id)
-        
-        # Cập nhật task.json
-        try:
-            summary = await self.get_summary(task_id)
-            asyncio.create_task(self._update_task_json(task_id, summary))
-        except Exception as e:
-            logger.error(f"Lỗi khi cập nhật task.json: {str(e)}")
-        
-        logger.info(f"Đã ghi nhận LLM request cho task {task_id}: {input_tokens} input, {output_tokens} output, {cost_usd:.6f} USD")
+        logger.info(f"Đã ghi nhận LLM request cho task {task_id}: {input_tokens} input, {output_tokens} output, {cost_usd:.6f} USD{' (cache hit)' if cache_hit else ''}")
 
     async def log_search_request(
         self,
@@ -226,7 +313,10 @@ class CostMonitoringService:
         num_results: Optional[int] = None,
         purpose: Optional[str] = None,
         input_tokens: Optional[int] = None,
-        output_tokens: Optional[int] = None
+        output_tokens: Optional[int] = None,
+        cache_hit: bool = False,
+        cost_share: float = 1.0,
+        coalesced: bool = False
     ) -> None:
         """
         Ghi nhận một Search request
@@ -240,12 +330,30 @@ class CostMonitoringService:
             purpose: Mục đích của request
             input_tokens: Số lượng token đầu vào (nếu có)
             output_tokens: Số lượng token đầu ra (nếu có)
+            cache_hit: Kết quả được lấy từ search cache, không tính chi phí
+            cost_share: Phần chi phí task phải chịu khi lời gọi được dùng chung (single-flight)
+            coalesced: Request được gộp vào lời gọi của task khác
         """
+        # Lời gọi dùng chung: giữ lại để phân bổ chi phí cho các task tham gia
+        if capture_cost("search", {
+            "provider": provider,
+            "query": query,
+            "duration_ms": duration_ms,
+            "num_results": num_results,
+            "purpose": purpose,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_hit": cache_hit
+        }):
+            return
+        
         # Tính toán chi phí
         cost_usd = 0.0
         
+        if cache_hit:
+            logger.info(f"Search cache hit cho provider {provider}, không tính chi phí")
         # Nếu có thông tin token và provider là perplexity, tính chi phí dựa trên token
-        if provider == "perplexity" and input_tokens is not None and output_tokens is not None:
+        elif provider == "perplexity" and input_tokens is not None and output_tokens is not None:
             model = "llama-3.1-sonar-small-128k-online"  # Mô hình mặc định của Perplexity
             cost_usd = self._calculate_llm_cost(model, input_tokens, output_tokens)
             logger.info(f"Tính chi phí Perplexity dựa trên token: {input_tokens} input, {output_tokens} output, {cost_usd:.6f} USD")
@@ -254,6 +362,12 @@ class CostMonitoringService:
             cost_usd = self._calculate_search_cost(provider)
             logger.info(f"Tính chi phí search dựa trên cố định: {cost_usd:.6f} USD")
         
+        cost_usd *= cost_share
+        if input_tokens is not None:
+            input_tokens = self._share_tokens(input_tokens, cost_share)
+        if output_tokens is not None:
+            output_tokens = self._share_tokens(output_tokens, cost_share)
+        
         # Lấy monitoring data
         monitoring = await self.get_monitoring(task_id)
         
@@ -267,24 +381,18 @@ class CostMonitoringService:
             num_results=num_results,
             purpose=purpose,
             input_tokens=input_tokens,
-            output_tokens=output_tokens
+            output_tokens=output_tokens,
+            cache_hit=cache_hit,
+            coalesced=coalesced
         )
         
-        # Thêm vào danh sách
-        monitoring.search_requests.append(search_cost)
-        
-        # Cập nhật summary
-        self._update_summary(monitoring)
-        
-        # Lưu dữ liệu
-        self._save_cost_data(task_id)
+        # Thêm vào danh sách và cập nhật summary tăng dần
+        monitoring.add_search_cost(search_cost)
+        COST_USD.inc(cost_usd, kind="search", name=provider)
+        self._record_budget_spend((input_tokens or 0) + (output_tokens or 0), cost_usd)
         
-        # Cập nhật task.json
-        try:
-            summary = await self.get_summary(task_id)
-            asyncio.create_task(self._update_task_json(task_id, summary))
-        except Exception as e:
-            logger.error(f"Lỗi khi cập nhật task.json: {str(e)}")
+        # Ghi nối vào event log theo lô
+        self._record_event(task_id, "search", search_cost)
         
         logger.info(f"Đã ghi nhận Search request cho task {task_id}: {provider}, {cost_usd:.6f} USD")
 
@@ -293,8 +401,8 @@ class CostMonitoringService:
         monitoring = await self.get_monitoring(task_id)
         phase_id = monitoring.start_phase(phase_name)
         
-        # Lưu dữ liệu
-        self._save_cost_data(task_id)
+        # Ghi nối trạng thái mới của phase vào event log
+        self._record_event(task_id, "phase", self._find_timing(monitoring.phase_timings, "phase_name", phase_name))
         
         logger.info(f"Bắt đầu timing cho phase {phase_name} của task {task_id}")
         return phase_id
@@ -304,11 +412,13 @@ class CostMonitoringService:
         monitoring = await self.get_monitoring(task_id)
         monitoring.end_phase(phase_name, status)
         
-        # Lưu dữ liệu
-        self._save_cost_data(task_id)
-        
-        # Cập nhật task.json với thông tin chi phí mới nhất
-        asyncio.create_task(self._update_task_json(task_id, monitoring.summary))
+        # Kết thúc phase: ghi ngay event log và task.json
+        timing = self._find_timing(monitoring.phase_timings, "phase_name", phase_name)
+        if timing:
+            self._record_event(task_id, "phase", timing)
+            if timing.duration_seconds is not None:
+                PHASE_DURATION.observe(timing.duration_seconds, phase=phase_name, status=status)
+        await self.flush(task_id)
         
         logger.info(f"Kết thúc timing cho phase {phase_name} của task {task_id} với trạng thái {status}")
     
@@ -317,8 +427,8 @@ class CostMonitoringService:
         monitoring = await self.get_monitoring(task_id)
         section_id = monitoring.start_section(section_id, section_title)
         
-        # Lưu dữ liệu
-        self._save_cost_data(task_id)
+        # Ghi nối trạng thái mới của section vào event log
+        self._record_event(task_id, "section", self._find_timing(monitoring.section_timings, "section_id", section_id))
         
         logger.info(f"Bắt đầu timing cho section {section_title} của task {task_id}")
         return section_id
@@ -328,14 +438,23 @@ class CostMonitoringService:
         monitoring = await self.get_monitoring(task_id)
         monitoring.end_section(section_id, status)
         
-        # Lưu dữ liệu
-        self._save_cost_data(task_id)
-        
-        # Cập nhật task.json với thông tin chi phí mới nhất
-        self._update_task_json(task_id, monitoring.summary)
+        # Ghi nối trạng thái mới của section vào event log
+        timing = self._find_timing(monitoring.section_timings, "section_id", section_id)
+        if timing:
+            self._record_event(task_id, "section", timing)
+            if timing.duration_seconds is not None:
+                SECTION_DURATION.observe(timing.duration_seconds, status=status)
         
         logger.info(f"Kết thúc timing cho section {section_id} của task {task_id} với trạng thái {status}")
     
+    @staticmethod
+    def _find_timing(timings: List[Any], key: str, value: str) -> Optional[Any]:
+        """Tìm bản ghi timing theo phase_name / section_id"""
+        for timing in timings:
+            if getattr(timing, key) == value:
+                return timing
+        return None
+    
     async def get_summary(self, task_id: str) -> CostSummary:
         """
         Lấy tổng hợp chi phí cho một task
@@ -348,14 +467,36 @@ class CostMonitoringService:
         """
         monitoring = await self.get_monitoring(task_id)
         
-        # Cập nhật summary trước khi trả về
-        self._update_summary(monitoring)
+        # Summary được cập nhật tăng dần khi ghi nhận request, không cần tính lại
+        return monitoring.ensure_summary()
+    
+    async def recompute_summary(self, task_id: str) -> CostSummary:
+        """
+        Tính lại summary từ toàn bộ request và so sánh với summary tăng dần
+        
+        Dùng để kiểm tra tính nhất quán; nếu hai kết quả lệch nhau, summary tính lại được dùng.
+        
+        Args:
+            task_id: ID của task
+            
+        Returns:
+            CostSummary: Summary tính lại từ đầu
+        """
+        monitoring = await self.get_monitoring(task_id)
+        incremental = monitoring.summary
+        summary = monitoring.recompute_summary()
+        
+        if incremental is not None and not incremental.matches(summary):
+            logger.warning(f"Summary tăng dần của task {task_id} không khớp với summary tính lại, đã thay bằng summary tính lại")
         
-        return monitoring.summary
+        return summary
     
     def _save_cost_data(self, task_id: str) -> None:
         """
-        Lưu dữ liệu cost monitoring vào file
+        Đánh dấu dữ liệu cost monitoring của task cần được ghi
+        
+        Dữ liệu được ghi theo lô bởi WriteBehindPersistence (theo chu kỳ, khi vượt ngưỡng
+        số thay đổi, khi kết thúc phase hoặc khi shutdown).
         
         Args:
             task_id: ID của task
@@ -363,21 +504,127 @@ class CostMonitoringService:
         if not self.storage_service:
             logger.warning(f"Không thể lưu cost monitoring cho task {task_id}: storage_service chưa được cấu hình")
             return
+        self._persistence.mark_dirty(task_id)
+    
+    async def flush(self, task_id: Optional[str] = None) -> None:
+        """
+        Ghi ngay các thay đổi đang chờ xuống cost.json và task.json
+        
+        Args:
+            task_id: ID của task cần ghi, None để ghi mọi task đang có thay đổi
+        """
+        if task_id is None:
+            await self._persistence.flush_all()
+        else:
+            await self._persistence.flush(task_id)
+        # Task vừa được ghi không còn bị ghim, có thể loại nếu đang vượt giới hạn bộ nhớ
+        self._cost_data.evict_over_limit()
+    
+    async def materialize_monitoring(self, task_id: str) -> Optional[ResearchCostMonitoring]:
+        """
+        Ghi các event đang chờ, gộp event log vào snapshot cost.json và trả về monitoring đầy đủ
+        
+        Args:
+            task_id: ID của task
+            
+        Returns:
+            Optional[ResearchCostMonitoring]: Monitoring của task, None nếu task chưa có dữ liệu chi phí
+        """
+        event_log = self._get_event_log()
+        if event_log is None:
+            return await self.get_monitoring(task_id)
+        
+        await self.flush(task_id)
+        compacted = await event_log.compact(task_id)
+        monitoring = self._cost_data.get(task_id)
+        if monitoring is None and compacted is not None:
+            self._cost_data[task_id] = compacted
+            monitoring = compacted
+        return monitoring
+    
+    async def release_monitoring(self, task_id: str) -> bool:
+        """
+        Ghi toàn bộ thay đổi của task rồi loại monitoring khỏi bộ nhớ (gọi khi task hoàn thành)
+        
+        Monitoring được tải lại từ storage nếu task được truy cập lại sau đó.
+        
+        Args:
+            task_id: ID của task
             
+        Returns:
+            bool: True nếu monitoring đã được loại khỏi bộ nhớ
+        """
+        await self.flush(task_id)
+        released = self._cost_data.evict(task_id)
+        if released:
+            self._pending_events.pop(task_id, None)
+            self._persistence.forget(task_id)
+        return released
+    
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """Lấy số task và dung lượng ước lượng của cost monitoring đang giữ trong bộ nhớ"""
+        return self._cost_data.get_stats()
+    
+    async def shutdown(self) -> None:
+        """Dừng ghi nền và ghi toàn bộ thay đổi còn lại (gọi khi tắt ứng dụng)"""
+        await self._persistence.stop()
+    
+    def get_persistence_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê ghi theo lô"""
+        return self._persistence.get_stats()
+    
+    async def _flush_task_data(self, task_id: str) -> None:
+        """
+        Ghi cost.json (nguyên tử) và cập nhật cost_info trong task.json cho một task
+        
+        Args:
+            task_id: ID của task
+        """
+        monitoring = self._cost_data.get(task_id)
+        if not monitoring or not self.storage_service:
+            return
+        
+        event_log = self._get_event_log()
+        events = self._pending_events.pop(task_id, [])
         try:
-            # Lấy dữ liệu monitoring
-            monitoring = self._cost_data.get(task_id)
-            if not monitoring:
-                logger.warning(f"Không tìm thấy cost monitoring cho task {task_id}")
-                return
-                
-            # Lưu dữ liệu vào file - sử dụng đường dẫn tương đối
-            file_path = f"research_tasks/{task_id}/cost.json"
-            # Sử dụng phương thức save_data thay vì storage_service.save trực tiếp
-            self.storage_service.save_data(monitoring.dict(), file_path)
-            logger.info(f"Đã lưu dữ liệu vào file {file_path}")
+            if event_log is not None:
+                # Chỉ ghi nối các event mới; snapshot cost.json được tạo lại khi compact
+                await event_log.append(task_id, events)
+            else:
+                # Storage không phải file cục bộ: ghi toàn bộ snapshot
+                file_path = f"research_tasks/{task_id}/cost.json"
+                await self.storage_service.save(monitoring.dict(), file_path)
+                logger.info(f"Đã lưu dữ liệu vào file {file_path}")
+        except Exception:
+            self._pending_events[task_id] = events + self._pending_events.get(task_id, [])
+            raise
+        
+        await self._update_cost_index(task_id, monitoring, events)
+        await self._update_task_json(task_id, monitoring.ensure_summary())
+    
+    async def _update_cost_index(
+        self,
+        task_id: str,
+        monitoring: ResearchCostMonitoring,
+        events: List[Tuple[str, Dict[str, Any]]]
+    ) -> None:
+        """
+        Đưa các event vừa ghi vào chỉ mục chi phí tổng hợp
+        
+        Lỗi chỉ được ghi log: chỉ mục là dữ liệu dẫn xuất và có thể dựng lại bằng create_cost_json.py.
+        
+        Args:
+            task_id: ID của task
+            monitoring: Monitoring hiện tại của task
+            events: Các event vừa được ghi
+        """
+        try:
+            if self.cost_index is None:
+                self.cost_index = get_cost_index()
+            if self.cost_index is not None:
+                await self.cost_index.apply_events(task_id, monitoring, events)
         except Exception as e:
-            logger.error(f"Lỗi khi lưu cost monitoring: {str(e)}")
+            logger.error(f"Lỗi khi cập nhật chỉ mục chi phí cho task {task_id}: {str(e)}")
     
     def ensure_cost_data_exists(self, task_id: str) -> bool:
         """
@@ -431,19 +678,26 @@ class CostMonitoringService:
             
             # Cập nhật URL báo cáo vào task.json
             try:
-                task_path = f"research_tasks/{task_id}/task.json"
-                task_data = await self.load_data(task_path)
-                
-                # Đảm bảo có cost_info
-                if "cost_info" not in task_data:
-                    task_data["cost_info"] = {}
-                
-                # Cập nhật cost_report_url
-                task_data["cost_info"]["cost_report_url"] = github_url
-                task_data["updated_at"] = datetime.now().isoformat()
-                
-                # Lưu lại vào file
-                await self.save_data(task_path, task_data)
+                if hasattr(self.storage_service, 'base_dir'):
+                    await get_task_writer(self.storage_service.base_dir).merge(
+                        task_id,
+                        {"cost_info": {"cost_report_url": github_url}},
+                        sticky=True
+                    )
+                else:
+                    task_path = f"research_tasks/{task_id}/task.json"
+                    task_data = await self.load_data(task_path)
+                    
+                    # Đảm bảo có cost_info
+                    if not task_data.get("cost_info"):
+                        task_data["cost_info"] = {}
+                    
+                    # Cập nhật cost_report_url
+                    task_data["cost_info"]["cost_report_url"] = github_url
+                    task_data["updated_at"] = datetime.now().isoformat()
+                    
+                    # Lưu lại vào file
+                    await self.save_data(task_path, task_data)
                 
                 logger.info(f"Đã cập nhật cost_report_url trong task.json cho task {task_id}")
             except Exception as e:
@@ -455,9 +709,23 @@ class CostMonitoringService:
             logger.error(f"Lỗi khi đẩy cost report lên GitHub cho task {task_id}: {str(e)}")
             return None
     
+    @staticmethod
+    def _cache_hit_rates(summary: CostSummary) -> Dict[str, float]:
+        """Tính tỷ lệ cache hit của LLM và search từ summary"""
+        return {
+            "llm": round(summary.llm_cache_hits / summary.total_llm_requests, 4) if summary.total_llm_requests else 0.0,
+            "search": round(summary.search_cache_hits / summary.total_search_requests, 4) if summary.total_search_requests else 0.0
+        }
+    
+    @staticmethod
+    def _format_hit_rate(hits: int, requests: int) -> str:
+        """Định dạng tỷ lệ cache hit, ví dụ: '40.0% (2/5)'"""
+        rate = (hits / requests * 100) if requests else 0.0
+        return f"{rate:.1f}% ({hits:,}/{requests:,})"
+    
     def _generate_markdown_report(self, monitoring: ResearchCostMonitoring) -> str:
         """Tạo báo cáo markdown từ dữ liệu monitoring"""
-        summary = monitoring.summary
+        summary = monitoring.ensure_summary()
         
         # Định dạng timestamp
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -470,6 +738,9 @@ class CostMonitoringService:
 - **Search Cost**: ${summary.search_cost_usd:.6f} USD
 - **Total Tokens**: {summary.total_tokens:,} tokens ({summary.total_input_tokens:,} input, {summary.total_output_tokens:,} output)
 - **Total Requests**: {summary.total_llm_requests + summary.total_search_requests:,} ({summary.total_llm_requests:,} LLM, {summary.total_search_requests:,} Search)
+- **LLM Cache Hit Rate**: {self._format_hit_rate(summary.llm_cache_hits, summary.total_llm_requests)}
+- **Search Cache Hit Rate**: {self._format_hit_rate(summary.search_cache_hits, summary.total_search_requests)}
+- **Coalesced Requests**: {summary.coalesced_requests:,}
 - **Generated at**: {timestamp}
 
 ## Cost Breakdown by Model
@@ -483,12 +754,12 @@ class CostMonitoringService:
             report += f"| {model} | {data['requests']:,} | {data['input_tokens']:,} | {data['output_tokens']:,} | ${data['cost_usd']:.6f} |\n"
         
         report += "\n## Cost Breakdown by Search Provider\n\n"
-        report += "| Provider | Requests | Cost (USD) |\n"
-        report += "|----------|----------|------------|\n"
+        report += "| Provider | Requests | Cache Hits | Cost (USD) |\n"
+        report += "|----------|----------|------------|------------|\n"
         
         # Thêm dữ liệu cho từng provider
         for provider, data in summary.provider_breakdown.items():
-            report += f"| {provider} | {data['requests']:,} | ${data['cost_usd']:.6f} |\n"
+            report += f"| {provider} | {data['requests']:,} | {data.get('cache_hits', 0):,} | ${data['cost_usd']:.6f} |\n"
         
         # Thêm thông tin về timing
         report += "\n## Phase Timing\n\n"
@@ -514,6 +785,9 @@ class CostMonitoringService:
         """
         Cập nhật thông tin chi phí vào file task.json
         
+        Với storage dạng file, cost summary được gộp qua writer task.json tuần tự của task
+        (dùng chung với save_task của các route) thay vì đọc-sửa-ghi trực tiếp.
+        
         Args:
             task_id: ID của task
             summary: Tổng hợp chi phí
@@ -525,19 +799,31 @@ class CostMonitoringService:
         if not self.storage_service:
             logger.warning(f"Không thể cập nhật task.json cho task {task_id}: storage_service chưa được cấu hình")
             return
-            
+        
+        cost_fields = {
+            "total_cost_usd": summary.total_cost_usd,
+            "llm_cost_usd": summary.llm_cost_usd,
+            "search_cost_usd": summary.search_cost_usd,
+            "total_tokens": summary.total_tokens,
+            "total_requests": summary.total_llm_requests + summary.total_search_requests,
+            "cache_hit_rate": self._cache_hit_rates(summary)
+        }
+        task_file_path = f"research_tasks/{task_id}/task.json"
+        
         try:
-            # Đọc file task.json
-            task_file_path = f"research_tasks/{task_id}/task.json"
-            task_data = None
+            if hasattr(self.storage_service, 'base_dir'):
+                written = await get_task_writer(self.storage_service.base_dir).merge(
+                    task_id, {"cost_info": cost_fields}, sticky=True
+                )
+                if not written:
+                    logger.warning(f"Chưa có task.json cho task {task_id}, cost summary sẽ được ghi cùng lần lưu task tiếp theo")
+                    return
+                logger.info(f"Đã cập nhật thông tin chi phí vào task.json cho task {task_id}")
+                return
             
+            # Storage không phải file: đọc-sửa-ghi toàn bộ task.json
             try:
-                # Kiểm tra xem storage_service có phương thức load_data không
-                if hasattr(self.storage_service, 'load_data'):
-                    task_data = self.storage_service.load_data(task_file_path)
-                else:
-                    # Sử dụng phương thức load nếu load_data không tồn tại
-                    task_data = await self.storage_service.load(task_file_path)
+                task_data = await self.storage_service.load(task_file_path)
                 logger.info(f"Đã đọc dữ liệu từ file: {task_file_path}")
             except Exception as e:
                 logger.error(f"Lỗi khi đọc file task.json: {str(e)}")
@@ -547,28 +833,12 @@ class CostMonitoringService:
                 logger.error(f"Không tìm thấy dữ liệu trong file task.json cho task {task_id}")
                 return
                 
-            # Cập nhật thông tin chi phí
-            if "cost_info" not in task_data:
-                task_data["cost_info"] = {}
-                
             # Kiểm tra task_data["cost_info"] không phải None trước khi cập nhật
-            if task_data["cost_info"] is None:
+            if task_data.get("cost_info") is None:
                 task_data["cost_info"] = {}
-                
-            # Cập nhật thông tin chi phí
-            task_data["cost_info"]["total_cost_usd"] = summary.total_cost_usd
-            task_data["cost_info"]["llm_cost_usd"] = summary.llm_cost_usd
-            task_data["cost_info"]["search_cost_usd"] = summary.search_cost_usd
-            task_data["cost_info"]["total_tokens"] = summary.total_tokens
-            task_data["cost_info"]["total_requests"] = summary.total_llm_requests + summary.total_search_requests
-            
-            # Lưu lại file task.json
-            # Kiểm tra xem storage_service có phương thức save_data không
-            if hasattr(self.storage_service, 'save_data'):
-                await self.storage_service.save_data(task_data, task_file_path)
-            else:
-                # Sử dụng phương thức save nếu save_data không tồn tại
-                await self.storage_service.save(task_data, task_file_path)
+            task_data["cost_info"].update(cost_fields)
+            
+            await self.storage_service.save(task_data, task_file_path)
             logger.info(f"Đã lưu dữ liệu vào file: {task_file_path}")
             logger.info(f"Đã cập nhật thông tin chi phí vào task.json cho task {task_id}")
             
@@ -584,23 +854,15 @@ class CostMonitoringService:
 
     async def save_data(self, file_path: str, data: Any) -> None:
         """
-        Phương thức đồng bộ để lưu dữ liệu vào file
+        Lưu dữ liệu JSON vào file trên thread pool I/O
         
         Args:
             file_path: Đường dẫn file
             data: Dữ liệu cần lưu
         """
-        import asyncio
-        import json
-        import os
-        
         try:
-            # Đảm bảo thư mục tồn tại
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # Lưu trực tiếp vào file thay vì gọi storage_service
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, default=self._json_serializer)
+            # Serialize và ghi trên thread pool I/O, không chặn event loop
+            await get_file_io().write_json(file_path, data, default=self._json_serializer)
             
             logger.info(f"Đã lưu dữ liệu vào file {file_path}")
         except Exception as e:
@@ -609,7 +871,7 @@ class CostMonitoringService:
 
     async def load_data(self, file_path: str) -> Any:
         """
-        Phương thức đồng bộ để đọc dữ liệu từ file
+        Đọc dữ liệu JSON từ file trên thread pool I/O
         
         Args:
             file_path: Đường dẫn file
@@ -617,17 +879,9 @@ class CostMonitoringService:
         Returns:
             Any: Dữ liệu đã đọc
         """
-        import json
-        import os
-        
         try:
-            # Kiểm tra file tồn tại
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"File không tồn tại: {file_path}")
-            
-            # Đọc trực tiếp từ file thay vì gọi storage_service
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # Đọc trên thread pool I/O, không chặn event loop
+            data = await get_file_io().read_json(file_path)
             
             logger.info(f"Đã đọc dữ liệu từ file {file_path}")
             return data
@@ -666,102 +920,15 @@ class CostMonitoringService:
             if not monitoring:
                 return False
             
-            # Cập nhật summary trước khi lưu
-            summary = self._update_summary(monitoring)
-                
-            # Lưu dữ liệu vào file
+            # Ghi ngay cost.json và task.json
             self._save_cost_data(task_id)
-            
-            # Cập nhật task.json
-            await self._update_task_json(task_id, summary)
+            await self.flush(task_id)
             
             return True
         except Exception as e:
             logger.error(f"Lỗi khi lưu dữ liệu monitoring: {str(e)}")
             return False
 
-    def _update_summary(self, monitoring: ResearchCostMonitoring) -> CostSummary:
-        """
-        Cập nhật summary cho monitoring
-        
-        Args:
-            monitoring: Đối tượng ResearchCostMonitoring
-            
-        Returns:
-            CostSummary: Đối tượng CostSummary đã cập nhật
-        """
-        # Tạo summary nếu chưa có
-        if not monitoring.summary:
-            monitoring.summary = CostSummary()
-        
-        # Reset summary data
-        summary = monitoring.summary
-        summary.total_cost_usd = 0.0
-        summary.llm_cost_usd = 0.0
-        summary.search_cost_usd = 0.0
-        summary.total_tokens = 0
-        summary.total_input_tokens = 0
-        summary.total_output_tokens = 0
-        summary.total_llm_requests = 0
-        summary.total_search_requests = 0
-        summary.model_breakdown = {}
-        summary.provider_breakdown = {}
-        summary.last_updated = datetime.now().isoformat()
-        
-        # Tính tổng chi phí và token từ LLM requests
-        for req in monitoring.llm_requests:
-            summary.llm_cost_usd += req.cost_usd
-            summary.total_cost_usd += req.cost_usd
-            summary.total_input_tokens += req.input_tokens
-            summary.total_output_tokens += req.output_tokens
-            summary.total_tokens += req.input_tokens + req.output_tokens
-            summary.total_llm_requests += 1
-            
-            # Cập nhật breakdown theo model
-            if req.model not in summary.model_breakdown:
-                summary.model_breakdown[req.model] = {
-                    "cost_usd": 0.0,
-                    "requests": 0,
-                    "input_tokens": 0,
-                    "output_tokens": 0
-                }
-            
-            model_data = summary.model_breakdown[req.model]
-            model_data["cost_usd"] += req.cost_usd
-            model_data["requests"] += 1
-            model_data["input_tokens"] += req.input_tokens
-            model_data["output_tokens"] += req.output_tokens
-        
-        # Tính tổng chi phí từ Search requests
-        for req in monitoring.search_requests:
-            summary.search_cost_usd += req.cost_usd
-            summary.total_cost_usd += req.cost_usd
-            summary.total_search_requests += 1
-            
-            # Cập nhật breakdown theo provider
-            if req.provider not in summary.provider_breakdown:
-                summary.provider_breakdown[req.provider] = {
-                    "cost_usd": 0.0,
-                    "requests": 0,
-                    "input_tokens": 0,
-                    "output_tokens": 0
-                }
-            
-            provider_data = summary.provider_breakdown[req.provider]
-            provider_data["cost_usd"] += req.cost_usd
-            provider_data["requests"] += 1
-            
-            # Nếu có thông tin token cho search request (Perplexity), cập nhật tổng token
-            if hasattr(req, 'input_tokens') and hasattr(req, 'output_tokens') and req.input_tokens and req.output_tokens:
-                summary.total_input_tokens += req.input_tokens
-                summary.total_output_tokens += req.output_tokens
-                summary.total_tokens += req.input_tokens + req.output_tokens
-                
-                provider_data["input_tokens"] += req.input_tokens
-                provider_data["output_tokens"] += req.output_tokens
-        
-        return summary
-        
     async def get_cost_summary(self, task_id: str) -> ResearchCostInfo:
         """Lấy tổng hợp chi phí cho một task"""
         try:
@@ -771,9 +938,7 @@ class CostMonitoringService:
                 monitoring = self.initialize_monitoring(task_id)
             
             # Cập nhật summary
-            summary = monitoring.summary
-            if not summary:
-                summary = monitoring._update_summary()
+            summary = monitoring.ensure_summary()
             
             # Chuyển đổi sang ResearchCostInfo
             cost_info = ResearchCostInfo(
@@ -783,6 +948,7 @@ class CostMonitoringService:
                 total_tokens=summary.total_tokens,
                 total_requests=summary.total_llm_requests + summary.total_search_requests,
                 model_breakdown=summary.model_breakdown,
+                cache_hit_rate=self._cache_hit_rates(summary),
                 execution_time_seconds={
                     timing.phase_name: timing.duration_seconds 
                     for timing in monitoring.phase_timings 
@@ -805,4 +971,7 @@ async def get_cost_service(storage_service=None):
     global cost_service
     if not cost_service:
         cost_service = CostMonitoringService(storage_service)
+    elif storage_service is not None and cost_service.storage_service is None:
+        # Singleton có thể đã được tạo trước (không có storage) bởi LLM/search service
+        cost_service.storage_service = storage_service
     return cost_service 
\ No newline at end of file
@@ -0,0 +1,214 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.logging import get_logger
+from app.services.core.storage.file_io import get_file_io
+from app.models.cost import (
+    LLMCost,
+    PhaseTimingInfo,
+    ResearchCostMonitoring,
+    SearchCost,
+    SectionTimingInfo
+)
+
+logger = get_logger(__name__)
+
+# Loại event trong log và model tương ứng
+EVENT_MODELS = {
+    "llm": LLMCost,
+    "search": SearchCost,
+    "phase": PhaseTimingInfo,
+    "section": SectionTimingInfo
+}
+
+# Khóa trong snapshot cost.json lưu vị trí (byte) của event log đã được gộp vào snapshot
+SNAPSHOT_OFFSET_KEY = "event_log_offset"
+
+
+def apply_event(monitoring: ResearchCostMonitoring, event_type: str, data: Dict[str, Any]) -> None:
+    """
+    Áp dụng một event vào monitoring
+
+    LLM/Search event được thêm vào danh sách (summary cập nhật tăng dần); phase/section event
+    là trạng thái mới nhất của timing và ghi đè bản ghi cùng phase_name / section_id.
+
+    Args:
+        monitoring: Monitoring cần cập nhật
+        event_type: Loại event ("llm", "search", "phase", "section")
+        data: Dữ liệu của event
+    """
+    if event_type == "llm":
+        monitoring.add_llm_cost(LLMCost.parse_obj(data))
+    elif event_type == "search":
+        monitoring.add_search_cost(SearchCost.parse_obj(data))
+    elif event_type == "phase":
+        _upsert(monitoring.phase_timings, PhaseTimingInfo.parse_obj(data), "phase_name")
+    elif event_type == "section":
+        _upsert(monitoring.section_timings, SectionTimingInfo.parse_obj(data), "section_id")
+    else:
+        logger.warning(f"Bỏ qua event không hỗ trợ: {event_type}")
+
+
+def _upsert(records: List[Any], record: Any, key: str) -> None:
+    for i, existing in enumerate(records):
+        if getattr(existing, key) == getattr(record, key):
+            records[i] = record
+            return
+    records.append(record)
+
+
+class CostEventLog:
+    """
+    Event log chỉ ghi nối (JSONL) cho chi phí và timing của từng task
+
+    Mỗi event là một dòng {"type": ..., "data": ...} trong research_tasks/{task_id}/cost_events.jsonl,
+    nên chi phí ghi mỗi event chỉ tỉ lệ với kích thước event. Snapshot cost.json chỉ được
+    tạo lại khi compact (khi cần đọc toàn bộ dữ liệu), kèm vị trí log đã được gộp.
+    """
+
+    def __init__(self, base_dir: str):
+        """
+        Args:
+            base_dir: Thư mục gốc của storage (chứa research_tasks/)
+        """
+        self.base_dir = str(base_dir)
+
+    def log_path(self, task_id: str) -> str:
+        return os.path.join(self.base_dir, "research_tasks", task_id, "cost_events.jsonl")
+
+    def snapshot_path(self, task_id: str) -> str:
+        return os.path.join(self.base_dir, "research_tasks", task_id, "cost.json")
+
+    async def append(self, task_id: str, events: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Ghi nối các event vào cuối log
+
+        Args:
+            task_id: ID của task
+            events: Danh sách (loại event, dữ liệu)
+
+        Returns:
+            int: Số byte đã ghi
+        """
+        if not events:
+            return 0
+        payload = "".join(
+            json.dumps({"type": event_type, "data": data}, ensure_ascii=False, default=str) + "\n"
+            for event_type, data in events
+        ).encode("utf-8")
+        path = self.log_path(task_id)
+
+        def _append() -> None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a+b") as f:
+                self._truncate_partial_line(task_id, f)
+                f.write(payload)
+                get_file_io().mark_written(path, f)
+
+        await get_file_io().run(_append, path=path, op="cost_events")
+        return len(payload)
+
+    async def materialize(self, task_id: str) -> Tuple[Optional[ResearchCostMonitoring], int]:
+        """
+        Dựng ResearchCostMonitoring từ snapshot gần nhất và các event sau snapshot
+
+        Args:
+            task_id: ID của task
+
+        Returns:
+            Tuple[Optional[ResearchCostMonitoring], int]: Monitoring (None nếu task chưa có dữ liệu)
+            và vị trí cuối log đã được áp dụng
+        """
+        file_io = get_file_io()
+        snapshot, offset = await file_io.run(
+            self._read_snapshot, task_id, path=self.snapshot_path(task_id), op="read_json"
+        )
+        events, end_offset = await file_io.run(
+            self._read_events, task_id, offset, path=self.log_path(task_id), op="cost_events"
+        )
+        if snapshot is None and not events:
+            return None, end_offset
+
+        if snapshot is None:
+            monitoring = ResearchCostMonitoring(task_id=task_id)
+        else:
+            monitoring = ResearchCostMonitoring.parse_obj(snapshot)
+        monitoring.recompute_summary()
+        for event_type, data in events:
+            apply_event(monitoring, event_type, data)
+        return monitoring, end_offset
+
+    async def compact(self, task_id: str) -> Optional[ResearchCostMonitoring]:
+        """
+        Gộp các event mới vào snapshot cost.json (ghi nguyên tử)
+
+        Args:
+            task_id: ID của task
+
+        Returns:
+            Optional[ResearchCostMonitoring]: Monitoring sau khi gộp, None nếu task chưa có dữ liệu
+        """
+        monitoring, offset = await self.materialize(task_id)
+        if monitoring is None:
+            return None
+        data = monitoring.dict()
+        data[SNAPSHOT_OFFSET_KEY] = offset
+        await get_file_io().run(self._write_snapshot, task_id, data, path=self.snapshot_path(task_id), op="write_json")
+        logger.info(f"Đã compact cost event log của task {task_id} (offset {offset})")
+        return monitoring
+
+    def _truncate_partial_line(self, task_id: str, f) -> None:
+        # Dòng cuối bị ghi dở (crash giữa lúc ghi) được cắt bỏ trước khi ghi nối, nếu không event
+        # mới sẽ nối vào dòng dở thành một dòng JSON không hợp lệ và bị bỏ qua khi đọc
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            chunk = f.read(end - start)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        f.truncate(end)
+        logger.warning(f"Đã cắt {size - end} byte ghi dở ở cuối cost event log của task {task_id}")
+
+    def _read_snapshot(self, task_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        path = self.snapshot_path(task_id)
+        if not os.path.exists(path):
+            return None, 0
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # Snapshot cũ (trước khi có event log) không có offset: mọi event trong log đều mới hơn
+        offset = data.pop(SNAPSHOT_OFFSET_KEY, 0) or 0
+        return data, int(offset)
+
+    def _read_events(self, task_id: str, offset: int) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+        path = self.log_path(task_id)
+        if not os.path.exists(path):
+            return [], offset
+        events = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                # Dòng cuối bị ghi dở (ví dụ do crash) được bỏ qua và đọc lại ở lần sau
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    event = json.loads(line)
+                    events.append((event["type"], event["data"]))
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Bỏ qua event không hợp lệ trong log của task {task_id}: {str(e)}")
+        return events, offset
+
+    def _write_snapshot(self, task_id: str, data: Dict[str, Any]) -> None:
+        path = self.snapshot_path(task_id)
+        get_file_io().atomic_write(path, lambda f: json.dump(data, f, ensure_ascii=False, indent=2, default=str))
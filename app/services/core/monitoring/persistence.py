@@ -0,0 +1,145 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class WriteBehindPersistence:
+    """
+    Ghi dữ liệu theo lô (write-behind): gộp các task bị thay đổi và chỉ ghi xuống storage
+    theo chu kỳ hoặc khi số thay đổi chờ ghi vượt ngưỡng
+
+    Mỗi lần đánh dấu dirty chỉ ghi nhận task_id; dữ liệu được serialize ở thời điểm flush
+    nên nhiều thay đổi liên tiếp của một task chỉ tạo ra một lần ghi.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[str], Awaitable[None]],
+        interval_seconds: float = 2.0,
+        max_pending_updates: int = 100
+    ):
+        """
+        Args:
+            flush_fn: Hàm ghi dữ liệu của một task xuống storage
+            interval_seconds: Chu kỳ flush nền (giây)
+            max_pending_updates: Số thay đổi chờ ghi tối đa trước khi flush ngay
+        """
+        self.flush_fn = flush_fn
+        self.interval_seconds = interval_seconds
+        self.max_pending_updates = max(1, max_pending_updates)
+        # task_id -> số thay đổi chưa được ghi
+        self._dirty: "OrderedDict[str, int]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._threshold_flush: Optional[asyncio.Task] = None
+        self.updates = 0
+        self.writes = 0
+        self.errors = 0
+
+    def mark_dirty(self, task_id: str) -> None:
+        """
+        Đánh dấu task cần được ghi lại
+
+        Args:
+            task_id: ID của task
+        """
+        self._dirty[task_id] = self._dirty.get(task_id, 0) + 1
+        self.updates += 1
+        self._ensure_flusher()
+
+        if self.pending_updates >= self.max_pending_updates:
+            loop = self._running_loop()
+            if loop and (self._threshold_flush is None or self._threshold_flush.done()):
+                self._threshold_flush = loop.create_task(self.flush_all())
+
+    @property
+    def pending_updates(self) -> int:
+        """Tổng số thay đổi chưa được ghi"""
+        return sum(self._dirty.values())
+
+    def is_dirty(self, task_id: str) -> bool:
+        """Task có thay đổi chưa được ghi hay không"""
+        return task_id in self._dirty
+
+    def is_busy(self, task_id: str) -> bool:
+        """Task có thay đổi chưa được ghi hoặc đang được ghi hay không"""
+        lock = self._locks.get(task_id)
+        return task_id in self._dirty or (lock is not None and lock.locked())
+    
+    def forget(self, task_id: str) -> None:
+        """Bỏ trạng thái của task không còn được theo dõi (ví dụ khi bị loại khỏi bộ nhớ)"""
+        lock = self._locks.get(task_id)
+        if task_id not in self._dirty and lock is not None and not lock.locked():
+            del self._locks[task_id]
+    
+    async def flush(self, task_id: str, force: bool = False) -> None:
+        """
+        Ghi dữ liệu của một task nếu có thay đổi
+
+        Args:
+            task_id: ID của task
+            force: Ghi kể cả khi task không có thay đổi chờ ghi
+        """
+        lock = self._locks.setdefault(task_id, asyncio.Lock())
+        async with lock:
+            # Lấy task ra trước khi ghi: thay đổi xảy ra trong lúc ghi sẽ đánh dấu dirty lại
+            if self._dirty.pop(task_id, None) is None and not force:
+                return
+            try:
+                await self.flush_fn(task_id)
+                self.writes += 1
+            except Exception as e:
+                self.errors += 1
+                self._dirty[task_id] = self._dirty.get(task_id, 0) + 1
+                logger.error(f"Lỗi khi ghi dữ liệu của task {task_id}, sẽ thử lại ở lần flush sau: {str(e)}")
+
+    async def flush_all(self) -> None:
+        """Ghi dữ liệu của mọi task đang có thay đổi"""
+        for task_id in list(self._dirty.keys()):
+            await self.flush(task_id)
+
+    async def stop(self) -> None:
+        """Dừng flush nền và ghi toàn bộ thay đổi còn lại"""
+        if self._flusher is not None and not self._flusher.done():
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+        self._flusher = None
+        await self.flush_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê số thay đổi đã gộp và số lần ghi thực tế"""
+        return {
+            "dirty_tasks": len(self._dirty),
+            "pending_updates": self.pending_updates,
+            "updates": self.updates,
+            "writes": self.writes,
+            "errors": self.errors
+        }
+
+    @staticmethod
+    def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    def _ensure_flusher(self) -> None:
+        """Khởi động vòng flush nền trên event loop hiện tại (tạo lại nếu loop đã đổi)"""
+        loop = self._running_loop()
+        if loop is None:
+            return
+        if self._flusher is not None and not self._flusher.done() and self._flusher.get_loop() is loop:
+            return
+        self._flusher = loop.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.flush_all()
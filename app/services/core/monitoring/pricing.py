@@ -0,0 +1,450 @@
+import bisect
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Bảng giá đi kèm mã nguồn, dùng khi PRICING_FILE để trống
+DEFAULT_PRICING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pricing.json")
+
+# Giá theo token cũ trong cấu hình (USD/token), áp cho mọi model của provider khi được đặt trong môi trường
+_ENV_PRICE_OVERRIDES = {
+    "openai": ("OPENAI_COST_PROMPT_TOKEN", "OPENAI_COST_COMPLETION_TOKEN"),
+    "anthropic": ("CLAUDE_COST_PROMPT_TOKEN", "CLAUDE_COST_COMPLETION_TOKEN"),
+    "perplexity": ("PERPLEXITY_COST_PROMPT_TOKEN", "PERPLEXITY_COST_COMPLETION_TOKEN"),
+}
+
+# Sau tên model trong bảng giá chỉ được là hết chuỗi hoặc phần hậu tố phiên bản
+# (gpt-4o-2024-08-06, claude-3-5-sonnet@20240620, ...), để "gpt-4" không khớp "gpt-4o"
+_PREFIX_BOUNDARY = r"(?=$|[-@:])"
+
+# Giới hạn số tên model đã phân giải được giữ lại
+_MAX_RESOLVED_NAMES = 4096
+
+_UNRESOLVED = object()
+
+
+def _parse_effective_from(value: Optional[str]) -> float:
+    """Chuyển ngày hiệu lực (YYYY-MM-DD hoặc ISO 8601, UTC) sang epoch; để trống là hiệu lực từ đầu"""
+    if not value:
+        return float("-inf")
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _format_effective_from(value: float) -> Optional[str]:
+    if value == float("-inf"):
+        return None
+    return datetime.fromtimestamp(value, tz=timezone.utc).isoformat()
+
+
+class _PriceSchedule:
+    """Các phiên bản giá của một model/provider, sắp xếp theo ngày hiệu lực"""
+
+    __slots__ = ("starts", "prices")
+
+    def __init__(self, versions: List[Tuple[float, Any]]):
+        versions = sorted(versions, key=lambda version: version[0])
+        self.starts = [start for start, _ in versions]
+        self.prices = [price for _, price in versions]
+
+    def lookup(self, at: float) -> Tuple[Optional[Any], float, float]:
+        """
+        Tìm giá hiệu lực tại thời điểm at
+
+        Returns:
+            tuple: (giá hoặc None nếu chưa có phiên bản nào hiệu lực, bắt đầu hiệu lực, hết hiệu lực)
+        """
+        index = bisect.bisect_right(self.starts, at) - 1
+        valid_until = self.starts[index + 1] if index + 1 < len(self.starts) else float("inf")
+        if index < 0:
+            return None, float("-inf"), valid_until
+        return self.prices[index], self.starts[index], valid_until
+
+
+class _PricingTable:
+    """Bảng giá đã biên dịch từ một phiên bản của file dữ liệu, không thay đổi sau khi tạo"""
+
+    def __init__(
+        self,
+        data: Dict[str, Any],
+        model_overrides: Optional[Dict[str, Dict[str, float]]] = None,
+        search_overrides: Optional[Dict[str, float]] = None
+    ):
+        self.version = str(data.get("version", "unknown"))
+        self.providers: Dict[str, Optional[str]] = {}
+        self.aliases: Dict[str, List[str]] = {}
+        self.models: Dict[str, _PriceSchedule] = {}
+        self.search: Dict[str, _PriceSchedule] = {}
+
+        for name, entry in (data.get("models") or {}).items():
+            name = name.strip().lower()
+            versions = [
+                (_parse_effective_from(price.get("effective_from")), (float(price["input"]), float(price["output"])))
+                for price in entry.get("prices", [])
+            ]
+            if not versions:
+                raise ValueError(f"Model {name} không có giá")
+            self.models[name] = _PriceSchedule(versions)
+            self.providers[name] = entry.get("provider")
+            self.aliases[name] = [alias.strip().lower() for alias in entry.get("aliases", [])]
+
+        for provider, entry in (data.get("search") or {}).items():
+            versions = [
+                (_parse_effective_from(price.get("effective_from")), float(price["request"]))
+                for price in entry.get("prices", [])
+            ]
+            if not versions:
+                raise ValueError(f"Search provider {provider} không có giá")
+            self.search[provider.strip().lower()] = _PriceSchedule(versions)
+
+        self._apply_env_overrides()
+        for name, price in (model_overrides or {}).items():
+            name = name.strip().lower()
+            self.models[name] = _PriceSchedule([(float("-inf"), (float(price["input"]), float(price["output"])))])
+            self.providers.setdefault(name, None)
+            self.aliases.setdefault(name, [])
+        for provider, price in (search_overrides or {}).items():
+            self.search[provider.strip().lower()] = _PriceSchedule([(float("-inf"), float(price))])
+
+        # Tên và alias trỏ về tên chuẩn; regex khớp tiền tố dài nhất được biên dịch một lần cho cả bảng
+        self.names: Dict[str, str] = {}
+        for name, aliases in self.aliases.items():
+            for alias in aliases:
+                self.names.setdefault(alias, name)
+        for name in self.models:
+            self.names[name] = name
+        alternatives = "|".join(re.escape(name) for name in sorted(self.names, key=len, reverse=True))
+        self.pattern = re.compile(f"^(?:{alternatives}){_PREFIX_BOUNDARY}") if alternatives else None
+
+    def _apply_env_overrides(self) -> None:
+        """Áp giá theo token trong biến môi trường (nếu được đặt) cho mọi model của provider"""
+        settings = get_settings()
+        fields_set = getattr(settings, "model_fields_set", set())
+        for provider, (input_field, output_field) in _ENV_PRICE_OVERRIDES.items():
+            if input_field not in fields_set and output_field not in fields_set:
+                continue
+            # Giá/token trong cấu hình được chuyển sang giá/1000 token
+            price = (float(getattr(settings, input_field)) * 1000, float(getattr(settings, output_field)) * 1000)
+            models = [name for name, owner in self.providers.items() if owner == provider]
+            for name in models:
+                self.models[name] = _PriceSchedule([(float("-inf"), price)])
+            logger.info(f"Áp giá {provider} từ biến môi trường cho {len(models)} model: {price[0]}/1000 input tokens, {price[1]}/1000 output tokens")
+
+    def resolve(self, model: str) -> Optional[str]:
+        """Tên chuẩn trong bảng giá của một tên model (alias hoặc tên có hậu tố phiên bản)"""
+        name = model.strip().lower()
+        canonical = self.names.get(name)
+        if canonical is None and self.pattern is not None:
+            match = self.pattern.match(name)
+            if match:
+                canonical = self.names[match.group(0)]
+        return canonical
+
+    def describe(self) -> Dict[str, Any]:
+        """Bảng giá dạng dict (dùng cho API)"""
+        return {
+            "version": self.version,
+            "models": {
+                name: {
+                    "provider": self.providers.get(name),
+                    "aliases": self.aliases.get(name, []),
+                    "prices": [
+                        {"effective_from": _format_effective_from(start), "input": price[0], "output": price[1]}
+                        for start, price in zip(schedule.starts, schedule.prices)
+                    ]
+                }
+                for name, schedule in self.models.items()
+            },
+            "search": {
+                provider: {
+                    "prices": [
+                        {"effective_from": _format_effective_from(start), "request": price}
+                        for start, price in zip(schedule.starts, schedule.prices)
+                    ]
+                }
+                for provider, schedule in self.search.items()
+            }
+        }
+
+
+class PricingRegistry:
+    """
+    Bảng giá model/search nạp từ file dữ liệu JSON, có phiên bản theo ngày hiệu lực
+
+    Tên model được khớp chính xác, theo alias hoặc theo tiền tố dài nhất (ví dụ
+    "claude-3-haiku-20240307" dùng giá "claude-3-haiku"). Kết quả phân giải tên và giá đang
+    hiệu lực được giữ lại nên mỗi lần tính chi phí chỉ là vài lần tra dict. File được kiểm tra
+    thay đổi (mtime) tối đa mỗi reload_interval_seconds và nạp lại mà không cần khởi động lại;
+    file lỗi không thay thế bảng giá đang dùng.
+    """
+
+    def __init__(self, path: Optional[str] = None, reload_interval_seconds: float = 30.0):
+        """
+        Args:
+            path: Đường dẫn file bảng giá, mặc định là bảng giá đi kèm mã nguồn
+            reload_interval_seconds: Chu kỳ kiểm tra file thay đổi (0 = không tự nạp lại)
+        """
+        self.path = path or DEFAULT_PRICING_FILE
+        self.reload_interval_seconds = max(0.0, reload_interval_seconds)
+        # Giá đặt lúc chạy qua update_model_pricing/update_search_pricing, giữ qua các lần nạp lại
+        self._model_overrides: Dict[str, Dict[str, float]] = {}
+        self._search_overrides: Dict[str, float] = {}
+        self._table: Optional[_PricingTable] = None
+        self._file_signature: Optional[Tuple[float, int]] = None
+        self._next_check = 0.0
+        self._loaded_at: Optional[str] = None
+        self._resolved: Dict[str, Any] = {}
+        # Giá đang hiệu lực theo tên chuẩn: (giá, bắt đầu hiệu lực, hết hiệu lực)
+        self._current: Dict[str, Tuple[Optional[Any], float, float]] = {}
+        self._current_search: Dict[str, Tuple[Optional[Any], float, float]] = {}
+        self._warned: set = set()
+        self._stats = {"reloads": 0, "reload_errors": 0, "unknown_models": 0}
+        self.reload(force=True)
+
+    def _read_signature(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Nạp lại file bảng giá nếu file đã thay đổi
+
+        Args:
+            force: Nạp lại kể cả khi file không đổi (ví dụ sau khi đổi giá lúc chạy)
+
+        Returns:
+            bool: True nếu bảng giá đã được thay thế
+        """
+        signature = self._read_signature()
+        if not force and signature == self._file_signature:
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            table = _PricingTable(data, self._model_overrides, self._search_overrides)
+        except Exception as e:
+            self._stats["reload_errors"] += 1
+            # Không kiểm tra lại file lỗi cho tới khi nó thay đổi
+            self._file_signature = signature
+            if self._table is None:
+                logger.error(f"Không thể nạp bảng giá từ {self.path}: {str(e)}, dùng bảng giá rỗng")
+                self._install(_PricingTable({}, self._model_overrides, self._search_overrides))
+            else:
+                logger.error(f"Không thể nạp lại bảng giá từ {self.path}: {str(e)}, giữ phiên bản {self._table.version}")
+            return False
+
+        previous = self._table.version if self._table is not None else None
+        self._file_signature = signature
+        self._install(table)
+        self._stats["reloads"] += 1
+        if previous is not None:
+            logger.info(f"Đã nạp lại bảng giá {self.path}: phiên bản {previous} -> {table.version}")
+        return True
+
+    def _install(self, table: _PricingTable) -> None:
+        """Thay bảng giá và xóa kết quả phân giải/giá đã giữ của bảng cũ"""
+        self._table = table
+        self._resolved = {}
+        self._current = {}
+        self._current_search = {}
+        self._warned = set()
+        self._loaded_at = datetime.now(timezone.utc).isoformat()
+
+    def _maybe_reload(self) -> _PricingTable:
+        """Kiểm tra file thay đổi khi đã tới chu kỳ, trả về bảng giá hiện tại"""
+        if self.reload_interval_seconds:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.reload_interval_seconds
+                self.reload()
+        return self._table
+
+    def resolve_model(self, model: str) -> Optional[str]:
+        """
+        Tên chuẩn trong bảng giá của một model
+
+        Args:
+            model: Tên model (có thể là alias hoặc có hậu tố phiên bản/ngày)
+
+        Returns:
+            Optional[str]: Tên chuẩn, None nếu không có giá
+        """
+        table = self._maybe_reload()
+        canonical = self._resolved.get(model, _UNRESOLVED)
+        if canonical is _UNRESOLVED:
+            canonical = table.resolve(model) if model else None
+            if len(self._resolved) >= _MAX_RESOLVED_NAMES:
+                self._resolved.clear()
+            self._resolved[model] = canonical
+        return canonical
+
+    def get_model_price(self, model: str, at: Optional[float] = None) -> Optional[Tuple[float, float]]:
+        """
+        Giá input/output (USD/1000 token) của một model
+
+        Args:
+            model: Tên model
+            at: Thời điểm (epoch giây), mặc định là hiện tại
+
+        Returns:
+            Optional[tuple]: (giá input, giá output), None nếu không có giá
+        """
+        canonical = self.resolve_model(model)
+        if canonical is None:
+            return None
+        return self._price_at(self._table.models[canonical], self._current, canonical, at)
+
+    def get_search_price(self, provider: str, at: Optional[float] = None) -> Optional[float]:
+        """
+        Giá mỗi request của một search provider
+
+        Args:
+            provider: Tên provider
+            at: Thời điểm (epoch giây), mặc định là hiện tại
+
+        Returns:
+            Optional[float]: Giá (USD), None nếu không có giá
+        """
+        table = self._maybe_reload()
+        key = provider.strip().lower() if provider else ""
+        schedule = table.search.get(key)
+        if schedule is None:
+            return None
+        return self._price_at(schedule, self._current_search, key, at)
+
+    @staticmethod
+    def _price_at(schedule: _PriceSchedule, current: Dict[str, Tuple[Optional[Any], float, float]], key: str, at: Optional[float]) -> Optional[Any]:
+        """Giá tại thời điểm at; giá đang hiệu lực được giữ cho tới khi phiên bản kế tiếp bắt đầu"""
+        if at is not None:
+            return schedule.lookup(at)[0]
+        now = time.time()
+        cached = current.get(key)
+        if cached is None or not cached[1] <= now < cached[2]:
+            cached = schedule.lookup(now)
+            current[key] = cached
+        return cached[0]
+
+    def calculate_llm_cost(self, model: str, input_tokens: int, output_tokens: int, at: Optional[float] = None) -> float:
+        """
+        Tính chi phí cho một LLM request
+
+        Args:
+            model: Tên model
+            input_tokens: Số input tokens
+            output_tokens: Số output tokens
+            at: Thời điểm của request (epoch giây), mặc định là hiện tại
+
+        Returns:
+            float: Chi phí (USD), 0 nếu model không có trong bảng giá
+        """
+        price = self.get_model_price(model, at)
+        if price is None:
+            self._warn_unknown("model", model)
+            return 0.0
+        return (input_tokens / 1000) * price[0] + (output_tokens / 1000) * price[1]
+
+    def calculate_search_cost(self, provider: str, at: Optional[float] = None) -> float:
+        """
+        Tính chi phí cho một Search request
+
+        Args:
+            provider: Tên provider
+            at: Thời điểm của request (epoch giây), mặc định là hiện tại
+
+        Returns:
+            float: Chi phí (USD), 0 nếu provider không có trong bảng giá
+        """
+        price = self.get_search_price(provider, at)
+        if price is None:
+            self._warn_unknown("provider", provider)
+            return 0.0
+        return price
+
+    def _warn_unknown(self, kind: str, name: str) -> None:
+        """Cảnh báo một lần cho mỗi model/provider không có giá trong bảng giá hiện tại"""
+        self._stats["unknown_models"] += 1
+        if (kind, name) not in self._warned:
+            self._warned.add((kind, name))
+            logger.warning(f"Không tìm thấy bảng giá cho {kind} {name}, chi phí được tính là 0")
+
+    def update_model_pricing(self, pricing_data: Dict[str, Dict[str, float]]) -> None:
+        """
+        Đặt giá model lúc chạy (USD/1000 token), giữ nguyên qua các lần nạp lại file
+
+        Args:
+            pricing_data: Tên model -> {"input": ..., "output": ...}
+        """
+        self._model_overrides.update(pricing_data)
+        self.reload(force=True)
+
+    def update_search_pricing(self, pricing_data: Dict[str, float]) -> None:
+        """
+        Đặt giá search lúc chạy (USD/request), giữ nguyên qua các lần nạp lại file
+
+        Args:
+            pricing_data: Tên provider -> giá mỗi request
+        """
+        self._search_overrides.update(pricing_data)
+        self.reload(force=True)
+
+    def get_pricing(self) -> Dict[str, Any]:
+        """
+        Bảng giá đang dùng
+
+        Returns:
+            dict: Phiên bản, file nguồn, giá theo model và search provider
+        """
+        table = self._maybe_reload()
+        return {"source": self.path, "loaded_at": self._loaded_at, **table.describe()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê bảng giá
+
+        Returns:
+            dict: Phiên bản, số model, số lần nạp lại và số lần gặp model không có giá
+        """
+        table = self._table
+        return {
+            "version": table.version,
+            "source": self.path,
+            "loaded_at": self._loaded_at,
+            "models": len(table.models),
+            "search_providers": len(table.search),
+            "resolved_names": len(self._resolved),
+            **self._stats
+        }
+
+
+# Singleton instance
+_pricing_registry: Optional[PricingRegistry] = None
+
+
+def get_pricing_registry() -> PricingRegistry:
+    """
+    Lấy bảng giá dùng chung
+
+    Returns:
+        PricingRegistry: Bảng giá
+    """
+    global _pricing_registry
+    if _pricing_registry is None:
+        settings = get_settings()
+        _pricing_registry = PricingRegistry(
+            settings.PRICING_FILE or None,
+            reload_interval_seconds=settings.PRICING_RELOAD_INTERVAL_SECONDS
+        )
+    return _pricing_registry
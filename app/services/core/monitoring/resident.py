@@ -0,0 +1,153 @@
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from app.core.logging import get_logger
+from app.models.cost import ResearchCostMonitoring
+
+logger = get_logger(__name__)
+
+
+def estimate_size(data: Any) -> int:
+    """
+    Ước lượng dung lượng bộ nhớ của một bản ghi theo kích thước JSON
+
+    Args:
+        data: Dữ liệu (dict hoặc model pydantic)
+
+    Returns:
+        int: Số byte ước lượng
+    """
+    if hasattr(data, "dict"):
+        data = data.dict()
+    return len(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class ResidentMonitoringStore:
+    """
+    Giữ ResearchCostMonitoring của các task trong bộ nhớ theo LRU, giới hạn số task và dung lượng
+
+    Task bị loại khỏi bộ nhớ được tải lại từ storage khi cần. Task đang "ghim" (còn thay đổi
+    chưa được ghi) không bao giờ bị loại để không mất dữ liệu.
+    """
+
+    def __init__(
+        self,
+        max_tasks: int = 100,
+        max_bytes: int = 64 * 1024 * 1024,
+        is_pinned: Optional[Callable[[str], bool]] = None
+    ):
+        """
+        Args:
+            max_tasks: Số task tối đa giữ trong bộ nhớ (0 = không giới hạn)
+            max_bytes: Dung lượng ước lượng tối đa (0 = không giới hạn)
+            is_pinned: Hàm kiểm tra task có đang bị ghim hay không
+        """
+        self.max_tasks = max_tasks
+        self.max_bytes = max_bytes
+        self.is_pinned = is_pinned or (lambda task_id: False)
+        self._entries: "OrderedDict[str, ResearchCostMonitoring]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries.keys()))
+
+    def __getitem__(self, task_id: str) -> ResearchCostMonitoring:
+        monitoring = self.get(task_id)
+        if monitoring is None:
+            raise KeyError(task_id)
+        return monitoring
+
+    def __setitem__(self, task_id: str, monitoring: ResearchCostMonitoring) -> None:
+        self._remove(task_id)
+        self._entries[task_id] = monitoring
+        self._sizes[task_id] = estimate_size(monitoring)
+        self._total_bytes += self._sizes[task_id]
+        self._evict_over_limit(keep=task_id)
+
+    def get(self, task_id: str, default: Optional[ResearchCostMonitoring] = None) -> Optional[ResearchCostMonitoring]:
+        """Lấy monitoring đang trong bộ nhớ và đánh dấu vừa được dùng"""
+        monitoring = self._entries.get(task_id)
+        if monitoring is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(task_id)
+        return monitoring
+
+    def grow(self, task_id: str, nbytes: int) -> None:
+        """
+        Ghi nhận monitoring của task tăng thêm một lượng dữ liệu (ví dụ một request mới)
+
+        Args:
+            task_id: ID của task
+            nbytes: Số byte ước lượng tăng thêm
+        """
+        if task_id not in self._entries:
+            return
+        self._sizes[task_id] += nbytes
+        self._total_bytes += nbytes
+        self._entries.move_to_end(task_id)
+        self._evict_over_limit(keep=task_id)
+
+    def evict(self, task_id: str) -> bool:
+        """
+        Loại task khỏi bộ nhớ nếu không bị ghim
+
+        Args:
+            task_id: ID của task
+
+        Returns:
+            bool: True nếu task đã bị loại
+        """
+        if task_id not in self._entries or self.is_pinned(task_id):
+            return False
+        self._remove(task_id)
+        self.evictions += 1
+        logger.info(f"Đã loại cost monitoring của task {task_id} khỏi bộ nhớ")
+        return True
+
+    def evict_over_limit(self) -> int:
+        """Loại các task ít dùng nhất cho tới khi trong giới hạn, trả về số task đã loại"""
+        return self._evict_over_limit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy số task và dung lượng ước lượng đang giữ trong bộ nhớ"""
+        return {
+            "resident_tasks": len(self._entries),
+            "resident_bytes": self._total_bytes,
+            "max_tasks": self.max_tasks,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def _over_limit(self) -> bool:
+        return (
+            (self.max_tasks > 0 and len(self._entries) > self.max_tasks)
+            or (self.max_bytes > 0 and self._total_bytes > self.max_bytes)
+        )
+
+    def _evict_over_limit(self, keep: Optional[str] = None) -> int:
+        evicted = 0
+        for task_id in list(self._entries.keys()):
+            if not self._over_limit():
+                break
+            if task_id != keep and self.evict(task_id):
+                evicted += 1
+        return evicted
+
+    def _remove(self, task_id: str) -> None:
+        if self._entries.pop(task_id, None) is not None:
+            self._total_bytes -= self._sizes.pop(task_id, 0)
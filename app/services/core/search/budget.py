@@ -0,0 +1,83 @@
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.services.core.monitoring.budget import get_budget_manager
+from app.services.core.search.base import BaseSearchService
+
+logger = get_logger(__name__)
+
+# Được đặt True khi lời gọi search vừa bị giảm số kết quả do ngân sách sắp hết;
+# search cache (bọc bên ngoài) dựa vào đó để không lưu kết quả đã giảm dưới khóa của số kết quả gốc
+search_degraded: ContextVar[bool] = ContextVar("search_budget_degraded", default=False)
+
+
+class BudgetedSearchService(BaseSearchService):
+    """
+    Bọc search service, kiểm tra ngân sách của task trước mỗi lời gọi
+
+    Khi ngân sách ở chế độ tiết kiệm, số kết quả được giảm xuống BUDGET_DEGRADED_SEARCH_RESULTS;
+    khi lời gọi sẽ vượt giới hạn, trả về danh sách rỗng để pipeline tiếp tục mà không gọi provider.
+    """
+
+    def __init__(self, service: BaseSearchService, provider_name: Optional[str] = None):
+        """
+        Args:
+            service: Search service (đã bọc single-flight)
+            provider_name: Tên provider dùng để ước lượng chi phí
+        """
+        self.service = service
+        self.provider_name = provider_name or getattr(service, "provider_name", service.__class__.__name__)
+        self.degraded_num_results = max(1, get_settings().BUDGET_DEGRADED_SEARCH_RESULTS)
+
+    async def search(self, query: str, num_results: int = 5, task_id: Optional[str] = None, purpose: Optional[str] = None, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Tìm kiếm nếu ngân sách của task cho phép
+
+        Args:
+            query: Search query
+            num_results: Number of results to return
+            task_id: Task ID for cost tracking
+            purpose: Purpose of the search request
+            **kwargs: Additional arguments
+
+        Returns:
+            list: List of search results (rỗng nếu vượt ngân sách)
+        """
+        budget = get_budget_manager() if task_id else None
+        if budget is None:
+            return await self.service.search(query, num_results=num_results, task_id=task_id, purpose=purpose, **kwargs)
+
+        decision = await budget.check_search(task_id, self.provider_name)
+        if decision.exceeded:
+            logger.warning(f"Bỏ qua tìm kiếm '{query[:100]}' của task {task_id}: vượt ngân sách ({decision.reason})")
+            return []
+        if decision.degraded and num_results > self.degraded_num_results:
+            logger.info(f"Ngân sách của task {task_id} sắp hết, giảm số kết quả tìm kiếm từ {num_results} xuống {self.degraded_num_results}")
+            num_results = self.degraded_num_results
+            search_degraded.set(True)
+        try:
+            return await self.service.search(query, num_results=num_results, task_id=task_id, purpose=purpose, **kwargs)
+        finally:
+            budget.release(decision)
+
+    async def check_connection(self) -> bool:
+        """Kiểm tra kết nối trực tiếp qua service gốc"""
+        return await self.service.check_connection()
+
+
+def wrap_with_budget(service: BaseSearchService, provider_name: Optional[str] = None) -> BaseSearchService:
+    """
+    Bọc search service bằng BudgetedSearchService nếu có cấu hình giới hạn ngân sách
+
+    Args:
+        service: Search service
+        provider_name: Tên provider
+
+    Returns:
+        BaseSearchService: Service đã bọc, hoặc chính service gốc nếu không giới hạn ngân sách
+    """
+    if get_budget_manager() is None:
+        return service
+    return BudgetedSearchService(service, provider_name=provider_name)
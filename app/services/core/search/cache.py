@@ -0,0 +1,200 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import CACHE_HITS
+from app.services.core.llm.cache import BaseResponseCache, DiskResponseCache, MemoryResponseCache
+from app.services.core.search.base import BaseSearchService
+from app.services.core.search.budget import search_degraded
+
+logger = get_logger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+", re.UNICODE)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Chuẩn hóa câu truy vấn để các truy vấn gần giống nhau dùng chung kết quả
+
+    Gộp chữ hoa/thường, dấu câu và khoảng trắng, ví dụ:
+    "AI  in Education: Overview!" và "ai in education overview" cho cùng kết quả.
+
+    Args:
+        query: Câu truy vấn gốc
+
+    Returns:
+        str: Câu truy vấn đã chuẩn hóa
+    """
+    text = unicodedata.normalize("NFC", query or "").casefold()
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_search_cache_key(provider: str, query: str, num_results: int, **kwargs) -> str:
+    """
+    Tạo khóa cache cho một lời gọi search
+
+    Args:
+        provider: Tên search provider
+        query: Câu truy vấn (sẽ được chuẩn hóa)
+        num_results: Số kết quả yêu cầu
+        **kwargs: Các tham số khác ảnh hưởng tới kết quả
+
+    Returns:
+        str: Khóa SHA-256 dạng hex
+    """
+    material = json.dumps(
+        [provider, normalize_query(query), num_results, kwargs],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class CachedSearchService(BaseSearchService):
+    """Bọc một search service bất kỳ, trả kết quả từ cache cho các truy vấn đã chuẩn hóa trùng nhau"""
+
+    def __init__(self, service: BaseSearchService, cache: BaseResponseCache, provider_name: Optional[str] = None):
+        """
+        Args:
+            service: Search service gốc
+            cache: Backend lưu kết quả (memory hoặc disk)
+            provider_name: Tên provider dùng cho khóa cache và ghi nhận chi phí
+        """
+        self.service = service
+        self.cache = cache
+        self.provider_name = provider_name or getattr(service, "provider_name", service.__class__.__name__)
+
+    async def search(self, query: str, num_results: int = 5, task_id: Optional[str] = None, purpose: Optional[str] = None, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Tìm kiếm qua cache, chỉ gọi service gốc khi cache miss
+
+        Args:
+            query: Search query
+            num_results: Number of results to return
+            task_id: Task ID for cost tracking
+            purpose: Purpose of the search request
+            **kwargs: Additional arguments
+
+        Returns:
+            list: List of search results
+        """
+        start_time = time.time()
+        cache_key = make_search_cache_key(self.provider_name, query, num_results, **kwargs)
+
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            results = cached["response"]
+            duration_ms = int((time.time() - start_time) * 1000)
+            logger.info(f"Search cache hit cho {self.provider_name}: '{query[:80]}'")
+            CACHE_HITS.inc(kind="search", name=self.provider_name)
+            if task_id:
+                await self._log_cache_hit(task_id, query, duration_ms, len(results), purpose)
+            return results
+
+        token = search_degraded.set(False)
+        try:
+            results = await self.service.search(query, num_results=num_results, task_id=task_id, purpose=purpose, **kwargs)
+            degraded = search_degraded.get()
+        finally:
+            search_degraded.reset(token)
+
+        # Không cache kết quả rỗng vì provider trả về [] khi gặp lỗi (hoặc khi vượt ngân sách),
+        # và không cache kết quả đã bị giảm số lượng do ngân sách
+        if results and not degraded:
+            await self.cache.set(cache_key, results)
+        return results
+
+    async def check_connection(self) -> bool:
+        """Kiểm tra kết nối trực tiếp qua service gốc, không dùng cache"""
+        return await self.service.check_connection()
+
+    async def _log_cache_hit(
+        self,
+        task_id: str,
+        query: str,
+        duration_ms: int,
+        num_results: int,
+        purpose: Optional[str]
+    ) -> None:
+        """Ghi nhận một search request được phục vụ từ cache (chi phí bằng 0)"""
+        try:
+            from app.services.core.monitoring.cost import get_cost_service
+
+            cost_service = await get_cost_service()
+            await cost_service.log_search_request(
+                task_id=task_id,
+                provider=self.provider_name,
+                query=query,
+                duration_ms=duration_ms,
+                num_results=num_results,
+                purpose=purpose,
+                cache_hit=True
+            )
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi nhận search cache hit: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê hit/miss của search cache"""
+        return {"provider": self.provider_name, **self.cache.get_stats()}
+
+
+_search_cache: Optional[BaseResponseCache] = None
+_search_cache_initialized = False
+
+
+def get_search_cache() -> Optional[BaseResponseCache]:
+    """
+    Lấy backend search cache dùng chung theo SEARCH_CACHE_BACKEND
+
+    Returns:
+        Optional[BaseResponseCache]: Cache đã cấu hình, hoặc None nếu cache bị tắt
+    """
+    global _search_cache, _search_cache_initialized
+    if _search_cache_initialized:
+        return _search_cache
+
+    settings = get_settings()
+    backend = (settings.SEARCH_CACHE_BACKEND or "none").lower()
+    if backend == "memory":
+        _search_cache = MemoryResponseCache(
+            max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS
+        )
+    elif backend == "disk":
+        _search_cache = DiskResponseCache(
+            directory=settings.SEARCH_CACHE_DIR,
+            max_bytes=settings.SEARCH_CACHE_MAX_BYTES,
+            ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS
+        )
+    elif backend != "none":
+        logger.warning(f"SEARCH_CACHE_BACKEND không hợp lệ: {backend}, tắt search cache")
+
+    if _search_cache:
+        logger.info(f"Bật search cache với backend: {backend}")
+    _search_cache_initialized = True
+    return _search_cache
+
+
+def wrap_with_cache(service: BaseSearchService, provider_name: Optional[str] = None) -> BaseSearchService:
+    """
+    Bọc search service bằng CachedSearchService nếu search cache được bật
+
+    Args:
+        service: Search service gốc
+        provider_name: Tên provider
+
+    Returns:
+        BaseSearchService: Service đã bọc cache, hoặc chính service gốc nếu cache bị tắt
+    """
+    cache = get_search_cache()
+    if cache is None:
+        return service
+    return CachedSearchService(service, cache, provider_name=provider_name)
@@ -0,0 +1,69 @@
+from typing import Any, Dict, List, Optional
+
+from app.core.logging import get_logger
+from app.core.singleflight import SingleFlight, get_single_flight
+from app.services.core.search.base import BaseSearchService
+from app.services.core.search.cache import make_search_cache_key
+
+logger = get_logger(__name__)
+
+
+class CoalescingSearchService(BaseSearchService):
+    """Bọc một search service, gộp các truy vấn giống nhau đang chạy đồng thời thành một lời gọi provider"""
+
+    def __init__(self, service: BaseSearchService, flight: SingleFlight, provider_name: Optional[str] = None):
+        """
+        Args:
+            service: Search service gốc
+            flight: SingleFlight dùng chung
+            provider_name: Tên provider dùng cho khóa gộp request
+        """
+        self.service = service
+        self.flight = flight
+        self.provider_name = provider_name or getattr(service, "provider_name", service.__class__.__name__)
+
+    async def search(self, query: str, num_results: int = 5, task_id: Optional[str] = None, purpose: Optional[str] = None, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Tìm kiếm, dùng chung kết quả với truy vấn giống nhau (sau chuẩn hóa) đang chạy
+
+        Args:
+            query: Search query
+            num_results: Number of results to return
+            task_id: Task ID for cost tracking
+            purpose: Purpose of the search request
+            **kwargs: Additional arguments
+
+        Returns:
+            list: List of search results
+        """
+        key = make_search_cache_key(self.provider_name, query, num_results, **kwargs)
+        results = await self.flight.do(
+            f"search:{key}",
+            lambda shared_task_id: self.service.search(
+                query, num_results=num_results, task_id=shared_task_id, purpose=purpose, **kwargs
+            ),
+            task_id=task_id
+        )
+        # Mỗi caller nhận bản sao riêng để không sửa lẫn kết quả của nhau
+        return list(results)
+
+    async def check_connection(self) -> bool:
+        """Kiểm tra kết nối trực tiếp qua service gốc"""
+        return await self.service.check_connection()
+
+
+def wrap_with_single_flight(service: BaseSearchService, provider_name: Optional[str] = None) -> BaseSearchService:
+    """
+    Bọc search service bằng CoalescingSearchService nếu single-flight được bật
+
+    Args:
+        service: Search service gốc
+        provider_name: Tên provider
+
+    Returns:
+        BaseSearchService: Service đã bọc, hoặc chính service gốc nếu tính năng bị tắt
+    """
+    flight = get_single_flight()
+    if flight is None:
+        return service
+    return CoalescingSearchService(service, flight, provider_name=provider_name)
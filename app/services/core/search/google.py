@@ -1,7 +1,10 @@
+import asyncio
+
 from googleapiclient.discovery import build
 
 from app.services.core.search.base import BaseSearchService
 from app.core.config import get_settings
+from app.core.ratelimit import run_with_rate_limit
 
 
 class GoogleService(BaseSearchService):
@@ -19,11 +22,13 @@ class GoogleService(BaseSearchService):
     async def search(self, query: str, num_results: int = 5) -> list[dict]:
         """Search using Google Custom Search API"""
         results = []
-        response = self.service.cse().list(
+        request = self.service.cse().list(
             q=query,
             cx=self.cx,
             num=num_results
-        ).execute()
+        )
+        # googleapiclient là thư viện đồng bộ: chạy trong thread, đi qua rate limiter của provider
+        response = await run_with_rate_limit("google", lambda: asyncio.to_thread(request.execute))
 
         for item in response.get("items", []):
             results.append({
@@ -0,0 +1,47 @@
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.metrics import SEARCH_ERRORS, SEARCH_REQUEST_DURATION
+from app.core.tracing import span
+from app.services.core.search.base import BaseSearchService
+
+
+class InstrumentedSearchService(BaseSearchService):
+    """Bọc search provider, ghi nhận độ trễ và lỗi của từng lời gọi provider vào metrics và trace"""
+
+    def __init__(self, service: BaseSearchService, provider_name: Optional[str] = None):
+        """
+        Args:
+            service: Search service gốc
+            provider_name: Tên provider dùng làm nhãn metric
+        """
+        self.service = service
+        self.provider_name = provider_name or getattr(service, "provider_name", service.__class__.__name__)
+
+    async def search(self, query: str, num_results: int = 5, task_id: Optional[str] = None, purpose: Optional[str] = None, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Tìm kiếm qua service gốc và ghi nhận độ trễ
+
+        Args:
+            query: Search query
+            num_results: Number of results to return
+            task_id: Task ID for cost tracking
+            purpose: Purpose of the search request
+            **kwargs: Additional arguments
+
+        Returns:
+            list: List of search results
+        """
+        start_time = time.time()
+        try:
+            with span("search.provider_call", provider=self.provider_name, purpose=purpose or ""):
+                return await self.service.search(query, num_results=num_results, task_id=task_id, purpose=purpose, **kwargs)
+        except Exception:
+            SEARCH_ERRORS.inc(provider=self.provider_name)
+            raise
+        finally:
+            SEARCH_REQUEST_DURATION.observe(time.time() - start_time, provider=self.provider_name, purpose=purpose or "")
+
+    async def check_connection(self) -> bool:
+        """Kiểm tra kết nối trực tiếp qua service gốc"""
+        return await self.service.check_connection()
@@ -6,6 +6,8 @@ import time
 from app.services.core.search.base import BaseSearchService
 from app.core.config import get_settings
 from app.core.logging import get_logger
+from app.core.metrics import SEARCH_ERRORS
+from app.core.ratelimit import run_with_rate_limit
 
 logger = get_logger(__name__)
 
@@ -52,27 +54,32 @@ class PerplexityService(BaseSearchService):
             
             # Gọi API chat completions
             logger.info(f"Gửi request đến Perplexity API...")
-            response = await self.client.post(
-                "/chat/completions",
-                json={
-                    "model": "llama-3.1-sonar-small-128k-online",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a helpful search assistant. Provide detailed and accurate information about the query."
-                        },
-                        {
-                            "role": "user",
-                            "content": query
-                        }
-                    ],
-                    "temperature": 0.2,
-                    "top_p": 0.9,
-                    "stream": False
-                }
-            )
             
-            response.raise_for_status()
+            async def send_request() -> httpx.Response:
+                response = await self.client.post(
+                    "/chat/completions",
+                    json={
+                        "model": "llama-3.1-sonar-small-128k-online",
+                        "messages": [
+                            {
+                                "role": "system",
+                                "content": "You are a helpful search assistant. Provide detailed and accurate information about the query."
+                            },
+                            {
+                                "role": "user",
+                                "content": query
+                            }
+                        ],
+                        "temperature": 0.2,
+                        "top_p": 0.9,
+                        "stream": False
+                    }
+                )
+                response.raise_for_status()
+                return response
+            
+            # Đi qua rate limiter: 429/5xx được thử lại (theo Retry-After) thay vì trả về kết quả rỗng ngay
+            response = await run_with_rate_limit(self.provider_name, send_request, tokens=len(query) // 4)
             data = response.json()
             
             end_time = time.time()
@@ -102,7 +109,7 @@ class PerplexityService(BaseSearchService):
                     cost_service = await factory.get_cost_monitoring_service()
                     
                     # Cập nhật log_search_request để bao gồm thông tin token
-                    cost_service.log_search_request(
+                    await cost_service.log_search_request(
                         task_id=task_id,
                         provider=self.provider_name,
                         query=query,
@@ -148,6 +155,7 @@ class PerplexityService(BaseSearchService):
         except Exception as e:
             logger.error(f"=== KẾT THÚC TÌM KIẾM VỚI PERPLEXITY API - THẤT BẠI ===")
             logger.error(f"Lỗi khi tìm kiếm với Perplexity API: {str(e)}")
+            SEARCH_ERRORS.inc(provider=self.provider_name)
             
             # Nếu có lỗi, trả về danh sách trống hoặc kết quả mẫu
             logger.info("Trả về danh sách kết quả trống")
@@ -1,11 +1,11 @@
 import json
 import os
-import asyncio
 from typing import Any, Dict, List, Optional
 from pathlib import Path
 
 from app.core.logging import logger
 from app.services.core.storage.base import BaseStorageService
+from app.services.core.storage.file_io import get_file_io
 
 class FileStorageService(BaseStorageService):
     """Service lưu trữ dữ liệu vào file"""
@@ -20,11 +20,13 @@ class FileStorageService(BaseStorageService):
         self.base_dir = Path(base_dir)
         # Tạo thư mục nếu chưa tồn tại
         os.makedirs(self.base_dir, exist_ok=True)
+        # Đọc/ghi file chạy trên thread pool I/O dùng chung, tuần tự theo đường dẫn
+        self.file_io = get_file_io()
         logger.info(f"Khởi tạo FileStorageService với thư mục cơ sở: {self.base_dir}")
     
     async def save(self, data: Any, file_path: str, **kwargs) -> str:
         """
-        Lưu dữ liệu vào file
+        Lưu dữ liệu vào file (nguyên tử: ghi ra file tạm rồi đổi tên đè lên file đích)
         
         Args:
             data: Dữ liệu cần lưu (có thể là string hoặc object)
@@ -37,20 +39,13 @@ class FileStorageService(BaseStorageService):
             # Tạo đường dẫn đầy đủ
             full_path = self.base_dir / file_path
             
-            # Tạo thư mục cha nếu chưa tồn tại
-            os.makedirs(full_path.parent, exist_ok=True)
-            
-            # Xác định loại dữ liệu và lưu phù hợp
+            # Xác định loại dữ liệu và lưu phù hợp (thư mục cha được tạo trên thread I/O)
             if isinstance(data, (dict, list)):
                 # Lưu dữ liệu dạng JSON
-                async with asyncio.Lock():
-                    with open(full_path, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, ensure_ascii=False, indent=2)
+                await self.file_io.write_json(str(full_path), data)
             else:
                 # Lưu dữ liệu dạng string
-                async with asyncio.Lock():
-                    with open(full_path, 'w', encoding='utf-8') as f:
-                        f.write(str(data))
+                await self.file_io.write_text(str(full_path), str(data))
             
             logger.info(f"Đã lưu dữ liệu vào file: {full_path}")
             return str(full_path)
@@ -77,22 +72,21 @@ class FileStorageService(BaseStorageService):
             # Tạo đường dẫn đầy đủ
             full_path = self.base_dir / file_path
             
-            # Kiểm tra file tồn tại
-            if not full_path.exists():
+            # Đọc dữ liệu
+            try:
+                if as_json:
+                    data = await self.file_io.read_json(str(full_path))
+                else:
+                    data = await self.file_io.read_text(str(full_path))
+            except FileNotFoundError:
                 logger.error(f"File không tồn tại: {full_path}")
                 raise FileNotFoundError(f"File không tồn tại: {full_path}")
             
-            # Đọc dữ liệu
-            async with asyncio.Lock():
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    if as_json:
-                        data = json.load(f)
-                    else:
-                        data = f.read()
-            
             logger.info(f"Đã đọc dữ liệu từ file: {full_path}")
             return data
             
+        except FileNotFoundError:
+            raise
         except json.JSONDecodeError:
             logger.error(f"Lỗi khi parse JSON từ file {file_path}")
             raise
@@ -114,13 +108,12 @@ class FileStorageService(BaseStorageService):
             # Tạo đường dẫn đầy đủ
             full_path = self.base_dir / file_path
             
-            # Kiểm tra file tồn tại
-            if not full_path.exists():
+            # Xóa file
+            try:
+                await self.file_io.run(os.remove, str(full_path), path=str(full_path), op="delete")
+            except FileNotFoundError:
                 logger.warning(f"File không tồn tại khi cố gắng xóa: {full_path}")
                 return False
-            
-            # Xóa file
-            os.remove(full_path)
             logger.info(f"Đã xóa file: {full_path}")
             return True
             
@@ -143,16 +136,18 @@ class FileStorageService(BaseStorageService):
             # Tạo đường dẫn đầy đủ
             full_path = self.base_dir / directory
             
-            # Kiểm tra thư mục tồn tại
-            if not full_path.exists():
-                logger.warning(f"Thư mục không tồn tại: {full_path}")
-                return []
+            def _list() -> Optional[List[str]]:
+                # Kiểm tra thư mục tồn tại
+                if not full_path.exists():
+                    return None
+                # Chuyển đổi sang đường dẫn tương đối so với base_dir
+                return [str(f.relative_to(self.base_dir)) for f in full_path.glob(pattern) if f.is_file()]
             
             # Liệt kê các file
-            files = list(full_path.glob(pattern))
-            
-            # Chuyển đổi sang đường dẫn tương đối so với base_dir
-            relative_paths = [str(f.relative_to(self.base_dir)) for f in files if f.is_file()]
+            relative_paths = await self.file_io.run(_list, op="list")
+            if relative_paths is None:
+                logger.warning(f"Thư mục không tồn tại: {full_path}")
+                return []
             
             logger.info(f"Đã liệt kê {len(relative_paths)} file trong thư mục {directory}")
             return relative_paths
@@ -176,22 +171,17 @@ class FileStorageService(BaseStorageService):
             # Tạo đường dẫn đầy đủ
             full_path = os.path.join(self.base_dir, file_path)
             
-            # Tạo thư mục cha nếu chưa tồn tại
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            
-            # Xác định loại dữ liệu và lưu phù hợp
+            # Xác định loại dữ liệu và lưu nguyên tử (thư mục cha được tạo nếu chưa tồn tại)
             if isinstance(data, (dict, list)):
                 # Lưu dữ liệu dạng JSON
-                with open(full_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+                self.file_io.atomic_write(full_path, lambda f: json.dump(data, f, ensure_ascii=False, indent=2))
             else:
                 # Lưu dữ liệu dạng string
-                with open(full_path, 'w', encoding='utf-8') as f:
-                    f.write(str(data))
+                self.file_io.atomic_write(full_path, lambda f: f.write(str(data)))
             
             logger.info(f"Đã lưu dữ liệu vào file: {full_path}")
             return str(full_path)
             
         except Exception as e:
             logger.error(f"Lỗi khi lưu dữ liệu vào file {file_path}: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
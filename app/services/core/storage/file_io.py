@@ -0,0 +1,387 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Callable, Dict, List, Optional, TextIO
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import FILE_IO_DURATION, FILE_IO_OPERATIONS, FILE_IO_QUEUE_DEPTH, FILE_IO_QUEUE_WAIT
+
+logger = get_logger(__name__)
+
+# Chính sách fsync cho các lần ghi file
+FSYNC_NONE = "none"  # Không fsync: chỉ an toàn khi tiến trình crash, không an toàn khi mất điện
+FSYNC_PHASE = "phase"  # fsync các file đã ghi của task khi task chuyển phase (sync)
+FSYNC_ALWAYS = "always"  # fsync file và thư mục sau mỗi lần ghi
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_PHASE, FSYNC_ALWAYS)
+
+
+class _PathLock:
+    """Khóa tuần tự cho một đường dẫn, gắn với event loop đã tạo ra nó"""
+
+    __slots__ = ("loop", "lock", "users")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class FileIOExecutor:
+    """
+    Thực hiện I/O file trên thread pool riêng có giới hạn thay vì trên thread của event loop
+
+    Đọc/ghi (kể cả serialize JSON) chạy trên tối đa max_workers thread; các thao tác trên cùng
+    một đường dẫn được thực hiện tuần tự theo thứ tự gửi. Số thao tác chờ khóa đường dẫn, chờ thread
+    và đang chạy được xuất qua metric deep_research_file_io_queue_depth.
+
+    Mọi lần ghi là nguyên tử (ghi ra file tạm cùng thư mục rồi os.replace): crash giữa chừng chỉ
+    để lại file cũ hoàn chỉnh. Độ bền khi mất điện theo fsync_policy: "always" fsync sau mỗi lần
+    ghi, "phase" ghi nhận file đã ghi và fsync chúng khi gọi sync (ở ranh giới phase của task),
+    "none" không fsync.
+    """
+
+    def __init__(self, max_workers: int = 8, fsync_policy: str = FSYNC_PHASE):
+        """
+        Args:
+            max_workers: Số thread I/O tối đa
+            fsync_policy: Chính sách fsync ("none", "phase" hoặc "always")
+        """
+        self.max_workers = max(1, max_workers)
+        if fsync_policy not in FSYNC_POLICIES:
+            logger.warning(f"STORAGE_FSYNC_POLICY không hợp lệ: {fsync_policy}, dùng '{FSYNC_PHASE}'")
+            fsync_policy = FSYNC_PHASE
+        self.fsync_policy = fsync_policy
+        # File đã ghi nhưng chưa fsync (chính sách "phase")
+        self._dirty: set = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._path_locks: Dict[str, _PathLock] = {}
+        self._lock = threading.Lock()
+        self._depth = {"waiting_path": 0, "queued": 0, "running": 0}
+        self._stats = {"completed": 0, "errors": 0, "max_queued": 0, "fsyncs": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="file-io")
+        return self._executor
+
+    def _adjust(self, state: str, amount: int) -> None:
+        with self._lock:
+            self._depth[state] += amount
+            if state == "queued":
+                self._stats["max_queued"] = max(self._stats["max_queued"], self._depth["queued"])
+        FILE_IO_QUEUE_DEPTH.inc(amount, state=state)
+
+    def _acquire_path(self, path: str) -> _PathLock:
+        loop = asyncio.get_running_loop()
+        entry = self._path_locks.get(path)
+        if entry is None or entry.loop is not loop:
+            # Khóa của event loop cũ (ví dụ giữa các lần chạy test) không dùng lại được
+            entry = self._path_locks[path] = _PathLock(loop)
+        entry.users += 1
+        return entry
+
+    def _release_path(self, path: str, entry: _PathLock) -> None:
+        entry.users -= 1
+        if entry.users <= 0 and self._path_locks.get(path) is entry:
+            del self._path_locks[path]
+
+    async def run(self, func: Callable[..., Any], *args: Any, path: Optional[str] = None, op: str = "io") -> Any:
+        """
+        Chạy một hàm I/O đồng bộ trên thread pool
+
+        Args:
+            func: Hàm cần chạy
+            *args: Tham số của hàm
+            path: Đường dẫn file; các thao tác cùng đường dẫn được thực hiện tuần tự
+            op: Tên thao tác dùng cho metric
+
+        Returns:
+            Any: Kết quả của hàm
+        """
+        if path is None:
+            return await self._submit(func, args, op)
+
+        key = os.path.abspath(path)
+        entry = self._acquire_path(key)
+        try:
+            self._adjust("waiting_path", 1)
+            try:
+                await entry.lock.acquire()
+            finally:
+                self._adjust("waiting_path", -1)
+            try:
+                return await self._submit(func, args, op)
+            finally:
+                entry.lock.release()
+        finally:
+            self._release_path(key, entry)
+
+    async def _submit(self, func: Callable[..., Any], args: tuple, op: str) -> Any:
+        submitted = time.perf_counter()
+        self._adjust("queued", 1)
+
+        def _call() -> Any:
+            started = time.perf_counter()
+            self._adjust("queued", -1)
+            self._adjust("running", 1)
+            FILE_IO_QUEUE_WAIT.observe(started - submitted, op=op)
+            try:
+                return func(*args)
+            finally:
+                self._adjust("running", -1)
+                FILE_IO_DURATION.observe(time.perf_counter() - started, op=op)
+
+        future = asyncio.get_running_loop().run_in_executor(self._get_executor(), _call)
+        try:
+            result = await future
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            FILE_IO_OPERATIONS.inc(op=op, outcome="error")
+            raise
+        with self._lock:
+            self._stats["completed"] += 1
+        FILE_IO_OPERATIONS.inc(op=op, outcome="ok")
+        return result
+
+    async def read_json(self, path: str) -> Any:
+        """
+        Đọc và parse file JSON
+
+        Args:
+            path: Đường dẫn file
+
+        Returns:
+            Any: Dữ liệu đã đọc
+
+        Raises:
+            FileNotFoundError: Nếu file không tồn tại
+        """
+        return await self.run(_read_json, path, path=path, op="read_json")
+
+    async def read_text(self, path: str) -> str:
+        """
+        Đọc nội dung file dạng text
+
+        Args:
+            path: Đường dẫn file
+
+        Returns:
+            str: Nội dung file
+
+        Raises:
+            FileNotFoundError: Nếu file không tồn tại
+        """
+        return await self.run(_read_text, path, path=path, op="read_text")
+
+    async def write_json(
+        self,
+        path: str,
+        data: Any,
+        indent: Optional[int] = 2,
+        default: Optional[Callable[[Any], Any]] = None
+    ) -> None:
+        """
+        Serialize và ghi nguyên tử dữ liệu JSON (tạo thư mục cha nếu cần)
+
+        Dữ liệu được serialize trên thread I/O nên người gọi không được sửa data cho tới khi ghi xong.
+
+        Args:
+            path: Đường dẫn file
+            data: Dữ liệu cần ghi
+            indent: Số khoảng trắng thụt lề (None = JSON gọn)
+            default: Hàm serialize các object đặc biệt
+        """
+        await self.run(
+            self.atomic_write, path,
+            lambda f: json.dump(data, f, ensure_ascii=False, indent=indent, default=default),
+            path=path, op="write_json"
+        )
+
+    async def write_text(self, path: str, text: str) -> None:
+        """
+        Ghi nguyên tử nội dung text (tạo thư mục cha nếu cần)
+
+        Args:
+            path: Đường dẫn file
+            text: Nội dung cần ghi
+        """
+        await self.run(self.atomic_write, path, lambda f: f.write(text), path=path, op="write_text")
+
+    def atomic_write(self, path: str, dump: Callable[[TextIO], Any]) -> None:
+        """
+        Ghi file nguyên tử theo chính sách fsync (đồng bộ, gọi trên thread I/O)
+
+        Args:
+            path: Đường dẫn file đích
+            dump: Hàm ghi nội dung vào file tạm đang mở
+        """
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                dump(f)
+                if self.fsync_policy == FSYNC_ALWAYS:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.mark_written(path)
+
+    def mark_written(self, path: str, f: Optional[IO] = None) -> None:
+        """
+        Áp chính sách fsync cho một file vừa được ghi
+
+        Với "always", file (qua f nếu còn mở) và thư mục chứa nó được fsync ngay; với "phase",
+        file được ghi nhận để fsync ở lần sync kế tiếp.
+
+        Args:
+            path: Đường dẫn file
+            f: File đang mở (ví dụ file được ghi nối), fsync trực tiếp qua file descriptor này
+        """
+        if self.fsync_policy == FSYNC_ALWAYS:
+            if f is not None:
+                f.flush()
+                os.fsync(f.fileno())
+            _fsync_directory(os.path.dirname(path) or ".")
+            with self._lock:
+                self._stats["fsyncs"] += 1
+        elif self.fsync_policy == FSYNC_PHASE:
+            with self._lock:
+                self._dirty.add(os.path.abspath(path))
+
+    async def sync(self, directory: Optional[str] = None) -> int:
+        """
+        fsync các file đã ghi nhưng chưa fsync (chính sách "phase") và thư mục chứa chúng
+
+        Args:
+            directory: Chỉ fsync file trong thư mục này (ví dụ thư mục của một task), None = mọi file
+
+        Returns:
+            int: Số file đã fsync
+        """
+        prefix = os.path.join(os.path.abspath(directory), "") if directory else None
+        with self._lock:
+            paths = [path for path in self._dirty if prefix is None or path.startswith(prefix)]
+            self._dirty.difference_update(paths)
+        if not paths:
+            return 0
+        try:
+            synced = await self.run(_fsync_paths, paths, op="fsync")
+        except Exception:
+            # Giữ lại để thử lại ở lần sync sau
+            with self._lock:
+                self._dirty.update(paths)
+            raise
+        with self._lock:
+            self._stats["fsyncs"] += synced
+        return synced
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê thread pool I/O
+
+        Returns:
+            dict: Số thread, số thao tác đang chờ/chạy, số thao tác đã xong và bị lỗi
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "tracked_paths": len(self._path_locks),
+                "fsync_policy": self.fsync_policy,
+                "unsynced_files": len(self._dirty),
+                **self._depth,
+                **self._stats
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Dừng thread pool (thread pool mới được tạo lại ở lần dùng kế tiếp)
+
+        Args:
+            wait: Chờ các thao tác đang chạy hoàn tất
+        """
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+def _read_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _fsync_directory(directory: str) -> None:
+    """fsync thư mục để lần đổi tên file bên trong bền vững (bỏ qua trên hệ điều hành không hỗ trợ)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _fsync_paths(paths: List[str]) -> int:
+    """fsync các file (bỏ qua file đã bị xóa) rồi fsync các thư mục chứa chúng"""
+    synced = 0
+    directories = set()
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        synced += 1
+        directories.add(os.path.dirname(path))
+    for directory in directories:
+        _fsync_directory(directory)
+    return synced
+
+
+# Singleton instance
+_file_io: Optional[FileIOExecutor] = None
+
+
+def get_file_io() -> FileIOExecutor:
+    """
+    Lấy thread pool I/O file dùng chung
+
+    Returns:
+        FileIOExecutor: Thread pool I/O file
+    """
+    global _file_io
+    if _file_io is None:
+        settings = get_settings()
+        _file_io = FileIOExecutor(settings.FILE_IO_MAX_WORKERS, fsync_policy=settings.STORAGE_FSYNC_POLICY)
+    return _file_io
+
+
+async def shutdown_file_io() -> None:
+    """fsync các file chưa fsync rồi dừng thread pool I/O file dùng chung (khi tắt ứng dụng)"""
+    if _file_io is None:
+        return
+    try:
+        await _file_io.sync()
+    except Exception as e:
+        logger.error(f"Lỗi khi fsync file trước khi tắt: {str(e)}")
+    _file_io.shutdown()
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    query TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    progress_phase TEXT,
+    progress_message TEXT,
+    progress_timestamp TEXT,
+    outline_sections_count INTEGER,
+    researched_sections_count INTEGER,
+    github_url TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_at ON tasks (updated_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_created_at ON tasks (status, created_at);
+CREATE TABLE IF NOT EXISTS index_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COLUMNS = (
+    "id", "status", "query", "created_at", "updated_at", "progress_phase", "progress_message",
+    "progress_timestamp", "outline_sections_count", "researched_sections_count", "github_url", "error"
+)
+
+_UPSERT = f"""
+INSERT INTO tasks ({", ".join(_COLUMNS)}) VALUES ({", ".join("?" for _ in _COLUMNS)})
+ON CONFLICT (id) DO UPDATE SET {", ".join(f"{column} = excluded.{column}" for column in _COLUMNS[1:])}
+"""
+
+# Khi dựng lại từ file: không ghi đè dòng đã được save_task cập nhật mới hơn trong lúc quét
+_UPSERT_IF_NEWER = _UPSERT + " WHERE tasks.updated_at IS NULL OR excluded.updated_at >= tasks.updated_at"
+
+# Cột được phép sắp xếp
+SORT_FIELDS = ("created_at", "updated_at", "status")
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return str(value.value)
+    return str(value)
+
+
+def _timestamp(value: Any) -> Optional[str]:
+    # Chuẩn hóa về ISO 8601 để so sánh/sắp xếp theo chuỗi trong SQLite đúng thứ tự thời gian
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).isoformat()
+        except ValueError:
+            return value
+    return _text(value)
+
+
+def task_summary_row(task: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Chuyển dữ liệu task (task.dict() hoặc nội dung task.json) thành một dòng của chỉ mục
+
+    Args:
+        task: Dữ liệu task
+
+    Returns:
+        tuple: Giá trị theo thứ tự các cột của bảng tasks
+    """
+    request = task.get("request") or {}
+    progress = task.get("progress_info") or {}
+    outline = task.get("outline") or {}
+    sections = task.get("sections")
+    error = task.get("error") or {}
+    return (
+        task["id"],
+        _text(task.get("status")) or "",
+        request.get("query"),
+        _timestamp(task.get("created_at")),
+        _timestamp(task.get("updated_at")),
+        _text(progress.get("phase")),
+        _text(progress.get("message")),
+        _text(progress.get("timestamp")),
+        len(outline["sections"]) if outline.get("sections") else None,
+        len(sections) if sections else None,
+        task.get("github_url"),
+        error.get("message")
+    )
+
+
+class TaskIndex:
+    """
+    Chỉ mục SQLite thông tin tóm tắt của mọi research task
+
+    Được cập nhật mỗi lần ResearchStorageService.save_task ghi task.json, nên danh sách task
+    (lọc theo trạng thái/ngày tạo, sắp xếp, phân trang) được trả về từ chỉ mục mà không cần
+    quét thư mục và parse từng task.json. Lần dùng đầu tiên trên dữ liệu cũ, chỉ mục được dựng
+    lại từ các task.json hiện có.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite (":memory:" để dùng bộ nhớ)
+        """
+        self.db_path = db_path
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if db_path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+            row = self._conn.execute("SELECT value FROM index_meta WHERE key = 'built_at'").fetchone()
+        self._built = row is not None
+
+    async def upsert(self, task: Dict[str, Any]) -> None:
+        """
+        Cập nhật thông tin tóm tắt của một task
+
+        Args:
+            task: Dữ liệu task (task.dict() hoặc nội dung task.json)
+        """
+        row = task_summary_row(task)
+        await asyncio.to_thread(self._execute, _UPSERT, row)
+
+    async def ensure_built(self, tasks_dir: str) -> None:
+        """
+        Dựng chỉ mục từ các task.json hiện có nếu chỉ mục chưa từng được dựng
+
+        Args:
+            tasks_dir: Thư mục chứa các thư mục task
+        """
+        if not self._built:
+            await self.rebuild(tasks_dir)
+
+    async def rebuild(self, tasks_dir: str) -> int:
+        """
+        Dựng lại chỉ mục từ các task.json trong thư mục
+
+        Args:
+            tasks_dir: Thư mục chứa các thư mục task
+
+        Returns:
+            int: Số task đã được đưa vào chỉ mục
+        """
+        count = await asyncio.to_thread(self._rebuild, tasks_dir)
+        self._built = True
+        logger.info(f"Đã dựng chỉ mục task từ {tasks_dir}: {count} task")
+        return count
+
+    async def query(
+        self,
+        status: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        sort: str = "created_at",
+        order: str = "desc",
+        limit: int = 100,
+        offset: int = 0
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Lấy danh sách task theo bộ lọc, đã sắp xếp và phân trang
+
+        Args:
+            status: Chỉ lấy task có trạng thái này
+            start_date: Ngày tạo từ (YYYY-MM-DD)
+            end_date: Ngày tạo đến (YYYY-MM-DD, bao gồm)
+            sort: Cột sắp xếp (created_at, updated_at, status)
+            order: "asc" hoặc "desc"
+            limit: Số task tối đa trả về
+            offset: Số task bỏ qua
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: Các task của trang và tổng số task khớp bộ lọc
+
+        Raises:
+            ValueError: Nếu cột sắp xếp hoặc thứ tự không hợp lệ
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cột sắp xếp không hợp lệ: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Thứ tự sắp xếp không hợp lệ: {order}")
+
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if start_date:
+            clauses.append("created_at >= ?")
+            params.append(start_date)
+        if end_date:
+            clauses.append("created_at < date(?, '+1 day')")
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # id là khóa phụ để thứ tự ổn định giữa các trang
+        sql = f"SELECT * FROM tasks {where} ORDER BY {sort} {order}, id {order} LIMIT ? OFFSET ?"
+        return await asyncio.to_thread(self._query_page, sql, f"SELECT COUNT(*) FROM tasks {where}", tuple(params), limit, offset)
+
+    async def count(self) -> int:
+        """Số task trong chỉ mục"""
+        rows = await asyncio.to_thread(self._query, "SELECT COUNT(*) AS count FROM tasks", ())
+        return rows[0]["count"]
+
+    def close(self) -> None:
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _query_page(self, sql: str, count_sql: str, params: tuple, limit: int, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            total = self._conn.execute(count_sql, params).fetchone()[0]
+            rows = self._conn.execute(sql, params + (limit, offset)).fetchall()
+        return [dict(row) for row in rows], total
+
+    def _rebuild(self, tasks_dir: str) -> int:
+        rows = []
+        if os.path.isdir(tasks_dir):
+            for task_id in os.listdir(tasks_dir):
+                task_file = os.path.join(tasks_dir, task_id, "task.json")
+                try:
+                    with open(task_file, "r", encoding="utf-8") as f:
+                        rows.append(task_summary_row(json.load(f)))
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Bỏ qua task.json không hợp lệ khi dựng chỉ mục: {task_file} ({str(e)})")
+        with self._lock, self._conn:
+            self._conn.executemany(_UPSERT_IF_NEWER, rows)
+            self._conn.execute(
+                "INSERT INTO index_meta (key, value) VALUES ('built_at', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (datetime.utcnow().isoformat(),)
+            )
+        return len(rows)
+
+
+# Một chỉ mục cho mỗi file SQLite
+_indexes: Dict[str, TaskIndex] = {}
+
+
+def get_task_index(db_path: str) -> TaskIndex:
+    """
+    Lấy chỉ mục task dùng chung cho một file SQLite
+
+    Args:
+        db_path: Đường dẫn file SQLite
+
+    Returns:
+        TaskIndex: Chỉ mục task
+    """
+    key = os.path.abspath(db_path)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = TaskIndex(db_path)
+    return index
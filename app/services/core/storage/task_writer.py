@@ -0,0 +1,319 @@
+import asyncio
+import copy
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import TASK_JSON_QUEUED_UPDATES, TASK_JSON_WRITES
+from app.services.core.storage.file_io import get_file_io
+
+logger = get_logger(__name__)
+
+
+def merge_patch(target: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Gộp patch vào target: dict lồng nhau được gộp đệ quy, các giá trị khác ghi đè
+
+    Args:
+        target: Dict được cập nhật tại chỗ
+        patch: Các giá trị cần gộp
+
+    Returns:
+        Dict[str, Any]: target sau khi gộp
+    """
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_patch(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def _json_serializer(obj: Any) -> Any:
+    """Hàm hỗ trợ serialize các object đặc biệt sang JSON"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if hasattr(obj, "dict") and callable(getattr(obj, "dict")):
+        return obj.dict()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+class _TaskWriteState:
+    """Các thay đổi đang chờ ghi của một task"""
+
+    __slots__ = ("document", "patch", "waiters", "worker")
+
+    def __init__(self):
+        # Bản đầy đủ mới nhất của task (None = đọc lại từ file khi ghi)
+        self.document: Optional[Dict[str, Any]] = None
+        # Các thay đổi từng phần đã gộp, áp dụng sau document
+        self.patch: Dict[str, Any] = {}
+        # Người gọi đang chờ lần ghi chứa thay đổi của họ
+        self.waiters: List[asyncio.Future] = []
+        self.worker: Optional[asyncio.Task] = None
+
+
+class TaskJsonWriter:
+    """
+    Bộ ghi task.json tuần tự theo từng task (actor)
+
+    Mọi thay đổi task.json (bản đầy đủ từ save_task, cost_info từ cost monitoring, ...) đi qua
+    một hàng đợi của task: tại mỗi thời điểm chỉ có một lần ghi cho mỗi task, các thay đổi đến
+    trong lúc đang ghi được gộp thành một lần ghi tiếp theo. Số lần ghi đồng thời trên mọi task
+    bị giới hạn, và mỗi lần ghi là nguyên tử (file tạm + rename) nên người đọc không bao giờ thấy
+    file ghi dở.
+
+    Cost summary được ghi với sticky=True: nó được áp lại lên mọi bản đầy đủ ghi sau đó, nên
+    route handler lưu task với cost_info cũ (hoặc None) không ghi đè số liệu chi phí mới hơn.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        max_concurrent_writes: int = 4,
+        max_tracked_tasks: int = 1000,
+        preserved_fields: Sequence[str] = ("cost_info",)
+    ):
+        """
+        Args:
+            base_dir: Thư mục gốc của storage (chứa research_tasks/)
+            max_concurrent_writes: Số lần ghi file đồng thời tối đa trên mọi task
+            max_tracked_tasks: Số task tối đa được giữ sticky patch (LRU)
+            preserved_fields: Trường được giữ nguyên từ file hiện tại khi bản đầy đủ để trống (None)
+        """
+        self.base_dir = str(base_dir)
+        self.max_concurrent_writes = max(1, max_concurrent_writes)
+        self.max_tracked_tasks = max(1, max_tracked_tasks)
+        self.preserved_fields = tuple(preserved_fields)
+        self._states: Dict[str, _TaskWriteState] = {}
+        self._sticky: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._write_slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def task_path(self, task_id: str) -> str:
+        return os.path.join(self.base_dir, "research_tasks", task_id, "task.json")
+
+    async def replace(self, task_id: str, document: Dict[str, Any]) -> bool:
+        """
+        Ghi bản đầy đủ của task (thay cho các bản đầy đủ và patch chưa được ghi trước đó)
+
+        Args:
+            task_id: ID của task
+            document: Nội dung đầy đủ của task.json
+
+        Returns:
+            bool: True khi đã ghi xong lần ghi chứa thay đổi này
+
+        Raises:
+            Exception: Lỗi khi ghi file
+        """
+        state = self._get_state(task_id)
+        state.document = document
+        state.patch = {}
+        return await self._enqueue(task_id, state)
+
+    async def merge(self, task_id: str, patch: Dict[str, Any], sticky: bool = False) -> bool:
+        """
+        Gộp một thay đổi từng phần vào task.json
+
+        Args:
+            task_id: ID của task
+            patch: Các trường cần cập nhật (dict lồng nhau được gộp đệ quy)
+            sticky: Áp lại patch lên mọi bản đầy đủ được ghi sau này (dùng cho cost summary)
+
+        Returns:
+            bool: True nếu đã ghi, False nếu task.json chưa tồn tại (không có gì để cập nhật)
+
+        Raises:
+            Exception: Lỗi khi ghi file
+        """
+        if sticky:
+            merge_patch(self._sticky.setdefault(task_id, {}), patch)
+            self._sticky.move_to_end(task_id)
+            while len(self._sticky) > self.max_tracked_tasks:
+                self._sticky.popitem(last=False)
+        state = self._get_state(task_id)
+        merge_patch(state.patch, patch)
+        return await self._enqueue(task_id, state)
+
+    async def flush(self, task_id: Optional[str] = None) -> None:
+        """
+        Chờ các lần ghi đang chờ hoặc đang chạy hoàn tất
+
+        Args:
+            task_id: ID của task, None để chờ mọi task
+        """
+        loop = self._running_loop()
+        if loop is None or loop is not self._loop:
+            return
+        if task_id is None:
+            states = list(self._states.values())
+        else:
+            states = [self._states[task_id]] if task_id in self._states else []
+        workers = [s.worker for s in states if s.worker is not None and not s.worker.done()]
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê số thay đổi đã nhận, đã gộp và số lần ghi thực tế"""
+        return {
+            "active_tasks": len(self._states),
+            "queued_updates": sum(len(s.waiters) for s in self._states.values()),
+            "sticky_tasks": len(self._sticky),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "writes": self.writes,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "max_concurrent_writes": self.max_concurrent_writes
+        }
+
+    @staticmethod
+    def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    def _get_state(self, task_id: str) -> _TaskWriteState:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Event loop đã đổi (ví dụ giữa các TestClient): hàng đợi của loop cũ không còn chạy được
+            self._loop = loop
+            self._write_slots = asyncio.Semaphore(self.max_concurrent_writes)
+            self._states = {}
+        state = self._states.get(task_id)
+        if state is None:
+            state = self._states[task_id] = _TaskWriteState()
+        return state
+
+    async def _enqueue(self, task_id: str, state: _TaskWriteState) -> bool:
+        self.submitted += 1
+        if state.waiters:
+            # Thay đổi được gộp vào lần ghi đang chờ của task
+            self.coalesced += 1
+            TASK_JSON_WRITES.inc(outcome="coalesced")
+        future = self._loop.create_future()
+        state.waiters.append(future)
+        TASK_JSON_QUEUED_UPDATES.inc()
+        if state.worker is None or state.worker.done():
+            state.worker = self._loop.create_task(self._drain(task_id, state))
+        return await future
+
+    async def _drain(self, task_id: str, state: _TaskWriteState) -> None:
+        """Ghi lần lượt các thay đổi đang chờ của task cho đến khi hàng đợi rỗng"""
+        try:
+            while state.waiters:
+                document, patch, waiters = state.document, state.patch, state.waiters
+                state.document, state.patch, state.waiters = None, {}, []
+                sticky = copy.deepcopy(self._sticky.get(task_id))
+                try:
+                    async with self._write_slots:
+                        written = await get_file_io().run(self._write, task_id, document, patch, sticky, op="task_json")
+                except Exception as e:
+                    self.errors += 1
+                    TASK_JSON_WRITES.inc(outcome="error")
+                    logger.error(f"Lỗi khi ghi task.json của task {task_id}: {str(e)}")
+                    self._resolve(waiters, error=e)
+                    continue
+                if written:
+                    self.writes += 1
+                    TASK_JSON_WRITES.inc(outcome="written")
+                else:
+                    self.skipped += 1
+                    TASK_JSON_WRITES.inc(outcome="skipped")
+                self._resolve(waiters, result=written)
+        finally:
+            # Thay đổi mới luôn được thêm trước khi kiểm tra worker nên không bị bỏ sót ở đây
+            if self._states.get(task_id) is state and not state.waiters:
+                del self._states[task_id]
+
+    @staticmethod
+    def _resolve(waiters: List[asyncio.Future], result: bool = False, error: Optional[Exception] = None) -> None:
+        TASK_JSON_QUEUED_UPDATES.inc(-len(waiters))
+        for waiter in waiters:
+            # Người gọi có thể đã bị hủy trong lúc chờ
+            if waiter.done():
+                continue
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(result)
+
+    def _write(
+        self,
+        task_id: str,
+        document: Optional[Dict[str, Any]],
+        patch: Dict[str, Any],
+        sticky: Optional[Dict[str, Any]]
+    ) -> bool:
+        path = self.task_path(task_id)
+        current = None
+        if document is None or any(
+            document.get(field) is None and field not in (sticky or {}) for field in self.preserved_fields
+        ):
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    current = json.load(f)
+
+        if document is None:
+            if current is None:
+                # Patch cho task chưa có task.json: không tạo file chỉ chứa một phần dữ liệu
+                return False
+            document = current
+        elif current is not None:
+            for field in self.preserved_fields:
+                if document.get(field) is None and current.get(field) is not None:
+                    document[field] = current[field]
+
+        if sticky:
+            merge_patch(document, sticky)
+        merge_patch(document, patch)
+
+        # Ghi nguyên tử theo chính sách fsync của storage
+        get_file_io().atomic_write(
+            path, lambda f: json.dump(document, f, ensure_ascii=False, indent=2, default=_json_serializer)
+        )
+        return True
+
+
+# Một writer cho mỗi thư mục storage
+_writers: Dict[str, TaskJsonWriter] = {}
+
+
+def get_task_writer(base_dir: str) -> TaskJsonWriter:
+    """
+    Lấy writer task.json dùng chung của một thư mục storage
+
+    Args:
+        base_dir: Thư mục gốc của storage (chứa research_tasks/)
+
+    Returns:
+        TaskJsonWriter: Writer của thư mục
+    """
+    key = os.path.abspath(str(base_dir))
+    writer = _writers.get(key)
+    if writer is None:
+        settings = get_settings()
+        writer = TaskJsonWriter(
+            str(base_dir),
+            max_concurrent_writes=settings.TASK_WRITER_MAX_CONCURRENT_WRITES,
+            max_tracked_tasks=settings.TASK_WRITER_MAX_TRACKED_TASKS
+        )
+        _writers[key] = writer
+    return writer
+
+
+async def flush_task_writers() -> None:
+    """Chờ mọi lần ghi task.json đang chờ hoàn tất (gọi khi tắt ứng dụng)"""
+    for writer in list(_writers.values()):
+        await writer.flush()
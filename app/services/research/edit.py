@@ -4,6 +4,8 @@ from typing import Any, Dict, List
 from app.core.config import get_edit_prompts, get_settings, EditPrompts
 from app.core.exceptions import EditError
 from app.core.factory import get_service_factory
+from app.core.tracing import traced
+from app.services.core.monitoring.budget import BUDGET_OK, get_budget_manager
 from app.services.research.base import (
     BaseEditPhase,
     ResearchSection,
@@ -15,6 +17,10 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def _edit_task_id(args: Dict[str, Any]):
+    """Lấy task_id cho span của phase chỉnh sửa từ request hoặc outline"""
+    return getattr(args["request"], "task_id", None) or getattr(args["outline"], "task_id", None)
+
 class EditService(BaseEditPhase):
     """Service thực hiện phase chỉnh sửa trong quy trình nghiên cứu"""
     
@@ -33,6 +39,7 @@ class EditService(BaseEditPhase):
             service_factory = get_service_factory()
             self.cost_service = await service_factory.get_cost_monitoring_service()
     
+    @traced("edit.execute", task_id=_edit_task_id, export=True)
     async def execute(
         self, 
         request: ResearchRequest,
@@ -98,30 +105,32 @@ class EditService(BaseEditPhase):
                 "target_audience": request.target_audience
             }
             
-            # Chỉnh sửa và kết hợp nội dung
-            logger.info("Bắt đầu chỉnh sửa và kết hợp nội dung...")
-            try:
-                content = await self.edit_content(sections, context, task_id)
-                logger.info(f"Chỉnh sửa nội dung thành công, độ dài: {len(content)} ký tự")
-            except Exception as e:
-                logger.error(f"Lỗi khi chỉnh sửa nội dung trong execute: {str(e)}")
-                # Tạo nội dung mặc định từ các sections
-                content = "# " + request.topic + "\n\n"
-                for section in sections:
-                    content += "## " + section.title + "\n\n"
-                    if section.content:
-                        content += section.content + "\n\n"
-                logger.info(f"Sử dụng nội dung mặc định do lỗi, độ dài: {len(content)} ký tự")
-            
-            # Tạo tiêu đề
-            logger.info("Bắt đầu tạo tiêu đề...")
-            try:
-                title = await self.create_title(content, context, task_id)
-                logger.info(f"Tạo tiêu đề thành công: {title}")
-            except Exception as e:
-                logger.error(f"Lỗi khi tạo tiêu đề trong execute: {str(e)}")
+            if await self._should_skip_edit(task_id):
+                # Ngân sách sắp hết: bỏ qua chỉnh sửa bằng LLM, ghép nội dung các phần
+                content = self._default_content(request.topic, sections)
                 title = request.topic
-                logger.info(f"Sử dụng tiêu đề mặc định do lỗi: {title}")
+                logger.info(f"Bỏ qua chỉnh sửa và tạo tiêu đề do ngân sách, độ dài nội dung: {len(content)} ký tự")
+            else:
+                # Chỉnh sửa và kết hợp nội dung
+                logger.info("Bắt đầu chỉnh sửa và kết hợp nội dung...")
+                try:
+                    content = await self.edit_content(sections, context, task_id)
+                    logger.info(f"Chỉnh sửa nội dung thành công, độ dài: {len(content)} ký tự")
+                except Exception as e:
+                    logger.error(f"Lỗi khi chỉnh sửa nội dung trong execute: {str(e)}")
+                    # Tạo nội dung mặc định từ các sections
+                    content = self._default_content(request.topic, sections)
+                    logger.info(f"Sử dụng nội dung mặc định do lỗi, độ dài: {len(content)} ký tự")
+                
+                # Tạo tiêu đề
+                logger.info("Bắt đầu tạo tiêu đề...")
+                try:
+                    title = await self.create_title(content, context, task_id)
+                    logger.info(f"Tạo tiêu đề thành công: {title}")
+                except Exception as e:
+                    logger.error(f"Lỗi khi tạo tiêu đề trong execute: {str(e)}")
+                    title = request.topic
+                    logger.info(f"Sử dụng tiêu đề mặc định do lỗi: {title}")
             
             # Thu thập các nguồn
             logger.info("Bắt đầu thu thập nguồn tham khảo...")
@@ -171,6 +180,7 @@ class EditService(BaseEditPhase):
                 details={"error": str(e)}
             )
     
+    @traced("edit.edit_content")
     async def edit_content(
         self, 
         sections: List[ResearchSection], 
@@ -270,6 +280,7 @@ class EditService(BaseEditPhase):
             logger.info(f"Sử dụng nội dung mặc định do lỗi, độ dài: {len(default_content)} ký tự")
             return default_content
     
+    @traced("edit.create_title")
     async def create_title(
         self, 
         content: str, 
@@ -411,6 +422,35 @@ class EditService(BaseEditPhase):
             logger.info(f"Sử dụng tiêu đề mặc định do lỗi: {context.get('topic', 'Không có tiêu đề')}")
             return context.get("topic", "Không có tiêu đề")
     
+    async def _should_skip_edit(self, task_id: str = None) -> bool:
+        """
+        Kiểm tra có nên bỏ qua chỉnh sửa bằng LLM vì ngân sách của task sắp hết hay không
+        
+        Args:
+            task_id: ID của task
+            
+        Returns:
+            bool: True nếu ngân sách đang ở chế độ tiết kiệm hoặc đã hết
+        """
+        budget = get_budget_manager() if task_id else None
+        if budget is None:
+            return False
+        try:
+            return await budget.get_status(task_id) != BUDGET_OK
+        except Exception as e:
+            logger.error(f"Lỗi khi kiểm tra ngân sách của task {task_id}: {str(e)}")
+            return False
+    
+    @staticmethod
+    def _default_content(topic: str, sections: List[ResearchSection]) -> str:
+        """Ghép nội dung các phần thành bài nghiên cứu khi không chỉnh sửa bằng LLM"""
+        content = "# " + topic + "\n\n"
+        for section in sections:
+            content += "## " + section.title + "\n\n"
+            if section.content:
+                content += section.content + "\n\n"
+        return content
+    
     def _collect_sources(self, sections: List[ResearchSection]) -> List[str]:
         """
         Thu thập các nguồn tham khảo từ các phần
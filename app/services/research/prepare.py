@@ -1,11 +1,13 @@
+import asyncio
 import json
 import re
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
-from app.core.config import get_prepare_prompts
+from app.core.config import get_prepare_prompts, get_settings
 from app.core.exceptions import PrepareError
 from app.core.factory import get_service_factory
 from app.core.logging import logger
+from app.core.tracing import traced
 from app.services.research.base import (
     BasePreparePhase,
     ResearchRequest,
@@ -22,6 +24,9 @@ class PrepareService(BasePreparePhase):
         service_factory = get_service_factory()
         self.llm_service = service_factory.create_llm_service_for_phase("prepare")
         self.search_service = None
+        self.settings = get_settings()
+        # Tìm kiếm context dàn ý chạy trước từ query gốc: (query, task)
+        self._speculative_search: Optional[Tuple[str, asyncio.Task]] = None
         # Khởi tạo cost monitoring service
         self.cost_service = None
         
@@ -31,6 +36,103 @@ class PrepareService(BasePreparePhase):
             service_factory = get_service_factory()
             self.cost_service = await service_factory.get_cost_monitoring_service()
     
+    def start_speculative_search(self, query: str, task_id: str = None) -> None:
+        """
+        Bắt đầu tìm kiếm context cho dàn ý từ query gốc, chạy song song với analyze_query
+        
+        Không làm gì nếu PREPARE_SPECULATIVE_SEARCH bị tắt. Kết quả được create_outline
+        sử dụng lại nếu topic sau khi phân tích không khác biệt đáng kể so với query gốc.
+        
+        Args:
+            query: Query gốc của yêu cầu nghiên cứu
+            task_id: ID của task để ghi nhận chi phí
+        """
+        if not self.settings.PREPARE_SPECULATIVE_SEARCH or not query:
+            return
+        
+        self.cancel_speculative_search()
+        logger.info(f"Bắt đầu tìm kiếm song song cho dàn ý với query gốc: {query}")
+        task = asyncio.create_task(self._run_speculative_search(query, task_id))
+        self._speculative_search = (query, task)
+    
+    async def _run_speculative_search(self, query: str, task_id: str = None) -> List[Dict[str, Any]]:
+        """Thực hiện tìm kiếm song song, trả về danh sách rỗng nếu có lỗi"""
+        try:
+            if self.search_service is None:
+                self.search_service = await get_service_factory().create_search_service()
+            return await self.search_service.search(
+                query=query,
+                task_id=task_id,
+                purpose="search_for_outline_speculative"
+            )
+        except Exception as e:
+            logger.error(f"Lỗi khi tìm kiếm song song cho dàn ý: {str(e)}")
+            return []
+    
+    def cancel_speculative_search(self) -> None:
+        """Huỷ tìm kiếm song song đang chạy (nếu có)"""
+        if self._speculative_search:
+            _, task = self._speculative_search
+            if not task.done():
+                task.cancel()
+            self._speculative_search = None
+    
+    async def _take_speculative_results(self, topic: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Lấy kết quả tìm kiếm song song nếu vẫn phù hợp với topic đã phân tích
+        
+        Args:
+            topic: Topic sau khi phân tích
+            
+        Returns:
+            Optional[List[Dict[str, Any]]]: Kết quả tìm kiếm, hoặc None nếu cần tìm kiếm lại
+        """
+        if not self._speculative_search:
+            return None
+        
+        query, task = self._speculative_search
+        self._speculative_search = None
+        
+        if not self._speculation_matches(query, topic):
+            logger.info(f"Topic '{topic}' khác biệt đáng kể so với query gốc, bỏ kết quả tìm kiếm song song")
+            if not task.done():
+                task.cancel()
+            return None
+        
+        results = await task
+        if not results:
+            logger.info("Tìm kiếm song song không có kết quả, tìm kiếm lại với topic đã phân tích")
+            return None
+        
+        logger.info(f"Sử dụng {len(results)} kết quả từ tìm kiếm song song cho dàn ý")
+        return results
+    
+    def _extract_keywords(self, text: str) -> set:
+        """Lấy các từ khóa quan trọng (độ dài > 3, không phải từ phổ biến) từ một đoạn văn bản"""
+        common_words = {"là", "và", "của", "trong", "về", "các", "những", "với", "cho", "tại", "bởi", "vì", "nên", "cần", "phải", "có", "không", "ở", "tại"}
+        words = set(re.sub(r"[^\w\s]", " ", (text or "").lower()).split())
+        return {word for word in words - common_words if len(word) > 3}
+    
+    def _speculation_matches(self, query: str, topic: str) -> bool:
+        """
+        Kiểm tra topic đã phân tích có còn khớp với query gốc dùng để tìm kiếm song song không
+        
+        Args:
+            query: Query gốc đã dùng để tìm kiếm
+            topic: Topic sau khi phân tích
+            
+        Returns:
+            bool: True nếu đủ tỷ lệ từ khóa của topic xuất hiện trong query gốc
+        """
+        topic_keywords = self._extract_keywords(topic)
+        if not topic_keywords:
+            return True
+        
+        overlap = len(topic_keywords & self._extract_keywords(query)) / len(topic_keywords)
+        logger.info(f"Tỷ lệ từ khóa trùng giữa topic và query gốc: {overlap:.2f}")
+        return overlap >= self.settings.PREPARE_SPECULATIVE_MIN_OVERLAP
+    
+    @traced("prepare.execute", task_id=lambda args: getattr(args["request"], "task_id", None), export=True)
     async def execute(self, request: ResearchRequest) -> ResearchOutline:
         """
         Thực thi phase chuẩn bị
@@ -83,6 +185,9 @@ class PrepareService(BasePreparePhase):
             if task_id:
                 await self.cost_service.start_phase_timing(task_id, "analyzing")
             
+            # Tìm kiếm context cho dàn ý song song với bước phân tích (nếu được bật)
+            self.start_speculative_search(request.query, task_id)
+            
             # Phân tích yêu cầu
             logger.info("Bắt đầu phân tích yêu cầu nghiên cứu...")
             analysis = await self.analyze_query(request.query, task_id)
@@ -90,7 +195,7 @@ class PrepareService(BasePreparePhase):
             
             # Kết thúc ghi nhận thời gian cho phase phân tích
             if task_id:
-                self.cost_service.end_phase_timing(task_id, "analyzing", "completed")
+                await self.cost_service.end_phase_timing(task_id, "analyzing", "completed")
             
             # Cập nhật request với thông tin phân tích
             updated_request = ResearchRequest(
@@ -124,6 +229,7 @@ class PrepareService(BasePreparePhase):
             return outline
             
         except Exception as e:
+            self.cancel_speculative_search()
             logger.error(f"=== KẾT THÚC PHASE CHUẨN BỊ - THẤT BẠI ===")
             logger.error(f"Lỗi trong quá trình chuẩn bị: {str(e)}")
             raise PrepareError(
@@ -131,6 +237,7 @@ class PrepareService(BasePreparePhase):
                 details={"error": str(e)}
             )
     
+    @traced("prepare.analyze_query")
     async def analyze_query(self, query: str, task_id: str = None) -> Dict[str, Any]:
         """
         Phân tích yêu cầu nghiên cứu
@@ -219,6 +326,10 @@ class PrepareService(BasePreparePhase):
             
             return analysis
             
+        except asyncio.CancelledError:
+            # Task bị hủy trong lúc phân tích: huỷ luôn tìm kiếm song song đang chờ kết quả phân tích
+            self.cancel_speculative_search()
+            raise
         except Exception as e:
             logger.error(f"Lỗi khi phân tích yêu cầu: {str(e)}")
             # Trả về phân tích mặc định nếu có lỗi
@@ -369,6 +480,7 @@ class PrepareService(BasePreparePhase):
         
         return analysis
 
+    @traced("prepare.create_outline")
     async def create_outline(self, request: ResearchRequest, task_id: str = None) -> ResearchOutline:
         """
         Tạo dàn ý cho bài nghiên cứu
@@ -390,8 +502,13 @@ class PrepareService(BasePreparePhase):
             search_query = f"{request.topic} {request.scope}"
             logger.info(f"Tìm kiếm thông tin liên quan với query: {search_query}")
             
+            # Dùng lại kết quả tìm kiếm song song nếu topic không thay đổi đáng kể
+            speculative_results = await self._take_speculative_results(request.topic)
+            
             # Kiểm tra search_service trước khi sử dụng
-            if self.search_service is not None:
+            if speculative_results:
+                search_results = speculative_results
+            elif self.search_service is not None:
                 logger.info(f"Search service có sẵn: {self.search_service.__class__.__name__}")
                 try:
                     # Gọi search API
@@ -1,11 +1,14 @@
+import asyncio
+import contextlib
 import json
 import time
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from app.core.config import get_research_prompts
-from app.core.exceptions import ResearchError
+from app.core.config import get_research_prompts, get_settings
+from app.core.exceptions import BudgetExceededError, ResearchError
 from app.core.factory import get_service_factory
 from app.core.logging import logger
+from app.core.tracing import traced
 from app.services.research.base import (
     BaseResearchPhase,
     ResearchSection,
@@ -23,6 +26,16 @@ class ResearchService(BaseResearchPhase):
         self.llm_service = service_factory.create_llm_service_for_phase("research")
         self.search_service = None
         self.update_progress_callback = None
+        # Callback lưu checkpoint mỗi khi một phần nghiên cứu xong: (index, section)
+        self.section_checkpoint_callback = None
+        # Số phần được nghiên cứu song song tối đa
+        settings = get_settings()
+        self.section_concurrency = settings.RESEARCH_SECTION_CONCURRENCY
+        # Ngân sách song song riêng cho từng stage search / LLM (0 = không giới hạn riêng)
+        self.search_concurrency = settings.RESEARCH_SEARCH_CONCURRENCY
+        self.llm_concurrency = settings.RESEARCH_LLM_CONCURRENCY
+        self._search_slots: Optional[asyncio.Semaphore] = None
+        self._llm_slots: Optional[asyncio.Semaphore] = None
         # Khởi tạo cost monitoring service
         self.cost_service = None
         
@@ -32,13 +45,38 @@ class ResearchService(BaseResearchPhase):
             service_factory = get_service_factory()
             self.cost_service = await service_factory.get_cost_monitoring_service()
     
+    def _stage_slot(self, slots: Optional[asyncio.Semaphore]):
+        """Trả về context manager giữ một slot của stage, hoặc không giới hạn nếu chưa cấu hình"""
+        return slots if slots is not None else contextlib.nullcontext()
+    
+    async def _report_progress(self, progress_info: Dict[str, Any]) -> None:
+        """Gửi thông tin tiến độ đến callback nếu có"""
+        if callable(self.update_progress_callback):
+            await self.update_progress_callback(progress_info)
+    
+    async def _save_checkpoint(self, index: int, section: ResearchSection) -> None:
+        """Lưu checkpoint của phần vừa nghiên cứu xong; lỗi khi lưu không làm dừng phase"""
+        if not callable(self.section_checkpoint_callback):
+            return
+        try:
+            await self.section_checkpoint_callback(index, section)
+        except Exception as e:
+            logger.warning(f"Không thể lưu checkpoint cho phần {index + 1}: {str(e)}")
+    
+    @traced("research.execute", task_id=lambda args: getattr(args["outline"], "task_id", None), export=True)
     async def execute(
         self, 
         request: ResearchRequest,
-        outline: ResearchOutline
+        outline: ResearchOutline,
+        completed_sections: Optional[Dict[int, ResearchSection]] = None
     ) -> List[ResearchSection]:
         """
         Thực thi phase nghiên cứu
+        
+        Args:
+            request: Yêu cầu nghiên cứu
+            outline: Dàn ý nghiên cứu
+            completed_sections: Các phần đã nghiên cứu từ lần chạy trước (theo vị trí trong dàn ý), sẽ không nghiên cứu lại
         """
         # Khởi tạo các service bất đồng bộ
         await self.initialize()
@@ -65,42 +103,99 @@ class ResearchService(BaseResearchPhase):
             if task_id:
                 await self.cost_service.start_phase_timing(task_id, "researching")
             
-            # Nghiên cứu từng phần
-            researched_sections = []
+            # Nghiên cứu các phần song song, giới hạn bởi section_concurrency
             total_sections = len(outline.sections)
+            concurrency = self.section_concurrency
+            if self.search_concurrency > 0 and self.llm_concurrency > 0:
+                # Cần đủ chỗ để cả hai stage cùng bận thì pipeline mới chồng lấp được
+                concurrency = max(concurrency, self.search_concurrency + self.llm_concurrency)
+            concurrency = max(1, min(concurrency, total_sections or 1))
+            logger.info(f"Số phần nghiên cứu song song tối đa: {concurrency}")
             
-            for i, section in enumerate(outline.sections):
-                logger.info(f"Bắt đầu nghiên cứu phần {i+1}/{total_sections}: {section.title}")
-                
-                # Cập nhật thông tin tiến độ
-                progress_info = {
-                    "phase": "researching",
-                    "current_section": i + 1,
-                    "total_sections": total_sections,
-                    "current_section_title": section.title,
-                    "completed_sections": i
-                }
-                
-                # Gửi thông tin tiến độ đến callback nếu có
-                if hasattr(self, 'update_progress_callback') and callable(self.update_progress_callback):
-                    await self.update_progress_callback(progress_info)
-                
-                # Bắt đầu ghi nhận thời gian cho section
-                if task_id:
+            semaphore = asyncio.Semaphore(concurrency)
+            # Hai stage search và tổng hợp có ngân sách riêng: search của các phần sau
+            # chạy trong khi LLM đang tổng hợp các phần trước
+            self._search_slots = asyncio.Semaphore(self.search_concurrency) if self.search_concurrency > 0 else None
+            self._llm_slots = asyncio.Semaphore(self.llm_concurrency) if self.llm_concurrency > 0 else None
+            logger.info(f"Giới hạn song song theo stage: search={self.search_concurrency or 'không giới hạn'}, llm={self.llm_concurrency or 'không giới hạn'}")
+            progress_lock = asyncio.Lock()
+            completed_sections = {
+                i: section for i, section in (completed_sections or {}).items()
+                if 0 <= i < total_sections
+            }
+            completed_count = len(completed_sections)
+            if completed_count:
+                logger.info(f"Tiếp tục từ checkpoint: {completed_count}/{total_sections} phần đã được nghiên cứu")
+            
+            async def research_one(i: int, section: ResearchSection) -> ResearchSection:
+                nonlocal completed_count
+                if i in completed_sections:
+                    return completed_sections[i]
+                async with semaphore:
+                    logger.info(f"Bắt đầu nghiên cứu phần {i+1}/{total_sections}: {section.title}")
+                    
+                    # Cập nhật thông tin tiến độ
+                    async with progress_lock:
+                        await self._report_progress({
+                            "phase": "researching",
+                            "current_section": i + 1,
+                            "total_sections": total_sections,
+                            "current_section_title": section.title,
+                            "completed_sections": completed_count
+                        })
+                    
+                    # Bắt đầu ghi nhận thời gian cho section
                     section_id = f"section_{i+1}"
-                    await self.cost_service.start_section_timing(task_id, section_id, section.title)
-                
-                # Nghiên cứu phần này
-                researched_section = await self.research_section(section, context, task_id)
-                researched_sections.append(researched_section)
-                
-                # Kết thúc ghi nhận thời gian cho section
-                if task_id:
-                    await self.cost_service.end_section_timing(task_id, section_id, "completed")
-                
-                logger.info(f"Đã hoàn thành nghiên cứu phần {i+1}/{total_sections}: {section.title}")
-                logger.info(f"Độ dài nội dung: {len(researched_section.content) if researched_section.content else 0} ký tự")
-                logger.info(f"Số nguồn tham khảo: {len(researched_section.sources) if researched_section.sources else 0}")
+                    if task_id:
+                        await self.cost_service.start_section_timing(task_id, section_id, section.title)
+                    
+                    # Nghiên cứu phần này
+                    try:
+                        researched_section = await self.research_section(section, context, task_id)
+                    except BaseException:
+                        if task_id:
+                            await self.cost_service.end_section_timing(task_id, section_id, "failed")
+                        raise
+                    
+                    # Kết thúc ghi nhận thời gian cho section
+                    if task_id:
+                        await self.cost_service.end_section_timing(task_id, section_id, "completed")
+                    
+                    await self._save_checkpoint(i, researched_section)
+                    
+                    # Các phần có thể hoàn thành không theo thứ tự, nên đếm số phần đã xong
+                    async with progress_lock:
+                        completed_count += 1
+                        await self._report_progress({
+                            "phase": "researching",
+                            "current_section": i + 1,
+                            "total_sections": total_sections,
+                            "current_section_title": section.title,
+                            "completed_sections": completed_count
+                        })
+                    
+                    logger.info(f"Đã hoàn thành nghiên cứu phần {i+1}/{total_sections}: {section.title} ({completed_count}/{total_sections} phần đã xong)")
+                    logger.info(f"Độ dài nội dung: {len(researched_section.content) if researched_section.content else 0} ký tự")
+                    logger.info(f"Số nguồn tham khảo: {len(researched_section.sources) if researched_section.sources else 0}")
+                    return researched_section
+            
+            tasks = [
+                asyncio.create_task(research_one(i, section))
+                for i, section in enumerate(outline.sections)
+            ]
+            try:
+                # gather giữ nguyên thứ tự của dàn ý trong kết quả trả về
+                researched_sections = await asyncio.gather(*tasks)
+            except BaseException:
+                # Một phần thất bại thì huỷ các phần còn lại
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            finally:
+                self._search_slots = None
+                self._llm_slots = None
+            researched_sections = list(researched_sections)
             
             # Kết thúc ghi nhận thời gian cho phase nghiên cứu
             if task_id:
@@ -120,6 +215,7 @@ class ResearchService(BaseResearchPhase):
                 details={"error": str(e)}
             )
             
+    @traced("research.section", attributes=lambda args: {"section": args["section"].title})
     async def research_section(
         self,
         section: ResearchSection,
@@ -138,49 +234,90 @@ class ResearchService(BaseResearchPhase):
             ResearchSection: Phần đã được nghiên cứu
         """
         try:
-            # Tìm kiếm thông tin
+            # Stage 1: tìm kiếm thông tin
             logger.info(f"Bắt đầu tìm kiếm thông tin cho phần: {section.title}")
-            search_results = await self._search_section_info(section, context, task_id)
+            async with self._stage_slot(self._search_slots):
+                search_results = await self._search_section_info(section, context, task_id)
             logger.info(f"Tìm kiếm thành công: {len(search_results)} kết quả")
             
             # Log một số kết quả tìm kiếm đầu tiên
             for i, result in enumerate(search_results[:3]):
                 logger.info(f"  Kết quả {i+1}: {result.get('title', 'N/A')} - {result.get('url', 'N/A')}")
             
-            # Tổng hợp thông tin
-            logger.info(f"Bắt đầu tổng hợp thông tin cho phần: {section.title}")
-            prompt = self.prompts.ANALYZE_AND_SYNTHESIZE.format(
-                topic=context["topic"],
-                scope=context["scope"],
-                target_audience=context["target_audience"],
-                section_title=section.title,
-                section_description=section.description,
-                search_results=json.dumps(search_results, ensure_ascii=False)
-            )
+            # Stage 2: tổng hợp thông tin
+            async with self._stage_slot(self._llm_slots):
+                return await self._synthesize_section(section, context, search_results, task_id)
             
-            logger.info(f"Gửi prompt tổng hợp đến LLM: {prompt[:100]}...")
-            # Truyền task_id để ghi nhận chi phí
+        except Exception as e:
+            logger.error(f"Lỗi khi nghiên cứu phần {section.title}: {str(e)}")
+            raise
+    
+    @traced("research.synthesize")
+    async def _synthesize_section(
+        self,
+        section: ResearchSection,
+        context: Dict[str, Any],
+        search_results: List[Dict[str, str]],
+        task_id: str = None
+    ) -> ResearchSection:
+        """
+        Tổng hợp nội dung cho một phần từ kết quả tìm kiếm
+        
+        Args:
+            section: Phần cần tổng hợp
+            context: Context cho việc nghiên cứu
+            search_results: Kết quả tìm kiếm của phần này
+            task_id: ID của task để ghi nhận chi phí
+            
+        Returns:
+            ResearchSection: Phần đã được nghiên cứu
+        """
+        logger.info(f"Bắt đầu tổng hợp thông tin cho phần: {section.title}")
+        prompt = self.prompts.ANALYZE_AND_SYNTHESIZE.format(
+            topic=context["topic"],
+            scope=context["scope"],
+            target_audience=context["target_audience"],
+            section_title=section.title,
+            section_description=section.description,
+            search_results=json.dumps(search_results, ensure_ascii=False)
+        )
+        
+        logger.info(f"Gửi prompt tổng hợp đến LLM: {prompt[:100]}...")
+        # Truyền task_id để ghi nhận chi phí
+        try:
             content = await self.llm_service.generate(
                 prompt=prompt,
                 task_id=task_id,
                 purpose=f"research_section_{section.title}"
             )
             logger.info(f"Nhận phản hồi từ LLM: {content[:100]}...")
+        except BudgetExceededError as e:
+            # Hết ngân sách: giữ lại kết quả tìm kiếm làm nội dung thô thay vì làm hỏng cả phase
+            logger.warning(f"Không tổng hợp phần {section.title} do vượt ngân sách: {e.details.get('reason')}")
+            content = self._budget_fallback_content(search_results)
+        
+        # Cập nhật nội dung cho phần
+        section.content = content
+        section.sources = [result["url"] for result in search_results]
+        
+        logger.info(f"Hoàn thành nghiên cứu phần: {section.title}")
+        logger.info(f"Độ dài nội dung: {len(content)} ký tự")
+        logger.info(f"Số nguồn tham khảo: {len(section.sources)}")
+        
+        return section
             
-            # Cập nhật nội dung cho phần
-            section.content = content
-            section.sources = [result["url"] for result in search_results]
-            
-            logger.info(f"Hoàn thành nghiên cứu phần: {section.title}")
-            logger.info(f"Độ dài nội dung: {len(content)} ký tự")
-            logger.info(f"Số nguồn tham khảo: {len(section.sources)}")
-            
-            return section
-            
-        except Exception as e:
-            logger.error(f"Lỗi khi nghiên cứu phần {section.title}: {str(e)}")
-            raise
-            
+    @staticmethod
+    def _budget_fallback_content(search_results: List[Dict[str, str]]) -> str:
+        """Nội dung thô của một phần từ kết quả tìm kiếm, dùng khi không còn ngân sách gọi LLM"""
+        lines = ["*Phần này chưa được tổng hợp do vượt ngân sách; dưới đây là các nguồn tìm được.*", ""]
+        for result in search_results:
+            line = f"- [{result.get('title', result.get('url', ''))}]({result.get('url', '')})"
+            if result.get("snippet"):
+                line += f": {result['snippet']}"
+            lines.append(line)
+        return "\n".join(lines)
+    
+    @traced("research.search")
     async def _search_section_info(
         self,
         section: ResearchSection,
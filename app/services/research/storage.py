@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import logging
@@ -6,8 +7,13 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 from uuid import UUID
 
+from app.core.config import get_settings
 from app.core.factory import get_service_factory
 from app.core.logging import get_logger
+from app.core.tracing import traced
+from app.services.core.storage.file_io import get_file_io
+from app.services.core.storage.task_index import get_task_index
+from app.services.core.storage.task_writer import get_task_writer
 from app.models.research import (
     ResearchRequest,
     ResearchResponse,
@@ -20,6 +26,40 @@ from app.models.research import (
 
 logger = get_logger(__name__)
 
+# File chỉ chứa các trường mà endpoint trạng thái/tiến độ cần, ghi cùng task.json
+STATUS_FILE = "status.json"
+
+
+def status_projection(task: ResearchResponse) -> Dict[str, Any]:
+    """
+    Trích các trường trạng thái/tiến độ của task (không gồm nội dung section và kết quả)
+    
+    Args:
+        task: Research task
+        
+    Returns:
+        Dict[str, Any]: Trạng thái, tiến độ, thời gian, số section, tóm tắt kết quả và lỗi
+    """
+    return {
+        "id": task.id,
+        "status": getattr(task.status, "value", task.status),
+        "progress_info": dict(task.progress_info or {}),
+        "created_at": task.created_at.isoformat() if task.created_at else None,
+        "updated_at": task.updated_at.isoformat() if task.updated_at else None,
+        "query": task.request.query if task.request else None,
+        "outline_sections": [
+            {"title": section.title, "description": section.description} for section in task.outline.sections
+        ] if task.outline else None,
+        "researched_sections_count": len(task.sections) if task.sections else None,
+        "result_info": {
+            "title": task.result.title,
+            "content_length": len(task.result.content) if task.result.content else 0,
+            "sources_count": len(task.result.sources) if task.result.sources else 0
+        } if task.result else None,
+        "error": {"message": task.error.message, "details": task.error.details} if task.error else None,
+        "github_url": task.github_url
+    }
+
 class ResearchStorageService:
     """Service quản lý lưu trữ và truy xuất dữ liệu nghiên cứu"""
     
@@ -34,6 +74,16 @@ class ResearchStorageService:
         self.storage_service = service_factory.get_storage_service(storage_provider)
         self.tasks_dir = "research_tasks"
         self.base_dir = self.storage_service.base_dir
+        # task.json được ghi qua writer tuần tự theo task, dùng chung với cost monitoring
+        self.task_writer = get_task_writer(self.base_dir)
+        # Đọc file trực tiếp (không qua storage_service) trên thread pool I/O dùng chung
+        self.file_io = get_file_io()
+        # Chỉ mục tóm tắt task (trạng thái, query, thời gian, số section) cho API liệt kê task
+        self.task_index = get_task_index(
+            get_settings().TASK_INDEX_PATH or os.path.join(self.base_dir, "task_index.db")
+        )
+        # Trạng thái đã lưu gần nhất của task đang chạy, dùng để nhận biết ranh giới phase
+        self._saved_status: Dict[str, ResearchStatus] = {}
         logger.info(f"Khởi tạo ResearchStorageService với provider: {storage_provider}")
     
     def _get_task_path(self, task_id: str, filename: str) -> str:
@@ -77,21 +127,39 @@ class ResearchStorageService:
             return obj.dict()
         raise TypeError(f"Type {type(obj)} not serializable")
     
+    @traced("storage.save_task", child_only=True)
     async def save_task(self, task: ResearchResponse) -> None:
         """Lưu thông tin task vào file"""
         try:
             task_path = self._get_task_path(task.id, "task.json")
             full_path = self._get_full_path(task_path)
             
-            # Đảm bảo thư mục tồn tại
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            
             # Chuyển sang dict để serialize
             task_dict = task.dict()
             
-            # Lưu vào file
-            with open(full_path, "w", encoding="utf-8") as f:
-                json.dump(task_dict, f, ensure_ascii=False, indent=2, default=self._json_serializer)
+            # Lưu vào file (tuần tự với các lần cập nhật cost_info của cùng task)
+            await self.task_writer.replace(task.id, task_dict)
+            
+            # Bản rút gọn cho endpoint trạng thái/tiến độ (không phải parse toàn bộ task.json)
+            await self.file_io.write_json(
+                self._get_full_path(self._get_task_path(task.id, STATUS_FILE)),
+                status_projection(task),
+                default=str
+            )
+            
+            # Cập nhật chỉ mục task, lỗi chỉ mục không làm hỏng việc lưu task
+            try:
+                await self.task_index.upsert(task_dict)
+            except Exception as e:
+                logger.error(f"Lỗi khi cập nhật chỉ mục cho task {task.id}: {str(e)}")
+            
+            # Task chuyển phase: fsync các artifact đã ghi từ lần chuyển trước (STORAGE_FSYNC_POLICY=phase)
+            if self._saved_status.get(task.id) != task.status:
+                await self.sync_task(task.id)
+                if task.status in (ResearchStatus.COMPLETED, ResearchStatus.FAILED):
+                    self._saved_status.pop(task.id, None)
+                else:
+                    self._saved_status[task.id] = task.status
             
             logger.info(f"Đã lưu dữ liệu vào file: {full_path}")
             logger.info(f"Đã lưu thông tin cơ bản của task {task.id} vào file: {full_path}")
@@ -99,6 +167,23 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi lưu thông tin task {task.id}: {str(e)}")
             raise
 
+    async def sync_task(self, task_id: str) -> int:
+        """
+        fsync các file của task đã ghi nhưng chưa được fsync
+        
+        Args:
+            task_id: ID của task
+            
+        Returns:
+            int: Số file đã fsync
+        """
+        try:
+            return await self.file_io.sync(self._get_full_path(os.path.join(self.tasks_dir, task_id)))
+        except Exception as e:
+            logger.error(f"Lỗi khi fsync file của task {task_id}: {str(e)}")
+            return 0
+
+    @traced("storage.update_cost_info", child_only=True)
     async def update_cost_info(self, task_id: str, cost_info: ResearchCostInfo) -> None:
         """
         Cập nhật thông tin chi phí cho một task và lưu lên GitHub
@@ -109,7 +194,7 @@ class ResearchStorageService:
         """
         try:
             # Lấy thông tin cơ bản hiện có
-            task_info = self.get_basic_task_info(task_id)
+            task_info = await self.get_basic_task_info(task_id)
             if not task_info:
                 logger.warning(f"Không tìm thấy task {task_id} để cập nhật cost_info")
                 return
@@ -123,11 +208,7 @@ class ResearchStorageService:
                 task_info["cost_info"] = cost_info
             
             # Lưu vào file local
-            task_path = self._get_task_path(task_id, "task.json")
-            full_path = self._get_full_path(task_path)
-            
-            with open(full_path, "w", encoding="utf-8") as f:
-                json.dump(task_info, f, ensure_ascii=False, indent=2, default=self._json_serializer)
+            await self.task_writer.merge(task_id, {"cost_info": task_info["cost_info"]})
             
             logger.info(f"Đã cập nhật cost_info cho task {task_id} vào file local")
             
@@ -159,8 +240,7 @@ class ResearchStorageService:
                     cost_info.cost_report_url = github_url
                     # Cập nhật lại file local với URL mới
                     task_info["cost_info"]["cost_report_url"] = github_url
-                    with open(full_path, "w", encoding="utf-8") as f:
-                        json.dump(task_info, f, ensure_ascii=False, indent=2, default=self._json_serializer)
+                    await self.task_writer.merge(task_id, {"cost_info": {"cost_report_url": github_url}})
                 
                 logger.info(f"Đã lưu cost.json lên GitHub: {github_url}")
                 
@@ -188,6 +268,7 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi cập nhật task {task.id} với cost_info: {str(e)}")
             return task
     
+    @traced("storage.load_task", child_only=True)
     async def load_task(self, task_id: str) -> Optional[ResearchResponse]:
         """
         Đọc thông tin cơ bản của task từ file
@@ -225,6 +306,7 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi đọc task {task_id}: {str(e)}")
             raise
     
+    @traced("storage.load_full_task", child_only=True)
     async def load_full_task(self, task_id: str) -> Optional[ResearchResponse]:
         """
         Đọc toàn bộ thông tin của task từ file, bao gồm outline, sections và result
@@ -236,23 +318,20 @@ class ResearchStorageService:
             Optional[ResearchResponse]: Task đầy đủ đã đọc hoặc None nếu không tìm thấy
         """
         try:
-            # Đọc thông tin cơ bản của task
-            task = await self.load_task(task_id)
+            # Đọc thông tin cơ bản, outline, sections và result đồng thời
+            task, outline, sections, result = await asyncio.gather(
+                self.load_task(task_id),
+                self.load_outline(task_id),
+                self.load_sections(task_id),
+                self.load_result(task_id)
+            )
             if not task:
                 return None
             
-            # Đọc outline
-            outline = await self.load_outline(task_id)
             if outline:
                 task.outline = outline
-            
-            # Đọc sections
-            sections = await self.load_sections(task_id)
             if sections:
                 task.sections = sections
-            
-            # Đọc result
-            result = await self.load_result(task_id)
             if result:
                 task.result = result
             
@@ -263,6 +342,36 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi đọc toàn bộ thông tin task {task_id}: {str(e)}")
             raise
     
+    async def load_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Đọc trạng thái/tiến độ của task từ status.json mà không parse toàn bộ task
+        
+        Task lưu trước khi có status.json được đọc từ task.json một lần và ghi bổ sung status.json.
+        
+        Args:
+            task_id: ID của task
+            
+        Returns:
+            Optional[Dict[str, Any]]: Kết quả của status_projection hoặc None nếu không tìm thấy task
+        """
+        status_path = self._get_full_path(self._get_task_path(task_id, STATUS_FILE))
+        try:
+            return await self.file_io.read_json(status_path)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logger.warning(f"status.json của task {task_id} không hợp lệ, đọc lại từ task.json: {str(e)}")
+        
+        task = await self.load_task(task_id)
+        if not task:
+            return None
+        projection = status_projection(task)
+        try:
+            await self.file_io.write_json(status_path, projection, default=str)
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi status.json cho task {task_id}: {str(e)}")
+        return projection
+    
     async def list_tasks(self) -> List[str]:
         """
         Liệt kê danh sách các task đã lưu
@@ -274,19 +383,24 @@ class ResearchStorageService:
             # Lấy đường dẫn đầy đủ đến thư mục tasks_dir
             full_tasks_dir = self._get_full_path(self.tasks_dir)
             
-            # Kiểm tra thư mục tồn tại
-            if not os.path.exists(full_tasks_dir):
+            def _list() -> Optional[List[str]]:
+                # Kiểm tra thư mục tồn tại
+                if not os.path.exists(full_tasks_dir):
+                    return None
+                # Liệt kê các thư mục trong tasks_dir
+                task_ids = []
+                for item in os.listdir(full_tasks_dir):
+                    task_dir = os.path.join(full_tasks_dir, item)
+                    task_file = os.path.join(task_dir, "task.json")
+                    if os.path.isdir(task_dir) and os.path.exists(task_file):
+                        task_ids.append(item)
+                return task_ids
+            
+            task_ids = await self.file_io.run(_list, op="list")
+            if task_ids is None:
                 logger.warning(f"Thư mục không tồn tại: {full_tasks_dir}")
                 return []
             
-            # Liệt kê các thư mục trong tasks_dir
-            task_ids = []
-            for item in os.listdir(full_tasks_dir):
-                task_dir = os.path.join(full_tasks_dir, item)
-                task_file = os.path.join(task_dir, "task.json")
-                if os.path.isdir(task_dir) and os.path.exists(task_file):
-                    task_ids.append(item)
-            
             logger.info(f"Đã liệt kê {len(task_ids)} tasks")
             return task_ids
             
@@ -294,6 +408,40 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi liệt kê tasks: {str(e)}")
             raise
     
+    async def list_task_summaries(
+        self,
+        status: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        sort: str = "created_at",
+        order: str = "desc",
+        limit: int = 100,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Liệt kê thông tin tóm tắt của các task từ chỉ mục (không đọc task.json)
+        
+        Args:
+            status: Chỉ lấy task có trạng thái này
+            start_date: Ngày tạo từ (YYYY-MM-DD)
+            end_date: Ngày tạo đến (YYYY-MM-DD, bao gồm)
+            sort: Cột sắp xếp (created_at, updated_at, status)
+            order: "asc" hoặc "desc"
+            limit: Số task tối đa trả về
+            offset: Số task bỏ qua
+            
+        Returns:
+            Dict[str, Any]: {"tasks": [...], "total": tổng số task khớp bộ lọc}
+            
+        Raises:
+            ValueError: Nếu cột sắp xếp hoặc thứ tự không hợp lệ
+        """
+        # Dữ liệu từ trước khi có chỉ mục: dựng chỉ mục từ các task.json một lần
+        await self.task_index.ensure_built(self._get_full_path(self.tasks_dir))
+        tasks, total = await self.task_index.query(status, start_date, end_date, sort, order, limit, offset)
+        return {"tasks": tasks, "total": total}
+    
+    @traced("storage.save_outline", child_only=True)
     async def save_outline(self, task_id: str, outline: ResearchOutline) -> str:
         """
         Lưu outline vào file
@@ -322,6 +470,7 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi lưu outline của task {task_id}: {str(e)}")
             raise
     
+    @traced("storage.load_outline", child_only=True)
     async def load_outline(self, task_id: str) -> Optional[ResearchOutline]:
         """
         Đọc outline từ file
@@ -355,6 +504,7 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi đọc outline của task {task_id}: {str(e)}")
             return None
     
+    @traced("storage.save_sections", child_only=True)
     async def save_sections(self, task_id: str, sections: List[ResearchSection]) -> str:
         """
         Lưu danh sách sections vào file
@@ -383,6 +533,7 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi lưu sections của task {task_id}: {str(e)}")
             raise
     
+    @traced("storage.load_sections", child_only=True)
     async def load_sections(self, task_id: str) -> Optional[List[ResearchSection]]:
         """
         Đọc danh sách sections từ file
@@ -416,6 +567,57 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi đọc sections của task {task_id}: {str(e)}")
             return None
     
+    @traced("storage.save_section_checkpoint", attributes=lambda args: {"index": args["index"]}, child_only=True)
+    async def save_section_checkpoint(self, task_id: str, index: int, section: ResearchSection) -> str:
+        """
+        Lưu checkpoint của một section vừa nghiên cứu xong
+        
+        Args:
+            task_id: ID của task
+            index: Vị trí của section trong dàn ý (bắt đầu từ 0)
+            section: Section đã nghiên cứu
+            
+        Returns:
+            str: Đường dẫn đến file đã lưu
+        """
+        try:
+            file_path = self._get_task_path(task_id, os.path.join("checkpoints", f"section_{index}.json"))
+            path = await self.storage_service.save({"index": index, "section": section.dict()}, file_path)
+            logger.info(f"Đã lưu checkpoint section {index + 1} của task {task_id}")
+            return path
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu checkpoint section {index + 1} của task {task_id}: {str(e)}")
+            raise
+    
+    async def load_section_checkpoints(self, task_id: str) -> Dict[int, ResearchSection]:
+        """
+        Đọc các checkpoint section đã lưu
+        
+        Args:
+            task_id: ID của task
+            
+        Returns:
+            Dict[int, ResearchSection]: Các section đã nghiên cứu, theo vị trí trong dàn ý
+        """
+        checkpoints: Dict[int, ResearchSection] = {}
+        try:
+            file_paths = await self.storage_service.list_files(
+                self._get_task_path(task_id, "checkpoints"), "section_*.json"
+            )
+            for file_path in file_paths:
+                data = await self.storage_service.load(file_path)
+                checkpoints[int(data["index"])] = ResearchSection(**data["section"])
+            
+            if checkpoints:
+                logger.info(f"Đã đọc {len(checkpoints)} checkpoint section của task {task_id}")
+            return checkpoints
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc checkpoint section của task {task_id}: {str(e)}")
+            return checkpoints
+    
+    @traced("storage.save_result", child_only=True)
     async def save_result(self, task_id: str, result: ResearchResult) -> str:
         """
         Lưu kết quả nghiên cứu vào file
@@ -459,6 +661,7 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi lưu kết quả của task {task_id}: {str(e)}")
             raise
     
+    @traced("storage.load_result", child_only=True)
     async def load_result(self, task_id: str) -> Optional[ResearchResult]:
         """
         Đọc kết quả nghiên cứu từ file
@@ -492,7 +695,7 @@ class ResearchStorageService:
             logger.error(f"Lỗi khi đọc kết quả của task {task_id}: {str(e)}")
             return None
     
-    def get_basic_task_info(self, task_id: str) -> Optional[Dict[str, Any]]:
+    async def get_basic_task_info(self, task_id: str) -> Optional[Dict[str, Any]]:
         """
         Lấy thông tin cơ bản của task từ file
         
@@ -506,15 +709,13 @@ class ResearchStorageService:
             file_path = self._get_task_path(task_id, "task.json")
             full_path = self._get_full_path(file_path)
             
-            # Kiểm tra file tồn tại
-            if not os.path.exists(full_path):
+            # Đọc file
+            try:
+                task_data = await self.file_io.read_json(full_path)
+            except FileNotFoundError:
                 logger.warning(f"Không tìm thấy file task {task_id}")
                 return None
             
-            # Đọc file
-            with open(full_path, "r", encoding="utf-8") as f:
-                task_data = json.load(f)
-            
             logger.info(f"Đã đọc thông tin cơ bản của task {task_id} từ file")
             return task_data
             
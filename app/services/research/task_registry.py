@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.logging import get_logger
+from app.models.research import ResearchResponse
+from app.services.core.monitoring.resident import estimate_size
+
+logger = get_logger(__name__)
+
+
+class TaskRegistry:
+    """
+    Giữ ResearchResponse của các task trong bộ nhớ theo LRU, giới hạn số task và dung lượng
+
+    Task đang được worker xử lý được ghim (pin) và không bao giờ bị loại; các task khác (thường
+    đã hoàn thành, chứa toàn bộ nội dung section và kết quả) bị loại khi vượt giới hạn và được
+    tải lại từ storage qua load() khi cần. Dùng như một dict: registry[task_id], task_id in registry,
+    registry.get(task_id).
+    """
+
+    def __init__(self, storage_service, max_tasks: int = 200, max_bytes: int = 128 * 1024 * 1024):
+        """
+        Args:
+            storage_service: ResearchStorageService dùng để tải lại task bị loại
+            max_tasks: Số task tối đa giữ trong bộ nhớ (0 = không giới hạn)
+            max_bytes: Dung lượng ước lượng tối đa (0 = không giới hạn)
+        """
+        self.storage_service = storage_service
+        self.max_tasks = max_tasks
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, ResearchResponse]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        # Số lần ghim của mỗi task (một task có thể được ghim bởi nhiều job liên tiếp)
+        self._pins: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries.keys()))
+
+    def __getitem__(self, task_id: str) -> ResearchResponse:
+        task = self._entries[task_id]
+        self._entries.move_to_end(task_id)
+        return task
+
+    def __setitem__(self, task_id: str, task: ResearchResponse) -> None:
+        self._remove(task_id)
+        self._entries[task_id] = task
+        self._sizes[task_id] = estimate_size(task)
+        self._total_bytes += self._sizes[task_id]
+        self._evict_over_limit(keep=task_id)
+
+    def __delitem__(self, task_id: str) -> None:
+        if task_id not in self._entries:
+            raise KeyError(task_id)
+        self._remove(task_id)
+
+    def get(self, task_id: str, default: Optional[ResearchResponse] = None) -> Optional[ResearchResponse]:
+        """Lấy task đang trong bộ nhớ (không tải từ storage) và đánh dấu vừa được dùng"""
+        if task_id not in self._entries:
+            return default
+        return self[task_id]
+
+    def values(self) -> List[ResearchResponse]:
+        """Các task đang trong bộ nhớ"""
+        return list(self._entries.values())
+
+    async def load(self, task_id: str, full: bool = False) -> Optional[ResearchResponse]:
+        """
+        Lấy task từ bộ nhớ, nếu không có thì tải từ storage và giữ lại trong bộ nhớ
+
+        Args:
+            task_id: ID của task
+            full: Tải kèm outline, sections và result khi phải đọc từ storage
+
+        Returns:
+            Optional[ResearchResponse]: Task hoặc None nếu không tìm thấy
+        """
+        task = self.get(task_id)
+        if task is not None:
+            self.hits += 1
+            return task
+
+        self.misses += 1
+        if full:
+            task = await self.storage_service.load_full_task(task_id)
+        else:
+            task = await self.storage_service.load_task(task_id)
+        if task is None:
+            return None
+
+        # Task có thể đã được thêm vào trong lúc chờ đọc file, bản trong bộ nhớ mới hơn
+        if task_id in self._entries:
+            return self[task_id]
+        self.loads += 1
+        self[task_id] = task
+        return task
+
+    def pin(self, task_id: str) -> None:
+        """Ghim task để không bị loại khỏi bộ nhớ (task đang được xử lý)"""
+        self._pins[task_id] = self._pins.get(task_id, 0) + 1
+
+    def unpin(self, task_id: str) -> None:
+        """Bỏ ghim task, task có thể bị loại nếu bộ nhớ vượt giới hạn"""
+        count = self._pins.get(task_id, 0) - 1
+        if count > 0:
+            self._pins[task_id] = count
+            return
+        self._pins.pop(task_id, None)
+        # Task được thay đổi tại chỗ trong lúc xử lý: ước lượng lại dung lượng rồi áp giới hạn
+        if task_id in self._entries:
+            self._total_bytes -= self._sizes[task_id]
+            self._sizes[task_id] = estimate_size(self._entries[task_id])
+            self._total_bytes += self._sizes[task_id]
+        self._evict_over_limit()
+
+    @contextmanager
+    def pinned(self, task_id: str):
+        """Ghim task trong phạm vi khối with"""
+        self.pin(task_id)
+        try:
+            yield
+        finally:
+            self.unpin(task_id)
+
+    def is_pinned(self, task_id: str) -> bool:
+        """Kiểm tra task có đang bị ghim hay không"""
+        return task_id in self._pins
+
+    def evict(self, task_id: str) -> bool:
+        """
+        Loại task khỏi bộ nhớ nếu không bị ghim
+
+        Args:
+            task_id: ID của task
+
+        Returns:
+            bool: True nếu task đã bị loại
+        """
+        if task_id not in self._entries or self.is_pinned(task_id):
+            return False
+        self._remove(task_id)
+        self.evictions += 1
+        logger.info(f"Đã loại task {task_id} khỏi bộ nhớ")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy số task, dung lượng ước lượng và tỷ lệ hit/miss của bộ nhớ task"""
+        lookups = self.hits + self.misses
+        return {
+            "resident_tasks": len(self._entries),
+            "resident_bytes": self._total_bytes,
+            "pinned_tasks": len(self._pins),
+            "max_tasks": self.max_tasks,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+    def _over_limit(self) -> bool:
+        return (
+            (self.max_tasks > 0 and len(self._entries) > self.max_tasks)
+            or (self.max_bytes > 0 and self._total_bytes > self.max_bytes)
+        )
+
+    def _evict_over_limit(self, keep: Optional[str] = None) -> int:
+        evicted = 0
+        for task_id in list(self._entries.keys()):
+            if not self._over_limit():
+                break
+            if task_id != keep and self.evict(task_id):
+                evicted += 1
+        return evicted
+
+    def _remove(self, task_id: str) -> None:
+        if self._entries.pop(task_id, None) is not None:
+            self._total_bytes -= self._sizes.pop(task_id, 0)
@@ -0,0 +1,129 @@
+"""
+Đo độ trễ event loop khi ghi/đọc result.json lớn: ghi trực tiếp trên thread của event loop
+(cách cũ của FileStorageService) so với FileIOExecutor (thread pool I/O riêng)
+
+Độ trễ được đo bằng một coroutine ngủ INTERVAL rồi ghi lại thời gian thức dậy muộn hơn dự kiến,
+tương ứng với thời gian mọi request/task khác trong tiến trình bị chặn. FileIOExecutor được chạy
+với từng chính sách fsync (none / phase / always) để so sánh độ bền với thông lượng.
+
+Ví dụ:
+    python benchmark_file_io.py
+    python benchmark_file_io.py --tasks 8 --writes 10 --sections 40 --section-kb 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from app.services.core.storage.file_io import FileIOExecutor
+
+INTERVAL = 0.005
+
+
+def _result_document(sections: int, section_kb: int) -> Dict[str, Any]:
+    """Kết quả nghiên cứu giả lập có kích thước tương tự result.json thật"""
+    content = "Nội dung nghiên cứu chi tiết. " * (section_kb * 1024 // 32)
+    return {
+        "title": "Benchmark",
+        "sections": [{"title": f"Phần {i}", "content": content, "sources": [f"https://example.com/{i}"]} for i in range(sections)]
+    }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _probe_lag(lags: List[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + INTERVAL
+        await asyncio.sleep(INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def _blocking_write(path: str, document: Dict[str, Any]) -> None:
+    # Cách cũ: async def nhưng open/json.dump chạy trên thread của event loop
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+
+
+async def _blocking_read(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def run(
+    mode: str,
+    base_dir: str,
+    tasks: int,
+    writes: int,
+    document: Dict[str, Any],
+    workers: int,
+    fsync_policy: str = "none"
+) -> Dict[str, float]:
+    file_io = FileIOExecutor(max_workers=workers, fsync_policy=fsync_policy)
+    if mode == "blocking":
+        write, read = _blocking_write, _blocking_read
+    else:
+        write, read = file_io.write_json, file_io.read_json
+
+    async def drive(task_index: int) -> None:
+        path = os.path.join(base_dir, "research_tasks", f"task-{task_index}", "result.json")
+        for _ in range(writes):
+            await write(path, document)
+            await read(path)
+        # Kết thúc phase: fsync các file đã ghi của task (chỉ có tác dụng với chính sách "phase")
+        await file_io.sync(os.path.dirname(path))
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_lag(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(drive(i) for i in range(tasks)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    file_io.shutdown()
+    return {
+        "elapsed": elapsed,
+        "lag_p50_ms": _percentile(lags, 50) * 1000,
+        "lag_p99_ms": _percentile(lags, 99) * 1000,
+        "lag_max_ms": max(lags, default=0.0) * 1000,
+        "max_queued": file_io.get_stats()["max_queued"]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark độ trễ event loop khi đọc/ghi file lớn")
+    parser.add_argument("--tasks", type=int, default=4, help="Số task ghi đồng thời")
+    parser.add_argument("--writes", type=int, default=5, help="Số lần ghi + đọc result.json mỗi task")
+    parser.add_argument("--sections", type=int, default=20, help="Số section trong result.json")
+    parser.add_argument("--section-kb", type=int, default=64, help="Kích thước nội dung mỗi section (KB)")
+    parser.add_argument("--workers", type=int, default=8, help="Số thread của FileIOExecutor")
+    args = parser.parse_args()
+
+    document = _result_document(args.sections, args.section_kb)
+    size_mb = len(json.dumps(document, ensure_ascii=False, indent=2).encode("utf-8")) / (1024 * 1024)
+    print(f"result.json ~{size_mb:.1f} MB, {args.tasks} task x {args.writes} lần ghi + đọc")
+    for mode, fsync_policy in (("blocking", "none"), ("file_io", "none"), ("file_io", "phase"), ("file_io", "always")):
+        with tempfile.TemporaryDirectory() as base_dir:
+            result = asyncio.run(run(mode, base_dir, args.tasks, args.writes, document, args.workers, fsync_policy))
+        label = mode if mode == "blocking" else f"{mode} (fsync {fsync_policy})"
+        print(
+            f"{label:24s} {result['elapsed']:.3f}s"
+            f" | độ trễ event loop p50 {result['lag_p50_ms']:7.2f} ms"
+            f" | p99 {result['lag_p99_ms']:7.2f} ms"
+            f" | max {result['lag_max_ms']:7.2f} ms"
+            f" | hàng đợi I/O tối đa {result['max_queued']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
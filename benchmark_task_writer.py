@@ -0,0 +1,167 @@
+"""
+So sánh cách ghi task.json cũ (mỗi cập nhật chi phí là một asyncio.create_task đọc-sửa-ghi,
+chạy song song với save_task của route) với TaskJsonWriter tuần tự theo task
+
+Ví dụ:
+    python benchmark_task_writer.py
+    python benchmark_task_writer.py --tasks 20 --cost-updates 200 --progress-saves 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from app.services.core.storage.task_writer import TaskJsonWriter
+
+
+def _task_path(base_dir: str, task_id: str) -> str:
+    return os.path.join(base_dir, "research_tasks", task_id, "task.json")
+
+
+def _document(task_id: str, progress: int) -> Dict[str, Any]:
+    """Bản đầy đủ mà route handler lưu: tiến độ mới, cost_info trong bộ nhớ của route là None"""
+    return {"id": task_id, "status": "researching", "progress": progress, "cost_info": None}
+
+
+class LegacyWriter:
+    """Mô phỏng cách ghi cũ: ghi trực tiếp, không nguyên tử, không tuần tự"""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.writes = 0
+        self.read_errors = 0
+
+    async def save_task(self, task_id: str, document: Dict[str, Any]) -> None:
+        path = _task_path(self.base_dir, task_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+        self.writes += 1
+
+    async def update_cost(self, task_id: str, total_cost: float) -> None:
+        path = _task_path(self.base_dir, task_id)
+        try:
+            data = await asyncio.to_thread(self._read, path)
+        except (OSError, ValueError):
+            # File đang bị ghi dở bởi lần ghi khác
+            self.read_errors += 1
+            return
+        data["cost_info"] = dict(data.get("cost_info") or {}, total_cost_usd=total_cost)
+        await asyncio.to_thread(self._write, path, data)
+        self.writes += 1
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write(path: str, data: Dict[str, Any]) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+async def run_legacy(base_dir: str, task_ids: List[str], cost_updates: int, progress_saves: int) -> Dict[str, Any]:
+    writer = LegacyWriter(base_dir)
+    for task_id in task_ids:
+        await writer.save_task(task_id, _document(task_id, 0))
+
+    background = []
+
+    async def drive(task_id: str) -> None:
+        for i in range(1, max(cost_updates, progress_saves) + 1):
+            if i <= cost_updates:
+                # Cách cũ: fire-and-forget, không ai chờ hay giới hạn số lần ghi đang chạy
+                background.append(asyncio.create_task(writer.update_cost(task_id, float(i))))
+            if i <= progress_saves:
+                await writer.save_task(task_id, _document(task_id, i))
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(drive(task_id) for task_id in task_ids))
+    peak_outstanding = sum(1 for task in background if not task.done())
+    await asyncio.gather(*background)
+    elapsed = time.perf_counter() - start
+    return {
+        "elapsed": elapsed,
+        "writes": writer.writes,
+        "read_errors": writer.read_errors,
+        "peak_outstanding": peak_outstanding,
+        **_check(base_dir, task_ids, cost_updates, progress_saves)
+    }
+
+
+async def run_writer(base_dir: str, task_ids: List[str], cost_updates: int, progress_saves: int) -> Dict[str, Any]:
+    writer = TaskJsonWriter(base_dir)
+    for task_id in task_ids:
+        await writer.replace(task_id, _document(task_id, 0))
+
+    async def drive(task_id: str) -> None:
+        pending = []
+        for i in range(1, max(cost_updates, progress_saves) + 1):
+            if i <= cost_updates:
+                pending.append(asyncio.ensure_future(
+                    writer.merge(task_id, {"cost_info": {"total_cost_usd": float(i)}}, sticky=True)
+                ))
+            if i <= progress_saves:
+                await writer.replace(task_id, _document(task_id, i))
+            await asyncio.sleep(0)
+        await asyncio.gather(*pending)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(drive(task_id) for task_id in task_ids))
+    await writer.flush()
+    elapsed = time.perf_counter() - start
+    stats = writer.get_stats()
+    return {
+        "elapsed": elapsed,
+        "writes": stats["writes"],
+        "read_errors": 0,
+        "peak_outstanding": stats["max_concurrent_writes"],
+        **_check(base_dir, task_ids, cost_updates, progress_saves)
+    }
+
+
+def _check(base_dir: str, task_ids: List[str], cost_updates: int, progress_saves: int) -> Dict[str, Any]:
+    """Đếm task có task.json cuối cùng thiếu tiến độ hoặc chi phí mới nhất"""
+    lost_progress = lost_cost = corrupted = 0
+    for task_id in task_ids:
+        try:
+            with open(_task_path(base_dir, task_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError:
+            corrupted += 1
+            continue
+        if data.get("progress") != progress_saves:
+            lost_progress += 1
+        if (data.get("cost_info") or {}).get("total_cost_usd") != float(cost_updates):
+            lost_cost += 1
+    return {"lost_progress": lost_progress, "lost_cost": lost_cost, "corrupted": corrupted}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark ghi task.json: cách cũ và TaskJsonWriter")
+    parser.add_argument("--tasks", type=int, default=10, help="Số task chạy đồng thời")
+    parser.add_argument("--cost-updates", type=int, default=100, help="Số lần cập nhật chi phí mỗi task")
+    parser.add_argument("--progress-saves", type=int, default=20, help="Số lần route lưu task mỗi task")
+    args = parser.parse_args()
+
+    task_ids = [f"bench-{i}" for i in range(args.tasks)]
+    for name, runner in (("legacy (create_task)", run_legacy), ("TaskJsonWriter", run_writer)):
+        with tempfile.TemporaryDirectory() as base_dir:
+            result = asyncio.run(runner(base_dir, task_ids, args.cost_updates, args.progress_saves))
+        print(
+            f"{name:22s} {result['elapsed']:.3f}s | ghi {result['writes']:5d} lần"
+            f" | tối đa {result['peak_outstanding']:4d} lần ghi chờ/chạy"
+            f" | lỗi đọc {result['read_errors']:4d}"
+            f" | task mất chi phí {result['lost_cost']}/{args.tasks}"
+            f" | mất tiến độ {result['lost_progress']}/{args.tasks}"
+            f" | hỏng {result['corrupted']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,87 @@
+"""
+Dựng lại (backfill) chỉ mục chi phí tổng hợp từ dữ liệu cost của các research task
+
+Ví dụ:
+    python create_cost_json.py
+    python create_cost_json.py --data-dir data --index-path data/cost_index.db
+    python create_cost_json.py --task-id 7c6867f0-b822-4317-ae57-b0f4942312c3 --create-missing
+"""
+import argparse
+import asyncio
 import json
-from datetime import datetime
+import time
 from pathlib import Path
 
-# Tạo dữ liệu cost monitoring cơ bản
-cost_data = {
-    'task_id': '7c6867f0-b822-4317-ae57-b0f4942312c3',
-    'llm_requests': [],
-    'search_requests': [],
-    'phase_timings': [],
-    'section_timings': [],
-    'summary': {
-        'total_cost_usd': 0.0,
-        'llm_cost_usd': 0.0,
-        'search_cost_usd': 0.0,
-        'total_llm_requests': 0,
-        'total_search_requests': 0,
-        'total_input_tokens': 0,
-        'total_output_tokens': 0,
-        'total_tokens': 0,
-        'model_breakdown': {},
-        'provider_breakdown': {}
-    },
-    'last_updated': datetime.now().isoformat()
-}
-
-# Lưu vào file
-file_path = Path('data/research_tasks/7c6867f0-b822-4317-ae57-b0f4942312c3/cost.json')
-with open(file_path, 'w', encoding='utf-8') as f:
-    json.dump(cost_data, f, ensure_ascii=False, indent=2)
-
-print(f'Đã tạo file {file_path}') 
\ No newline at end of file
+from app.core.config import get_settings
+from app.models.cost import ResearchCostMonitoring
+from app.services.core.monitoring.analytics import CostAnalyticsIndex
+from app.services.core.monitoring.events import CostEventLog
+
+
+def create_empty_cost_json(data_dir: Path, task_id: str) -> Path:
+    """Tạo file cost.json rỗng cho task chưa có dữ liệu chi phí"""
+    file_path = data_dir / "research_tasks" / task_id / "cost.json"
+    cost_data = ResearchCostMonitoring(task_id=task_id)
+    cost_data.recompute_summary()
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(cost_data.dict(), f, ensure_ascii=False, indent=2)
+    print(f"Đã tạo file {file_path}")
+    return file_path
+
+
+async def backfill(data_dir: Path, index_path: str, task_ids=None, create_missing: bool = False) -> int:
+    """
+    Đưa dữ liệu cost (cost.json và cost_events.jsonl) của các task vào chỉ mục
+
+    Args:
+        data_dir: Thư mục dữ liệu (chứa research_tasks/)
+        index_path: Đường dẫn file SQLite của chỉ mục
+        task_ids: Danh sách task cần backfill, None để backfill mọi task
+        create_missing: Tạo cost.json rỗng cho task chưa có dữ liệu chi phí
+
+    Returns:
+        int: Số task đã được đưa vào chỉ mục
+    """
+    event_log = CostEventLog(str(data_dir))
+    index = CostAnalyticsIndex(index_path)
+    tasks_dir = data_dir / "research_tasks"
+    if task_ids is None:
+        task_ids = sorted(p.name for p in tasks_dir.iterdir() if p.is_dir()) if tasks_dir.is_dir() else []
+
+    indexed = 0
+    try:
+        for task_id in task_ids:
+            try:
+                monitoring, _ = await event_log.materialize(task_id)
+            except Exception as e:
+                print(f"Bỏ qua task {task_id}: {str(e)}")
+                continue
+            if monitoring is None:
+                if not create_missing:
+                    continue
+                create_empty_cost_json(data_dir, task_id)
+                monitoring = ResearchCostMonitoring(task_id=task_id)
+            await index.reindex_task(monitoring)
+            indexed += 1
+    finally:
+        index.close()
+    return indexed
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Backfill chỉ mục chi phí tổng hợp từ research_tasks/*/cost.json")
+    parser.add_argument("--data-dir", default="data", help="Thư mục dữ liệu chứa research_tasks/")
+    parser.add_argument("--index-path", default=settings.COST_INDEX_PATH, help="File SQLite của chỉ mục")
+    parser.add_argument("--task-id", action="append", dest="task_ids", help="Chỉ backfill task này (có thể lặp lại)")
+    parser.add_argument("--create-missing", action="store_true", help="Tạo cost.json rỗng cho task chưa có dữ liệu chi phí")
+    args = parser.parse_args()
+
+    start = time.time()
+    indexed = asyncio.run(backfill(Path(args.data_dir), args.index_path, args.task_ids, args.create_missing))
+    print(f"Đã đưa {indexed} task vào chỉ mục {args.index_path} trong {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
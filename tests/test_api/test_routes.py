@@ -193,3 +193,137 @@ def test_edit_only_not_found():
     response = client.post("/api/v1/research/edit_only", json=edit_request)
     assert response.status_code == 404
     assert "Không thể tải đầy đủ thông tin task" in response.json()["detail"]
+
+def test_create_research_rejected_when_queue_full(sample_request):
+    """Test trả về 429 khi hàng đợi xử lý đã đầy"""
+    with patch("app.api.routes.job_queue.is_saturated", return_value=True):
+        response = client.post("/api/v1/research/complete", json=sample_request)
+    
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+def test_resume_research_not_found():
+    """Test resume endpoint với research_id không tồn tại"""
+    response = client.post("/api/v1/research/non-existent-id/resume")
+    assert response.status_code == 404
+
+def test_resume_research_already_completed(sample_request):
+    """Test không cho phép resume task đã hoàn thành"""
+    from app.api.routes import research_tasks
+    task_id = "resume-completed-task"
+    research_tasks[task_id] = ResearchResponse(
+        id=task_id,
+        status=ResearchStatus.COMPLETED,
+        request=ResearchRequest(**sample_request)
+    )
+    try:
+        response = client.post(f"/api/v1/research/{task_id}/resume")
+        assert response.status_code == 409
+    finally:
+        del research_tasks[task_id]
+
+def test_metrics_endpoint():
+    """Test endpoint /metrics trả về metric theo định dạng Prometheus"""
+    response = client.get("/api/v1/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE deep_research_llm_request_duration_seconds histogram" in response.text
+    assert 'deep_research_job_queue_jobs{state="queued"}' in response.text
+
+def test_research_trace_not_found():
+    """Test lấy trace của task không có span nào"""
+    # ID riêng: các test khác đọc "non-existent-id" qua storage và tạo span cho ID đó
+    response = client.get("/api/v1/research/trace-missing-id/trace")
+    assert response.status_code == 404
+
+    response = client.get("/api/v1/research/trace-missing-id/trace?format=xml")
+    assert response.status_code == 400
+
+def test_list_research_from_index():
+    """Test liệt kê task từ chỉ mục: tham số sai trả 400, tổng số task nằm trong X-Total-Count"""
+    page = {"tasks": [{
+        "id": "indexed-task", "status": "completed", "query": "q",
+        "created_at": "2024-06-01T08:00:00", "updated_at": "2024-06-01T09:00:00",
+        "progress_phase": "completed", "progress_message": "Done", "progress_timestamp": None,
+        "outline_sections_count": 3, "researched_sections_count": 3, "github_url": None, "error": None
+    }], "total": 7}
+    with patch(
+        "app.api.routes.research_storage_service.list_task_summaries", new=AsyncMock(return_value=page)
+    ) as list_task_summaries:
+        response = client.get("/api/v1/research?status=completed&sort=updated_at&order=asc&limit=1&offset=2")
+    
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "7"
+    assert list_task_summaries.call_args.args == ("completed", None, None, "updated_at", "asc", 1, 2)
+    task = response.json()[0]
+    assert task["id"] == "indexed-task"
+    assert task["outline_sections_count"] == 3
+    assert task["progress_summary"]["message"] == "Done"
+    assert "elapsed_time" in task and "github_url" not in task
+    
+    assert client.get("/api/v1/research?sort=query").status_code == 400
+    assert client.get("/api/v1/research?order=up").status_code == 400
+
+def test_create_research_marks_task_failed_when_enqueue_fails(sample_request):
+    """Test task đã lưu được đánh dấu FAILED khi không đưa được vào hàng đợi, không để lại task PENDING"""
+    from app.api.routes import job_queue, research_tasks
+    with patch("app.api.routes.job_queue.submit", new=AsyncMock(side_effect=OSError("journal unavailable"))), \
+            patch("app.api.routes.research_storage_service.save_task", new=AsyncMock()) as save_task:
+        response = client.post("/api/v1/research/complete", json=sample_request)
+    
+    assert response.status_code == 500
+    task = save_task.await_args.args[0]
+    assert task.status == ResearchStatus.FAILED
+    assert research_tasks[task.id].status == ResearchStatus.FAILED
+    assert not job_queue.is_active(f"complete:{task.id}")
+    assert job_queue.get_stats()["queued"] == 0
+    del research_tasks[task.id]
+
+def test_resume_research_uses_original_job_type(sample_request):
+    """Test task tạo bởi /research được tiếp tục bằng job "research", không chạy edit/đẩy GitHub"""
+    from app.api.routes import research_tasks
+    task_id = "resume-research-task"
+    research_tasks[task_id] = ResearchResponse(
+        id=task_id,
+        status=ResearchStatus.FAILED,
+        request=ResearchRequest(**sample_request),
+        job_type="research"
+    )
+    try:
+        with patch("app.api.routes.job_queue.submit", new=AsyncMock()) as submit, \
+                patch("app.api.routes.research_storage_service.save_task", new=AsyncMock()):
+            response = client.post(f"/api/v1/research/{task_id}/resume")
+        
+        assert response.status_code == 200
+        job_id, job_type, payload = submit.await_args.args
+        assert (job_id, job_type) == (f"research:{task_id}", "research")
+        assert "resume" not in payload
+    finally:
+        from app.api.routes import job_queue
+        job_queue.release(f"research:{task_id}")
+        del research_tasks[task_id]
+
+@pytest.mark.asyncio
+async def test_research_job_releases_cost_monitoring_when_task_ends(sample_request):
+    """Test job giải phóng cost monitoring khi task kết thúc (COMPLETED/FAILED), giữ lại khi chưa kết thúc"""
+    from app.api.routes import _run_research_job, research_tasks
+    task_id = "release-monitoring-task"
+    cost_service = AsyncMock()
+    factory = AsyncMock()
+    factory.get_cost_monitoring_service.return_value = cost_service
+    
+    def finish(status):
+        async def process(task_id, request):
+            research_tasks[task_id].status = status
+        return process
+    
+    research_tasks[task_id] = ResearchResponse(id=task_id, status=ResearchStatus.PENDING, request=ResearchRequest(**sample_request))
+    try:
+        with patch("app.api.routes.get_service_factory", return_value=factory):
+            for status in (ResearchStatus.COMPLETED, ResearchStatus.FAILED, ResearchStatus.RESEARCHING):
+                with patch("app.api.routes.process_research", new=finish(status)):
+                    await _run_research_job({"task_id": task_id, "request": sample_request})
+        
+        assert [call.args for call in cost_service.release_monitoring.await_args_list] == [(task_id,), (task_id,)]
+    finally:
+        del research_tasks[task_id]
@@ -0,0 +1,55 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from app.core.metrics import SEARCH_ERRORS, SEARCH_REQUEST_DURATION, MetricsRegistry
+from app.services.core.search.instrumented import InstrumentedSearchService
+
+
+def test_registry_renders_prometheus_text():
+    """Test xuất counter, gauge và histogram theo định dạng text của Prometheus"""
+    registry = MetricsRegistry()
+    tokens = registry.counter("llm_tokens_total", "Tokens", ("model",))
+    in_flight = registry.gauge("in_flight", "In flight")
+    latency = registry.histogram("latency_seconds", "Latency", ("provider",), buckets=(0.1, 1.0))
+
+    tokens.inc(10, model='gpt-4"o')
+    tokens.inc(5, model='gpt-4"o')
+    in_flight.set(3)
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, provider="openai")
+
+    text = registry.render()
+    assert "# TYPE llm_tokens_total counter" in text
+    assert 'llm_tokens_total{model="gpt-4\\"o"} 15' in text
+    assert "in_flight 3" in text
+    assert 'latency_seconds_bucket{provider="openai",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{provider="openai",le="1"} 2' in text
+    assert 'latency_seconds_bucket{provider="openai",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{provider="openai"} 3' in text
+    assert registry.counter("llm_tokens_total", "Tokens", ("model",)) is tokens
+
+def test_metric_label_validation():
+    """Test metric yêu cầu đúng tập nhãn và counter không giảm"""
+    registry = MetricsRegistry()
+    counter = registry.counter("errors_total", "Errors", ("provider",))
+
+    with pytest.raises(ValueError):
+        counter.inc(model="gpt-4")
+    with pytest.raises(ValueError):
+        counter.inc(-1, provider="openai")
+    with pytest.raises(ValueError):
+        registry.gauge("errors_total", "Errors", ("provider",))
+
+@pytest.mark.asyncio
+async def test_instrumented_search_records_latency_and_errors():
+    """Test wrapper search ghi nhận độ trễ và lỗi của provider"""
+    service = AsyncMock()
+    service.search = AsyncMock(side_effect=[[{"title": "a"}], RuntimeError("boom")])
+    instrumented = InstrumentedSearchService(service, provider_name="metrics-test")
+
+    assert await instrumented.search("q", purpose="p") == [{"title": "a"}]
+    with pytest.raises(RuntimeError):
+        await instrumented.search("q", purpose="p")
+
+    assert SEARCH_REQUEST_DURATION.get_count(provider="metrics-test", purpose="p") == 2
+    assert SEARCH_ERRORS.get(provider="metrics-test") == 1
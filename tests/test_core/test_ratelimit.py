@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from app.core.ratelimit import (
+    AIMDController,
+    ProviderRateLimiter,
+    TokenBucket,
+    get_error_status,
+    get_retry_after
+)
+
+
+class FakeStatusError(Exception):
+    """Lỗi giả lập giống APIStatusError của SDK"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_error_status_and_retry_after():
+    """Test đọc status code và Retry-After từ lỗi của provider"""
+    error = FakeStatusError(429, {"retry-after": "2"})
+
+    assert get_error_status(error) == 429
+    assert get_retry_after(error) == 2.0
+    assert get_error_status(ValueError("boom")) is None
+    assert get_retry_after(FakeStatusError(503)) is None
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_when_budget_exhausted():
+    """Test bucket chờ nạp lại khi hết ngân sách và điều chỉnh theo usage thực tế"""
+    bucket = TokenBucket(per_minute=6000)  # 100 token mỗi giây
+
+    assert await bucket.acquire(6000) == 0.0
+    waited = await bucket.acquire(5)
+    assert 0 < waited <= 0.1
+
+    bucket.adjust(-1000)
+    assert bucket.tokens < 0
+
+def test_aimd_controller_increases_and_backs_off():
+    """Test giới hạn concurrency tăng dần khi thành công và giảm một nửa khi bị 429"""
+    controller = AIMDController(initial=4, minimum=1, maximum=8, cooldown_seconds=0)
+
+    for _ in range(8):
+        controller.on_success()
+    assert controller.limit > 5
+
+    limit = controller.limit
+    controller.on_throttle(retry_after=3)
+    assert controller.limit == pytest.approx(limit / 2)
+    assert controller.paused_until > 0
+
+    for _ in range(10):
+        controller.on_throttle()
+    assert controller.limit == 1
+
+@pytest.mark.asyncio
+async def test_limiter_retries_throttled_calls():
+    """Test limiter thử lại khi gặp 429 và ném lỗi khi không thể thử lại"""
+    limiter = ProviderRateLimiter(
+        "fake",
+        requests_per_minute=600,
+        controller=AIMDController(initial=4, cooldown_seconds=0),
+        max_retries=2,
+        backoff_seconds=0
+    )
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeStatusError(429, {"retry-after": "0"})
+        return "ok"
+
+    assert await limiter.call(flaky, tokens=10) == "ok"
+    assert limiter.retries == 2
+    # 4 -> 2 -> 1 sau hai lần 429, rồi tăng lại sau lần thành công
+    assert limiter.controller.limit == 2
+    assert limiter.controller.in_flight == 0
+
+    async def bad_request():
+        raise FakeStatusError(400)
+
+    with pytest.raises(FakeStatusError):
+        await limiter.call(bad_request)
+    assert limiter.retries == 2
+
+@pytest.mark.asyncio
+async def test_controller_limits_concurrency():
+    """Test số request đồng thời không vượt quá giới hạn của controller"""
+    limiter = ProviderRateLimiter("fake", controller=AIMDController(initial=2, maximum=2))
+    running, peak = 0, 0
+
+    async def work():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*(limiter.call(work) for _ in range(6)))
+
+    assert peak == 2
+    assert limiter.total_requests == 6
+
+@pytest.mark.asyncio
+async def test_cancelled_woken_waiter_passes_slot_on():
+    """Test request đã được đánh thức nhưng bị hủy trước khi lấy slot nhường slot cho request chờ tiếp theo"""
+    controller = AIMDController(initial=1, maximum=1)
+    await controller.acquire()
+    first = asyncio.create_task(controller.acquire())
+    second = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    controller.release()
+    first.cancel()
+    await asyncio.wait_for(second, timeout=1)
+
+    assert first.cancelled()
+    assert controller.in_flight == 1
@@ -0,0 +1,129 @@
+import asyncio
+import gc
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.core.singleflight import SHARED_TASK_ID, SingleFlight, capture_cost
+
+
+async def _upstream(calls, release, shared_task_id):
+    """Lời gọi upstream giả lập, ghi một chi phí rồi chờ được giải phóng"""
+    calls.append(shared_task_id)
+    capture_cost("llm", {"model": "fake-model", "input_tokens": 100, "output_tokens": 50})
+    await release.wait()
+    return "result"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_call():
+    """Test các request cùng key đang chạy được gộp và chia đều chi phí"""
+    flight = SingleFlight(attribution="proportional")
+    calls, release = [], asyncio.Event()
+    cost_service = AsyncMock()
+
+    with patch("app.services.core.monitoring.cost.get_cost_service", AsyncMock(return_value=cost_service)):
+        waiters = [
+            asyncio.create_task(flight.do("key", lambda tid: _upstream(calls, release, tid), task_id=f"task-{i}"))
+            for i in range(4)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+
+    assert results == ["result"] * 4
+    assert calls == [SHARED_TASK_ID]
+    assert flight.get_stats()["coalesced"] == 3
+    shares = [call.kwargs["cost_share"] for call in cost_service.log_llm_request.call_args_list]
+    assert shares == [0.25] * 4
+    assert sorted(call.kwargs["task_id"] for call in cost_service.log_llm_request.call_args_list) == [f"task-{i}" for i in range(4)]
+    assert [call.kwargs["coalesced"] for call in cost_service.log_llm_request.call_args_list].count(False) == 1
+
+@pytest.mark.asyncio
+async def test_first_attribution_and_sequential_calls():
+    """Test chế độ 'first' tính toàn bộ chi phí cho leader; request tuần tự không được gộp"""
+    flight = SingleFlight(attribution="first")
+    calls, release = [], asyncio.Event()
+    cost_service = AsyncMock()
+
+    with patch("app.services.core.monitoring.cost.get_cost_service", AsyncMock(return_value=cost_service)):
+        leader = asyncio.create_task(flight.do("key", lambda tid: _upstream(calls, release, tid), task_id="task-a"))
+        follower = asyncio.create_task(flight.do("key", lambda tid: _upstream(calls, release, tid), task_id="task-b"))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(leader, follower)
+        await flight.do("key", lambda tid: _upstream(calls, release, tid), task_id="task-c")
+
+    assert len(calls) == 2
+    shares = {call.kwargs["task_id"]: call.kwargs["cost_share"] for call in cost_service.log_llm_request.call_args_list}
+    assert shares == {"task-a": 1.0, "task-b": 0.0, "task-c": 1.0}
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_all_waiters():
+    """Test lỗi của lời gọi upstream được trả về cho mọi request đang chờ"""
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def failing(_):
+        await release.wait()
+        raise ValueError("upstream error")
+
+    waiters = [asyncio.create_task(flight.do("key", failing)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.get_stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_error_after_all_callers_cancelled_is_retrieved():
+    """Test lỗi của lời gọi upstream không bị báo "never retrieved" khi mọi caller đã bị hủy"""
+    flight = SingleFlight()
+    release = asyncio.Event()
+    contexts = []
+    loop = asyncio.get_running_loop()
+    loop.set_exception_handler(lambda _, context: contexts.append(context))
+
+    async def failing(_):
+        await release.wait()
+        raise ValueError("upstream error")
+
+    try:
+        waiter = asyncio.create_task(flight.do("key", failing))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert flight.get_stats()["in_flight"] == 0
+        del waiter
+        gc.collect()
+    finally:
+        loop.set_exception_handler(None)
+
+    assert not [context for context in contexts if "never retrieved" in context.get("message", "")]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_participant_still_pays_its_share():
+    """Test caller bị hủy khi đang chờ vẫn được phân bổ phần chi phí của lời gọi dùng chung"""
+    flight = SingleFlight(attribution="proportional")
+    calls, release = [], asyncio.Event()
+    cost_service = AsyncMock()
+
+    with patch("app.services.core.monitoring.cost.get_cost_service", AsyncMock(return_value=cost_service)):
+        leader = asyncio.create_task(flight.do("key", lambda tid: _upstream(calls, release, tid), task_id="task-a"))
+        follower = asyncio.create_task(flight.do("key", lambda tid: _upstream(calls, release, tid), task_id="task-b"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        assert await follower == "result"
+
+    shares = {call.kwargs["task_id"]: call.kwargs["cost_share"] for call in cost_service.log_llm_request.call_args_list}
+    assert shares == {"task-a": 0.5, "task-b": 0.5}
+    assert [call.kwargs["coalesced"] for call in cost_service.log_llm_request.call_args_list] == [False, True]
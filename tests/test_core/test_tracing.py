@@ -0,0 +1,93 @@
+import asyncio
+import json
+import pytest
+
+from app.core import tracing
+from app.core.tracing import Tracer, span, to_chrome_trace, to_otlp_json, traced
+
+TASK_ID = "7c6867f0-b822-4317-ae57-b0f4942312c3"
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    """Tracer riêng cho mỗi test, ghi trace vào thư mục tạm"""
+    instance = Tracer(export_dir=str(tmp_path), export_format="chrome")
+    monkeypatch.setattr(tracing, "_tracer", instance)
+    monkeypatch.setattr(tracing, "_tracer_initialized", True)
+    return instance
+
+
+@traced("test.section", attributes=lambda args: {"section": args["title"]})
+async def research_section(title: str):
+    with span("test.search"):
+        await asyncio.sleep(0)
+    return title
+
+
+@pytest.mark.asyncio
+async def test_spans_propagate_across_tasks(tracer):
+    """Test span con (kể cả trong asyncio task song song) gắn với span cha và cùng trace"""
+    with span("test.phase", task_id=TASK_ID) as root:
+        await asyncio.gather(research_section("A"), research_section("B"))
+
+    spans = tracer.get_spans(TASK_ID)
+    by_name = {}
+    for item in spans:
+        by_name.setdefault(item.name, []).append(item)
+    assert len(spans) == 5
+    assert all(item.parent_id == root.span_id for item in by_name["test.section"])
+    section_ids = {item.span_id for item in by_name["test.section"]}
+    assert {item.parent_id for item in by_name["test.search"]} == section_ids
+    assert sorted(item.attributes["section"] for item in by_name["test.section"]) == ["A", "B"]
+
+    chrome = to_chrome_trace(spans)
+    lanes = {event["tid"] for event in chrome["traceEvents"] if event["name"] == "test.section"}
+    assert len(lanes) == 2
+    otlp = to_otlp_json(spans)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {item["traceId"] for item in otlp} == {TASK_ID.replace("-", "")}
+
+@pytest.mark.asyncio
+async def test_traced_without_trace_is_noop_and_records_errors(tracer):
+    """Test không ghi span khi không có trace, span lỗi được đánh dấu error"""
+    assert await research_section("A") == "A"
+    assert tracer.get_stats()["spans"] == 0
+
+    @traced("test.fail")
+    async def fail(task_id: str):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await fail(task_id=TASK_ID)
+    failed = tracer.get_spans(TASK_ID)[0]
+    assert failed.status == "error"
+    assert "boom" in failed.attributes["error"]
+
+@pytest.mark.asyncio
+async def test_export_writes_trace_file(tracer, tmp_path):
+    """Test span được đánh dấu export ghi trace của task ra file"""
+    with span("test.phase", task_id=TASK_ID, export=True):
+        await research_section("A")
+    await tracer.flush()
+
+    path = tmp_path / TASK_ID / "trace.json"
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert [event["name"] for event in data["traceEvents"]] == ["test.phase", "test.section", "test.search"]
+    assert await tracer.load_exported(TASK_ID) == data
+
+@pytest.mark.asyncio
+async def test_child_only_span_never_starts_a_trace(tracer):
+    """Test span child_only (ví dụ đọc storage từ API) không tạo trace mới, chỉ gắn vào span cha"""
+    @traced("test.load", child_only=True)
+    async def load(task_id: str):
+        return task_id
+
+    assert await load(task_id=TASK_ID) == TASK_ID
+    assert await load(task_id="unknown-id") == "unknown-id"
+    assert tracer.get_spans(TASK_ID) is None
+    assert tracer.get_stats()["spans"] == 0
+
+    with span("test.phase", task_id=TASK_ID) as root:
+        await load(task_id=TASK_ID)
+    spans = {item.name: item for item in tracer.get_spans(TASK_ID)}
+    assert set(spans) == {"test.phase", "test.load"}
+    assert spans["test.load"].parent_id == root.span_id
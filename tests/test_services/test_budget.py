@@ -0,0 +1,137 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.core.exceptions import BudgetExceededError
+from app.services.core.llm import base as llm_base
+from app.services.core.llm.base import BaseLLMService
+from app.services.core.monitoring.budget import BUDGET_DEGRADED, BUDGET_EXCEEDED, BUDGET_OK, BudgetManager
+from app.services.core.monitoring.cost import CostMonitoringService
+from app.services.core.llm.cache import MemoryResponseCache
+from app.services.core.search.budget import BudgetedSearchService
+from app.services.core.search.cache import CachedSearchService
+
+
+class FakeLLMService(BaseLLMService):
+    """LLM service giả lập ghi lại model được dùng cho mỗi lời gọi"""
+
+    def __init__(self):
+        super().__init__({"MAX_TOKENS": 100, "TEMPERATURE": 0.5})
+        self.model_name = "gpt-4"
+        self.budget_fallback_model = "gpt-4o-mini"
+        self.models = []
+
+    def get_completion(self, prompt, max_tokens=None, temperature=None, **kwargs):
+        raise NotImplementedError
+
+    def count_tokens(self, text):
+        return 100
+
+    async def _get_completion_async(self, prompt, max_tokens=None, temperature=None, **kwargs):
+        self.models.append(kwargs.get("model", self.model_name))
+        self._last_usage = {"input_tokens": 100, "output_tokens": 100}
+        return "response"
+
+    async def stream(self, prompt, **kwargs):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def cost_service():
+    """CostMonitoringService không có storage, dùng làm nguồn chi tiêu của task"""
+    service = CostMonitoringService()
+    with patch("app.services.core.monitoring.cost.get_cost_service", AsyncMock(return_value=service)):
+        yield service
+
+
+@pytest.mark.asyncio
+async def test_budget_manager_degrades_then_blocks(cost_service):
+    """Test trạng thái ngân sách theo chi tiêu của task và phần đặt trước của lời gọi đang chạy"""
+    budget = BudgetManager(task_max_tokens=1000, degrade_ratio=0.8)
+
+    first = await budget.check_llm("task-1", "gpt-4", 300, 100)
+    assert first.status == BUDGET_OK
+    # Lời gọi đang chạy được tính vào ngân sách cho tới khi trả lại
+    second = await budget.check_llm("task-1", "gpt-4", 400, 100)
+    assert second.status == BUDGET_DEGRADED
+    assert (await budget.check_llm("task-1", "gpt-4", 100, 100)).status == BUDGET_EXCEEDED
+
+    budget.release(first)
+    budget.release(second)
+    assert budget.get_stats()["reserved_tokens"] == 0
+    await cost_service.log_llm_request("task-1", "gpt-4", 500, 100)
+    assert await budget.get_status("task-1") == BUDGET_OK
+    await cost_service.log_llm_request("task-1", "gpt-4", 400, 0)
+    assert await budget.get_status("task-1") == BUDGET_DEGRADED
+    assert (await budget.check_search("task-2", "perplexity")).status == BUDGET_OK
+
+
+@pytest.mark.asyncio
+async def test_generate_switches_to_fallback_model_and_stops_at_limit(cost_service):
+    """Test generate dùng model rẻ hơn khi gần hết ngân sách USD và không gọi provider khi vượt"""
+    service = FakeLLMService()
+    # gpt-4: ~0.009 USD mỗi lời gọi (100 + 100 token), gpt-4o-mini rẻ hơn nhiều
+    budget = BudgetManager(task_max_usd=0.02, degrade_ratio=0.5)
+
+    with patch.object(llm_base, "get_budget_manager", return_value=budget), \
+         patch.object(llm_base, "get_response_cache", return_value=None), \
+         patch.object(llm_base, "get_single_flight", return_value=None), \
+         patch.object(llm_base, "get_cost_service", AsyncMock(return_value=cost_service)):
+        await service.generate("prompt", task_id="task-1")
+        await service.generate("prompt", task_id="task-1")
+        assert service.models == ["gpt-4", "gpt-4o-mini"]
+
+        summary = await cost_service.get_summary("task-1")
+        assert summary.total_cost_usd < 0.02
+
+        budget.task_max_usd = summary.total_cost_usd
+        with pytest.raises(BudgetExceededError):
+            await service.generate("prompt", task_id="task-1")
+    assert len(service.models) == 2
+    assert budget.get_stats()["reserved_usd"] == 0
+
+
+@pytest.mark.asyncio
+async def test_budgeted_search_reduces_and_skips_results(cost_service):
+    """Test search giảm số kết quả ở chế độ tiết kiệm và trả về rỗng khi vượt ngân sách"""
+    inner = AsyncMock()
+    inner.search = AsyncMock(return_value=[{"title": "t", "url": "u"}])
+    service = BudgetedSearchService(inner, provider_name="perplexity")
+    # Mỗi lời gọi perplexity ước lượng 0.005 USD
+    budget = BudgetManager(task_max_usd=0.01, degrade_ratio=0.6)
+
+    with patch("app.services.core.search.budget.get_budget_manager", return_value=budget):
+        await service.search("query", num_results=5, task_id="task-1")
+        assert inner.search.await_args.kwargs["num_results"] == 5
+
+        await cost_service.log_search_request("task-1", "perplexity", "query")
+        await service.search("query", num_results=5, task_id="task-1")
+        assert inner.search.await_args.kwargs["num_results"] == service.degraded_num_results
+
+        await cost_service.log_search_request("task-1", "perplexity", "query")
+        assert await service.search("query", num_results=5, task_id="task-1") == []
+        assert inner.search.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_search_cache_hit_skips_budget_and_degraded_results_are_not_cached(cost_service):
+    """Test cache bọc ngoài ngân sách: cache hit không kiểm tra ngân sách, kết quả đã giảm không được cache"""
+    inner = AsyncMock()
+    inner.search = AsyncMock(return_value=[{"title": "t", "url": "u"}])
+    budget = BudgetManager(task_max_usd=0.01, degrade_ratio=0.6)
+    budget.check_search = AsyncMock(wraps=budget.check_search)
+
+    with patch("app.services.core.search.budget.get_budget_manager", return_value=budget):
+        budgeted = BudgetedSearchService(inner, provider_name="perplexity")
+        service = CachedSearchService(budgeted, MemoryResponseCache(), provider_name="perplexity")
+        await service.search("query", num_results=5, task_id="task-1")
+        await service.search("query", num_results=5, task_id="task-1")
+        assert inner.search.await_count == 1
+        assert budget.check_search.await_count == 1
+
+        # Task khác ở chế độ tiết kiệm: kết quả đã giảm không được lưu cho khóa 3 kết quả
+        await cost_service.log_search_request("task-2", "perplexity", "query")
+        await service.search("other query", num_results=3, task_id="task-2")
+        assert inner.search.await_args.kwargs["num_results"] == budgeted.degraded_num_results
+        await service.search("other query", num_results=3, task_id="task-3")
+        assert inner.search.await_count == 3
+        assert inner.search.await_args.kwargs["num_results"] == 3
@@ -0,0 +1,86 @@
+import pytest
+
+from app.models.cost import LLMCost, PhaseTimingInfo, ResearchCostMonitoring, SearchCost
+from app.services.core.monitoring.analytics import CostAnalyticsIndex, percentile
+from app.services.core.monitoring.cost import CostMonitoringService
+from app.services.core.storage.file import FileStorageService
+
+
+def make_monitoring(task_id, cost_usd, tokens, day="2024-05-01", duration=10.0):
+    monitoring = ResearchCostMonitoring(task_id=task_id)
+    monitoring.add_llm_cost(LLMCost(
+        timestamp=f"{day}T10:00:00",
+        model="gpt-4",
+        input_tokens=tokens,
+        output_tokens=tokens,
+        total_tokens=2 * tokens,
+        cost_usd=cost_usd,
+        purpose="test",
+        task_id=task_id
+    ))
+    monitoring.add_search_cost(SearchCost(
+        timestamp=f"{day}T10:01:00",
+        provider="google",
+        query="q",
+        num_results=5,
+        cost_usd=0.01,
+        task_id=task_id
+    ))
+    monitoring.phase_timings.append(PhaseTimingInfo(phase_name="researching", duration_seconds=duration))
+    return monitoring
+
+
+def test_percentile_nearest_rank():
+    """Test percentile theo nearest-rank"""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile([], 50) is None
+
+@pytest.mark.asyncio
+async def test_index_aggregates_across_tasks():
+    """Test truy vấn chi phí theo ngày, token theo model, p50/p95 phase và task tốn kém nhất"""
+    index = CostAnalyticsIndex(":memory:")
+    await index.reindex_task(make_monitoring("task-1", 1.0, 100, day="2024-05-01", duration=10))
+    await index.reindex_task(make_monitoring("task-2", 3.0, 200, day="2024-05-02", duration=30))
+    # Backfill lại không nhân đôi dữ liệu
+    await index.reindex_task(make_monitoring("task-1", 1.0, 100, day="2024-05-01", duration=10))
+
+    spend = await index.get_spend()
+    assert spend["total_cost_usd"] == pytest.approx(4.02)
+    assert [day["day"] for day in spend["days"]] == ["2024-05-01", "2024-05-02"]
+    assert (await index.get_spend(start_date="2024-05-02"))["llm_cost_usd"] == pytest.approx(3.0)
+
+    models = await index.get_model_usage()
+    assert models == [{
+        "model": "gpt-4", "requests": 2, "input_tokens": 300, "output_tokens": 300,
+        "total_tokens": 600, "cost_usd": pytest.approx(4.0)
+    }]
+
+    phases = await index.get_phase_durations()
+    assert phases[0]["phase_name"] == "researching"
+    assert phases[0]["p50_seconds"] == 10
+    assert phases[0]["p95_seconds"] == 30
+
+    top = await index.get_top_tasks(limit=1)
+    assert top[0]["task_id"] == "task-2"
+    index.close()
+
+@pytest.mark.asyncio
+async def test_cost_service_updates_index_on_flush(tmp_path):
+    """Test CostMonitoringService cập nhật chỉ mục tăng dần khi flush"""
+    service = CostMonitoringService(FileStorageService(base_dir=str(tmp_path)))
+    service._persistence.interval_seconds = 60
+    service.cost_index = CostAnalyticsIndex(":memory:")
+
+    await service.log_llm_request("task-1", "gpt-4", 100, 50)
+    await service.flush("task-1")
+    await service.log_llm_request("task-1", "gpt-4", 100, 50)
+    await service.flush("task-1")
+
+    models = await service.cost_index.get_model_usage()
+    assert models[0]["requests"] == 2
+    assert models[0]["total_tokens"] == 300
+    top = await service.cost_index.get_top_tasks()
+    assert top[0]["total_tokens"] == 300
+    await service.shutdown()
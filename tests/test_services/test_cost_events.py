@@ -0,0 +1,103 @@
+import json
+import pytest
+
+from app.models.cost import LLMCost, PhaseTimingInfo, ResearchCostMonitoring
+from app.services.core.monitoring.cost import CostMonitoringService
+from app.services.core.monitoring.events import SNAPSHOT_OFFSET_KEY, CostEventLog
+from app.services.core.storage.file import FileStorageService
+
+
+def llm_event(tokens=100):
+    cost = LLMCost(
+        model="gpt-4",
+        input_tokens=tokens,
+        output_tokens=0,
+        total_tokens=tokens,
+        cost_usd=0.01,
+        purpose="test",
+        task_id="task-1"
+    )
+    return ("llm", cost.dict())
+
+
+@pytest.mark.asyncio
+async def test_event_log_round_trip_and_phase_upsert(tmp_path):
+    """Test dựng lại monitoring từ event log, phase event ghi đè trạng thái cũ"""
+    log = CostEventLog(str(tmp_path))
+    phase = PhaseTimingInfo(phase_name="researching")
+    await log.append("task-1", [llm_event(), ("phase", phase.dict())])
+    phase.status = "completed"
+    await log.append("task-1", [llm_event(50), ("phase", phase.dict())])
+
+    monitoring, offset = await log.materialize("task-1")
+
+    assert len(monitoring.llm_requests) == 2
+    assert monitoring.summary.total_tokens == 150
+    assert [p.status for p in monitoring.phase_timings] == ["completed"]
+    assert offset == (tmp_path / "research_tasks/task-1/cost_events.jsonl").stat().st_size
+    assert await log.materialize("task-2") == (None, 0)
+
+@pytest.mark.asyncio
+async def test_event_log_compact_and_partial_line(tmp_path):
+    """Test compact ghi snapshot kèm offset, chỉ các event sau snapshot được đọc lại"""
+    log = CostEventLog(str(tmp_path))
+    await log.append("task-1", [llm_event(), llm_event()])
+
+    await log.compact("task-1")
+    snapshot = json.loads((tmp_path / "research_tasks/task-1/cost.json").read_text(encoding="utf-8"))
+    assert len(snapshot["llm_requests"]) == 2
+    assert snapshot[SNAPSHOT_OFFSET_KEY] > 0
+
+    await log.append("task-1", [llm_event()])
+    with open(log.log_path("task-1"), "ab") as f:
+        f.write(b'{"type": "llm", "da')
+
+    monitoring, _ = await log.materialize("task-1")
+    assert len(monitoring.llm_requests) == 3
+    assert ResearchCostMonitoring.parse_obj(snapshot).summary.total_tokens == 200
+
+@pytest.mark.asyncio
+async def test_append_after_crash_truncates_partial_line(tmp_path):
+    """Test event ghi sau một dòng ghi dở (crash) không bị nối vào dòng dở và mất"""
+    log = CostEventLog(str(tmp_path))
+    await log.append("task-1", [llm_event()])
+    with open(log.log_path("task-1"), "ab") as f:
+        f.write(b'{"type": "llm", "da')
+
+    await log.append("task-1", [llm_event(50)])
+
+    monitoring, offset = await log.materialize("task-1")
+    assert [request.input_tokens for request in monitoring.llm_requests] == [100, 50]
+    assert offset == (tmp_path / "research_tasks/task-1/cost_events.jsonl").stat().st_size
+
+    # Log chỉ gồm một dòng ghi dở
+    (tmp_path / "research_tasks/task-2").mkdir(parents=True)
+    with open(log.log_path("task-2"), "wb") as f:
+        f.write(b'{"type": "ll')
+    await log.append("task-2", [llm_event()])
+    monitoring, _ = await log.materialize("task-2")
+    assert len(monitoring.llm_requests) == 1
+
+@pytest.mark.asyncio
+async def test_cost_service_appends_and_materializes(tmp_path):
+    """Test service chỉ ghi nối event, snapshot cost.json được tạo khi materialize"""
+    storage = FileStorageService(base_dir=str(tmp_path))
+    service = CostMonitoringService(storage)
+    service._persistence.interval_seconds = 60
+    for _ in range(5):
+        await service.log_llm_request("task-1", "gpt-4", 100, 50, prompt="prompt")
+    await service.flush("task-1")
+
+    cost_path = tmp_path / "research_tasks/task-1/cost.json"
+    events_path = tmp_path / "research_tasks/task-1/cost_events.jsonl"
+    assert not cost_path.exists()
+    assert len(events_path.read_text(encoding="utf-8").splitlines()) == 5
+
+    monitoring = await service.materialize_monitoring("task-1")
+    assert monitoring.summary.total_tokens == 5 * 150
+    assert len(json.loads(cost_path.read_text(encoding="utf-8"))["llm_requests"]) == 5
+
+    # Service mới (ví dụ sau khi restart) tải lại từ snapshot và event log
+    reloaded = await CostMonitoringService(storage).load_monitoring("task-1")
+    assert reloaded.summary.total_tokens == 5 * 150
+    await service.shutdown()
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.core.monitoring.cost import CostMonitoringService
+from app.services.core.monitoring.persistence import WriteBehindPersistence
+from app.services.core.storage.file import FileStorageService
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """FileStorageService trên thư mục tạm, có sẵn task.json"""
+    service = FileStorageService(base_dir=str(tmp_path))
+    service.save_data({"id": "task-1", "status": "researching"}, "research_tasks/task-1/task.json")
+    return service
+
+
+@pytest.mark.asyncio
+async def test_persistence_coalesces_updates():
+    """Test nhiều thay đổi của cùng task chỉ tạo một lần ghi"""
+    flush_fn = AsyncMock()
+    persistence = WriteBehindPersistence(flush_fn, interval_seconds=60, max_pending_updates=1000)
+
+    for _ in range(30):
+        persistence.mark_dirty("task-1")
+    persistence.mark_dirty("task-2")
+    await persistence.flush_all()
+    await persistence.flush_all()
+
+    assert flush_fn.await_count == 2
+    assert persistence.get_stats()["updates"] == 31
+    await persistence.stop()
+
+@pytest.mark.asyncio
+async def test_persistence_flushes_on_threshold_and_retries_errors():
+    """Test flush ngay khi vượt ngưỡng và giữ task dirty nếu ghi lỗi"""
+    flush_fn = AsyncMock(side_effect=[OSError("disk full"), None])
+    persistence = WriteBehindPersistence(flush_fn, interval_seconds=60, max_pending_updates=3)
+
+    for _ in range(3):
+        persistence.mark_dirty("task-1")
+    await asyncio.sleep(0.01)
+
+    assert flush_fn.await_count == 1
+    assert persistence.is_dirty("task-1")
+
+    await persistence.stop()
+    assert flush_fn.await_count == 2
+    assert not persistence.is_dirty("task-1")
+
+@pytest.mark.asyncio
+async def test_cost_service_writes_on_phase_end(storage):
+    """Test log request chỉ đánh dấu dirty, kết thúc phase ghi event log và task.json"""
+    service = CostMonitoringService(storage)
+    service._persistence.interval_seconds = 60
+    await service.start_phase_timing("task-1", "researching")
+    for _ in range(30):
+        await service.log_llm_request("task-1", "gpt-4", 100, 50, prompt="prompt")
+
+    events_path = storage.base_dir / "research_tasks/task-1/cost_events.jsonl"
+    assert not events_path.exists()
+
+    await service.end_phase_timing("task-1", "researching")
+
+    events = [json.loads(line) for line in events_path.read_text(encoding="utf-8").splitlines()]
+    task_data = json.loads((storage.base_dir / "research_tasks/task-1/task.json").read_text(encoding="utf-8"))
+    assert sum(1 for event in events if event["type"] == "llm") == 30
+    assert task_data["cost_info"]["total_tokens"] == 30 * 150
+    assert service.get_persistence_stats()["writes"] == 1
+    assert not list(events_path.parent.glob("*.tmp"))
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_cost_data_evicts_lru_and_reloads(storage):
+    """Test chỉ giữ số task giới hạn trong bộ nhớ, task bị loại được tải lại từ storage"""
+    service = CostMonitoringService(storage)
+    service._persistence.interval_seconds = 60
+    service._cost_data.max_tasks = 2
+    for task_id in ("task-a", "task-b", "task-c"):
+        await service.log_llm_request(task_id, "gpt-4", 100, 50)
+    # Các task còn dữ liệu chưa ghi bị ghim
+    assert service.get_memory_stats()["resident_tasks"] == 3
+
+    await service.flush()
+    stats = service.get_memory_stats()
+    assert stats["resident_tasks"] == 2
+    assert stats["evictions"] == 1
+    assert stats["resident_bytes"] > 0
+    assert "task-a" not in service._cost_data
+
+    monitoring = await service.get_monitoring("task-a")
+    assert monitoring.summary.total_tokens == 150
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_release_monitoring_after_completion(storage):
+    """Test giải phóng monitoring khi task hoàn thành, dữ liệu được ghi trước khi loại"""
+    service = CostMonitoringService(storage)
+    service._persistence.interval_seconds = 60
+    await service.log_llm_request("task-1", "gpt-4", 100, 50)
+
+    assert await service.release_monitoring("task-1")
+    assert service.get_memory_stats()["resident_tasks"] == 0
+
+    summary = await service.get_summary("task-1")
+    assert summary.total_tokens == 150
+    await service.shutdown()
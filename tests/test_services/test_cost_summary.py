@@ -0,0 +1,66 @@
+import pytest
+
+from app.models.cost import LLMCost, ResearchCostMonitoring, SearchCost
+from app.services.core.monitoring.cost import CostMonitoringService
+
+
+def _build_monitoring() -> ResearchCostMonitoring:
+    monitoring = ResearchCostMonitoring(task_id="task-1")
+    for i in range(20):
+        monitoring.add_llm_cost(LLMCost(
+            model="gpt-4" if i % 2 else "claude-3-5-sonnet-latest",
+            input_tokens=100 + i,
+            output_tokens=50,
+            cost_usd=0.001 * i,
+            cache_hit=i % 5 == 0,
+            coalesced=i % 7 == 0
+        ))
+        monitoring.add_search_cost(SearchCost(
+            provider="perplexity",
+            cost_usd=0.0005,
+            input_tokens=10 if i % 3 else None,
+            output_tokens=20 if i % 3 else None,
+            cache_hit=i % 4 == 0
+        ))
+    return monitoring
+
+
+def test_incremental_summary_matches_recompute():
+    """Test summary cập nhật tăng dần khớp với summary tính lại từ đầu"""
+    monitoring = _build_monitoring()
+    incremental = monitoring.summary.copy(deep=True)
+
+    recomputed = monitoring.recompute_summary()
+
+    assert incremental.matches(recomputed)
+    assert recomputed.total_llm_requests == 20
+    assert recomputed.total_search_requests == 20
+    assert recomputed.model_breakdown["gpt-4"]["requests"] == 10
+    assert recomputed.llm_cache_hits == 4
+    assert recomputed.search_cache_hits == 5
+    assert recomputed.provider_breakdown["perplexity"]["input_tokens"] == 130
+
+def test_legacy_monitoring_without_summary_is_recomputed_once():
+    """Test dữ liệu cũ không có summary được tính lại trước khi cộng tăng dần"""
+    monitoring = _build_monitoring()
+    data = monitoring.dict()
+    data["summary"] = None
+    legacy = ResearchCostMonitoring.parse_obj(data)
+
+    legacy.add_llm_cost(LLMCost(model="gpt-4", input_tokens=1, output_tokens=1, cost_usd=0.5))
+
+    assert legacy.summary.total_llm_requests == 21
+    assert legacy.summary.matches(legacy.recompute_summary())
+
+@pytest.mark.asyncio
+async def test_recompute_summary_repairs_drift():
+    """Test recompute_summary phát hiện và sửa summary bị lệch"""
+    service = CostMonitoringService()
+    monitoring = service.initialize_monitoring("task-1")
+    monitoring.add_llm_cost(LLMCost(model="gpt-4", input_tokens=10, output_tokens=5, cost_usd=0.01))
+    monitoring.summary.total_cost_usd = 99.0
+
+    summary = await service.recompute_summary("task-1")
+
+    assert summary.total_cost_usd == pytest.approx(0.01)
+    assert (await service.get_summary("task-1")).total_cost_usd == pytest.approx(0.01)
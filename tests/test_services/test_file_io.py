@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+from app.services.core.storage.file import FileStorageService
+from app.services.core.storage.file_io import FileIOExecutor
+
+
+@pytest.mark.asyncio
+async def test_writes_to_same_path_run_in_order(tmp_path):
+    """Test các lần ghi cùng một file được thực hiện tuần tự theo thứ tự gửi, người đọc thấy file hoàn chỉnh"""
+    file_io = FileIOExecutor(max_workers=4)
+    path = str(tmp_path / "nested" / "result.json")
+    payload = "x" * 100000
+
+    operations = []
+    for i in range(20):
+        operations.append(file_io.write_json(path, {"version": i, "payload": payload}))
+        operations.append(file_io.read_json(path) if i else asyncio.sleep(0))
+    results = await asyncio.gather(*operations)
+
+    reads = [result for result in results if isinstance(result, dict)]
+    assert [read["version"] for read in reads] == list(range(1, 20))
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f)["version"] == 19
+
+    stats = file_io.get_stats()
+    assert stats["errors"] == 0
+    assert stats["queued"] == stats["running"] == stats["waiting_path"] == 0
+    assert stats["tracked_paths"] == 0
+    file_io.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_pool_is_bounded_and_keeps_event_loop_responsive():
+    """Test thao tác chặn chạy trên thread pool giới hạn, event loop vẫn xử lý việc khác"""
+    file_io = FileIOExecutor(max_workers=2)
+    running = []
+    peak = []
+    guard = threading.Lock()
+
+    def blocking_io(index: int) -> int:
+        with guard:
+            running.append(index)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with guard:
+            running.remove(index)
+        return index
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    try:
+        results = await asyncio.gather(*(file_io.run(blocking_io, i) for i in range(6)))
+    finally:
+        ticker_task.cancel()
+
+    assert results == list(range(6))
+    assert max(peak) == 2
+    assert file_io.get_stats()["max_queued"] >= 4
+    # 3 lượt x 50ms trên 2 thread: event loop phải tiếp tục chạy ticker trong lúc chờ
+    assert ticks >= 10
+    file_io.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_file_storage_round_trip_and_missing_file(tmp_path):
+    """Test FileStorageService lưu/đọc qua thread pool I/O và báo lỗi khi file không tồn tại"""
+    storage = FileStorageService(str(tmp_path))
+
+    await storage.save({"title": "Kết quả"}, "research_tasks/task-1/result.json")
+    await storage.save("# Kết quả", "research_tasks/task-1/result.md")
+
+    assert await storage.load("research_tasks/task-1/result.json") == {"title": "Kết quả"}
+    assert await storage.load("research_tasks/task-1/result.md", as_json=False) == "# Kết quả"
+    assert sorted(await storage.list_files("research_tasks/task-1", "*.json")) == ["research_tasks/task-1/result.json"]
+    with pytest.raises(FileNotFoundError):
+        await storage.load("research_tasks/task-1/missing.json")
+    assert await storage.delete("research_tasks/task-1/result.md") is True
+    assert await storage.delete("research_tasks/task-1/result.md") is False
+
+
+@pytest.mark.asyncio
+async def test_failed_write_keeps_previous_file(tmp_path):
+    """Test lần ghi lỗi giữa chừng không làm hỏng file cũ và không để lại file tạm"""
+    file_io = FileIOExecutor(fsync_policy="none")
+    path = str(tmp_path / "task.json")
+    await file_io.write_json(path, {"status": "researching"})
+
+    with pytest.raises(TypeError):
+        await file_io.write_json(path, {"status": "editing", "bad": object()})
+
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f) == {"status": "researching"}
+    assert os.listdir(tmp_path) == ["task.json"]
+    file_io.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fsync_policies(tmp_path):
+    """Test "always" fsync sau mỗi lần ghi, "phase" chỉ fsync file của thư mục được sync"""
+    task_1, task_2 = str(tmp_path / "task-1"), str(tmp_path / "task-2")
+
+    with patch("app.services.core.storage.file_io.os.fsync") as fsync:
+        always = FileIOExecutor(fsync_policy="always")
+        await always.write_json(os.path.join(task_1, "outline.json"), {"title": "t"})
+        assert fsync.call_count == 2  # file và thư mục chứa file
+        assert always.get_stats()["unsynced_files"] == 0
+        always.shutdown()
+
+        fsync.reset_mock()
+        phase = FileIOExecutor(fsync_policy="phase")
+        await phase.write_json(os.path.join(task_1, "outline.json"), {"title": "t"})
+        await phase.write_text(os.path.join(task_1, "result.md"), "# t")
+        await phase.write_json(os.path.join(task_2, "task.json"), {"id": "task-2"})
+        assert fsync.call_count == 0
+        assert phase.get_stats()["unsynced_files"] == 3
+
+        assert await phase.sync(task_1) == 2
+        assert fsync.call_count == 3  # 2 file và thư mục task-1
+        assert phase.get_stats()["unsynced_files"] == 1
+        assert await phase.sync(task_1) == 0
+        assert await phase.sync() == 1
+        phase.shutdown()
+
+    assert FileIOExecutor(fsync_policy="sometimes").fsync_policy == "phase"
@@ -0,0 +1,70 @@
+import httpx
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.core.llm import http_pool
+from app.services.core.llm.claude import ClaudeService
+
+
+@pytest.fixture
+def shared_client(monkeypatch):
+    """Mỗi test bắt đầu với HTTP client dùng chung chưa được tạo"""
+    monkeypatch.setattr(http_pool, "_client", None)
+    monkeypatch.setattr(http_pool, "_transport", None)
+    monkeypatch.setattr(http_pool, "_client_loop", None)
+
+
+def _response(text: str = "xin chào"):
+    return SimpleNamespace(
+        content=[SimpleNamespace(text=text)],
+        usage=SimpleNamespace(input_tokens=12, output_tokens=34)
+    )
+
+
+@pytest.mark.asyncio
+async def test_claude_client_reuses_shared_http_client(shared_client):
+    """Test async client của Claude được dùng lại và chỉ tạo lại khi HTTP client dùng chung thay đổi"""
+    service = ClaudeService({"ANTHROPIC_API_KEY": "test-key"})
+    client = service.client
+    assert service.client is client
+    assert client._client is http_pool.get_shared_http_client()
+
+    await http_pool.close_shared_http_client()
+    recreated = service.client
+    assert recreated is not client
+    assert recreated._client is http_pool.get_shared_http_client()
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_count_requests(shared_client):
+    """Test thống kê connection pool ghi nhận request thành công và lỗi"""
+    assert http_pool.get_pool_stats() == {"initialized": False}
+    client = http_pool.get_shared_http_client()
+
+    handle = AsyncMock(side_effect=[httpx.Response(200), httpx.ConnectError("lỗi kết nối")])
+    with patch.object(httpx.AsyncHTTPTransport, "handle_async_request", handle):
+        await client.get("https://api.example.test/ok")
+        with pytest.raises(httpx.ConnectError):
+            await client.get("https://api.example.test/fail")
+
+    stats = http_pool.get_pool_stats()
+    assert stats["initialized"] is True
+    assert stats["requests_total"] == 2
+    assert stats["errors_total"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["peak_in_flight"] == 1
+
+
+def test_claude_sync_completion_uses_sync_client():
+    """Test get_completion gọi client đồng bộ và lưu usage cho cost tracking"""
+    service = ClaudeService({"ANTHROPIC_API_KEY": "test-key", "ANTHROPIC_MODEL_NAME": "claude-test"})
+    sync_client = MagicMock()
+    sync_client.messages.create.return_value = _response()
+    service._sync_client = sync_client
+
+    assert service.get_completion("Câu hỏi", max_tokens=50) == "xin chào"
+    kwargs = sync_client.messages.create.call_args.kwargs
+    assert kwargs["model"] == "claude-test"
+    assert kwargs["max_tokens"] == 50
+    assert service._last_usage == {"input_tokens": 12, "output_tokens": 34}
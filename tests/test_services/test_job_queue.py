@@ -0,0 +1,155 @@
+import asyncio
+import pytest
+
+from app.core.exceptions import JobAlreadyActiveError, QueueFullError
+from app.services.core.jobs import JobJournal, JobQueue
+
+@pytest.fixture
+def journal(tmp_path):
+    """Fixture tạo journal SQLite tạm thời"""
+    journal = JobJournal(str(tmp_path / "jobs.db"))
+    yield journal
+    journal.close()
+
+@pytest.mark.asyncio
+async def test_workers_limit_concurrency(journal):
+    """Test số job chạy đồng thời không vượt quá số worker"""
+    queue = JobQueue(journal, workers=2)
+    active = 0
+    peak = 0
+    done = []
+    
+    async def handler(payload):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        done.append(payload["n"])
+    
+    queue.register_handler("test", handler)
+    for n in range(5):
+        await queue.submit(f"job-{n}", "test", {"n": n})
+    await queue._queue.join()
+    await queue.stop()
+    
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_submit_rejected_when_saturated(journal):
+    """Test từ chối job mới khi hàng đợi đã đầy"""
+    queue = JobQueue(journal, workers=1, max_pending=1)
+    release = asyncio.Event()
+    
+    async def handler(payload):
+        await release.wait()
+    
+    queue.register_handler("test", handler)
+    await queue.submit("job-1", "test", {})
+    
+    assert queue.is_saturated()
+    with pytest.raises(QueueFullError):
+        await queue.submit("job-2", "test", {})
+    
+    release.set()
+    await queue._queue.join()
+    assert not queue.is_saturated()
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_unfinished_jobs_resumed_on_start(tmp_path):
+    """Test job chưa hoàn thành trong journal được chạy lại khi khởi động"""
+    path = str(tmp_path / "jobs.db")
+    journal = JobJournal(path)
+    await journal.add("job-1", "test", {"task_id": "task-1"})
+    await journal.mark_running("job-1")
+    await journal.add("job-2", "test", {"task_id": "task-2"})
+    journal.close()
+    
+    resumed = []
+    
+    async def handler(payload):
+        resumed.append(payload["task_id"])
+    
+    queue = JobQueue(JobJournal(path), workers=1)
+    queue.register_handler("test", handler)
+    await queue.start()
+    await queue._queue.join()
+    
+    assert resumed == ["task-1", "task-2"]
+    assert await queue.journal.list_unfinished() == []
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_do_not_exceed_max_pending(journal):
+    """Test chỗ trong hàng đợi được giữ trước await nên các submit đồng thời không vượt giới hạn"""
+    queue = JobQueue(journal, workers=1, max_pending=2)
+    release = asyncio.Event()
+    
+    async def handler(payload):
+        await release.wait()
+    
+    queue.register_handler("test", handler)
+    results = await asyncio.gather(
+        *(queue.submit(f"job-{n}", "test", {}) for n in range(5)),
+        return_exceptions=True
+    )
+    
+    assert sum(1 for result in results if result is None) == 2
+    assert sum(1 for result in results if isinstance(result, QueueFullError)) == 3
+    release.set()
+    await queue._queue.join()
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_reservation_released_when_journal_write_fails(journal, monkeypatch):
+    """Test chỗ đã giữ được trả lại khi ghi journal lỗi"""
+    queue = JobQueue(journal, workers=1, max_pending=1)
+    queue.register_handler("test", lambda payload: asyncio.sleep(0))
+    
+    async def failing_add(*args):
+        raise OSError("disk full")
+    
+    monkeypatch.setattr(journal, "add", failing_add)
+    with pytest.raises(OSError):
+        await queue.submit("job-1", "test", {})
+    
+    assert not queue.is_saturated()
+    assert not queue.is_active("job-1")
+    
+    queue.reserve("job-2")
+    assert queue.is_saturated()
+    queue.release("job-2")
+    assert queue.get_stats()["queued"] == 0
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_duplicate_job_rejected_while_active(journal):
+    """Test không nhận job trùng ID khi job đang chờ hoặc đang chạy, kể cả khi submit đồng thời"""
+    queue = JobQueue(journal, workers=1)
+    release = asyncio.Event()
+    runs = []
+    
+    async def handler(payload):
+        runs.append(payload)
+        await release.wait()
+    
+    queue.register_handler("test", handler)
+    results = await asyncio.gather(
+        queue.submit("job-1", "test", {}),
+        queue.submit("job-1", "test", {}),
+        return_exceptions=True
+    )
+    assert results[0] is None
+    assert isinstance(results[1], JobAlreadyActiveError)
+    with pytest.raises(JobAlreadyActiveError):
+        queue.reserve("job-1")
+    
+    release.set()
+    await queue._queue.join()
+    assert len(runs) == 1
+    await queue.submit("job-1", "test", {})
+    await queue._queue.join()
+    assert len(runs) == 2
+    await queue.stop()
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.core.llm import base as llm_base
+from app.services.core.llm.base import BaseLLMService
+from app.services.core.llm.cache import DiskResponseCache, MemoryResponseCache, make_cache_key
+
+
+class FakeLLMService(BaseLLMService):
+    """LLM service giả lập để kiểm tra cache trong BaseLLMService.generate"""
+    
+    def __init__(self):
+        super().__init__({"MAX_TOKENS": 100, "TEMPERATURE": 0.5})
+        self.model_name = "fake-model"
+        self.calls = 0
+    
+    def get_completion(self, prompt, max_tokens=None, temperature=None, **kwargs):
+        raise NotImplementedError
+    
+    def count_tokens(self, text):
+        return len(text) // 4
+    
+    async def _get_completion_async(self, prompt, max_tokens=None, temperature=None, **kwargs):
+        self.calls += 1
+        self._last_usage = {"input_tokens": 10, "output_tokens": 20}
+        return f"response {self.calls}"
+    
+    async def stream(self, prompt, **kwargs):
+        raise NotImplementedError
+
+
+def test_cache_key_depends_on_parameters():
+    """Test khóa cache thay đổi theo model, prompt và tham số sinh"""
+    key = make_cache_key("OpenAI", "gpt-4", "prompt", 100, 0.5)
+    
+    assert key == make_cache_key("OpenAI", "gpt-4", "prompt", 100, 0.5)
+    assert key != make_cache_key("OpenAI", "gpt-4", "prompt", 200, 0.5)
+    assert key != make_cache_key("OpenAI", "gpt-4", "prompt", 100, 0.7)
+    assert key != make_cache_key("Claude", "gpt-4", "prompt", 100, 0.5)
+    assert key != make_cache_key("OpenAI", "gpt-4", "other prompt", 100, 0.5)
+
+@pytest.mark.asyncio
+async def test_memory_cache_lru_and_ttl():
+    """Test cache trong bộ nhớ loại bỏ entry ít dùng nhất và entry hết hạn"""
+    cache = MemoryResponseCache(max_entries=2)
+    await cache.set("a", "A")
+    await cache.set("b", "B")
+    await cache.get("a")
+    await cache.set("c", "C")
+    
+    assert (await cache.get("a"))["response"] == "A"
+    assert await cache.get("b") is None
+    assert (await cache.get("c"))["response"] == "C"
+    
+    expired = MemoryResponseCache(ttl_seconds=1)
+    await expired.set("a", "A")
+    expired._entries["a"]["created_at"] -= 10
+    assert await expired.get("a") is None
+
+@pytest.mark.asyncio
+async def test_disk_cache_persists_and_evicts_by_size(tmp_path):
+    """Test cache trên đĩa đọc lại được sau khi khởi tạo lại và giới hạn dung lượng"""
+    cache = DiskResponseCache(str(tmp_path), max_bytes=10_000)
+    await cache.set("aa1", "x" * 10)
+    
+    reopened = DiskResponseCache(str(tmp_path), max_bytes=10_000)
+    assert (await reopened.get("aa1"))["response"] == "x" * 10
+    
+    small = DiskResponseCache(str(tmp_path / "small"), max_bytes=300)
+    await small.set("bb1", "y" * 150)
+    await small.set("bb2", "z" * 150)
+    
+    assert await small.get("bb1") is None
+    assert (await small.get("bb2"))["response"] == "z" * 150
+
+@pytest.mark.asyncio
+async def test_disk_cache_reads_of_different_keys_do_not_wait_for_each_other(tmp_path):
+    """Test đọc một key chậm không chặn đọc/ghi các key khác"""
+    cache = DiskResponseCache(str(tmp_path))
+    await cache.set("aa1", "slow")
+    await cache.set("bb1", "fast")
+    
+    release = threading.Event()
+    read = cache._read
+    
+    def slow_read(key):
+        if key == "aa1":
+            release.wait(5)
+        return read(key)
+    
+    with patch.object(cache, "_read", side_effect=slow_read):
+        slow = asyncio.create_task(cache.get("aa1"))
+        await asyncio.sleep(0.05)
+        assert (await asyncio.wait_for(cache.get("bb1"), timeout=2))["response"] == "fast"
+        await asyncio.wait_for(cache.set("cc1", "new"), timeout=2)
+        assert not slow.done()
+        release.set()
+        assert (await slow)["response"] == "slow"
+    assert cache.get_stats()["entries"] == 3
+
+@pytest.mark.asyncio
+async def test_generate_uses_cache_and_logs_zero_cost_hit():
+    """Test generate trả về phản hồi từ cache và ghi nhận cache hit với chi phí bằng 0"""
+    service = FakeLLMService()
+    cache = MemoryResponseCache()
+    
+    with patch.object(llm_base, "get_response_cache", return_value=cache), \
+         patch.object(service, "_log_request_cost", new_callable=AsyncMock) as mock_log:
+        first = await service.generate("prompt", task_id="task-1", purpose="test")
+        second = await service.generate("prompt", task_id="task-1", purpose="test")
+        bypassed = await service.generate("prompt", task_id="task-1", purpose="test", use_cache=False)
+    
+    assert first == second == "response 1"
+    assert bypassed == "response 2"
+    assert service.calls == 2
+    
+    hit_call = mock_log.await_args_list[1]
+    assert hit_call.kwargs["cache_hit"] is True
+    assert hit_call.kwargs["input_tokens"] == 0
+    assert "cache_hit" not in mock_log.await_args_list[0].kwargs
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -155,3 +156,80 @@ async def test_execute_error(prepare_service):
         await prepare_service.execute(request)
     
     assert "Lỗi trong quá trình chuẩn bị" in str(exc_info.value)
+
+@pytest.fixture
+def speculative_prepare_service():
+    """Fixture tạo PrepareService bật tìm kiếm song song cho dàn ý"""
+    with patch("app.services.research.prepare.get_service_factory") as mock_get_factory:
+        mock_factory = MagicMock()
+        mock_factory.create_llm_service_for_phase.return_value = AsyncMock()
+        mock_get_factory.return_value = mock_factory
+        
+        service = PrepareService()
+        service.settings = MagicMock(PREPARE_SPECULATIVE_SEARCH=True, PREPARE_SPECULATIVE_MIN_OVERLAP=0.5)
+        service.search_service = AsyncMock()
+        service.search_service.search.return_value = [{"title": "Kết quả", "content": "Nội dung"}]
+        
+        yield service
+
+@pytest.mark.asyncio
+async def test_speculative_search_reused_when_topic_matches(speculative_prepare_service):
+    """Test dùng lại kết quả tìm kiếm song song khi topic khớp với query gốc"""
+    service = speculative_prepare_service
+    service.start_speculative_search("Tác động của trí tuệ nhân tạo đến giáo dục", "task-1")
+    
+    results = await service._take_speculative_results("Trí tuệ nhân tạo trong giáo dục")
+    
+    assert results == [{"title": "Kết quả", "content": "Nội dung"}]
+    service.search_service.search.assert_awaited_once_with(
+        query="Tác động của trí tuệ nhân tạo đến giáo dục",
+        task_id="task-1",
+        purpose="search_for_outline_speculative"
+    )
+    assert service._speculative_search is None
+
+@pytest.mark.asyncio
+async def test_speculative_search_discarded_when_topic_differs(speculative_prepare_service):
+    """Test bỏ kết quả tìm kiếm song song khi topic khác biệt đáng kể"""
+    service = speculative_prepare_service
+    service.start_speculative_search("Tác động của trí tuệ nhân tạo đến giáo dục", "task-1")
+    
+    results = await service._take_speculative_results("Blockchain trong ngân hàng số")
+    
+    assert results is None
+    assert service._speculative_search is None
+
+def test_speculative_search_disabled(speculative_prepare_service):
+    """Test không tìm kiếm song song khi tính năng bị tắt"""
+    service = speculative_prepare_service
+    service.settings.PREPARE_SPECULATIVE_SEARCH = False
+    
+    service.start_speculative_search("Trí tuệ nhân tạo", "task-1")
+    
+    assert service._speculative_search is None
+
+@pytest.mark.asyncio
+async def test_speculative_search_cancelled_when_analysis_cancelled(speculative_prepare_service):
+    """Test tìm kiếm song song bị hủy khi task bị hủy trong lúc phân tích yêu cầu"""
+    service = speculative_prepare_service
+    release = asyncio.Event()
+    
+    async def slow(*args, **kwargs):
+        await release.wait()
+        return []
+    
+    service.search_service.search.side_effect = slow
+    service.llm_service = AsyncMock()
+    service.llm_service.generate.side_effect = slow
+    service.start_speculative_search("Trí tuệ nhân tạo", "task-1")
+    _, search_task = service._speculative_search
+    
+    analysis = asyncio.create_task(service.analyze_query("Trí tuệ nhân tạo", "task-1"))
+    await asyncio.sleep(0)
+    analysis.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await analysis
+    await asyncio.sleep(0)
+    
+    assert search_task.cancelled()
+    assert service._speculative_search is None
@@ -0,0 +1,90 @@
+import json
+import os
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from app.services.core.monitoring.pricing import PricingRegistry
+
+
+def _write_pricing(path, version, models, search=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "models": models, "search": search or {}}, f)
+
+
+def _epoch(day: str) -> float:
+    return datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp()
+
+
+def test_bundled_pricing_matches_aliases_and_dated_names():
+    """Test tên model có hậu tố ngày/phiên bản và alias dùng giá của tên chuẩn dài nhất khớp"""
+    registry = PricingRegistry(reload_interval_seconds=0)
+
+    assert registry.resolve_model("gpt-4o-2024-08-06") == "gpt-4o"
+    assert registry.resolve_model("gpt-4o-mini-2024-07-18") == "gpt-4o-mini"
+    assert registry.resolve_model("gpt-4-0613") == "gpt-4"
+    assert registry.resolve_model("gpt-4-32k-0613") == "gpt-4-32k"
+    assert registry.resolve_model("claude-3-haiku-20240307") == "claude-3-haiku"
+    assert registry.resolve_model("claude-3-5-sonnet-latest") == "claude-3-5-sonnet"
+    assert registry.resolve_model("claude-3.5-sonnet") == "claude-3-5-sonnet"
+    assert registry.resolve_model("gpt-4.5-preview") is None
+    assert registry.resolve_model("gpt-40") is None
+
+    assert registry.calculate_llm_cost("gpt-4-0613", 1000, 1000) == pytest.approx(0.09)
+    assert registry.calculate_llm_cost("unknown-model", 1000, 1000) == 0.0
+    assert registry.calculate_search_cost("perplexity") == 0.005
+    assert registry.get_stats()["unknown_models"] == 1
+
+
+def test_pricing_versions_and_hot_reload(tmp_path):
+    """Test giá theo ngày hiệu lực và nạp lại file khi thay đổi, file lỗi giữ bảng giá cũ"""
+    path = tmp_path / "pricing.json"
+    _write_pricing(path, "v1", {
+        "model-a": {"prices": [
+            {"input": 1.0, "output": 2.0},
+            {"effective_from": "2024-06-01", "input": 0.5, "output": 1.0}
+        ]}
+    }, {"google": {"prices": [{"request": 0.01}]}})
+    registry = PricingRegistry(str(path), reload_interval_seconds=0)
+
+    assert registry.get_model_price("model-a-001", at=_epoch("2024-05-31")) == (1.0, 2.0)
+    assert registry.get_model_price("model-a-001", at=_epoch("2024-06-01")) == (0.5, 1.0)
+    assert registry.calculate_llm_cost("model-a", 1000, 1000) == pytest.approx(1.5)
+
+    _write_pricing(path, "v2", {"model-a": {"prices": [{"input": 2.0, "output": 2.0}]}})
+    os.utime(path, (1, 1))
+    assert registry.reload() is True
+    assert registry.get_stats()["version"] == "v2"
+    assert registry.calculate_llm_cost("model-a", 1000, 1000) == pytest.approx(4.0)
+    assert registry.calculate_search_cost("google") == 0.0
+
+    path.write_text("{not json", encoding="utf-8")
+    assert registry.reload() is False
+    assert registry.get_stats()["version"] == "v2"
+    assert registry.get_stats()["reload_errors"] == 1
+    assert registry.calculate_llm_cost("model-a", 1000, 1000) == pytest.approx(4.0)
+
+
+def test_runtime_and_env_overrides_survive_reload(tmp_path):
+    """Test giá đặt lúc chạy và giá theo token trong biến môi trường được áp trên file bảng giá"""
+    path = tmp_path / "pricing.json"
+    _write_pricing(path, "v1", {
+        "gpt-x": {"provider": "openai", "prices": [{"input": 1.0, "output": 1.0}]},
+        "claude-x": {"provider": "anthropic", "prices": [{"input": 1.0, "output": 1.0}]}
+    })
+    settings = MagicMock(
+        model_fields_set={"OPENAI_COST_PROMPT_TOKEN", "OPENAI_COST_COMPLETION_TOKEN"},
+        OPENAI_COST_PROMPT_TOKEN=0.000001,
+        OPENAI_COST_COMPLETION_TOKEN=0.000002
+    )
+    with patch("app.services.core.monitoring.pricing.get_settings", return_value=settings):
+        registry = PricingRegistry(str(path), reload_interval_seconds=0)
+        assert registry.get_model_price("gpt-x") == pytest.approx((0.001, 0.002))
+        assert registry.get_model_price("claude-x") == (1.0, 1.0)
+
+        registry.update_model_pricing({"claude-x": {"input": 3.0, "output": 4.0}, "new-model": {"input": 1.0, "output": 0.0}})
+        registry.update_search_pricing({"bing": 0.02})
+        assert registry.reload(force=True) is True
+        assert registry.get_model_price("claude-x-2024") == (3.0, 4.0)
+        assert registry.calculate_llm_cost("new-model", 2000, 500) == pytest.approx(2.0)
+        assert registry.calculate_search_cost("bing") == 0.02
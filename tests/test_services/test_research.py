@@ -1,3 +1,4 @@
+import asyncio
 import json
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -8,6 +9,7 @@ from app.services.research.base import (
     ResearchOutline,
     ResearchSection
 )
+from app.services.research import research as research_module
 from app.services.research.research import ResearchService
 
 @pytest.fixture
@@ -149,3 +151,144 @@ async def test_execute_error(research_service, mock_request, mock_outline):
         await research_service.execute(mock_request, mock_outline)
     
     assert "Lỗi trong quá trình nghiên cứu" in str(exc_info.value)
+
+@pytest.fixture
+def concurrent_research_service():
+    """Fixture tạo ResearchService với factory được mock để chạy song song"""
+    mock_llm = AsyncMock()
+    mock_search = AsyncMock()
+    mock_cost = AsyncMock()
+    mock_factory = MagicMock()
+    mock_factory.create_llm_service_for_phase.return_value = mock_llm
+    mock_factory.create_search_service = AsyncMock(return_value=mock_search)
+    mock_factory.get_cost_monitoring_service = AsyncMock(return_value=mock_cost)
+    
+    with patch.object(research_module, "get_service_factory", return_value=mock_factory):
+        service = ResearchService()
+        yield service
+
+@pytest.mark.asyncio
+async def test_execute_concurrent_keeps_order_and_limit(concurrent_research_service, mock_request):
+    """Test nghiên cứu song song giữ thứ tự dàn ý và giới hạn số phần chạy cùng lúc"""
+    service = concurrent_research_service
+    service.section_concurrency = 2
+    outline = ResearchOutline(
+        sections=[ResearchSection(title=f"Section {i}", description=f"Description {i}") for i in range(5)],
+        task_id="task-1"
+    )
+    
+    in_flight = 0
+    max_in_flight = 0
+    
+    async def fake_search(query, num_results=5, task_id=None, purpose=None, **kwargs):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        # Phần đầu tiên chậm nhất để các phần hoàn thành không theo thứ tự
+        await asyncio.sleep(0.05 if "Section 0" in query else 0.01)
+        in_flight -= 1
+        return [{"title": query, "url": f"https://example.com/{len(query)}"}]
+    
+    async def fake_generate(prompt, task_id=None, purpose=None, **kwargs):
+        return f"content for {purpose}"
+    
+    service.llm_service.generate.side_effect = fake_generate
+    progress_updates = []
+    
+    async def progress_callback(progress_info):
+        progress_updates.append(progress_info)
+    
+    service.update_progress_callback = progress_callback
+    
+    search_service = await research_module.get_service_factory().create_search_service()
+    search_service.search.side_effect = fake_search
+    results = await service.execute(mock_request, outline)
+    
+    assert [s.title for s in results] == [f"Section {i}" for i in range(5)]
+    assert results[0].content == "content for research_section_Section 0"
+    assert max_in_flight == 2
+    
+    completed_counts = [p["completed_sections"] for p in progress_updates]
+    assert completed_counts == sorted(completed_counts)
+    assert completed_counts[-1] == 5
+    
+    cost_service = service.cost_service
+    assert cost_service.start_section_timing.await_count == 5
+    assert cost_service.end_section_timing.await_count == 5
+
+@pytest.mark.asyncio
+async def test_execute_pipelines_search_and_synthesis(concurrent_research_service, mock_request):
+    """Test search của các phần sau chạy trong khi LLM đang tổng hợp, với ngân sách riêng cho từng stage"""
+    service = concurrent_research_service
+    service.section_concurrency = 1
+    service.search_concurrency = 2
+    service.llm_concurrency = 1
+    outline = ResearchOutline(
+        sections=[ResearchSection(title=f"Section {i}", description=f"Description {i}") for i in range(4)],
+        task_id="task-1"
+    )
+    
+    searches_in_flight = 0
+    max_searches_in_flight = 0
+    llm_in_flight = 0
+    max_llm_in_flight = 0
+    overlapped = False
+    
+    async def fake_search(query, num_results=5, task_id=None, purpose=None, **kwargs):
+        nonlocal searches_in_flight, max_searches_in_flight, overlapped
+        searches_in_flight += 1
+        max_searches_in_flight = max(max_searches_in_flight, searches_in_flight)
+        if llm_in_flight:
+            overlapped = True
+        await asyncio.sleep(0.01)
+        searches_in_flight -= 1
+        return [{"title": query, "url": "https://example.com"}]
+    
+    async def fake_generate(prompt, task_id=None, purpose=None, **kwargs):
+        nonlocal llm_in_flight, max_llm_in_flight
+        llm_in_flight += 1
+        max_llm_in_flight = max(max_llm_in_flight, llm_in_flight)
+        await asyncio.sleep(0.02)
+        llm_in_flight -= 1
+        return "content"
+    
+    search_service = await research_module.get_service_factory().create_search_service()
+    search_service.search.side_effect = fake_search
+    service.llm_service.generate.side_effect = fake_generate
+    
+    results = await service.execute(mock_request, outline)
+    
+    assert [s.title for s in results] == [f"Section {i}" for i in range(4)]
+    assert max_llm_in_flight == 1
+    assert max_searches_in_flight <= 2
+    assert overlapped
+
+@pytest.mark.asyncio
+async def test_execute_resumes_from_checkpoints(concurrent_research_service, mock_request):
+    """Test các phần đã có checkpoint không được nghiên cứu lại, các phần mới được lưu checkpoint"""
+    service = concurrent_research_service
+    outline = ResearchOutline(
+        sections=[ResearchSection(title=f"Section {i}", description=f"Description {i}") for i in range(3)],
+        task_id="task-1"
+    )
+    done = ResearchSection(title="Section 1", description="Description 1", content="đã có", sources=[])
+    
+    async def fake_generate(prompt, task_id=None, purpose=None, **kwargs):
+        return f"content for {purpose}"
+    
+    service.llm_service.generate.side_effect = fake_generate
+    search_service = await research_module.get_service_factory().create_search_service()
+    search_service.search.return_value = [{"title": "Kết quả", "url": "https://example.com"}]
+    
+    checkpoints = {}
+    
+    async def checkpoint_callback(index, section):
+        checkpoints[index] = section
+    
+    service.section_checkpoint_callback = checkpoint_callback
+    results = await service.execute(mock_request, outline, {1: done})
+    
+    assert [s.title for s in results] == ["Section 0", "Section 1", "Section 2"]
+    assert results[1] is done
+    assert sorted(checkpoints) == [0, 2]
+    assert search_service.search.await_count == 2
@@ -0,0 +1,77 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.models.cost import ResearchCostMonitoring, SearchCost
+from app.services.core.search.base import BaseSearchService
+from app.services.core.search.cache import (
+    CachedSearchService,
+    make_search_cache_key,
+    normalize_query
+)
+from app.services.core.llm.cache import DiskResponseCache, MemoryResponseCache
+
+
+class FakeSearchService(BaseSearchService):
+    """Search service giả lập, đếm số lần gọi provider"""
+
+    def __init__(self, results=None):
+        self.provider_name = "fake"
+        self.calls = 0
+        self.results = [{"title": "AI", "url": "https://example.com", "snippet": "AI"}] if results is None else results
+
+    async def search(self, query, num_results=5, task_id=None, purpose=None, **kwargs):
+        self.calls += 1
+        return self.results[:num_results]
+
+
+def test_normalize_query_folds_case_whitespace_and_punctuation():
+    """Test các truy vấn gần giống nhau được chuẩn hóa về cùng một dạng"""
+    assert normalize_query("  AI in Education:   Overview! ") == "ai in education overview"
+    assert normalize_query("Giáo dục, AI?") == normalize_query("giáo   dục AI")
+    assert make_search_cache_key("perplexity", "AI, Education", 5) == make_search_cache_key("perplexity", "ai education", 5)
+    assert make_search_cache_key("perplexity", "ai education", 5) != make_search_cache_key("perplexity", "ai education", 3)
+    assert make_search_cache_key("perplexity", "ai education", 5) != make_search_cache_key("google", "ai education", 5)
+
+@pytest.mark.asyncio
+async def test_cached_search_reuses_results_and_logs_cache_hit():
+    """Test truy vấn lặp lại được trả từ cache và ghi nhận là cache hit"""
+    inner = FakeSearchService()
+    service = CachedSearchService(inner, MemoryResponseCache())
+    cost_service = AsyncMock()
+
+    with patch("app.services.core.monitoring.cost.get_cost_service", AsyncMock(return_value=cost_service)):
+        first = await service.search("AI in Education", task_id="task-1", purpose="research")
+        second = await service.search("ai  in education.", task_id="task-1", purpose="research")
+
+    assert first == second
+    assert inner.calls == 1
+    cost_service.log_search_request.assert_awaited_once()
+    assert cost_service.log_search_request.call_args.kwargs["cache_hit"] is True
+    assert cost_service.log_search_request.call_args.kwargs["provider"] == "fake"
+
+@pytest.mark.asyncio
+async def test_cached_search_skips_empty_results(tmp_path):
+    """Test kết quả rỗng (provider lỗi) không được lưu vào cache"""
+    inner = FakeSearchService(results=[])
+    service = CachedSearchService(inner, DiskResponseCache(str(tmp_path)))
+
+    assert await service.search("query") == []
+    assert await service.search("query") == []
+    assert inner.calls == 2
+
+    inner.results = [{"title": "t", "url": "u", "snippet": "s"}]
+    await service.search("query")
+    # Kết quả được lưu trên đĩa, instance cache mới vẫn đọc được
+    reloaded = CachedSearchService(inner, DiskResponseCache(str(tmp_path)))
+    assert await reloaded.search("Query!") == inner.results
+    assert inner.calls == 3
+
+def test_summary_reports_search_cache_hits():
+    """Test summary tính số search cache hit theo từng provider"""
+    monitoring = ResearchCostMonitoring(task_id="task-1")
+    monitoring.add_search_cost(SearchCost(provider="perplexity", cost_usd=0.01))
+    monitoring.add_search_cost(SearchCost(provider="perplexity", cost_usd=0.0, cache_hit=True))
+
+    assert monitoring.summary.search_cache_hits == 1
+    assert monitoring.summary.provider_breakdown["perplexity"]["cache_hits"] == 1
+    assert monitoring.summary.provider_breakdown["perplexity"]["requests"] == 2
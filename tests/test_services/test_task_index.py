@@ -0,0 +1,91 @@
+import json
+import os
+import pytest
+from datetime import datetime
+
+from app.models.research import ResearchRequest, ResearchResponse, ResearchStatus
+from app.services.core.storage.task_index import TaskIndex
+
+
+def _task(task_id: str, status: ResearchStatus, created_at: str, **extra) -> dict:
+    return ResearchResponse(
+        id=task_id,
+        status=status,
+        request=ResearchRequest(query=f"query {task_id}"),
+        created_at=datetime.fromisoformat(created_at),
+        updated_at=datetime.fromisoformat(created_at),
+        **extra
+    ).dict()
+
+
+@pytest.mark.asyncio
+async def test_query_filters_sorts_and_paginates():
+    """Test lọc theo trạng thái/ngày tạo, sắp xếp và phân trang trên chỉ mục"""
+    index = TaskIndex(":memory:")
+    await index.upsert(_task("a", ResearchStatus.COMPLETED, "2024-06-01T08:00:00"))
+    await index.upsert(_task("b", ResearchStatus.FAILED, "2024-06-02T09:00:00"))
+    await index.upsert(_task("c", ResearchStatus.COMPLETED, "2024-06-03T10:00:00"))
+    await index.upsert(_task("d", ResearchStatus.PENDING, "2024-06-03T23:59:00"))
+
+    rows, total = await index.query(limit=2)
+    assert total == 4
+    assert [row["id"] for row in rows] == ["d", "c"]
+    rows, _ = await index.query(limit=2, offset=2)
+    assert [row["id"] for row in rows] == ["b", "a"]
+
+    rows, total = await index.query(status="completed", order="asc")
+    assert total == 2
+    assert [row["id"] for row in rows] == ["a", "c"]
+    assert rows[0]["query"] == "query a"
+
+    rows, total = await index.query(start_date="2024-06-02", end_date="2024-06-03")
+    assert total == 3
+    assert {row["id"] for row in rows} == {"b", "c", "d"}
+
+    # Lưu lại task cập nhật dòng hiện có
+    await index.upsert(_task("d", ResearchStatus.COMPLETED, "2024-06-03T23:59:00"))
+    _, total = await index.query(status="completed")
+    assert total == 3
+
+    with pytest.raises(ValueError):
+        await index.query(sort="query")
+    index.close()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_from_existing_task_files(tmp_path):
+    """Test dựng chỉ mục từ task.json có sẵn, bỏ qua file lỗi và không ghi đè dữ liệu mới hơn"""
+    tasks_dir = tmp_path / "research_tasks"
+    for task_id, status, created_at in (
+        ("old-1", ResearchStatus.COMPLETED, "2024-05-01T00:00:00"),
+        ("old-2", ResearchStatus.RESEARCHING, "2024-05-02T00:00:00")
+    ):
+        os.makedirs(tasks_dir / task_id)
+        task = _task(task_id, status, created_at, outline={"title": "t", "sections": [
+            {"title": "s1", "description": "d"}, {"title": "s2", "description": "d"}
+        ]})
+        (tasks_dir / task_id / "task.json").write_text(json.dumps(task, default=str), encoding="utf-8")
+    os.makedirs(tasks_dir / "broken")
+    (tasks_dir / "broken" / "task.json").write_text("{", encoding="utf-8")
+    os.makedirs(tasks_dir / "empty")
+
+    db_path = str(tmp_path / "task_index.db")
+    index = TaskIndex(db_path)
+    # Task được lưu (mới hơn file trên đĩa) trước khi chỉ mục được dựng
+    newer = _task("old-2", ResearchStatus.COMPLETED, "2024-05-02T00:00:00")
+    newer["updated_at"] = datetime(2024, 5, 3)
+    await index.upsert(newer)
+
+    await index.ensure_built(str(tasks_dir))
+    rows, total = await index.query(sort="created_at", order="asc")
+    assert total == 2
+    assert rows[0]["outline_sections_count"] == 2
+    assert [(row["id"], row["status"]) for row in rows] == [("old-1", "completed"), ("old-2", "completed")]
+    index.close()
+
+    # Chỉ mục được giữ giữa các lần khởi động, không quét lại thư mục
+    reopened = TaskIndex(db_path)
+    (tasks_dir / "old-1" / "task.json").unlink()
+    await reopened.ensure_built(str(tasks_dir))
+    assert await reopened.count() == 2
+    reopened.close()
@@ -0,0 +1,79 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.models.research import (
+    ResearchRequest,
+    ResearchResponse,
+    ResearchResult,
+    ResearchStatus
+)
+from app.services.research.task_registry import TaskRegistry
+
+
+def _task(task_id: str, status: ResearchStatus = ResearchStatus.COMPLETED, content_kb: int = 0) -> ResearchResponse:
+    task = ResearchResponse(id=task_id, status=status, request=ResearchRequest(query=f"query {task_id}"))
+    if content_kb:
+        task.result = ResearchResult(title="t", content="x" * content_kb * 1024, sections=[], sources=[])
+    return task
+
+
+def _storage(tasks=None):
+    tasks = tasks or {}
+    storage = MagicMock()
+    storage.load_task = AsyncMock(side_effect=lambda task_id: tasks.get(task_id))
+    storage.load_full_task = AsyncMock(side_effect=lambda task_id: tasks.get(task_id))
+    return storage
+
+
+def test_evicts_least_recently_used_within_limits():
+    """Test loại task ít dùng nhất khi vượt số task hoặc dung lượng tối đa"""
+    registry = TaskRegistry(_storage(), max_tasks=2, max_bytes=0)
+    registry["a"] = _task("a")
+    registry["b"] = _task("b")
+    registry["a"]  # a vừa được dùng, b là task ít dùng nhất
+    registry["c"] = _task("c")
+    assert list(registry) == ["a", "c"]
+
+    by_size = TaskRegistry(_storage(), max_tasks=0, max_bytes=150 * 1024)
+    by_size["big-1"] = _task("big-1", content_kb=100)
+    by_size["big-2"] = _task("big-2", content_kb=100)
+    assert list(by_size) == ["big-2"]
+    assert by_size.get_stats()["evictions"] == 1
+    assert by_size.get_stats()["resident_bytes"] <= 150 * 1024
+
+
+def test_pinned_task_is_never_evicted_until_unpinned():
+    """Test task đang xử lý (được ghim) không bị loại, được loại khi bỏ ghim nếu vượt giới hạn"""
+    registry = TaskRegistry(_storage(), max_tasks=1, max_bytes=0)
+    running = _task("running", ResearchStatus.RESEARCHING)
+    with registry.pinned("running"):
+        registry["running"] = running
+        registry["done"] = _task("done")
+        registry["other"] = _task("other")
+        assert "running" in registry
+        assert "done" not in registry
+        running.status = ResearchStatus.COMPLETED
+    # Bỏ ghim: "running" là task ít dùng nhất nên bị loại
+    assert not registry.is_pinned("running")
+    assert list(registry) == ["other"]
+
+
+@pytest.mark.asyncio
+async def test_load_reloads_evicted_task_and_counts_hits():
+    """Test task bị loại được tải lại từ storage, thống kê hit/miss"""
+    stored = {"a": _task("a"), "b": _task("b")}
+    storage = _storage(stored)
+    registry = TaskRegistry(storage, max_tasks=1, max_bytes=0)
+
+    assert (await registry.load("a")).id == "a"
+    assert (await registry.load("a")).id == "a"
+    assert (await registry.load("b", full=True)).id == "b"
+    assert "a" not in registry
+    assert (await registry.load("a")).id == "a"
+    assert await registry.load("missing") is None
+
+    assert storage.load_task.await_count == 3
+    assert storage.load_full_task.await_count == 1
+    stats = registry.get_stats()
+    assert (stats["hits"], stats["misses"], stats["loads"]) == (1, 4, 3)
+    assert stats["resident_tasks"] == 1
@@ -0,0 +1,81 @@
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.models.research import (
+    ResearchOutline,
+    ResearchRequest,
+    ResearchResponse,
+    ResearchResult,
+    ResearchSection,
+    ResearchStatus
+)
+from app.services.core.storage.file import FileStorageService
+from app.services.research.storage import ResearchStorageService
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """ResearchStorageService ghi vào thư mục tạm"""
+    factory = MagicMock()
+    factory.get_storage_service.return_value = FileStorageService(str(tmp_path))
+    with patch("app.services.research.storage.get_service_factory", return_value=factory):
+        yield ResearchStorageService()
+
+
+def _task(task_id: str) -> ResearchResponse:
+    sections = [ResearchSection(title=f"Phần {i}", description=f"Mô tả {i}", content="x" * 1000) for i in range(3)]
+    return ResearchResponse(
+        id=task_id,
+        status=ResearchStatus.RESEARCHING,
+        request=ResearchRequest(query="Nghiên cứu"),
+        outline=ResearchOutline(sections=[ResearchSection(title=s.title, description=s.description) for s in sections]),
+        sections=sections[:2],
+        progress_info={"phase": "researching", "current_section": 3}
+    )
+
+
+@pytest.mark.asyncio
+async def test_status_is_read_from_projection(storage, tmp_path):
+    """Test trạng thái được đọc từ status.json, không cần parse task.json"""
+    await storage.save_task(_task("task-1"))
+
+    task_dir = tmp_path / "research_tasks" / "task-1"
+    status = json.loads((task_dir / "status.json").read_text(encoding="utf-8"))
+    assert "sections" not in status
+    assert status["outline_sections"][2] == {"title": "Phần 2", "description": "Mô tả 2"}
+
+    with patch.object(storage, "load_task", side_effect=AssertionError("task.json không được đọc")):
+        status = await storage.load_task_status("task-1")
+    assert status["status"] == "researching"
+    assert status["researched_sections_count"] == 2
+    assert status["progress_info"]["current_section"] == 3
+    assert await storage.load_task_status("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_status_projection_backfilled_for_legacy_tasks(storage, tmp_path):
+    """Test task chưa có status.json được đọc từ task.json một lần rồi ghi bổ sung status.json"""
+    await storage.save_task(_task("legacy"))
+    status_file = tmp_path / "research_tasks" / "legacy" / "status.json"
+    status_file.unlink()
+
+    status = await storage.load_task_status("legacy")
+    assert status["query"] == "Nghiên cứu"
+    assert status_file.exists()
+
+
+@pytest.mark.asyncio
+async def test_load_full_task_reads_artifacts(storage):
+    """Test load_full_task đọc task, outline, sections và result"""
+    task = _task("full")
+    await storage.save_task(task)
+    await storage.save_outline("full", task.outline)
+    await storage.save_sections("full", task.sections)
+    await storage.save_result("full", ResearchResult(title="Kết quả", content="# Kết quả", sections=task.sections, sources=[]))
+
+    loaded = await storage.load_full_task("full")
+    assert len(loaded.outline.sections) == 3
+    assert len(loaded.sections) == 2
+    assert loaded.result.title == "Kết quả"
+    assert await storage.load_full_task("missing") is None
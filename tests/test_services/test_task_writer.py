@@ -0,0 +1,70 @@
+import asyncio
+import json
+import os
+import pytest
+from unittest.mock import patch
+
+from app.services.core.storage.task_writer import TaskJsonWriter
+
+
+def _read_task(writer: TaskJsonWriter, task_id: str) -> dict:
+    with open(writer.task_path(task_id), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.asyncio
+async def test_writer_coalesces_concurrent_updates(tmp_path):
+    """Test các thay đổi đồng thời của một task được gộp, bản đầy đủ và patch mới nhất thắng"""
+    writer = TaskJsonWriter(str(tmp_path), max_concurrent_writes=1)
+
+    updates = [writer.replace("task-1", {"id": "task-1", "progress": i, "cost_info": None}) for i in range(20)]
+    updates.append(writer.merge("task-1", {"cost_info": {"total_cost_usd": 0.5}}))
+    results = await asyncio.gather(*updates)
+
+    assert all(results)
+    data = _read_task(writer, "task-1")
+    assert data["progress"] == 19
+    assert data["cost_info"] == {"total_cost_usd": 0.5}
+
+    stats = writer.get_stats()
+    assert stats["submitted"] == 21
+    assert stats["writes"] < stats["submitted"]
+    assert stats["writes"] + stats["coalesced"] == stats["submitted"]
+    assert stats["active_tasks"] == 0
+    assert not [name for name in os.listdir(tmp_path / "research_tasks" / "task-1") if name.endswith(".tmp")]
+
+
+@pytest.mark.asyncio
+async def test_writer_keeps_cost_summary_across_full_saves(tmp_path):
+    """Test cost summary (sticky) không bị bản đầy đủ có cost_info cũ hoặc None ghi đè"""
+    writer = TaskJsonWriter(str(tmp_path))
+    await writer.replace("task-1", {"id": "task-1", "status": "researching", "cost_info": None})
+    await writer.merge("task-1", {"cost_info": {"total_cost_usd": 1.25, "total_tokens": 900}}, sticky=True)
+
+    await writer.replace("task-1", {"id": "task-1", "status": "editing", "cost_info": {"total_cost_usd": 0.1}})
+    data = _read_task(writer, "task-1")
+    assert data["status"] == "editing"
+    assert data["cost_info"] == {"total_cost_usd": 1.25, "total_tokens": 900}
+
+    # Writer mới (ví dụ sau khi khởi động lại) vẫn giữ cost_info từ file khi bản đầy đủ để trống
+    restarted = TaskJsonWriter(str(tmp_path))
+    await restarted.replace("task-1", {"id": "task-1", "status": "completed", "cost_info": None})
+    data = _read_task(restarted, "task-1")
+    assert data["status"] == "completed"
+    assert data["cost_info"]["total_cost_usd"] == 1.25
+
+
+@pytest.mark.asyncio
+async def test_writer_skips_missing_task_and_reports_errors(tmp_path):
+    """Test patch cho task chưa có task.json không tạo file, lỗi ghi được trả về người gọi"""
+    writer = TaskJsonWriter(str(tmp_path))
+
+    assert await writer.merge("task-2", {"cost_info": {"total_cost_usd": 1.0}}) is False
+    assert not os.path.exists(writer.task_path("task-2"))
+    assert writer.get_stats()["skipped"] == 1
+
+    with patch("app.services.core.storage.task_writer.os.replace", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            await writer.replace("task-3", {"id": "task-3"})
+    assert writer.get_stats()["errors"] == 1
+    assert not os.listdir(tmp_path / "research_tasks" / "task-3")